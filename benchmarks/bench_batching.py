@@ -0,0 +1,146 @@
+"""
+Benchmark of batched classification against a stub LLM backend.
+
+The stub answers after a fixed round trip latency plus a delay proportional to the
+number of prompt tokens, counted as whitespace separated words, so the benchmark shows
+how batching amortizes both the round trips and the system prompt over the files.
+
+Usage:
+    python -m benchmarks.bench_batching [--files 64] [--tokens 300] [--latency 0.2] [--sizes 1 2 4 8 16]
+"""
+
+import re
+import json
+import time
+import random
+import argparse
+from concurrent.futures import ThreadPoolExecutor
+from typing import List
+
+from gpt_pdf_organizer.app.application import Application
+from gpt_pdf_organizer.service.prompt_querier import PromptQuerier
+from gpt_pdf_organizer.service.prompt_querier import PromptResponse
+from gpt_pdf_organizer.service.prompt_querier import TokenUsage
+from gpt_pdf_organizer.utils.config import Config
+from gpt_pdf_organizer.utils.pdf import ExtractedDocument
+
+WORDS = (
+    "the analytical engine weaves algebraical patterns just as the jacquard loom weaves "
+    "flowers and leaves eigenvalue manifold neuroscience"
+).split()
+DOCUMENT_ID_PATTERN = re.compile(r"^Document id: (\S+)$", re.MULTILINE)
+ANSWER = {
+    "content_type": "article",
+    "author": "Ada Lovelace",
+    "year": "1843",
+    "title": "Notes on the Analytical Engine",
+    "topic": "Formal Sciences",
+    "sub_topic": "Computer Science",
+}
+
+
+class StubPromptQuerier(PromptQuerier):
+    """
+    Answers single and batched queries after a simulated latency.
+    """
+
+    def __init__(self, latency: float, seconds_per_1k_tokens: float):
+        super().__init__()
+        self.latency = latency
+        self.seconds_per_1k_tokens = seconds_per_1k_tokens
+
+    def query(self, prompt, system_prompt=None, **kwargs):
+        prompt_tokens = len(prompt.split()) + len((system_prompt or "").split())
+        time.sleep(self.latency + self.seconds_per_1k_tokens * prompt_tokens / 1000)
+
+        document_ids = DOCUMENT_ID_PATTERN.findall(prompt)
+        if document_ids:
+            answer = json.dumps([{"id": i, **ANSWER} for i in document_ids])
+        else:
+            answer = json.dumps(ANSWER)
+        return PromptResponse(
+            answer, TokenUsage(prompt_tokens=prompt_tokens, completion_tokens=len(answer.split()))
+        )
+
+    def clamp_text_by_tokens(self, text, max_tokens):
+        words = text.split()[:max_tokens]
+        return " ".join(words), len(words)
+
+
+def build_documents(num_files: int, num_tokens: int, seed: int = 0) -> List[ExtractedDocument]:
+    rng = random.Random(seed)
+    return [
+        ExtractedDocument(
+            content=" ".join(rng.choice(WORDS) for _ in range(num_tokens)),
+            num_tokens=num_tokens,
+        )
+        for _ in range(num_files)
+    ]
+
+
+def run(batch_size: int, documents: List[ExtractedDocument], args) -> dict:
+    config = Config({
+        "apiKey": "benchmark",
+        "maxNumTokens": args.tokens,
+        "logLevel": "warning",
+        "organizer": {"subfoldersFromAttributes": ["content_type"], "filenameFromAttributes": ["title"]},
+        "concurrency": {"queryWorkers": args.query_workers},
+        "batch": {"size": batch_size, "maxTokens": args.max_batch_tokens},
+    })
+    app = Application(
+        config=config,
+        prompt_querier=StubPromptQuerier(args.latency, args.seconds_per_1k_tokens),
+    )
+    pending = [(i, document, {}) for i, document in enumerate(documents)]
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=args.query_workers) as query_pool:
+        queries = [
+            query_pool.submit(
+                app._classify_batch,
+                [(f"file{i}.pdf", document, resolved) for i, document, resolved in batch],
+            )
+            for batch in app._pack_batches(pending)
+        ]
+        for query in queries:
+            query.result()
+    elapsed = time.perf_counter() - start
+
+    stats = app.get_stats()
+    return {
+        "batch_size": batch_size,
+        "requests": stats["queries"],
+        "requests_per_second": stats["queries"] / elapsed,
+        "files_per_second": len(documents) / elapsed,
+        "prompt_tokens_per_file": stats["prompt_tokens"] / len(documents),
+        "completion_tokens_per_file": stats["completion_tokens"] / len(documents),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--files", type=int, default=64)
+    parser.add_argument("--tokens", type=int, default=300, help="tokens of content per file")
+    parser.add_argument("--latency", type=float, default=0.2, help="seconds per round trip")
+    parser.add_argument("--seconds-per-1k-tokens", type=float, default=0.05)
+    parser.add_argument("--query-workers", type=int, default=4)
+    parser.add_argument("--max-batch-tokens", type=int, default=8000)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1, 2, 4, 8, 16])
+    args = parser.parse_args()
+
+    documents = build_documents(args.files, args.tokens)
+    print(
+        f"{'batch size':>10} {'requests':>9} {'requests/s':>11} {'files/s':>9} "
+        f"{'prompt tokens/file':>19} {'completion tokens/file':>23}"
+    )
+    for batch_size in args.sizes:
+        result = run(batch_size, documents, args)
+        print(
+            f"{result['batch_size']:>10} {result['requests']:>9} "
+            f"{result['requests_per_second']:>11.1f} {result['files_per_second']:>9.1f} "
+            f"{result['prompt_tokens_per_file']:>19.1f} {result['completion_tokens_per_file']:>23.1f}"
+        )
+
+
+if __name__ == "__main__":
+    main()
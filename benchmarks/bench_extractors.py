@@ -0,0 +1,142 @@
+"""
+Benchmark of the text extraction backends.
+
+Each backend extracts the first pages of a corpus, a synthetic one by default or the
+PDF files of --input-path, and the benchmark reports the pages extracted per second,
+the files it failed on, and how much its content agrees with the reference backend:
+the similarity of the words of the first --tokens tokens and, with --classify, the
+fraction of files classified with the same title and content type by the LLM of the
+config file.
+
+Usage:
+    python -m benchmarks.bench_extractors [--input-path PDFS] [--files 50] [--pages 3]
+        [--classify --config-file config.yaml]
+"""
+
+import re
+import json
+import time
+import argparse
+import tempfile
+from typing import Dict
+from typing import List
+from typing import Optional
+
+from benchmarks.corpus import build_corpus
+from gpt_pdf_organizer.domain.prompt_builder import SYSTEM_PROMPT
+from gpt_pdf_organizer.domain.prompt_builder import build_query_from_content
+from gpt_pdf_organizer.gpt_pdf_organizer import TEXT_EXTRACTORS
+from gpt_pdf_organizer.gpt_pdf_organizer import build_prompt_querier
+from gpt_pdf_organizer.gpt_pdf_organizer import build_text_extractor
+from gpt_pdf_organizer.service.prompt_querier import PromptQuerier
+from gpt_pdf_organizer.service.text_extractor import TextExtractor
+from gpt_pdf_organizer.utils.config import Config
+from gpt_pdf_organizer.utils.file import read_files_from_path
+
+WORD_PATTERN = re.compile(r"\w+")
+
+
+def extract(extractor: TextExtractor, files: List[str], num_pages: int, num_tokens: int) -> dict:
+    contents = {}
+    failures = 0
+    num_pages_read = 0
+    start = time.perf_counter()
+    for file in files:
+        try:
+            with extractor.open(file) as document:
+                pages = []
+                for text in document.iter_pages_text():
+                    pages.append(text)
+                    if len(pages) >= num_pages:
+                        break
+        except Exception:
+            failures += 1
+            continue
+        num_pages_read += len(pages)
+        # whitespace separated words stand for tokens, the same for every backend
+        contents[file] = " ".join(" ".join(pages).split()[:num_tokens])
+    elapsed = time.perf_counter() - start
+
+    return {
+        "pages_per_second": num_pages_read / elapsed if elapsed else 0.0,
+        "failures": failures,
+        "contents": contents,
+    }
+
+
+def get_similarity(text: str, reference: str) -> float:
+    """
+    Get the Jaccard similarity of the sets of lowercase words of two texts.
+    """
+    words = set(WORD_PATTERN.findall(text.lower()))
+    reference_words = set(WORD_PATTERN.findall(reference.lower()))
+    if not words and not reference_words:
+        return 1.0
+    return len(words & reference_words) / len(words | reference_words)
+
+
+def classify(prompt_querier: PromptQuerier, content: str) -> Optional[Dict[str, str]]:
+    try:
+        metadata = json.loads(prompt_querier.query(
+            build_query_from_content(content=content), system_prompt=SYSTEM_PROMPT
+        ))
+    except Exception:
+        return None
+    return {key: str(metadata.get(key, "")).strip().lower() for key in ("title", "content_type")}
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--input-path", type=str, default=None, help="PDF files to extract, a synthetic corpus by default")
+    parser.add_argument("--files", type=int, default=50, help="files of the synthetic corpus")
+    parser.add_argument("--pages", type=int, default=3, help="first pages extracted from each file")
+    parser.add_argument("--tokens", type=int, default=1000, help="words of content compared between backends")
+    parser.add_argument("--backends", type=str, nargs="+", default=list(TEXT_EXTRACTORS))
+    parser.add_argument("--reference", type=str, default="pdfplumber")
+    parser.add_argument("--classify", action="store_true", help="also compare the classifications of the LLM")
+    parser.add_argument("--config-file", type=str, default="./config.yaml")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as folder:
+        if args.input_path is not None:
+            files = read_files_from_path(args.input_path, "pdf")
+        else:
+            files = build_corpus(folder, args.files, min_pages=1, max_pages=2 * args.pages)
+
+        results = {
+            name: extract(build_text_extractor(name), files, args.pages, args.tokens)
+            for name in dict.fromkeys([args.reference] + args.backends)
+        }
+
+    prompt_querier = None
+    classifications = {}
+    if args.classify:
+        config = Config()
+        config.load_from_file(args.config_file)
+        prompt_querier = build_prompt_querier(config)
+        for name, result in results.items():
+            classifications[name] = {
+                file: classify(prompt_querier, content) for file, content in result["contents"].items()
+            }
+
+    reference = results[args.reference]["contents"]
+    print(f"{'backend':>12} {'pages/s':>10} {'failures':>9} {'similarity':>11} {'same classification':>20}")
+    for name in args.backends:
+        result = results[name]
+        common = [file for file in result["contents"] if file in reference]
+        similarity = sum(
+            get_similarity(result["contents"][file], reference[file]) for file in common
+        ) / max(1, len(common))
+        line = f"{name:>12} {result['pages_per_second']:>10.1f} {result['failures']:>9} {similarity:>11.3f}"
+        if prompt_querier is not None:
+            agreement = sum(
+                classifications[name][file] is not None
+                and classifications[name][file] == classifications[args.reference][file]
+                for file in common
+            ) / max(1, len(common))
+            line += f" {agreement:>20.1%}"
+        print(line)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,84 @@
+"""
+Benchmark of the placement modes on a synthetic corpus.
+
+Each mode places a corpus of files of random content from a source folder into an
+output folder, and the benchmark reports the files and megabytes placed per second
+and the mode actually used, which differs when the mode fell back, e.g. reflink on a
+filesystem not supporting it. Use --output-dir on another filesystem to measure the
+fallbacks across filesystems.
+
+Usage:
+    python -m benchmarks.bench_placement [--files 200] [--size-mb 2] [--dir /tmp] [--output-dir /mnt/other]
+"""
+
+import os
+import time
+import shutil
+import argparse
+import tempfile
+from collections import Counter
+from typing import List
+
+from gpt_pdf_organizer.utils.placement import PLACEMENT_MODES
+from gpt_pdf_organizer.utils.placement import place_file
+
+
+def build_corpus(folder: str, num_files: int, size: int) -> List[str]:
+    os.makedirs(folder, exist_ok=True)
+    files = []
+    for i in range(num_files):
+        path = os.path.join(folder, f"file{i}.pdf")
+        with open(path, "wb") as f:
+            f.write(os.urandom(size))
+        files.append(path)
+    return files
+
+
+def run(mode: str, files: List[str], output_dir: str, size: int) -> dict:
+    shutil.rmtree(output_dir, ignore_errors=True)
+    os.makedirs(output_dir)
+    used_modes = Counter()
+
+    start = time.perf_counter()
+    for file in files:
+        used_modes[place_file(file, os.path.join(output_dir, os.path.basename(file)), mode)] += 1
+    elapsed = time.perf_counter() - start
+
+    return {
+        "mode": mode,
+        "files_per_second": len(files) / elapsed,
+        "megabytes_per_second": len(files) * size / elapsed / 1024 ** 2,
+        "used_modes": ", ".join(f"{used_mode} x{count}" for used_mode, count in used_modes.items()),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--files", type=int, default=200)
+    parser.add_argument("--size-mb", type=float, default=2.0, help="size of each file")
+    parser.add_argument("--dir", type=str, default=None, help="folder of the corpus, a temporary one by default")
+    parser.add_argument("--output-dir", type=str, default=None, help="output folder, next to the corpus by default")
+    # move is left out: it renames the corpus away
+    parser.add_argument(
+        "--modes", type=str, nargs="+", default=[mode for mode in PLACEMENT_MODES if mode != "move"]
+    )
+    args = parser.parse_args()
+
+    size = int(args.size_mb * 1024 ** 2)
+    with tempfile.TemporaryDirectory(dir=args.dir) as folder:
+        files = build_corpus(os.path.join(folder, "corpus"), args.files, size)
+        output_dir = args.output_dir or os.path.join(folder, "output")
+
+        print(f"{'mode':>16} {'files/s':>10} {'MB/s':>10}  used modes")
+        for mode in args.modes:
+            result = run(mode, files, output_dir, size)
+            print(
+                f"{result['mode']:>16} {result['files_per_second']:>10.1f} "
+                f"{result['megabytes_per_second']:>10.1f}  {result['used_modes']}"
+            )
+        if args.output_dir is not None:
+            shutil.rmtree(output_dir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
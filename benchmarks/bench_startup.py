@@ -0,0 +1,128 @@
+"""
+Benchmark of the startup time of the command line interface.
+
+Fresh interpreters import the CLI module with `python -X importtime` and run --help,
+and the benchmark reports the import time of the module, the modules taking most of
+it, and the wall-clock time of --help, the best of --repeat runs.
+
+The heavy dependencies are imported by the stage needing them: any of DEFERRED_MODULES
+imported along with the CLI module is reported as a regression, as are times slower
+than --baseline by more than --threshold, and the benchmark then exits with status 1.
+
+Usage:
+    python -m benchmarks.bench_startup [--repeat 5] [--output startup.json]
+        [--baseline baseline.json] [--threshold 0.2]
+"""
+
+import sys
+import json
+import time
+import argparse
+import subprocess
+from typing import Dict
+from typing import List
+from typing import Tuple
+
+CLI_MODULE = "gpt_pdf_organizer.gpt_pdf_organizer"
+# the top-level packages not to import when the CLI starts
+DEFERRED_MODULES = ("openai", "httpx", "pdfplumber", "pdfminer", "pypdfium2", "tiktoken", "rich")
+
+
+def measure_imports(module: str = CLI_MODULE) -> List[Tuple[str, int, int]]:
+    """
+    Import the given module in a fresh interpreter with -X importtime.
+
+    Returns the name, self and cumulative microseconds of each imported module, in
+    import order.
+    """
+    stderr = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        capture_output=True, text=True, check=True,
+    ).stderr
+    imports = []
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        self_us, cumulative_us, name = line[len("import time:"):].split("|")
+        imports.append((name.strip(), int(self_us), int(cumulative_us)))
+    return imports
+
+
+def get_deferred_imports(imports: List[Tuple[str, int, int]]) -> List[str]:
+    """
+    Get the modules of DEFERRED_MODULES among the given imports.
+    """
+    return sorted({
+        name for name, _, _ in imports if name.split(".")[0] in DEFERRED_MODULES
+    })
+
+
+def measure_help_seconds() -> float:
+    start = time.perf_counter()
+    subprocess.run(
+        [sys.executable, "-m", CLI_MODULE, "--help"], capture_output=True, check=True
+    )
+    return time.perf_counter() - start
+
+
+def run_benchmark(repeat: int) -> Tuple[Dict[str, float], List[Tuple[str, int, int]]]:
+    """
+    Get the startup results, in seconds, and the imports of the fastest import run.
+    """
+    runs = [measure_imports() for _ in range(repeat)]
+    imports = min(runs, key=lambda run: run[-1][2])
+    results = {
+        "startup.import": imports[-1][2] / 1e6,
+        "startup.help": min(measure_help_seconds() for _ in range(repeat)),
+    }
+    return results, imports
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--top", type=int, default=10, help="number of the slowest imports listed")
+    parser.add_argument("--output", type=str, default=None, help="JSON file the results are written to")
+    parser.add_argument("--baseline", type=str, default=None, help="JSON results to compare against")
+    parser.add_argument("--threshold", type=float, default=0.2, help="allowed slowdown, e.g. 0.2 for 20%%")
+    args = parser.parse_args()
+
+    # imported here, as the suite imports the whole application
+    from benchmarks.bench_suite import compare_results
+    from benchmarks.bench_suite import get_environment
+
+    results, imports = run_benchmark(args.repeat)
+    if args.output is not None:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(
+                {"environment": get_environment(), "arguments": vars(args), "results": results},
+                f, indent=2, sort_keys=True,
+            )
+
+    print(f"{'slowest imports':<60} {'self ms':>8} {'total ms':>9}")
+    for name, self_us, cumulative_us in sorted(imports, key=lambda i: i[1], reverse=True)[:args.top]:
+        print(f"{name:<60} {self_us / 1000:>8.1f} {cumulative_us / 1000:>9.1f}")
+    print()
+
+    baseline = {}
+    if args.baseline is not None:
+        with open(args.baseline, "r", encoding="utf-8") as f:
+            baseline = json.load(f)["results"]
+    for name, seconds in sorted(results.items()):
+        line = f"{name:<20} {seconds * 1000:>8.1f} ms"
+        if baseline.get(name):
+            line += f" (baseline {baseline[name] * 1000:.1f} ms, {seconds / baseline[name] - 1:+.1%})"
+        print(line)
+
+    regressions = compare_results(baseline, results, args.threshold)
+    deferred_imports = get_deferred_imports(imports)
+    if deferred_imports:
+        print(f"imported at startup: {', '.join(deferred_imports)}")
+    if regressions:
+        print(f"{len(regressions)} regressions above {args.threshold:.0%}: {', '.join(regressions)}")
+    if deferred_imports or regressions:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
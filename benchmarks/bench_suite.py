@@ -0,0 +1,284 @@
+"""
+Reproducible benchmark suite of the application, with a regression check.
+
+The suite builds deterministic synthetic PDF corpora, runs the whole organize path
+over them against a fake LLM backend of configurable latency, sequentially and
+pipelined, and micro-benchmarks the hot helpers: page reading, token clamping, snake
+casing and the builders of the output paths.
+
+Every result is a number of seconds per operation, the best of --repeat runs, written
+to --output as JSON with the commit and environment it was measured on. With
+--baseline, results slower than the baseline by more than --threshold are reported as
+regressions, and the suite exits with status 1.
+
+Usage:
+    python -m benchmarks.bench_suite [--corpora small medium] [--latency 0.01] [--repeat 3]
+        [--output results.json] [--baseline baseline.json] [--threshold 0.1]
+"""
+
+import os
+import sys
+import json
+import time
+import shutil
+import hashlib
+import argparse
+import platform
+import tempfile
+import subprocess
+from contextlib import contextmanager
+from typing import Callable
+from typing import Dict
+from typing import Iterator
+from typing import List
+
+from benchmarks.corpus import CORPORA
+from benchmarks.corpus import build_corpus
+from gpt_pdf_organizer.app.application import Application
+from gpt_pdf_organizer.service.prompt_querier import PromptQuerier
+from gpt_pdf_organizer.service.prompt_querier import PromptResponse
+from gpt_pdf_organizer.service.prompt_querier import TokenUsage
+from gpt_pdf_organizer.utils.config import Config
+from gpt_pdf_organizer.utils.pdf import read_pdf_page
+from gpt_pdf_organizer.utils.tokenizer import get_tokenizer
+
+TOPICS = ["Formal Sciences", "Natural Sciences", "Social Sciences", "Humanities"]
+MODES = {
+    "sequential": {"extractionWorkers": 1, "queryWorkers": 1},
+    "pipelined": {"extractionWorkers": 2, "queryWorkers": 4},
+}
+
+
+class FakePromptQuerier(PromptQuerier):
+    """
+    Answers each query after a fixed latency plus a delay proportional to its prompt
+    tokens, counted as whitespace separated words, with metadata derived from the
+    prompt, so the files of a corpus are spread over several folders.
+
+    Holds no lock, so it can be pickled to the extraction processes.
+    """
+
+    def __init__(self, latency: float = 0.0, seconds_per_1k_tokens: float = 0.0):
+        super().__init__()
+        self.latency = latency
+        self.seconds_per_1k_tokens = seconds_per_1k_tokens
+
+    def query(self, prompt, system_prompt=None, **kwargs):
+        prompt_tokens = len(prompt.split()) + len((system_prompt or "").split())
+        delay = self.latency + self.seconds_per_1k_tokens * prompt_tokens / 1000
+        if delay > 0:
+            time.sleep(delay)
+
+        digest = hashlib.sha1(prompt.encode("utf-8")).hexdigest()
+        answer = json.dumps({
+            "content_type": "article",
+            "author": f"Author {digest[:2]}",
+            "year": str(1990 + int(digest[2:4], 16) % 35),
+            "title": f"Document {digest[:12]}",
+            "topic": TOPICS[int(digest[4], 16) % len(TOPICS)],
+            "sub_topic": "null",
+        })
+        return PromptResponse(
+            answer, TokenUsage(prompt_tokens=prompt_tokens, completion_tokens=len(answer.split()))
+        )
+
+    def clamp_text_by_tokens(self, text, max_tokens):
+        words = text.split()[:max_tokens]
+        return " ".join(words), len(words)
+
+
+def best_of(repeat: int, function: Callable[[], float]) -> float:
+    """
+    Run a measurement several times and keep the fastest, the least noisy estimate.
+    """
+    return min(function() for _ in range(repeat))
+
+
+def time_per_call(function: Callable[[], object], number: int) -> float:
+    start = time.perf_counter()
+    for _ in range(number):
+        function()
+    return (time.perf_counter() - start) / number
+
+
+@contextmanager
+def working_directory(path: str) -> Iterator[None]:
+    # the application writes its logs to the working directory
+    previous = os.getcwd()
+    os.chdir(path)
+    try:
+        yield
+    finally:
+        os.chdir(previous)
+
+
+def build_config(mode: str, args) -> Config:
+    return Config({
+        "apiKey": "benchmark",
+        "maxNumTokens": args.tokens,
+        "logLevel": "warning",
+        "organizer": {
+            "subfoldersFromAttributes": ["topic", "year"],
+            "filenameFromAttributes": ["author", "title"],
+        },
+        "concurrency": MODES[mode],
+        "cache": {"enabled": False},
+        "pageTextStore": {"enabled": False},
+        "rateLimit": {"enabled": False},
+    })
+
+
+def bench_organize(corpus_dir: str, num_files: int, mode: str, folder: str, args) -> Dict[str, float]:
+    """
+    Organize a corpus and return the seconds per file of the whole run and of each stage.
+    """
+    output_dir = os.path.join(folder, "output")
+    app = Application(
+        config=build_config(mode, args),
+        prompt_querier=FakePromptQuerier(args.latency, args.seconds_per_1k_tokens),
+    )
+    start = time.perf_counter()
+    for _ in app.organize(corpus_dir, output_dir):
+        pass
+    elapsed = time.perf_counter() - start
+    shutil.rmtree(output_dir)
+
+    results = {"file": elapsed / num_files}
+    for stage, summary in app.get_run_report()["stages"].items():
+        results[f"stage.{stage}"] = summary["sum"] / num_files
+    return results
+
+
+def bench_helpers(corpus: List[str], args) -> Dict[str, float]:
+    """
+    Micro-benchmark the helpers called for each file, in seconds per call.
+    """
+    results = {}
+    config = build_config("sequential", args)
+    app = Application(config=config, prompt_querier=FakePromptQuerier())
+    metadata = {
+        "content_type": "Article", "author": "Ada King, Countess of Lovelace", "year": "1843",
+        "title": "Notes on the Analytical Engine (Sketch of the Analytical Engine)",
+        "topic": "Formal Sciences", "sub_topic": "null",
+    }
+    files = corpus[:20]
+
+    results["read_pdf_page"] = best_of(
+        args.repeat, lambda: time_per_call(lambda: [read_pdf_page(file, 0) for file in files], 1) / len(files)
+    )
+    pages = [read_pdf_page(file, 0) for file in files]
+    try:
+        tokenizer = get_tokenizer(config.llmModelName)
+    except Exception as e:
+        # tiktoken downloads its encodings on first use
+        print(f"skipping clamp_text_by_tokens: could not load the tokenizer: {e}", file=sys.stderr)
+    else:
+        results["clamp_text_by_tokens"] = best_of(args.repeat, lambda: time_per_call(
+            lambda: [tokenizer.clamp_text_by_tokens(page, args.tokens) for page in pages], 10
+        ) / len(pages))
+    results["convert_to_snake_case"] = best_of(args.repeat, lambda: time_per_call(
+        lambda: app._convert_to_snake_case(metadata["title"]), 10000
+    ))
+    results["build_filename"] = best_of(args.repeat, lambda: time_per_call(
+        lambda: app._build_filename_from_attribute_values(metadata), 10000
+    ))
+    results["build_output_dir"] = best_of(args.repeat, lambda: time_per_call(
+        lambda: app.build_output_dir_from_attribute_values(metadata), 10000
+    ))
+    return results
+
+
+def run_suite(args) -> Dict[str, float]:
+    results = {}
+    with tempfile.TemporaryDirectory(dir=args.dir) as folder, working_directory(folder):
+        for corpus_name in args.corpora:
+            num_files, min_pages, max_pages = CORPORA[corpus_name]
+            corpus_dir = os.path.join(folder, corpus_name)
+            corpus = build_corpus(corpus_dir, num_files, min_pages, max_pages, seed=args.seed)
+
+            for mode in args.modes:
+                runs = [bench_organize(corpus_dir, num_files, mode, folder, args) for _ in range(args.repeat)]
+                best = min(runs, key=lambda run: run["file"])
+                for name, seconds in best.items():
+                    results[f"organize.{corpus_name}.{mode}.{name}"] = seconds
+                print(f"organize {corpus_name} {mode}: {best['file'] * 1000:.2f} ms per file", file=sys.stderr)
+
+            if corpus_name == args.corpora[0]:
+                for name, seconds in bench_helpers(corpus, args).items():
+                    results[f"helpers.{name}"] = seconds
+    return results
+
+
+def compare_results(
+    baseline: Dict[str, float], current: Dict[str, float], threshold: float
+) -> List[str]:
+    """
+    Get the names of the results slower than their baseline by more than the threshold,
+    a fraction, e.g. 0.1 for 10%. Per stage results are left out: their sum is checked
+    through the time per file.
+    """
+    return [
+        name for name, seconds in current.items()
+        if ".stage." not in name
+        and baseline.get(name)
+        and seconds > baseline[name] * (1 + threshold)
+    ]
+
+
+def get_environment() -> Dict[str, str]:
+    try:
+        commit = subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        commit = None
+    return {
+        "commit": commit,
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpus": os.cpu_count(),
+        "time": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--corpora", type=str, nargs="+", default=["small", "medium"], choices=list(CORPORA))
+    parser.add_argument("--modes", type=str, nargs="+", default=list(MODES), choices=list(MODES))
+    parser.add_argument("--latency", type=float, default=0.01, help="seconds per fake LLM round trip")
+    parser.add_argument("--seconds-per-1k-tokens", type=float, default=0.0)
+    parser.add_argument("--tokens", type=int, default=500, help="maxNumTokens of the runs")
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--dir", type=str, default=None, help="folder of the corpora, a temporary one by default")
+    parser.add_argument("--output", type=str, default=None, help="JSON file the results are written to")
+    parser.add_argument("--baseline", type=str, default=None, help="JSON results to compare against")
+    parser.add_argument("--threshold", type=float, default=0.1, help="allowed slowdown, e.g. 0.1 for 10%%")
+    args = parser.parse_args()
+
+    results = run_suite(args)
+    report = {"environment": get_environment(), "arguments": vars(args), "results": results}
+    if args.output is not None:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2, sort_keys=True)
+
+    baseline = {}
+    if args.baseline is not None:
+        with open(args.baseline, "r", encoding="utf-8") as f:
+            baseline = json.load(f)["results"]
+
+    print(f"{'benchmark':<52} {'ms':>10} {'baseline':>10} {'change':>8}")
+    for name, seconds in sorted(results.items()):
+        line = f"{name:<52} {seconds * 1000:>10.4f}"
+        if baseline.get(name):
+            line += f" {baseline[name] * 1000:>10.4f} {seconds / baseline[name] - 1:>+8.1%}"
+        print(line)
+
+    regressions = compare_results(baseline, results, args.threshold)
+    if regressions:
+        print(f"{len(regressions)} regressions above {args.threshold:.0%}: {', '.join(regressions)}")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
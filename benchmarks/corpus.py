@@ -0,0 +1,125 @@
+"""
+Deterministic synthetic PDF corpora for the benchmarks and the tests.
+
+The PDF files are written directly, with one page of Helvetica text per item, so
+building a corpus needs no PDF library and gives the same bytes for the same seed.
+"""
+
+import os
+import random
+from typing import List
+
+# words of the synthetic pages, mixing short and long, plain and accented words
+WORDS = (
+    "the analytical engine weaves algebraical patterns just as the jacquard loom weaves "
+    "flowers and leaves eigenvalue manifold neuroscience theorem proof lemma dataset "
+    "regression protein synthesis climate model sonnet chapter volume edition"
+).split()
+WORDS_PER_LINE = 12
+
+# name: number of files, minimum and maximum number of pages per file
+CORPORA = {
+    "small": (20, 1, 3),
+    "medium": (100, 1, 10),
+    "large": (400, 5, 30),
+}
+
+
+def write_pdf(path, pages_text, info=None, xmp=None):
+    """
+    Write a minimal PDF file with one page of Helvetica text per item of pages_text.
+
+    info is an optional document info dictionary, e.g. {"Title": "A title"}, and xmp an
+    optional XMP metadata packet.
+    """
+    objects = [
+        b"<< /Type /Catalog /Pages 2 0 R >>",
+        None,
+        b"<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>",
+    ]
+    if xmp is not None:
+        xmp = xmp.encode("utf-8")
+        objects[0] = f"<< /Type /Catalog /Pages 2 0 R /Metadata {len(objects) + 1} 0 R >>".encode()
+        objects.append(
+            b"<< /Type /Metadata /Subtype /XML /Length %d >>\nstream\n" % len(xmp)
+            + xmp + b"\nendstream"
+        )
+    info_reference = ""
+    if info is not None:
+        info_reference = f" /Info {len(objects) + 1} 0 R"
+        objects.append(
+            ("<< " + " ".join(f"/{key} ({value})" for key, value in info.items()) + " >>").encode("latin-1")
+        )
+    kids = []
+    for text in pages_text:
+        lines = []
+        for i, line in enumerate(text.split("\n")):
+            line = line.replace("\\", "\\\\").replace("(", "\\(").replace(")", "\\)")
+            lines.append(f"BT /F1 10 Tf 50 {750 - 14 * i} Td ({line}) Tj ET")
+        stream = "\n".join(lines).encode("latin-1")
+        kids.append(f"{len(objects) + 1} 0 R")
+        objects.append(
+            f"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 612 792] "
+            f"/Resources << /Font << /F1 3 0 R >> >> /Contents {len(objects) + 2} 0 R >>".encode()
+        )
+        objects.append(
+            b"<< /Length %d >>\nstream\n" % len(stream) + stream + b"\nendstream"
+        )
+    objects[1] = f"<< /Type /Pages /Kids [{' '.join(kids)}] /Count {len(kids)} >>".encode()
+
+    output = bytearray(b"%PDF-1.4\n")
+    offsets = []
+    for i, obj in enumerate(objects):
+        offsets.append(len(output))
+        output += f"{i + 1} 0 obj\n".encode() + obj + b"\nendobj\n"
+    xref_offset = len(output)
+    output += f"xref\n0 {len(objects) + 1}\n0000000000 65535 f \n".encode()
+    for offset in offsets:
+        output += f"{offset:010d} 00000 n \n".encode()
+    output += (
+        f"trailer\n<< /Size {len(objects) + 1} /Root 1 0 R{info_reference} >>\n"
+        f"startxref\n{xref_offset}\n%%EOF\n"
+    ).encode()
+
+    with open(path, "wb") as f:
+        f.write(output)
+    return str(path)
+
+
+def build_pages(rng: random.Random, num_pages: int, words_per_page: int) -> List[str]:
+    """
+    Build the text of the pages of a synthetic document, starting with a title line.
+    """
+    pages = []
+    for page in range(num_pages):
+        lines = [
+            " ".join(rng.choice(WORDS) for _ in range(WORDS_PER_LINE))
+            for _ in range(max(1, words_per_page // WORDS_PER_LINE))
+        ]
+        if page == 0:
+            lines.insert(0, "Title " + " ".join(rng.choice(WORDS) for _ in range(4)))
+        pages.append("\n".join(lines))
+    return pages
+
+
+def build_corpus(
+    folder: str,
+    num_files: int,
+    min_pages: int = 1,
+    max_pages: int = 10,
+    words_per_page: int = 300,
+    seed: int = 0,
+) -> List[str]:
+    """
+    Write a corpus of num_files PDF files of min_pages to max_pages pages to the given
+    folder. The same arguments always give the same files.
+
+    Returns the paths of the files.
+    """
+    os.makedirs(folder, exist_ok=True)
+    rng = random.Random(seed)
+    files = []
+    for i in range(num_files):
+        pages = build_pages(rng, rng.randint(min_pages, max_pages), words_per_page)
+        files.append(write_pdf(os.path.join(folder, f"document{i:05d}.pdf"), pages))
+    return files
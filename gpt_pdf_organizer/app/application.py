@@ -4,70 +4,675 @@ The main application use case class.
 
 import os
 import json
+import asyncio
 import time
-import shutil
+import threading
+from functools import partial
+from collections import deque
+from collections import Counter
+from collections import OrderedDict
+from concurrent.futures import Future
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable
 from typing import Dict
+from typing import Iterable
+from typing import Iterator
 from typing import List
 from typing import Tuple
+from typing import Union
 from typing import Optional
 from typing import Generator
+from typing import AsyncGenerator
 
 from gpt_pdf_organizer.service.prompt_querier import PromptQuerier
-from gpt_pdf_organizer.utils.file import read_files_from_path
+from gpt_pdf_organizer.service.metadata_resolver import MetadataResolver
+from gpt_pdf_organizer.service.metrics_hook import MetricsHook
+from gpt_pdf_organizer.service.text_extractor import TextExtractor
+from gpt_pdf_organizer.service.metadata_resolver import ResolvedAttribute
+from gpt_pdf_organizer.utils.classification_cache import ClassificationCache
+from gpt_pdf_organizer.utils.duplicate_index import DuplicateIndex
+from gpt_pdf_organizer.utils.file import FileScanner
+from gpt_pdf_organizer.utils.file import hash_file
+from gpt_pdf_organizer.utils.library_manifest import LibraryManifest
+from gpt_pdf_organizer.utils.library_manifest import ManifestEntry
+from gpt_pdf_organizer.utils.metrics import Metrics
+from gpt_pdf_organizer.utils.metrics import write_json_report
+from gpt_pdf_organizer.utils.metrics import write_prometheus_report
+from gpt_pdf_organizer.utils.page_text_store import PageTextStore
+from gpt_pdf_organizer.utils.placement import place_file
+from gpt_pdf_organizer.utils.run_journal import RunJournal
+from gpt_pdf_organizer.utils.run_journal import get_file_key
+from gpt_pdf_organizer.utils.work_folder import WorkFolder
+from gpt_pdf_organizer.domain.prompt_builder import PROMPT_VERSION
+from gpt_pdf_organizer.domain.prompt_builder import SYSTEM_PROMPT
 from gpt_pdf_organizer.domain.prompt_builder import build_query_from_content
-from gpt_pdf_organizer.utils.pdf import read_pdf_page
+from gpt_pdf_organizer.domain.attribute import Attribute
+from gpt_pdf_organizer.domain.pricing import estimate_cost
+from gpt_pdf_organizer.utils.pdf import ExtractedDocument
+from gpt_pdf_organizer.utils.pdf import ExtractionLimits
+from gpt_pdf_organizer.utils.pdf import extract_document
 from gpt_pdf_organizer.utils.config import Config
+from gpt_pdf_organizer.app.exception import ExtractionGuardException
 from gpt_pdf_organizer.app.exception import InvalidPromptResponseException
 from gpt_pdf_organizer.app.exception import PdfFileContentNotAvailableException
+from gpt_pdf_organizer.app.exception import RateLimitException
+from gpt_pdf_organizer.app.batching import BatchingMixin
+from gpt_pdf_organizer.app.deduplication import DeduplicationMixin
+from gpt_pdf_organizer.app.file_job import FileJob
+from gpt_pdf_organizer.app.file_job import UNCLASSIFIED_FILE_EXCEPTIONS
+from gpt_pdf_organizer.app.planning import PlanningMixin
+from gpt_pdf_organizer.app.watching import WatchingMixin
 
 import logging
 
 ACCEPTED_CHARACTERS = "abcdefghijklmnopqrstuvwxyzABCDEFGHIJKLMNOPQRSTUVWXYZ0123456789_"
+MAX_NUM_PAGES_TO_READ = 25
 
 
-class Application:
+class Application(BatchingMixin, PlanningMixin, WatchingMixin, DeduplicationMixin):
 
-    def __init__(self, config: Config, prompt_querier: PromptQuerier):
+    def __init__(
+        self,
+        config: Config,
+        prompt_querier: PromptQuerier,
+        classification_cache: Optional[ClassificationCache] = None,
+        page_text_store: Optional[PageTextStore] = None,
+        metadata_resolvers: Optional[List[MetadataResolver]] = None,
+        metrics_hooks: Optional[List[MetricsHook]] = None,
+        text_extractors: Optional[List[TextExtractor]] = None,
+    ):
         """
         Initialize the application.
+
+        The text of the PDF files is extracted with the first of the text extractors,
+        pdfplumber by default, the next ones taking over for the files it fails on,
+        within the limits of the extraction settings.
+
+        The metrics hooks, if any, are notified of the timing of each stage of each
+        file and of the counters of the run as they are recorded.
         """
         self.config = config
         self.prompt_querier = prompt_querier
+        self.classification_cache = classification_cache
+        self.page_text_store = page_text_store
+        self.metadata_resolvers = metadata_resolvers or []
+        self.text_extractors = text_extractors
+        self.extraction_limits = self._get_extraction_limits()
         self.progress = 0
+        self.num_files_handled = 0
+        self.num_files_to_process = None
+        self.input_files = None
         self.process_message = ""
         self.error = False
         self.log_file_path = ""
+        self.stats = Counter()
+        self._stats_lock = threading.Lock()
+        self.metrics = Metrics(counters=self.stats, hooks=metrics_hooks, enabled=config.metrics.enabled)
+        self._run_started_at = None
+        self._run_elapsed = 0.0
+        self._peak_memory_bytes = None
+        # whether the last run is a dry run, see plan
+        self._planning = False
+        self.run_journal = None
+        self.library_manifest = None
+        self.work_folder = None
+        self.duplicate_index = None
+        # file and future metadata of the most recent representatives, by representative id
+        self._representatives = OrderedDict()
+        self._duplicates_lock = threading.Lock()
         self._initialize_logger()
 
-    def organize(self, input_path: str, output_dir: str) -> Generator:
+    def organize(self, input_path: str, output_dir: str, resume: bool = False) -> Generator:
         """
         Run the application.
+
+        Files are handled one after another, unless several files are classified per
+        query, in which case the batched mode is used, or more than one extraction or
+        query worker is configured, in which case the pipelined mode is used.
+        Either way, one item is yielded per handled file.
+
+        Files are handled while the input path is still being scanned, so the total
+        number of files, and the progress, are unknown until the scan finishes.
+
+        When resume is true, files recorded in the run journal of the output
+        directory by a previous run are skipped, which needs journal.enabled.
+
+        When distributed.enabled is true, the files are shared with the other workers
+        handling the same input path into the same output directory: each file is
+        handled by the worker claiming it, and the files claimed by other workers are
+        handled here once their lease is released or expires, e.g. when their worker
+        crashed.
         """
+        files = self._start_run(input_path, output_dir, resume)
+        try:
+            yield from self._organize_files(files, output_dir)
+            while self.work_folder is not None and self.work_folder.has_deferred_files():
+                files = self.work_folder.claim_files(self.work_folder.wait_for_released_files())
+                yield from self._organize_files(files, output_dir)
+        finally:
+            self._finish_run()
 
-        self._initialize_output_dir(output_dir=output_dir)
+    def _organize_files(self, files: Iterable[str], output_dir: str) -> Generator:
+        """
+        Handle the given files in the batched, pipelined or sequential mode, as configured.
+        """
+        concurrency = self.config.concurrency
+        if self.config.batch.size > 1:
+            yield from self._organize_batched(files, output_dir)
+            return
 
-        files = read_files_from_path(input_path, "pdf")
-        self.logger.info(
-            "processing %d files from folder %s ...", (len(files), input_path)
-        )
+        if concurrency.extractionWorkers > 1 or concurrency.queryWorkers > 1:
+            yield from self._organize_pipelined(files, output_dir)
+            return
 
-        # store files that could not be classified
-        self.progress = 0
-        total_files = len(files)
-        self.num_files_to_process = total_files
-        self.logger.info(
-            f"processing total of files: {total_files} in folder {input_path} ...")
-        for i, file in enumerate(files):
-            self.progress = 100.0*(i + 1) / total_files
+        for file in files:
+            self._update_progress(self.num_files_handled + 1)
             self.error = not self._handle_file(file, output_dir)
             yield
 
-    def get_progress(self) -> float:
+    def _start_run(self, input_path: str, output_dir: str, resume: bool) -> Iterator[str]:
+        """
+        Initialize the output directory and the run journal, and start scanning the files to handle.
+
+        In a distributed run, the files are claimed from the work folder of the output
+        directory as they are scanned.
+        """
+        self._check_resume(resume)
+        files = self._scan_input_files(input_path)
+        self.logger.info("processing files from folder %s ...", input_path)
+
+        settings = self.config.distributed
+        if settings.enabled:
+            self.work_folder = WorkFolder(
+                WorkFolder.get_path(output_dir),
+                worker_id=settings.workerId,
+                lease_seconds=settings.leaseSeconds,
+                heartbeat_seconds=settings.heartbeatSeconds,
+                on_lease_lost=self._handle_lost_lease,
+            )
+            self.work_folder.start(input_path)
+            self.logger.info("claiming files as worker %s", self.work_folder.worker_id)
+
+        handled_file_keys = self._open_run(output_dir, load_handled_file_keys=resume)
+        if resume:
+            files = self._skip_handled_files(files, handled_file_keys)
+        if self.work_folder is not None:
+            files = self.work_folder.claim_files(files)
+        return files
+
+    def _check_resume(self, resume: bool):
+        """
+        Check that the files handled by a previous run can be skipped, which needs the run journal.
+
+        Raises:
+            ValueError: when resume is true and journal.enabled is false.
+        """
+        if resume and not self.config.journal.enabled:
+            raise ValueError("Resuming a run needs the run journal, please enable journal.enabled")
+
+    def _handle_lost_lease(self, file: str):
+        """
+        Count a file whose lease was taken over by another worker while it was being
+        handled, e.g. after a pause longer than distributed.leaseSeconds. Both workers
+        handle it, which placing files again tolerates.
+        """
+        self.logger.warning("lost the lease of file %s to another worker", file)
+        with self._stats_lock:
+            self.stats["leases_lost"] += 1
+
+    def _open_run(self, output_dir: str, load_handled_file_keys: bool = False) -> set:
+        """
+        Initialize the output directory, the duplicate index, the run journal and the
+        library manifest, which are those of the worker in a distributed run, merged
+        into those of the output directory once all the workers are done.
+
+        Returns the keys of the files recorded in the run journal by previous runs, when
+        asked to load them, and an empty set otherwise.
+        """
+        self._run_started_at = time.perf_counter()
+        self._planning = False
+        self._initialize_output_dir(output_dir=output_dir)
+
+        self.duplicate_index = None
+        self._representatives.clear()
+        if self.config.deduplication.enabled:
+            self.duplicate_index = DuplicateIndex(threshold=self.config.deduplication.threshold)
+
+        handled_file_keys = set()
+        if self.config.journal.enabled:
+            journal_path = RunJournal.get_path(output_dir)
+            if load_handled_file_keys:
+                handled_file_keys = RunJournal.load_handled_file_keys(journal_path)
+
+            if self.work_folder is not None:
+                journal_path = self.work_folder.journal_path
+            self.run_journal = RunJournal(
+                journal_path, flush_interval=self.config.journal.flushIntervalSeconds
+            )
+
+        if self.config.manifest.enabled:
+            self.library_manifest = LibraryManifest(
+                LibraryManifest.get_path(output_dir) if self.work_folder is None else self.work_folder.manifest_path,
+                flush_interval=self.config.manifest.flushIntervalSeconds,
+                # the work folder may be on NFS, where the write-ahead log does not work
+                wal=self.work_folder is None,
+            )
+
+        return handled_file_keys
+
+    def _scan_input_files(self, input_path: str) -> Iterator[str]:
+        """
+        Start scanning the PDF files of the input path, and reset the progress.
+        """
+        self.input_files = self._build_file_scanner(input_path)
+        self.progress = 0
+        self.num_files_handled = 0
+        self.num_files_to_process = None
+        return self._time_discovery(iter(self.input_files))
+
+    def _build_file_scanner(self, input_path: str) -> FileScanner:
+        settings = self.config.input
+        return FileScanner(
+            input_path,
+            extensions=["pdf"],
+            recursive=settings.recursive,
+            include=settings.include,
+            exclude=settings.exclude,
+            follow_symlinks=settings.followSymlinks,
+            sort_entries=settings.sortEntries,
+            on_error=lambda e: self.logger.warning("could not scan %s: %s, skipping ...", e.filename, e),
+        )
+
+    def _time_discovery(self, files: Iterator[str]) -> Iterator[str]:
+        """
+        Time the discovery of each file by the scanner.
+        """
+        while True:
+            start = time.perf_counter()
+            file = next(files, None)
+            if file is None:
+                return
+            self.metrics.observe("discovery", time.perf_counter() - start)
+            yield file
+
+    def _skip_handled_files(self, files: Iterable[str], handled_file_keys: set) -> Iterator[str]:
+        """
+        Skip the files recorded in the run journal by a previous run.
+        """
+        for file in files:
+            if get_file_key(file) in handled_file_keys:
+                self.stats["resumed_skipped"] += 1
+                continue
+            yield file
+
+    def _update_progress(self, num_files_handled: int):
+        """
+        Update the progress once the given number of files were handled. The progress is
+        None while the total number of files is unknown, i.e. the scan is not finished.
+        """
+        self.num_files_handled = num_files_handled
+        input_files = self.input_files
+        if self.work_folder is not None:
+            # the share of the files of this worker is unknown until the run ends
+            input_files = None
+        if self.num_files_to_process is None and input_files is not None and input_files.finished:
+            self.num_files_to_process = input_files.num_files - self.stats["resumed_skipped"]
+            self.logger.info(
+                "found %d files, %d already handled by a previous run",
+                input_files.num_files, self.stats["resumed_skipped"],
+            )
+
+        if self.num_files_to_process:
+            self.progress = 100.0*num_files_handled / self.num_files_to_process
+        else:
+            self.progress = None
+
+    def _finish_run(self):
+        """
+        Flush and close the run journal and the library manifest, and report the metrics
+        of the run.
+        """
+        if self._run_started_at is not None:
+            self._run_elapsed = time.perf_counter() - self._run_started_at
+            self._run_started_at = None
+        self._report_run()
+
+        self.input_files = None
+        self.duplicate_index = None
+        self._representatives.clear()
+        if self.run_journal is not None:
+            self.run_journal.close()
+            self.run_journal = None
+        if self.library_manifest is not None:
+            self.library_manifest.close()
+            self.library_manifest = None
+        if self.work_folder is not None:
+            # the files not done, e.g. when the run is interrupted, are left to the other workers
+            self.work_folder.close()
+            self.work_folder = None
+
+    def _organize_pipelined(
+        self,
+        files: Iterable[str],
+        output_dir: str,
+        pools: Optional[Tuple[ProcessPoolExecutor, ThreadPoolExecutor]] = None,
+    ) -> Generator:
+        """
+        Run the application as a pipeline of three stages.
+
+        PDF text extraction runs in a process pool, LLM queries run in a separate
+        thread pool, and file placement runs in the calling thread, in input order.
+        The number of files in flight is bounded so memory stays flat on large inputs.
+
+        The extraction and query pools are created for the run, unless given, in which
+        case they are left running.
+        """
+        concurrency = self.config.concurrency
+        max_in_flight = 2 * (concurrency.extractionWorkers + concurrency.queryWorkers)
+        files_to_submit = iter(files)
+        in_flight = deque()
+
+        owns_pools = pools is None
+        extraction_pool, query_pool = pools or self._create_pools()
+
+        def submit_next_file() -> bool:
+            file = next(files_to_submit, None)
+            if file is None:
+                return False
+            job = self._prepare_file(file)
+            in_flight.append(
+                (job, self._submit_file(job, extraction_pool, query_pool))
+            )
+            return True
+
+        try:
+            while len(in_flight) < max_in_flight and submit_next_file():
+                pass
+
+            while in_flight:
+                job, classification = in_flight.popleft()
+                submit_next_file()
+
+                self._update_progress(self.num_files_handled + 1)
+                try:
+                    job.metadata = classification.result()
+                except RateLimitException as e:
+                    self.error = not self._handle_rate_limited_file(job, e)
+                except UNCLASSIFIED_FILE_EXCEPTIONS as e:
+                    self.error = not self._handle_classification_error(
+                        job, output_dir, e)
+                else:
+                    self.error = not self._complete_file(job, output_dir)
+
+                yield
+        finally:
+            # files still queued when the run is interrupted are dropped
+            if owns_pools:
+                extraction_pool.shutdown(cancel_futures=True)
+                query_pool.shutdown(cancel_futures=True)
+
+    def _create_pools(
+        self, initializer: Optional[Callable] = None
+    ) -> Tuple[Optional[ProcessPoolExecutor], ThreadPoolExecutor]:
+        """
+        Create the extraction process pool and the query thread pool of the configured sizes.
+
+        In the batched mode, the text is extracted in the calling thread with a single
+        extraction worker, so there is no extraction pool.
+        """
+        concurrency = self.config.concurrency
+        extraction_pool = None
+        if self.config.batch.size == 1 or concurrency.extractionWorkers > 1:
+            extraction_pool = ProcessPoolExecutor(
+                max_workers=concurrency.extractionWorkers, initializer=initializer
+            )
+        return extraction_pool, ThreadPoolExecutor(max_workers=concurrency.queryWorkers)
+
+    def _extract_documents(
+        self, jobs: List[FileJob], extraction_pool: Optional[ProcessPoolExecutor]
+    ) -> List[Union[ExtractedDocument, ExtractionGuardException]]:
+        """
+        Extract the documents of the given files, in the extraction pool if any.
+
+        Files whose extraction was stopped by the extraction limits get the exception
+        instead of their document.
+        """
+        if extraction_pool is None:
+            extractions = [self._build_extraction(job) for job in jobs]
+        else:
+            extractions = [extraction_pool.submit(self._build_extraction(job)).result for job in jobs]
+
+        documents = []
+        for extraction in extractions:
+            try:
+                documents.append(extraction())
+            except ExtractionGuardException as e:
+                documents.append(e)
+        return documents
+
+    def relayout(self, output_dir: str) -> Generator:
+        """
+        Move the classified files of an output folder to the destinations built from
+        their metadata in its library manifest with the current organizer settings,
+        e.g. after changing organizer.subfoldersFromAttributes, without querying the LLM.
+
+        Files whose new destination is taken by another file are skipped, and the
+        folders left empty are removed. One item is yielded per classified file.
+        """
+        self._run_started_at = time.perf_counter()
+        self._planning = False
+        self.input_files = None
+        self.num_files_handled = 0
+        self.library_manifest = LibraryManifest(
+            LibraryManifest.get_path(output_dir),
+            flush_interval=self.config.manifest.flushIntervalSeconds,
+        )
+        self.num_files_to_process = self.library_manifest.count(status="classified")
+
+        try:
+            for entry in self.library_manifest.iter_entries(status="classified"):
+                self._update_progress(self.num_files_handled + 1)
+                self.error = not self._relayout_entry(entry, output_dir)
+                yield
+        finally:
+            self._finish_run()
+
+    def _relayout_entry(self, entry: ManifestEntry, output_dir: str) -> bool:
+        """
+        Move a classified file to the destination built from its metadata, if not there already.
+        """
+        source = entry.destination
+        destination = os.path.abspath(self._build_destination(output_dir, entry.metadata))
+        if source == destination:
+            self.process_message = f"file {source} is already in place"
+            return True
+        if not os.path.lexists(source):
+            self.logger.warning("file %s no longer exists, skipping ...", source)
+            self.process_message = f"file {source} no longer exists, skipping ..."
+            self.stats["missing_files"] += 1
+            return False
+        if os.path.lexists(destination):
+            self.logger.warning("cannot move file %s to %s, which is another file, skipping ...", source, destination)
+            self.process_message = f"cannot move file {source} to {destination}, which is another file, skipping ..."
+            self.stats["relayout_conflicts"] += 1
+            return False
+
+        self.logger.info(f"moving file {source} to {destination}")
+        os.makedirs(os.path.dirname(destination), exist_ok=True)
+        with self.metrics.time("placement"):
+            place_file(source, destination, "move")
+        self._remove_empty_folders(os.path.dirname(source), output_dir)
+
+        entry.destination = destination
+        entry.recorded_at = None
+        self.library_manifest.record(entry)
+        self.stats["relayout_moved"] += 1
+        self.process_message = f"moved file {source} --> {destination} ..."
+        return True
+
+    @staticmethod
+    def _remove_empty_folders(folder: str, output_dir: str):
+        """
+        Remove a folder of the output folder and its parents, as long as they are empty.
+        """
+        output_dir = os.path.abspath(output_dir)
+        folder = os.path.abspath(folder)
+        while folder.startswith(output_dir + os.sep):
+            try:
+                os.rmdir(folder)
+            except OSError:
+                # not empty
+                return
+            folder = os.path.dirname(folder)
+
+    async def organize_async(self, input_path: str, output_dir: str, resume: bool = False) -> AsyncGenerator:
+        """
+        Run the application on an asyncio event loop.
+
+        PDF text extraction runs in a process pool, while up to
+        concurrency.queryWorkers queries are awaited concurrently through the
+        prompt querier aquery. Files are placed in input order and one item is
+        yielded per handled file, as with organize.
+        """
+        files = self._start_run(input_path, output_dir, resume)
+        try:
+            async for _ in self._organize_async(files, output_dir):
+                yield
+            while self.work_folder is not None and self.work_folder.has_deferred_files():
+                released_files = await asyncio.get_running_loop().run_in_executor(
+                    None, self.work_folder.wait_for_released_files
+                )
+                async for _ in self._organize_async(self.work_folder.claim_files(released_files), output_dir):
+                    yield
+        finally:
+            self._finish_run()
+
+    async def _organize_async(self, files: Iterable[str], output_dir: str) -> AsyncGenerator:
+        """
+        Run the extraction, query and placement stages of the given files on the event loop.
         """
-        Get the progress of the application.
+        concurrency = self.config.concurrency
+        max_in_flight = 2 * (concurrency.extractionWorkers + concurrency.queryWorkers)
+        query_slots = asyncio.Semaphore(concurrency.queryWorkers)
+        files_to_submit = iter(files)
+        in_flight = deque()
+
+        extraction_pool = ProcessPoolExecutor(max_workers=concurrency.extractionWorkers)
+
+        def submit_next_file() -> bool:
+            file = next(files_to_submit, None)
+            if file is None:
+                return False
+            job = self._prepare_file(file)
+            in_flight.append((job, asyncio.ensure_future(
+                self._handle_file_async(job, extraction_pool, query_slots)
+            )))
+            return True
+
+        try:
+            while len(in_flight) < max_in_flight and submit_next_file():
+                pass
+
+            while in_flight:
+                job, classification = in_flight.popleft()
+                submit_next_file()
+
+                self._update_progress(self.num_files_handled + 1)
+                try:
+                    job.metadata = await classification
+                except RateLimitException as e:
+                    self.error = not self._handle_rate_limited_file(job, e)
+                except UNCLASSIFIED_FILE_EXCEPTIONS as e:
+                    self.error = not self._handle_classification_error(
+                        job, output_dir, e)
+                else:
+                    self.error = not self._complete_file(job, output_dir)
+
+                yield
+        finally:
+            for _, classification in in_flight:
+                classification.cancel()
+            extraction_pool.shutdown(cancel_futures=True)
+
+    async def _handle_file_async(
+        self,
+        job: FileJob,
+        extraction_pool: ProcessPoolExecutor,
+        query_slots: asyncio.Semaphore,
+    ) -> Dict[str, str]:
+        """
+        Extract and classify a file, returning its parsed metadata.
+        """
+        if job.metadata is not None:
+            return job.metadata
+
+        document = await asyncio.get_running_loop().run_in_executor(
+            extraction_pool, self._build_extraction(job)
+        )
+        async with query_slots:
+            return await self._aclassify_content(job, document)
+
+    def _submit_file(
+        self,
+        job: FileJob,
+        extraction_pool: ProcessPoolExecutor,
+        query_pool: ThreadPoolExecutor,
+    ) -> Future:
+        """
+        Submit a file to the extraction and query stages of the pipeline.
+
+        Returns a future resolving to the parsed metadata of the file.
+        """
+        classification = Future()
+        if job.metadata is not None:
+            classification.set_result(job.metadata)
+            return classification
+
+        def on_classified(query: Future):
+            try:
+                classification.set_result(query.result())
+            except Exception as e:
+                classification.set_exception(e)
+
+        def on_extracted(extraction: Future):
+            try:
+                document = extraction.result()
+            except Exception as e:
+                classification.set_exception(e)
+                return
+
+            try:
+                query = query_pool.submit(self._classify_content, job, document)
+            except RuntimeError as e:
+                # the pipeline was shut down while the file was being extracted
+                classification.set_exception(e)
+                return
+            query.add_done_callback(on_classified)
+
+        extraction = extraction_pool.submit(self._build_extraction(job))
+        extraction.add_done_callback(on_extracted)
+        return classification
+
+    def get_progress(self) -> Optional[float]:
+        """
+        Get the progress of the application, in percent, or None while the total number
+        of files is unknown.
         """
         return self.progress
 
+    def get_num_files_handled(self) -> int:
+        """
+        Get the number of files handled so far.
+        """
+        return self.num_files_handled
+
+    def get_num_files_to_process(self) -> Optional[int]:
+        """
+        Get the total number of files to handle, or None while the input path is being scanned.
+        """
+        return self.num_files_to_process
+
     def get_process_message(self) -> str:
         """
         Get the process message.
@@ -86,48 +691,591 @@ class Application:
         """
         return self.log_file_path
 
+    def get_stats(self) -> Counter:
+        """
+        Get the counters of the run, e.g. cache_hits, cache_misses, resolved_without_llm
+        and prompt_tokens.
+        """
+        return self.stats
+
     def _handle_file(self, file: str, output_dir: str):
+        job = self._prepare_file(file)
+        if job.metadata is None:
+            try:
+                document = self._build_extraction(job)()
+                job.metadata = self._classify_content(job, document)
+            except RateLimitException as e:
+                return self._handle_rate_limited_file(job, e)
+            except UNCLASSIFIED_FILE_EXCEPTIONS as e:
+                return self._handle_classification_error(job, output_dir, e)
+
+        return self._complete_file(job, output_dir)
+
+    def _prepare_file(self, file: str) -> FileJob:
+        """
+        Start handling a file, resolving its metadata from the classification cache when possible.
+        """
         self.logger.info("processing file %s ...", file)
+        job = FileJob(file=file)
+        if self.run_journal is not None or self.library_manifest is not None:
+            job.journal_key = get_file_key(file)
+
+        if self.classification_cache is None and self.page_text_store is None and self.duplicate_index is None:
+            return job
+
+        with self.metrics.time("hash"):
+            job.content_hash = hash_file(file)
+        if self.classification_cache is None:
+            return job
+
+        job.cache_key = ClassificationCache.build_key(
+            content_hash=job.content_hash,
+            model_name=self.config.llmModelName,
+            prompt_version=PROMPT_VERSION,
+            max_num_tokens=self.config.maxNumTokens,
+            resolver_settings=self._get_resolver_settings(),
+            token_tiers=",".join(str(tier) for tier in self._get_token_tiers()[:-1]),
+        )
+        job.metadata = self.classification_cache.get(job.cache_key)
+        job.cached = job.metadata is not None
+        with self._stats_lock:
+            self.stats["cache_hits" if job.cached else "cache_misses"] += 1
+        if job.cached:
+            self.logger.info("found cached classification of file %s", file)
+
+        return job
+
+    def _complete_file(self, job: FileJob, output_dir: str) -> bool:
+        """
+        Finish handling a classified file: cache its metadata, place it and journal it.
+        """
+        if self.classification_cache is not None and not job.cached and job.cache_key is not None:
+            self.classification_cache.put(job.cache_key, job.metadata)
+
+        if job.duplicate_of is not None and self.config.deduplication.duplicatesFolder:
+            destination = self._place_duplicate_file(job, output_dir)
+            self._record_in_journal(job, "duplicate", destination, duplicate_of=job.duplicate_of)
+        else:
+            destination = self._place_classified_file(job.file, output_dir, job.metadata)
+            self._record_in_journal(job, "classified", destination)
+        self._record_file_timing(job)
+        return True
+
+    def _record_in_journal(self, job: FileJob, status: str, destination: str, **extra):
+        """
+        Record the outcome of a handled file in the run journal and in the library
+        manifest, if enabled, and mark it as done in the work folder of a distributed run.
+        """
+        if self.work_folder is not None:
+            self.work_folder.complete(job.file, status)
+        if self.library_manifest is not None:
+            self.library_manifest.record(ManifestEntry(
+                source=os.path.abspath(job.file),
+                status=status,
+                destination=os.path.abspath(destination) if destination is not None else None,
+                metadata=job.metadata,
+                file_key=job.journal_key,
+                content_hash=job.content_hash,
+                model=self.config.llmModelName,
+                prompt_version=PROMPT_VERSION,
+                elapsed_seconds=time.perf_counter() - job.started_at,
+                peak_memory_bytes=job.peak_memory_bytes,
+                reason=extra.get("reason"),
+            ))
+        if self.run_journal is None:
+            return
+
+        if job.peak_memory_bytes is not None:
+            extra["peak_memory_bytes"] = job.peak_memory_bytes
+        self.run_journal.record(
+            key=job.journal_key,
+            source=job.file,
+            status=status,
+            destination=destination,
+            metadata=job.metadata,
+            **extra,
+        )
+
+    def _classify_content(self, job: FileJob, document: ExtractedDocument) -> Dict[str, str]:
+        """
+        Resolve the metadata of a file, querying the LLM with its extracted content for
+        the attributes that could not be resolved otherwise, unless the file duplicates
+        another one whose metadata it then reuses.
+        """
+        self._record_extraction(job, document)
+        resolved = self._resolve_metadata(job.file, document)
+        if self._get_missing_attributes(resolved):
+            claim = self._claim_representative(job, document)
+            if claim is not None:
+                metadata = self._reuse_representative_metadata(job, *claim)
+                if metadata is not None:
+                    return metadata
+
         try:
-            content = self._read_first_k_tokens_from_pdf(
-                pdf_path=file, k=self.config.maxNumTokens
+            metadata = self._query_metadata(job.file, document, resolved)
+        except BaseException as e:
+            self._settle_representative(job, e)
+            raise
+        self._settle_representative(job, metadata)
+        return metadata
+
+    def _query_metadata(
+        self,
+        file: str,
+        document: ExtractedDocument,
+        resolved: Dict[Attribute, ResolvedAttribute],
+        first_tier: int = 0,
+    ) -> Dict[str, str]:
+        """
+        Query the LLM with the extracted content of a file for the attributes missing
+        from the resolved ones, if any, by token tier.
+        """
+        if not self._get_missing_attributes(resolved):
+            return self._merge_metadata({}, resolved)
+
+        tier_queries = self._query_tiers(file, document, resolved, first_tier)
+        prompt = next(tier_queries)
+        while True:
+            with self.metrics.time("query"):
+                response = self.prompt_querier.query(prompt, system_prompt=SYSTEM_PROMPT)
+            try:
+                prompt = tier_queries.send(response)
+            except StopIteration as e:
+                return e.value
+
+    async def _aquery_metadata(
+        self,
+        file: str,
+        document: ExtractedDocument,
+        resolved: Dict[Attribute, ResolvedAttribute],
+    ) -> Dict[str, str]:
+        """
+        Asynchronously query the LLM with the extracted content of a file for the
+        attributes missing from the resolved ones, if any, by token tier.
+        """
+        if not self._get_missing_attributes(resolved):
+            return self._merge_metadata({}, resolved)
+
+        tier_queries = self._query_tiers(file, document, resolved)
+        prompt = next(tier_queries)
+        while True:
+            with self.metrics.time("query"):
+                response = await self.prompt_querier.aquery(prompt, system_prompt=SYSTEM_PROMPT)
+            try:
+                prompt = tier_queries.send(response)
+            except StopIteration as e:
+                return e.value
+
+    def _query_tiers(
+        self,
+        file: str,
+        document: ExtractedDocument,
+        resolved: Dict[Attribute, ResolvedAttribute],
+        first_tier: int = 0,
+    ) -> Generator[str, str, Dict[str, str]]:
+        """
+        Walk the token tiers of a file, for both the blocking and the asyncio queries:
+        the prompt of each tier is yielded, the response to it is sent back, and the
+        metadata of the file is returned once an answer classifies it.
+
+        The content is first clamped to the smallest token tier, and the LLM is queried
+        again with the content of the next tier while its answer cannot classify the file.
+        """
+        missing_attributes = self._get_missing_attributes(resolved)
+        tiers = self._get_token_tiers()
+        for tier in range(first_tier, len(tiers)):
+            response = yield self._build_prompt(
+                file,
+                self._get_tier_content(document, tiers[tier]),
+                missing_attributes if resolved else None,
             )
-            if content is None:
-                self.logger.warning(
-                    "could not extract content from file %s, skipping ...", file
+            self._record_usage(file, response)
+            try:
+                metadata = self._parse_metadata(file, response, resolved)
+            except (json.JSONDecodeError, InvalidPromptResponseException):
+                if self._is_last_tier(document, tier):
+                    raise
+                self.logger.info(
+                    "could not classify file %s from %d tokens, retrying with %d tokens ...",
+                    file, tiers[tier], tiers[tier + 1],
                 )
-                raise PdfFileContentNotAvailableException(
-                    "could not extract content from file")
+                continue
+
+            self._record_tier(tier)
+            return metadata
+
+    async def _aclassify_content(self, job: FileJob, document: ExtractedDocument) -> Dict[str, str]:
+        """
+        Asynchronously resolve the metadata of a file, querying the LLM with its extracted
+        content for the attributes that could not be resolved otherwise, unless the file
+        duplicates another one whose metadata it then reuses.
+        """
+        self._record_extraction(job, document)
+        resolved = self._resolve_metadata(job.file, document)
+        if self._get_missing_attributes(resolved):
+            claim = self._claim_representative(job, document)
+            if claim is not None:
+                match, representative_file, representative = claim
+                try:
+                    # the representative is classified by another task of the event loop
+                    await asyncio.wrap_future(representative)
+                except Exception:
+                    pass
+                metadata = self._reuse_representative_metadata(job, match, representative_file, representative)
+                if metadata is not None:
+                    return metadata
+
+        try:
+            metadata = await self._aquery_metadata(job.file, document, resolved)
+        except BaseException as e:
+            self._settle_representative(job, e)
+            raise
+        self._settle_representative(job, metadata)
+        return metadata
+
+    def _get_token_tiers(self) -> List[int]:
+        """
+        Get the increasing token budgets the content of a file is sent with: the
+        configured tiers smaller than maxNumTokens, then maxNumTokens.
+        """
+        tiers = [tier for tier in self.config.tokenBudget.tiers if tier < self.config.maxNumTokens]
+        return tiers + [self.config.maxNumTokens]
+
+    def _get_tier_content(self, document: ExtractedDocument, budget: int) -> Optional[str]:
+        """
+        Get the extracted content of a file clamped to the given token budget.
+        """
+        if document.content is None or document.num_tokens <= budget:
+            return document.content
+        return self.prompt_querier.clamp_text_by_tokens(document.content, budget)[0]
+
+    def _is_last_tier(self, document: ExtractedDocument, tier: int) -> bool:
+        """
+        Whether a tier is the last one worth querying for a document: the largest tier,
+        or the first one sending its whole extracted content.
+        """
+        tiers = self._get_token_tiers()
+        return tier == len(tiers) - 1 or document.num_tokens <= tiers[tier]
+
+    def _record_tier(self, tier: int):
+        """
+        Count a file classified from the content of the given token tier.
+        """
+        with self._stats_lock:
+            self.stats[f"token_tier_{self._get_token_tiers()[tier]}"] += 1
+
+    def _record_usage(self, file: str, response: str):
+        """
+        Add the tokens billed for the query of a file to the run stats, when the prompt
+        querier reports them.
+        """
+        usage = getattr(response, "usage", None)
+        if usage is None:
+            return
 
-            self.logger.debug(
-                f"extracted content from file {file}, content size is {len(content)}"
+        self.logger.info(
+            "query of file %s used %d prompt tokens (%d cached) and %d completion tokens",
+            file, usage.prompt_tokens, usage.cached_prompt_tokens, usage.completion_tokens,
+        )
+        self.metrics.increment("queries")
+        self.metrics.increment("prompt_tokens", usage.prompt_tokens)
+        self.metrics.increment("cached_prompt_tokens", usage.cached_prompt_tokens)
+        self.metrics.increment("completion_tokens", usage.completion_tokens)
+
+    def _record_extraction(self, job: FileJob, document: ExtractedDocument):
+        """
+        Record the timings and the peak memory of the extraction of a document, which
+        may have run in another process, and whether a text extractor failed on it.
+        """
+        for stage, seconds in document.timings.items():
+            self.metrics.observe(stage, seconds)
+        self._record_peak_memory(job, document.peak_memory_bytes)
+        if len(document.extractors) > 1:
+            self.logger.warning(
+                "could not extract file %s with %s, used %s instead",
+                job.file, ", ".join(document.extractors[:-1]), document.extractors[-1],
             )
-            prompt = build_query_from_content(content=content)
-            response = self.prompt_querier.query(prompt)
-            metadata = json.loads(response) or {}
-            title = metadata.get("title", None)
-
-            if not type(title) == str or title.strip() == "null":
-                self.logger.error(
-                    f"could not classify file {file}, skipping ...")
-                raise InvalidPromptResponseException("could not classify file")
-        except (json.JSONDecodeError, InvalidPromptResponseException, PdfFileContentNotAvailableException) as e:
-            self.logger.error(f"could not classify file: {e}, skipping ...")
-            self._handle_unclassified_file(file, output_dir)
-            self.process_message = f"could not classify file: {file}, moving to unclassified folder ..."
-            return False
+            with self._stats_lock:
+                self.stats["extraction_fallbacks"] += 1
 
-        filename = self._build_filename_from_attribute_values(metadata)
-        final_output_dir = os.path.join(
-            output_dir, self.build_output_dir_from_attribute_values(metadata)
+    def _record_extraction_stopped(self, job: FileJob, error: ExtractionGuardException):
+        """
+        Record the extraction of a file stopped by the extraction limits.
+        """
+        self.logger.warning("stopped the extraction of file %s: %s", job.file, error)
+        self._record_peak_memory(job, error.peak_memory_bytes)
+        with self._stats_lock:
+            self.stats["extractions_stopped"] += 1
+
+    def _record_peak_memory(self, job: FileJob, peak_memory_bytes: Optional[int]):
+        """
+        Record the peak memory of the extraction of a file, when it was measured.
+        """
+        if peak_memory_bytes is None:
+            return
+
+        job.peak_memory_bytes = peak_memory_bytes
+        self.logger.info(
+            "extraction of file %s peaked at %.1f MB", job.file, peak_memory_bytes / 2 ** 20
         )
-        os.makedirs(final_output_dir, exist_ok=True)
+        with self._stats_lock:
+            self._peak_memory_bytes = max(self._peak_memory_bytes or 0, peak_memory_bytes)
 
-        dest = os.path.join(final_output_dir, filename + ".pdf")
-        self._move_or_copy_file(file, dest)
+    def _record_file_timing(self, job: FileJob):
+        """
+        Record the time a file took from the start of its handling until its outcome.
+        """
+        self.metrics.observe("file", time.perf_counter() - job.started_at)
+
+    def get_run_report(self) -> Dict:
+        """
+        Get the report of the last run: its throughput, token usage and estimated cost,
+        counters, and the latency summary of each stage.
+        """
+        with self._stats_lock:
+            counters = dict(self.stats)
+        elapsed = self._run_elapsed
+        if self._run_started_at is not None:
+            elapsed = time.perf_counter() - self._run_started_at
+
+        model = self.config.llmModelName
+        prompt_tokens = counters.get("prompt_tokens", 0)
+        cached_prompt_tokens = counters.get("cached_prompt_tokens", 0)
+        completion_tokens = counters.get("completion_tokens", 0)
+        return {
+            "model": model,
+            "elapsed_seconds": elapsed,
+            "files": self.num_files_handled,
+            "throughput": {
+                "files_per_second": self.num_files_handled / elapsed if elapsed else 0.0,
+                "tokens_per_second": (prompt_tokens + completion_tokens) / elapsed if elapsed else 0.0,
+            },
+            "cost": {
+                "model": model,
+                "prompt_tokens": prompt_tokens,
+                "cached_prompt_tokens": cached_prompt_tokens,
+                "completion_tokens": completion_tokens,
+                "estimated_usd": estimate_cost(
+                    model, prompt_tokens, completion_tokens, cached_prompt_tokens,
+                    prices=self.config.metrics.prices,
+                ),
+            },
+            "peak_memory_bytes": self._peak_memory_bytes,
+            "counters": counters,
+            "stages": self.metrics.get_stages(),
+        }
+
+    def _report_run(self):
+        """
+        Write the report of the run to the configured paths, and pass it to the metrics hooks.
+        """
+        settings = self.config.metrics
+        if not settings.enabled:
+            return
+
+        report = self.get_run_report()
+        if self._planning:
+            report["plan"] = self.get_plan_report()
+        try:
+            if self.work_folder is not None:
+                # merged with the reports of the other workers once they are all done
+                write_json_report(self.work_folder.report_path, {
+                    **report,
+                    "worker": self.work_folder.worker_id,
+                    "started_at": self.work_folder.started_at,
+                    "finished_at": time.time(),
+                })
+            if settings.reportPath:
+                write_json_report(settings.reportPath, report)
+            if settings.prometheusPath:
+                write_prometheus_report(settings.prometheusPath, report)
+        except OSError as e:
+            self.logger.error(f"could not write the run report: {e}")
+        for hook in self.metrics.hooks:
+            hook.on_report(report)
+
+    def _resolve_metadata(
+        self, file: str, document: ExtractedDocument
+    ) -> Dict[Attribute, ResolvedAttribute]:
+        """
+        Resolve the attributes of a file with the metadata resolvers, keeping the most
+        confident value of each attribute that meets the confidence threshold.
+        """
+        threshold = self.config.metadataResolver.confidenceThreshold
+        resolved = {}
+        for resolver in self.metadata_resolvers:
+            attributes = resolver.resolve(document.document_info, document.first_page_text)
+            for attribute, value in attributes.items():
+                if value.confidence < threshold:
+                    continue
+                if attribute not in resolved or value.confidence > resolved[attribute].confidence:
+                    resolved[attribute] = value
+
+        if resolved:
+            self.logger.info(
+                "resolved %s of file %s without the LLM",
+                ", ".join(f"{a.name.lower()} from {v.source}" for a, v in resolved.items()),
+                file,
+            )
+        if resolved and not self._get_missing_attributes(resolved):
+            with self._stats_lock:
+                self.stats["resolved_without_llm"] += 1
+
+        return resolved
+
+    def _get_required_attributes(self) -> List[Attribute]:
+        """
+        Get the attributes used to place a file, which must be known before placing it.
+        """
+        organizer = self.config.organizer
+        attributes = [Attribute.TITLE]
+        for attribute in organizer.filenameFromAttributes + organizer.subfoldersFromAttributes:
+            if attribute not in attributes:
+                attributes.append(attribute)
+        return attributes
+
+    def _get_missing_attributes(
+        self, resolved: Dict[Attribute, ResolvedAttribute]
+    ) -> List[Attribute]:
+        return [
+            attribute for attribute in self._get_required_attributes()
+            if attribute not in resolved
+        ]
+
+    def _get_resolver_settings(self) -> str:
+        """
+        Describe the metadata resolvers, so classifications made with different resolvers
+        are cached apart.
+        """
+        if not self.metadata_resolvers:
+            return ""
+
+        return ":".join([
+            ",".join(type(resolver).__name__ for resolver in self.metadata_resolvers),
+            str(self.config.metadataResolver.confidenceThreshold),
+            ",".join(attribute.value for attribute in self._get_required_attributes()),
+        ])
+
+    def _merge_metadata(
+        self, metadata: Dict[str, str], resolved: Dict[Attribute, ResolvedAttribute]
+    ) -> Dict[str, str]:
+        """
+        Merge resolved attributes into the metadata returned by the LLM, resolved values
+        taking precedence, and set the attributes known by neither to "null".
+        """
+        for attribute in Attribute:
+            key = attribute.name.lower()
+            if attribute in resolved:
+                metadata[key] = resolved[attribute].value
+            elif key not in metadata:
+                metadata[key] = "null"
+        return metadata
+
+    def _build_prompt(
+        self,
+        file: str,
+        content: Optional[str],
+        attributes: Optional[List[Attribute]] = None,
+    ) -> str:
+        """
+        Build the LLM prompt from the extracted content of a file.
+        """
+        if content is None:
+            self.logger.warning(
+                "could not extract content from file %s, skipping ...", file
+            )
+            raise PdfFileContentNotAvailableException(
+                "could not extract content from file")
+
+        self.logger.debug(
+            f"extracted content from file {file}, content size is {len(content)}"
+        )
+        with self.metrics.time("prompt"):
+            return build_query_from_content(content=content, attributes=attributes)
+
+    def _parse_metadata(
+        self,
+        file: str,
+        response: str,
+        resolved: Optional[Dict[Attribute, ResolvedAttribute]] = None,
+    ) -> Dict[str, str]:
+        """
+        Parse the metadata returned by the LLM for a file, merge the resolved attributes
+        into it and validate it.
+        """
+        with self.metrics.time("parse"):
+            return self._build_metadata(file, json.loads(response) or {}, resolved)
+
+    def _build_metadata(
+        self,
+        file: str,
+        metadata: Dict[str, str],
+        resolved: Optional[Dict[Attribute, ResolvedAttribute]] = None,
+    ) -> Dict[str, str]:
+        """
+        Merge the resolved attributes into the metadata returned by the LLM for a file and
+        validate it.
+        """
+        metadata = self._merge_metadata(metadata, resolved or {})
+        title = metadata.get("title", None)
+
+        if not type(title) == str or title.strip() == "null":
+            self.logger.error(
+                f"could not classify file {file}, skipping ...")
+            raise InvalidPromptResponseException("could not classify file")
+
+        return metadata
+
+    def _handle_classification_error(self, job: FileJob, output_dir: str, error: Exception) -> bool:
+        """
+        Send a file that could not be classified to the unclassified folder.
+        """
+        if isinstance(error, ExtractionGuardException):
+            self._record_extraction_stopped(job, error)
+        self.logger.error(f"could not classify file: {error}, skipping ...")
+        destination = self._handle_unclassified_file(job.file, output_dir)
+        self._record_in_journal(job, "unclassified", destination, reason=str(error))
+        self._record_file_timing(job)
+        self.process_message = f"could not classify file: {job.file}, moving to unclassified folder ..."
+        return False
+
+    def _handle_rate_limited_file(self, job: FileJob, error: RateLimitException) -> bool:
+        """
+        Leave a file whose query is still rate limited after retrying where it is.
+
+        The file is neither placed nor journaled, so that a resumed run classifies it.
+        """
+        self._record_file_timing(job)
+        if self.work_folder is not None:
+            self.work_folder.release(job.file)
+        self.logger.error(f"could not classify file {job.file}: {error}, leaving it for a resumed run ...")
+        with self._stats_lock:
+            self.stats["rate_limited"] += 1
+        self.process_message = f"rate limited while classifying file: {job.file}, leaving it for a resumed run ..."
+        return False
+
+    def _place_classified_file(self, file: str, output_dir: str, metadata: Dict[str, str]) -> str:
+        """
+        Move or copy a classified file to its destination built from its metadata.
+
+        Returns the destination path of the file.
+        """
+        dest = self._build_destination(output_dir, metadata)
+        os.makedirs(os.path.dirname(dest), exist_ok=True)
+        self._place_file(file, dest)
 
         self.process_message = f"successfully processed file {file} --> {dest} ..."
-        return True
+        return dest
+
+    def _build_destination(self, output_dir: str, metadata: Dict[str, str]) -> str:
+        """
+        Build the destination path of a classified file from its metadata.
+        """
+        filename = self._build_filename_from_attribute_values(metadata)
+        final_output_dir = os.path.join(
+            output_dir, self.build_output_dir_from_attribute_values(metadata)
+        )
+        return os.path.join(final_output_dir, filename + ".pdf")
 
     def _handle_unclassified_file(self, unclassified_file: str, output_dir: str) -> str:
         """
@@ -138,19 +1286,23 @@ class Application:
         unclassified_files_output_dir = os.path.join(
             output_dir, "unclassified")
         os.makedirs(unclassified_files_output_dir, exist_ok=True)
-        self._move_or_copy_file(
-            unclassified_file, unclassified_files_output_dir)
+        dest = os.path.join(
+            unclassified_files_output_dir, os.path.basename(unclassified_file))
+        self._place_file(unclassified_file, dest)
+        return dest
 
-    def _move_or_copy_file(self, source: str, dest: str):
+    def _place_file(self, source: str, dest: str):
         """
-        Move or copy the given file.
+        Place the given file at its destination according to organizer.placement.
         """
-        if self.config.organizer.moveInsteadOfCopy:
-            self.logger.info(f"moving file {source} to {dest}")
-            shutil.move(source, dest)
-        else:
-            self.logger.info(f"copying file {source} to {dest}")
-            shutil.copy(source, dest)
+        mode = self.config.organizer.placement
+        self.logger.info(f"placing file {source} at {dest} ({mode})")
+        with self.metrics.time("placement"):
+            used_mode = place_file(source, dest, mode)
+        if used_mode != mode:
+            self.logger.info(f"could not place file {source} with {mode}, used {used_mode} instead")
+            with self._stats_lock:
+                self.stats["placement_fallbacks"] += 1
 
     def _initialize_log_folder(self, log_folder: str):
         """
@@ -197,35 +1349,40 @@ class Application:
 
         return value
 
-    def _read_first_k_tokens_from_pdf(
-        self, pdf_path: str, k: int, limit_num_pages: int = 25
-    ) -> str:
+    def _build_extraction(self, job: FileJob) -> Callable[[], ExtractedDocument]:
         """
-        Read the first k tokens from the given PDF file.
-        """
-        current_text = ""
-        current_page = 0
-        total_tokens_read = 0
-        while True:
-            text = read_pdf_page(pdf_path=pdf_path, page_index=current_page)
-            if text is None:
-                break
+        Build the extraction of the first maxNumTokens tokens, the first page and the
+        embedded metadata of a file, to be called in this process or submitted to an
+        extraction pool, to which it is picklable.
 
-            text, num_tokens_read = self.prompt_querier.clamp_text_by_tokens(
-                text=text, max_tokens=k - total_tokens_read
-            )
-            total_tokens_read += num_tokens_read
-            current_text += text
-
-            if total_tokens_read >= k:
-                break
-
-            if current_page >= limit_num_pages:
-                return None
-
-            current_page += 1
+        The page text store, if any, is read before falling back to parsing the file.
+        """
+        return partial(
+            extract_document,
+            job.file,
+            self.config.maxNumTokens,
+            self.prompt_querier.clamp_text_by_tokens,
+            limit_num_pages=MAX_NUM_PAGES_TO_READ,
+            content_hash=job.content_hash,
+            page_text_store=self.page_text_store,
+            text_extractors=self.text_extractors,
+            limits=self.extraction_limits,
+        )
 
-        return current_text
+    def _get_extraction_limits(self) -> Optional[ExtractionLimits]:
+        """
+        Get the limits of the guarded extraction from the extraction settings, or None
+        when none is set.
+        """
+        settings = self.config.extraction
+        limits = ExtractionLimits(
+            max_file_size_bytes=None if settings.maxFileSizeMb is None else int(settings.maxFileSizeMb * 2 ** 20),
+            max_num_pages=settings.maxNumPages,
+            max_page_chars=settings.maxPageChars,
+            timeout_seconds=settings.timeoutSeconds,
+            max_memory_bytes=None if settings.maxMemoryMb is None else int(settings.maxMemoryMb * 2 ** 20),
+        )
+        return None if limits == ExtractionLimits() else limits
 
     def _initialize_output_dir(self, output_dir: str):
         """
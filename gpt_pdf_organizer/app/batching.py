@@ -0,0 +1,459 @@
+"""
+The batched mode of the application, classifying several files per LLM query, and the
+batch jobs submitted to a batch backend.
+"""
+
+import os
+import json
+from itertools import islice
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict
+from typing import Iterable
+from typing import List
+from typing import Optional
+from typing import Tuple
+from typing import Union
+from typing import Generator
+
+from gpt_pdf_organizer.service.metadata_resolver import ResolvedAttribute
+from gpt_pdf_organizer.service.prompt_querier import PromptResponse
+from gpt_pdf_organizer.service.prompt_querier import TokenUsage
+from gpt_pdf_organizer.utils.batch_job import BatchJobFolder
+from gpt_pdf_organizer.utils.batch_job import BatchResults
+from gpt_pdf_organizer.utils.run_journal import get_file_key
+from gpt_pdf_organizer.domain.prompt_builder import SYSTEM_PROMPT
+from gpt_pdf_organizer.domain.prompt_builder import BATCH_SYSTEM_PROMPT
+from gpt_pdf_organizer.domain.prompt_builder import build_batch_query_from_contents
+from gpt_pdf_organizer.domain.attribute import Attribute
+from gpt_pdf_organizer.utils.pdf import ExtractedDocument
+from gpt_pdf_organizer.app.exception import ExtractionGuardException
+from gpt_pdf_organizer.app.exception import InvalidPromptResponseException
+from gpt_pdf_organizer.app.exception import PdfFileContentNotAvailableException
+from gpt_pdf_organizer.app.exception import RateLimitException
+from gpt_pdf_organizer.app.file_job import FileJob
+from gpt_pdf_organizer.app.file_job import UNCLASSIFIED_FILE_EXCEPTIONS
+
+# completion tokens reserved for the answer of each file of a batched query
+BATCH_COMPLETION_TOKENS_PER_FILE = 100
+# number of files extracted at once when preparing a batch job
+BATCH_JOB_CHUNK_SIZE = 64
+
+
+class BatchingMixin:
+    """
+    The batched mode and the batch jobs of the Application.
+    """
+
+    def _organize_batched(
+        self,
+        files: Iterable[str],
+        output_dir: str,
+        pools: Optional[Tuple[Optional[ProcessPoolExecutor], ThreadPoolExecutor]] = None,
+    ) -> Generator:
+        """
+        Run the application classifying several files per LLM query.
+
+        Files are handled in windows of batch.size times concurrency.queryWorkers files:
+        their text is extracted, in a process pool when more than one extraction worker
+        is configured, then packed into batches queried concurrently, and the files are
+        placed in input order.
+
+        The extraction and query pools are created for the run, unless given, in which
+        case they are left running.
+        """
+        concurrency = self.config.concurrency
+        window_size = self.config.batch.size * concurrency.queryWorkers
+        files = iter(files)
+
+        owns_pools = pools is None
+        extraction_pool, query_pool = pools or self._create_pools()
+
+        try:
+            while True:
+                jobs = [self._prepare_file(file) for file in islice(files, window_size)]
+                if not jobs:
+                    break
+                results = self._classify_jobs_batched(jobs, extraction_pool, query_pool)
+                for job, result in zip(jobs, results):
+                    self._update_progress(self.num_files_handled + 1)
+                    if isinstance(result, RateLimitException):
+                        self.error = not self._handle_rate_limited_file(job, result)
+                    elif isinstance(result, Exception):
+                        self.error = not self._handle_classification_error(
+                            job, output_dir, result)
+                    else:
+                        job.metadata = result
+                        self.error = not self._complete_file(job, output_dir)
+                    yield
+        finally:
+            if owns_pools:
+                if extraction_pool is not None:
+                    extraction_pool.shutdown(cancel_futures=True)
+                query_pool.shutdown(cancel_futures=True)
+
+    def _classify_jobs_batched(
+        self,
+        jobs: List[FileJob],
+        extraction_pool: Optional[ProcessPoolExecutor],
+        query_pool: ThreadPoolExecutor,
+    ) -> List[Union[Dict[str, str], Exception]]:
+        """
+        Classify the given files, packing the ones that need the LLM into batched queries.
+
+        Returns the metadata of each file, or the exception that prevented its classification.
+        """
+        results = [job.metadata for job in jobs]
+        to_extract = [i for i, job in enumerate(jobs) if job.metadata is None]
+        documents = self._extract_documents([jobs[i] for i in to_extract], extraction_pool)
+
+        pending = []
+        duplicates = []
+        for i, document in zip(to_extract, documents):
+            if isinstance(document, ExtractionGuardException):
+                results[i] = document
+                continue
+            self._record_extraction(jobs[i], document)
+            resolved = self._resolve_metadata(jobs[i].file, document)
+            if not self._get_missing_attributes(resolved):
+                results[i] = self._merge_metadata({}, resolved)
+            elif document.content is None:
+                self.logger.warning(
+                    "could not extract content from file %s, skipping ...", jobs[i].file
+                )
+                results[i] = PdfFileContentNotAvailableException(
+                    "could not extract content from file")
+            else:
+                claim = self._claim_representative(jobs[i], document)
+                if claim is None:
+                    pending.append((i, document, resolved))
+                else:
+                    duplicates.append((i, document, resolved, claim))
+
+        batches = self._pack_batches(pending)
+        queries = [
+            query_pool.submit(
+                self._classify_batch,
+                [(jobs[i].file, document, resolved) for i, document, resolved in batch],
+            )
+            for batch in batches
+        ]
+        for batch, query in zip(batches, queries):
+            for (i, _, _), result in zip(batch, query.result()):
+                results[i] = result
+                self._settle_representative(jobs[i], result)
+
+        # the representatives of the window are settled: duplicates reuse their metadata
+        for i, document, resolved, claim in duplicates:
+            results[i] = self._reuse_representative_metadata(jobs[i], *claim)
+            if results[i] is None:
+                try:
+                    results[i] = self._query_metadata(jobs[i].file, document, resolved)
+                except (RateLimitException,) + UNCLASSIFIED_FILE_EXCEPTIONS as e:
+                    results[i] = e
+
+        return results
+
+    def _pack_batches(self, pending: List[Tuple]) -> List[List[Tuple]]:
+        """
+        Pack the extracted documents into batches of at most batch.size documents and
+        batch.maxTokens tokens of content. A document larger than the token budget gets
+        a batch of its own.
+        """
+        batches = []
+        batch_tokens = 0
+        first_tier = self._get_token_tiers()[0]
+        for item in pending:
+            # batched queries send the content of the first token tier
+            num_tokens = min(item[1].num_tokens, first_tier)
+            if (
+                not batches
+                or len(batches[-1]) >= self.config.batch.size
+                or batch_tokens + num_tokens > self.config.batch.maxTokens
+            ):
+                batches.append([])
+                batch_tokens = 0
+            batches[-1].append(item)
+            batch_tokens += num_tokens
+
+        return batches
+
+    def _classify_batch(
+        self, items: List[Tuple[str, ExtractedDocument, Dict[Attribute, ResolvedAttribute]]]
+    ) -> List[Union[Dict[str, str], Exception]]:
+        """
+        Query the LLM once for a batch of files, given with their extracted document and
+        resolved attributes.
+
+        The batch is sent with the content of the first token tier. Files whose answer
+        is missing or malformed in the response are queried again one at a time, from
+        the next token tier if their answer could not classify them. Returns the
+        metadata of each file, or the exception that prevented its classification.
+        """
+        answers = {}
+        first_tier = self._get_token_tiers()[0]
+        if len(items) > 1:
+            contents = {
+                str(i): self._get_tier_content(document, first_tier)
+                for i, (_, document, _) in enumerate(items)
+            }
+            with self.metrics.time("prompt"):
+                prompt = build_batch_query_from_contents(contents)
+            try:
+                with self.metrics.time("query"):
+                    response = self.prompt_querier.query(
+                        prompt,
+                        system_prompt=BATCH_SYSTEM_PROMPT,
+                        max_tokens=max(
+                            self.config.maxNumTokens, BATCH_COMPLETION_TOKENS_PER_FILE * len(items)
+                        ),
+                    )
+            except RateLimitException as e:
+                return [e] * len(items)
+            self._record_usage(f"batch of {len(items)} files", response)
+            with self.metrics.time("parse"):
+                answers = self._parse_batch_response(response)
+
+        results = []
+        for i, (file, document, resolved) in enumerate(items):
+            try:
+                answer = answers.get(str(i))
+                if answer is None:
+                    if len(items) > 1:
+                        self.logger.warning(
+                            "missing or malformed batch answer for file %s, querying it alone ...", file
+                        )
+                        with self._stats_lock:
+                            self.stats["batch_retries"] += 1
+                    results.append(self._query_metadata(file, document, resolved))
+                    continue
+
+                try:
+                    results.append(self._build_metadata(file, answer, resolved))
+                except InvalidPromptResponseException:
+                    if self._is_last_tier(document, 0):
+                        raise
+                    results.append(self._query_metadata(file, document, resolved, first_tier=1))
+                else:
+                    self._record_tier(0)
+            except (RateLimitException,) + UNCLASSIFIED_FILE_EXCEPTIONS as e:
+                results.append(e)
+
+        return results
+
+    def _parse_batch_response(self, response: str) -> Dict[str, Dict[str, str]]:
+        """
+        Parse the answers of a batched query, keyed by document id. Answers that are not
+        dictionaries with an id are left out.
+        """
+        try:
+            answers = json.loads(response)
+        except json.JSONDecodeError:
+            return {}
+
+        # some models wrap the array in a dictionary, e.g. {"documents": [...]}
+        if isinstance(answers, dict):
+            lists = [value for value in answers.values() if isinstance(value, list)]
+            answers = lists[0] if len(lists) == 1 else []
+        if not isinstance(answers, list):
+            return {}
+
+        return {
+            str(answer["id"]): {key: value for key, value in answer.items() if key != "id"}
+            for answer in answers
+            if isinstance(answer, dict) and "id" in answer
+        }
+
+    def prepare_batch_job(self, input_path: str, job_folder: BatchJobFolder) -> Generator:
+        """
+        Extract the files of the input path and write the requests classifying them to
+        the given batch job folder, to be submitted to a batch backend.
+
+        Files with a cached classification, or whose attributes were all resolved
+        without the LLM, get no request. Files are extracted a chunk at a time, and
+        requests are written as they are built. One item is yielded per file.
+        """
+        files = self._scan_input_files(input_path)
+        self.logger.info("preparing batch job of files from folder %s ...", input_path)
+        os.makedirs(job_folder.path, exist_ok=True)
+        extraction_pool = None
+        if self.config.concurrency.extractionWorkers > 1:
+            extraction_pool = ProcessPoolExecutor(
+                max_workers=self.config.concurrency.extractionWorkers)
+
+        try:
+            with open(job_folder.requests_path, "w", encoding="utf-8") as requests, \
+                    open(job_folder.manifest_path, "w", encoding="utf-8") as manifest:
+                start = 0
+                while True:
+                    jobs = [
+                        self._prepare_file(file) for file in islice(files, BATCH_JOB_CHUNK_SIZE)
+                    ]
+                    if not jobs:
+                        break
+                    documents = iter(self._extract_documents(
+                        [job for job in jobs if job.metadata is None], extraction_pool
+                    ))
+                    for i, job in enumerate(jobs, start):
+                        document = next(documents) if job.metadata is None else None
+                        entry = self._prepare_batch_job_entry(f"file-{i}", job, document, requests)
+                        manifest.write(json.dumps(entry) + "\n")
+                        self._update_progress(i + 1)
+                        self.process_message = f"prepared file {job.file} ..."
+                        yield
+                    start += len(jobs)
+        finally:
+            if extraction_pool is not None:
+                extraction_pool.shutdown(cancel_futures=True)
+
+    def _prepare_batch_job_entry(
+        self,
+        custom_id: str,
+        job: FileJob,
+        document: Union[ExtractedDocument, ExtractionGuardException, None],
+        requests,
+    ) -> Dict:
+        """
+        Build the manifest entry of a file, writing its request if it needs the LLM.
+        """
+        entry = {
+            "custom_id": custom_id,
+            "file": job.file,
+            "content_hash": job.content_hash,
+            "cache_key": job.cache_key,
+            "cached": job.cached,
+            "metadata": job.metadata,
+            "resolved": {},
+            "error": None,
+        }
+        if document is None:
+            return entry
+        if isinstance(document, ExtractionGuardException):
+            self._record_extraction_stopped(job, document)
+            entry["error"] = str(document)
+            return entry
+
+        self._record_extraction(job, document)
+        resolved = self._resolve_metadata(job.file, document)
+        missing_attributes = self._get_missing_attributes(resolved)
+        if not missing_attributes:
+            entry["metadata"] = self._merge_metadata({}, resolved)
+        elif document.content is None:
+            self.logger.warning(
+                "could not extract content from file %s, skipping ...", job.file
+            )
+            entry["error"] = "could not extract content from file"
+        else:
+            entry["resolved"] = {
+                attribute.value: value.__dict__ for attribute, value in resolved.items()
+            }
+            prompt = self._build_prompt(
+                job.file, document.content, missing_attributes if resolved else None
+            )
+            requests.write(json.dumps({
+                "custom_id": custom_id,
+                "method": "POST",
+                "url": "/v1/chat/completions",
+                "body": {
+                    "model": self.config.llmModelName,
+                    "max_tokens": self.config.maxNumTokens,
+                    "messages": [
+                        {"role": "system", "content": SYSTEM_PROMPT},
+                        {"role": "user", "content": prompt},
+                    ],
+                },
+            }) + "\n")
+            self.stats["batch_requests"] += 1
+
+        return entry
+
+    def apply_batch_job(self, job_folder: BatchJobFolder, output_dir: str) -> Generator:
+        """
+        Place the files of a batch job whose results were downloaded to its folder.
+
+        The manifest is streamed, and results are read by request id, so memory does
+        not grow with the number of files. Files whose request failed are sent to the
+        unclassified folder. One item is yielded per file.
+        """
+        self._open_run(output_dir)
+
+        with open(job_folder.manifest_path, "rb") as manifest:
+            self.num_files_to_process = sum(1 for _ in manifest)
+
+        try:
+            with BatchResults(job_folder.results_path) as results, \
+                    open(job_folder.manifest_path, "r", encoding="utf-8") as manifest:
+                for i, line in enumerate(manifest):
+                    self._update_progress(i + 1)
+                    self.error = not self._apply_batch_job_entry(
+                        json.loads(line), results, output_dir)
+                    yield
+        finally:
+            self._finish_run()
+
+    def _apply_batch_job_entry(self, entry: Dict, results: BatchResults, output_dir: str) -> bool:
+        """
+        Place the file of a manifest entry, using the result of its request if it had one.
+        """
+        job = FileJob(
+            file=entry["file"],
+            content_hash=entry["content_hash"],
+            cache_key=entry["cache_key"],
+            metadata=entry["metadata"],
+            cached=entry["cached"],
+        )
+        if not os.path.exists(job.file):
+            self.logger.warning("file %s no longer exists, skipping ...", job.file)
+            self.process_message = f"file {job.file} no longer exists, skipping ..."
+            self.stats["missing_files"] += 1
+            return False
+
+        if self.run_journal is not None or self.library_manifest is not None:
+            job.journal_key = get_file_key(job.file)
+
+        try:
+            if entry["error"] is not None:
+                raise PdfFileContentNotAvailableException(entry["error"])
+
+            if job.metadata is None:
+                resolved = {
+                    Attribute(attribute): ResolvedAttribute(**value)
+                    for attribute, value in entry["resolved"].items()
+                }
+                job.metadata = self._parse_batch_job_result(
+                    job.file, results.get(entry["custom_id"]), resolved
+                )
+        except UNCLASSIFIED_FILE_EXCEPTIONS as e:
+            return self._handle_classification_error(job, output_dir, e)
+
+        return self._complete_file(job, output_dir)
+
+    def _parse_batch_job_result(
+        self,
+        file: str,
+        result: Optional[Dict],
+        resolved: Dict[Attribute, ResolvedAttribute],
+    ) -> Dict[str, str]:
+        """
+        Parse the metadata of a file from the result of its batch request.
+        """
+        if result is None:
+            raise InvalidPromptResponseException("no result for the batch request of the file")
+
+        response = result.get("response") or {}
+        if result.get("error") or response.get("status_code") != 200:
+            raise InvalidPromptResponseException(
+                f"batch request of the file failed: {result.get('error') or response.get('body')}"
+            )
+
+        body = response["body"]
+        usage = body.get("usage")
+        content = PromptResponse(
+            body["choices"][0]["message"]["content"],
+            None if usage is None else TokenUsage(
+                prompt_tokens=usage["prompt_tokens"],
+                completion_tokens=usage["completion_tokens"],
+            ),
+        )
+        self._record_usage(file, content)
+        return self._parse_metadata(file, content, resolved)
@@ -0,0 +1,102 @@
+"""
+The deduplication of the application, reusing the classification of the files that
+other files duplicate.
+"""
+
+import os
+from concurrent.futures import Future
+from typing import Dict
+from typing import Optional
+from typing import Tuple
+from typing import Union
+
+from gpt_pdf_organizer.utils.duplicate_index import DuplicateMatch
+from gpt_pdf_organizer.utils.pdf import ExtractedDocument
+from gpt_pdf_organizer.app.file_job import FileJob
+
+
+class DeduplicationMixin:
+    """
+    The deduplication of the files of the Application.
+    """
+
+    def _claim_representative(
+        self, job: FileJob, document: ExtractedDocument
+    ) -> Optional[Tuple[DuplicateMatch, str, Future]]:
+        """
+        Look up the file duplicated by a file about to be sent to the LLM, by content hash
+        and, if enabled, by similarity of the first page text.
+
+        Returns the match, the file and the future metadata of the representative it
+        duplicates, or else None after registering the file as a new representative,
+        whose metadata must then be settled with _settle_representative.
+        """
+        if self.duplicate_index is None:
+            return None
+
+        settings = self.config.deduplication
+        text = document.first_page_text if settings.nearDuplicates else ""
+        with self._duplicates_lock:
+            match = self.duplicate_index.add_or_match(job.content_hash, text)
+            if match is None:
+                job.representative = Future()
+                self._representatives[len(self.duplicate_index) - 1] = (job.file, job.representative)
+                if len(self._representatives) > settings.maxRepresentatives:
+                    self._representatives.popitem(last=False)
+                return None
+
+            entry = self._representatives.get(match.representative)
+
+        if entry is None:
+            # the representative is too old to be remembered, classify the file itself
+            return None
+        return (match, *entry)
+
+    def _reuse_representative_metadata(
+        self, job: FileJob, match: DuplicateMatch, representative_file: str, representative: Future
+    ) -> Optional[Dict[str, str]]:
+        """
+        Wait for the metadata of the representative duplicated by a file, and return a
+        copy of it, or None if the representative could not be classified.
+        """
+        try:
+            metadata = representative.result()
+        except Exception:
+            return None
+
+        job.duplicate_of = representative_file
+        kind = "exact" if match.exact else "near"
+        self.logger.info(
+            "file %s is an %s duplicate of file %s (similarity %.2f), reusing its classification",
+            job.file, kind, representative_file, match.similarity,
+        )
+        with self._stats_lock:
+            self.stats[f"{kind}_duplicates"] += 1
+        return dict(metadata)
+
+    def _settle_representative(self, job: FileJob, result: Union[Dict[str, str], BaseException]):
+        """
+        Set the metadata of a representative, or the exception that prevented its
+        classification, waking up the files that duplicate it.
+        """
+        if job.representative is None:
+            return
+
+        if isinstance(result, BaseException):
+            job.representative.set_exception(result)
+        else:
+            job.representative.set_result(result)
+        job.representative = None
+
+    def _place_duplicate_file(self, job: FileJob, output_dir: str) -> str:
+        """
+        Place a duplicate file in the duplicates folder.
+
+        Returns the destination path of the file.
+        """
+        duplicates_output_dir = os.path.join(output_dir, "duplicates")
+        os.makedirs(duplicates_output_dir, exist_ok=True)
+        dest = os.path.join(duplicates_output_dir, os.path.basename(job.file))
+        self._place_file(job.file, dest)
+        self.process_message = f"file {job.file} duplicates {job.duplicate_of} --> {dest} ..."
+        return dest
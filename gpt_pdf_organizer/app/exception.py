@@ -6,3 +6,32 @@ class PdfFileContentNotAvailableException(Exception):
 
 class InvalidPromptResponseException(Exception):
     pass
+
+class RateLimitException(Exception):
+    """
+    Raised when the AI backend rejected a query for exceeding the rate limits.
+
+    retry_after is the number of seconds to wait before retrying, when the backend tells.
+    """
+
+    def __init__(self, message: str = "rate limit exceeded", retry_after=None):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+class ExtractionGuardException(Exception):
+    """
+    Raised when the guarded extraction of a PDF file was stopped, because the file
+    exceeded one of the configured limits or the sandboxed extraction process died.
+
+    peak_memory_bytes is the peak memory of the extraction process, when it was measured.
+    """
+
+    def __init__(self, message: str, peak_memory_bytes=None):
+        super().__init__(message)
+        self.peak_memory_bytes = peak_memory_bytes
+
+
+class TokenizerFileNotCachedException(Exception):
+    """
+    Raised in offline mode when an encoding file of a tokenizer is missing from the cache.
+    """
@@ -0,0 +1,43 @@
+"""
+The state of a file going through the stages of the application.
+"""
+
+import json
+import time
+from dataclasses import dataclass
+from dataclasses import field
+from concurrent.futures import Future
+from typing import Dict
+from typing import Optional
+
+from gpt_pdf_organizer.app.exception import ExtractionGuardException
+from gpt_pdf_organizer.app.exception import InvalidPromptResponseException
+from gpt_pdf_organizer.app.exception import PdfFileContentNotAvailableException
+
+# the errors sending a file to the unclassified folder
+UNCLASSIFIED_FILE_EXCEPTIONS = (
+    json.JSONDecodeError,
+    InvalidPromptResponseException,
+    PdfFileContentNotAvailableException,
+    ExtractionGuardException,
+)
+
+
+@dataclass
+class FileJob:
+    """
+    The state of a file going through the stages of the application.
+    """
+    file: str
+    content_hash: Optional[str] = None
+    cache_key: Optional[str] = None
+    metadata: Optional[Dict[str, str]] = None
+    cached: bool = False
+    journal_key: Optional[str] = None
+    # the future metadata of a file other files may duplicate
+    representative: Optional[Future] = None
+    # the file whose metadata was reused, when the file is a duplicate
+    duplicate_of: Optional[str] = None
+    # the peak memory of the extraction of the file, when it ran in the sandbox
+    peak_memory_bytes: Optional[int] = None
+    started_at: float = field(default_factory=time.perf_counter)
@@ -0,0 +1,255 @@
+"""
+The dry runs of the application, planning a run without querying the LLM.
+"""
+
+import os
+import json
+import math
+import time
+from itertools import islice
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass
+from typing import Dict
+from typing import List
+from typing import Optional
+from typing import Union
+from typing import Generator
+
+from gpt_pdf_organizer.service.metadata_resolver import ResolvedAttribute
+from gpt_pdf_organizer.utils.duplicate_index import DuplicateIndex
+from gpt_pdf_organizer.utils.run_journal import RunJournal
+from gpt_pdf_organizer.domain.prompt_builder import SYSTEM_PROMPT
+from gpt_pdf_organizer.domain.attribute import Attribute
+from gpt_pdf_organizer.domain.pricing import estimate_cost
+from gpt_pdf_organizer.domain.projection import project_query_seconds
+from gpt_pdf_organizer.domain.projection import project_run_seconds
+from gpt_pdf_organizer.utils.pdf import ExtractedDocument
+from gpt_pdf_organizer.app.exception import ExtractionGuardException
+from gpt_pdf_organizer.app.batching import BATCH_JOB_CHUNK_SIZE
+from gpt_pdf_organizer.app.file_job import FileJob
+
+# the statuses of the files of a dry run plan
+PLAN_STATUSES = ("query", "cached", "resolved", "duplicate", "unclassified")
+
+
+@dataclass
+class FilePlan:
+    """
+    What a run would do with a file, as planned by a dry run.
+
+    The status is one of PLAN_STATUSES: the file would be sent to the LLM, reuse its
+    cached classification, be classified by the metadata resolvers, reuse the
+    classification of the file it duplicates, or be sent to the unclassified folder.
+    The attributes of the destination left to the LLM are shown as {attribute}.
+    """
+    file: str
+    status: str
+    destination: str
+    prompt_tokens: int = 0
+    completion_tokens: int = 0
+    reason: Optional[str] = None
+
+
+class PlanningMixin:
+    """
+    The dry runs of the Application.
+    """
+
+    def plan(self, input_path: str, output_dir: str, resume: bool = False) -> Generator:
+        """
+        Plan a run without querying the LLM nor writing to the output directory.
+
+        The input path is scanned and its files are extracted, in a process pool when
+        more than one extraction worker is configured, a chunk at a time. The plan of
+        each file, with its would-be destination and the prompt tokens it would be
+        sent with, counted by the tokenizer of the model, is yielded and written as a
+        JSON line to dryRun.planPath, if set, as it is made, so memory does not grow
+        with the number of files. The totals are given by get_plan_report.
+
+        When resume is true, files recorded in the run journal of the output
+        directory by a previous run are skipped, which needs journal.enabled.
+        """
+        self._check_resume(resume)
+        files = self._scan_input_files(input_path)
+        self.logger.info("planning files from folder %s ...", input_path)
+        if resume:
+            handled_file_keys = RunJournal.load_handled_file_keys(RunJournal.get_path(output_dir))
+            files = self._skip_handled_files(files, handled_file_keys)
+
+        self._run_started_at = time.perf_counter()
+        self._planning = True
+        self.duplicate_index = None
+        if self.config.deduplication.enabled:
+            self.duplicate_index = DuplicateIndex(threshold=self.config.deduplication.threshold)
+        # file and planned destination of the most recent representatives, by representative id
+        representatives = OrderedDict()
+        extraction_pool = None
+        if self.config.concurrency.extractionWorkers > 1:
+            extraction_pool = ProcessPoolExecutor(
+                max_workers=self.config.concurrency.extractionWorkers)
+
+        plan_file = None
+        try:
+            if self.config.dryRun.planPath:
+                plan_file = open(self.config.dryRun.planPath, "w", encoding="utf-8")
+            while True:
+                jobs = [self._prepare_file(file) for file in islice(files, BATCH_JOB_CHUNK_SIZE)]
+                if not jobs:
+                    break
+                documents = iter(self._extract_documents(
+                    [job for job in jobs if job.metadata is None], extraction_pool
+                ))
+                for job in jobs:
+                    document = next(documents) if job.metadata is None else None
+                    file_plan = self._plan_file(job, document, output_dir, representatives)
+                    self.stats[f"plan_{file_plan.status}"] += 1
+                    self.stats["plan_prompt_tokens"] += file_plan.prompt_tokens
+                    self.stats["plan_completion_tokens"] += file_plan.completion_tokens
+                    if plan_file is not None:
+                        plan_file.write(json.dumps(file_plan.__dict__) + "\n")
+
+                    self._update_progress(self.num_files_handled + 1)
+                    self.process_message = (
+                        f"planned file {job.file} --> {file_plan.destination} ({file_plan.status}"
+                        + (f", {file_plan.prompt_tokens} prompt tokens)" if file_plan.prompt_tokens else ")")
+                    )
+                    yield file_plan
+        finally:
+            if plan_file is not None:
+                plan_file.close()
+            if extraction_pool is not None:
+                extraction_pool.shutdown(cancel_futures=True)
+            self._finish_run()
+
+    def _plan_file(
+        self,
+        job: FileJob,
+        document: Union[ExtractedDocument, ExtractionGuardException, None],
+        output_dir: str,
+        representatives: OrderedDict,
+    ) -> FilePlan:
+        """
+        Plan what a run would do with a file, given its extracted document unless its
+        classification is cached.
+        """
+        if job.metadata is not None:
+            return FilePlan(job.file, "cached", self._build_destination(output_dir, job.metadata))
+
+        unclassified_destination = os.path.join(output_dir, "unclassified", os.path.basename(job.file))
+        if isinstance(document, ExtractionGuardException):
+            self._record_extraction_stopped(job, document)
+            return FilePlan(job.file, "unclassified", unclassified_destination, reason=str(document))
+
+        self._record_extraction(job, document)
+        resolved = self._resolve_metadata(job.file, document)
+        missing_attributes = self._get_missing_attributes(resolved)
+        if not missing_attributes:
+            return FilePlan(
+                job.file, "resolved", self._build_destination(output_dir, self._merge_metadata({}, resolved))
+            )
+        if document.content is None:
+            return FilePlan(
+                job.file, "unclassified", unclassified_destination,
+                reason="could not extract content from file",
+            )
+
+        destination = self._build_planned_destination(output_dir, resolved, missing_attributes)
+        if self.duplicate_index is not None:
+            settings = self.config.deduplication
+            text = document.first_page_text if settings.nearDuplicates else ""
+            match = self.duplicate_index.add_or_match(job.content_hash, text)
+            if match is None:
+                representatives[len(self.duplicate_index) - 1] = (job.file, destination)
+                if len(representatives) > settings.maxRepresentatives:
+                    representatives.popitem(last=False)
+            elif match.representative in representatives:
+                representative_file, destination = representatives[match.representative]
+                if settings.duplicatesFolder:
+                    destination = os.path.join(output_dir, "duplicates", os.path.basename(job.file))
+                return FilePlan(job.file, "duplicate", destination, reason=f"duplicates {representative_file}")
+
+        # the first query of a file sends the content of the first token tier
+        prompt = self._build_prompt(
+            job.file,
+            self._get_tier_content(document, self._get_token_tiers()[0]),
+            missing_attributes if resolved else None,
+        )
+        return FilePlan(
+            job.file, "query", destination,
+            prompt_tokens=self.prompt_querier.count_prompt_tokens(prompt, system_prompt=SYSTEM_PROMPT),
+            completion_tokens=self.config.dryRun.completionTokensPerFile,
+        )
+
+    def _build_planned_destination(
+        self,
+        output_dir: str,
+        resolved: Dict[Attribute, ResolvedAttribute],
+        missing_attributes: List[Attribute],
+    ) -> str:
+        """
+        Build the destination of a file from its resolved attributes, the attributes
+        left to the LLM shown as {attribute}.
+        """
+        metadata = {attribute.value: f"__{attribute.value}__" for attribute in missing_attributes}
+        destination = self._build_destination(output_dir, self._merge_metadata(metadata, resolved))
+        for attribute in missing_attributes:
+            destination = destination.replace(f"__{attribute.value}__", f"{{{attribute.value}}}")
+        return destination
+
+    def get_plan_report(self) -> Dict:
+        """
+        Get the report of the last dry run: the files planned per status, the queries,
+        tokens and estimated cost of the run, and its projected wall time under the
+        configured concurrency and rate limits.
+
+        The wall time is projected from the time the dry run took to scan and extract
+        the files, and dryRun.queryLatencySeconds per query.
+        """
+        with self._stats_lock:
+            counters = dict(self.stats)
+        elapsed = self._run_elapsed
+        if self._run_started_at is not None:
+            elapsed = time.perf_counter() - self._run_started_at
+
+        config = self.config
+        files_to_query = counters.get("plan_query", 0)
+        num_queries = math.ceil(files_to_query / config.batch.size)
+        prompt_tokens = counters.get("plan_prompt_tokens", 0)
+        completion_tokens = counters.get("plan_completion_tokens", 0)
+
+        rate_limit = config.rateLimit
+        concurrency = config.concurrency.queryWorkers
+        if rate_limit.enabled and rate_limit.maxConcurrency:
+            concurrency = min(concurrency, rate_limit.maxConcurrency)
+        query_seconds = project_query_seconds(
+            num_queries,
+            # the rate limiter counts the completion tokens a query may generate
+            prompt_tokens + num_queries * config.maxNumTokens,
+            latency_seconds=config.dryRun.queryLatencySeconds,
+            concurrency=concurrency,
+            requests_per_minute=rate_limit.requestsPerMinute if rate_limit.enabled else None,
+            tokens_per_minute=rate_limit.tokensPerMinute if rate_limit.enabled else None,
+        )
+        pipelined = config.batch.size == 1 and (
+            config.llmClient.useAsync
+            or config.concurrency.extractionWorkers > 1
+            or config.concurrency.queryWorkers > 1
+        )
+        return {
+            "model": config.llmModelName,
+            "files": self.num_files_handled,
+            "statuses": {status: counters.get(f"plan_{status}", 0) for status in PLAN_STATUSES},
+            "queries": num_queries,
+            "cost": {
+                "model": config.llmModelName,
+                "prompt_tokens": prompt_tokens,
+                "completion_tokens": completion_tokens,
+                "estimated_usd": estimate_cost(
+                    config.llmModelName, prompt_tokens, completion_tokens, prices=config.metrics.prices,
+                ),
+            },
+            "extraction_seconds": elapsed,
+            "query_seconds": query_seconds,
+            "projected_seconds": project_run_seconds(elapsed, query_seconds, pipelined),
+        }
@@ -0,0 +1,109 @@
+"""
+The watch mode of the application, handling the PDF files landing in a folder.
+"""
+
+import os
+import signal
+import threading
+from typing import Iterable
+from typing import Iterator
+from typing import Generator
+
+from gpt_pdf_organizer.utils.run_journal import get_file_key
+from gpt_pdf_organizer.utils.watcher import FolderWatcher
+from gpt_pdf_organizer.app.exception import FilepathNotSupportedException
+
+# seconds between two checks of the stop event when watching a folder
+WATCH_TIMEOUT_SECONDS = 1.0
+
+
+class WatchingMixin:
+    """
+    The watch mode of the Application.
+    """
+
+    def watch(self, input_path: str, output_dir: str, stop: threading.Event) -> Generator:
+        """
+        Run the application on the PDF files landing in the input folder, until stop is set.
+
+        The files already in the folder, then the new and modified ones, are handled once
+        their size and modification time stayed the same for watch.settleSeconds, and
+        the files recorded in the run journal, by this run or a previous one, are skipped.
+        Settled files are handled in the batched or pipelined mode, with the worker pools
+        kept running between them, as are the LLM client, the tokenizer and the caches.
+        One item is yielded per handled file.
+
+        Once stop is set, no more files are started, the files in flight are finished,
+        and the run journal and the run report are written.
+
+        Raises:
+            FilepathNotSupportedException: when the input path is not a folder.
+        """
+        scanner = self._build_file_scanner(input_path)
+        if not os.path.isdir(input_path):
+            raise FilepathNotSupportedException("Watched path must be a folder")
+        self.input_files = None
+        self.progress = None
+        self.num_files_handled = 0
+        self.num_files_to_process = None
+
+        settings = self.config.watch
+        watcher = FolderWatcher(
+            scanner,
+            settle_seconds=settings.settleSeconds,
+            poll_interval=settings.pollIntervalSeconds,
+            use_polling=settings.usePolling,
+            ignored_folders=[output_dir],
+        )
+        handled_file_keys = self._open_run(output_dir, load_handled_file_keys=True)
+        organize = self._organize_batched if self.config.batch.size > 1 else self._organize_pipelined
+        extraction_pool, query_pool = pools = self._create_pools(initializer=_ignore_stop_signals)
+        try:
+            with watcher:
+                self.logger.info("watching folder %s with %s ...", input_path, watcher.backend)
+                while not stop.is_set():
+                    files = watcher.get_settled_files(timeout=WATCH_TIMEOUT_SECONDS)
+                    files = self._skip_handled_watched_files(files, handled_file_keys)
+                    yield from organize(self._until_stopped(files, stop), output_dir, pools)
+                    if self.run_journal is not None:
+                        self.run_journal.flush()
+                    if self.library_manifest is not None:
+                        self.library_manifest.flush()
+            self.logger.info("stopped watching folder %s", input_path)
+        finally:
+            if extraction_pool is not None:
+                extraction_pool.shutdown(cancel_futures=True)
+            query_pool.shutdown(cancel_futures=True)
+            self._finish_run()
+
+    def _skip_handled_watched_files(self, files: Iterable[str], handled_file_keys: set) -> Iterator[str]:
+        """
+        Skip the watched files already handled, by this run or a previous one, and the
+        files gone before being handled.
+        """
+        for file in files:
+            try:
+                file_key = get_file_key(file)
+            except OSError:
+                continue
+            if file_key in handled_file_keys:
+                continue
+            handled_file_keys.add(file_key)
+            yield file
+
+    @staticmethod
+    def _until_stopped(files: Iterable[str], stop: threading.Event) -> Iterator[str]:
+        for file in files:
+            if stop.is_set():
+                # the remaining files are handled by the next run
+                return
+            yield file
+
+
+def _ignore_stop_signals():
+    """
+    Leave the stop signals to the watching process, which lets the worker processes
+    finish the files in flight before shutting them down.
+    """
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    signal.signal(signal.SIGTERM, signal.SIG_IGN)
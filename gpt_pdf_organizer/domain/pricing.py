@@ -0,0 +1,58 @@
+"""
+This file contains the prices of the LLM models, used to estimate the cost of a run.
+"""
+
+from typing import Dict
+from typing import Optional
+
+# USD per million tokens of each model: prompt, completion and cached prompt tokens.
+# A versioned model name, e.g. gpt-4o-2024-08-06, is priced as its longest listed prefix.
+DEFAULT_PRICES: Dict[str, Dict[str, float]] = {
+    "gpt-3.5-turbo": {"prompt": 0.5, "completion": 1.5},
+    "gpt-4": {"prompt": 30.0, "completion": 60.0},
+    "gpt-4-turbo": {"prompt": 10.0, "completion": 30.0},
+    "gpt-4o": {"prompt": 2.5, "completion": 10.0, "cachedPrompt": 1.25},
+    "gpt-4o-mini": {"prompt": 0.15, "completion": 0.6, "cachedPrompt": 0.075},
+}
+
+
+def get_model_prices(
+    model: str, prices: Optional[Dict[str, Dict[str, float]]] = None
+) -> Optional[Dict[str, float]]:
+    """
+    Get the prices of a model, from the given prices merged over the default ones, or
+    None if the model is unknown.
+    """
+    all_prices = {**DEFAULT_PRICES, **(prices or {})}
+    if model in all_prices:
+        return all_prices[model]
+
+    prefixes = [name for name in all_prices if model.startswith(name)]
+    if not prefixes:
+        return None
+    return all_prices[max(prefixes, key=len)]
+
+
+def estimate_cost(
+    model: str,
+    prompt_tokens: int,
+    completion_tokens: int,
+    cached_prompt_tokens: int = 0,
+    prices: Optional[Dict[str, Dict[str, float]]] = None,
+) -> Optional[float]:
+    """
+    Estimate the cost in USD of the given token usage of a model, or None if the model
+    has no known price. cached_prompt_tokens are part of prompt_tokens, and are billed at
+    the cached prompt price of the model, if any.
+    """
+    model_prices = get_model_prices(model, prices)
+    if model_prices is None:
+        return None
+
+    cached_price = model_prices.get("cachedPrompt", model_prices["prompt"])
+    cost = (
+        (prompt_tokens - cached_prompt_tokens) * model_prices["prompt"]
+        + cached_prompt_tokens * cached_price
+        + completion_tokens * model_prices["completion"]
+    )
+    return cost / 1_000_000
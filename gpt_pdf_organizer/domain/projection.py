@@ -0,0 +1,41 @@
+"""
+This file contains the projection of the wall time of a run, used to plan a run before
+querying the LLM.
+"""
+
+from typing import Optional
+
+
+def project_query_seconds(
+    num_queries: int,
+    num_tokens: int,
+    latency_seconds: float,
+    concurrency: int,
+    requests_per_minute: Optional[int] = None,
+    tokens_per_minute: Optional[int] = None,
+) -> float:
+    """
+    Project the seconds taken by the given number of queries, each taking
+    latency_seconds, with up to concurrency queries in flight, and no faster than the
+    requests and tokens per minute rate limits allow, if any. num_tokens are the tokens
+    counted against the tokens per minute limit by all the queries.
+    """
+    if num_queries == 0:
+        return 0.0
+
+    seconds = num_queries * latency_seconds / max(concurrency, 1)
+    if requests_per_minute:
+        seconds = max(seconds, 60.0 * num_queries / requests_per_minute)
+    if tokens_per_minute:
+        seconds = max(seconds, 60.0 * num_tokens / tokens_per_minute)
+    return seconds
+
+
+def project_run_seconds(extraction_seconds: float, query_seconds: float, pipelined: bool) -> float:
+    """
+    Project the wall time of a run from the time of its extraction and query stages,
+    which overlap when the run is pipelined and follow each other otherwise.
+    """
+    if pipelined:
+        return max(extraction_seconds, query_seconds)
+    return extraction_seconds + query_seconds
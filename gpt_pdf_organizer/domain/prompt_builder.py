@@ -1,9 +1,19 @@
 """
 This module contains the functions to build the prompt that will be sent to AI LLM.
+
+The prompt is split into a static system prompt, identical in every request so the
+provider can cache it as a prefix, and a user prompt holding the content of each file.
 """
 
+from typing import Dict
+from typing import List
+from typing import Optional
+
 from gpt_pdf_organizer.domain.attribute import Attribute
 
+# bump whenever the prompt changes, so cached classifications of the previous prompt are not reused
+PROMPT_VERSION = 3
+
 topics = {
     "Natural Sciences": ["Physics", "Chemistry", "Biology", "Earth Sciences"],
     "Formal Sciences": ["Mathematics", "Computer Science", "Statistics"],
@@ -22,18 +32,61 @@ topics = {
 }
 
 
-def build_query_from_content(content: str) -> str:
+def _build_system_prompt(batch: bool = False) -> str:
+    example = ", ".join(
+        f'"{attribute.name.lower()}": "{attribute.name}"' for attribute in Attribute
+    )
+    if batch:
+        introduction = (
+            "You will be given the text extracts of the first pages of several PDF files, "
+            "each preceded by its document id. For each PDF file, extract what is its content type (Book, Article or Unknown). "
+        )
+        output = (
+            "Output the answer as a json array with one json dictionary per PDF file, in any order, like this: "
+            f'[{{"id": "DOCUMENT_ID", {example}}}]. '
+        )
+    else:
+        introduction = (
+            "You will be given a text extract of the first pages of a PDF file. "
+            "Extract what is its content type (Book, Article or Unknown). "
+        )
+        output = f"Output the answer in json dictionary format like this: {{{example}}}. "
+
     return (
-        f"Based on the following text extract of the first pages of a PDF file, extract: "
-        f"\n\n {content}\n\n, what is the its content type (Book, Article or Unknown)? "
-        "In the case content type is known, also retrieve the Author, the Year and the Title of the original PDF file."
-        f"Also provide one main topic and one subtopic that the PDF is about, from the given table of topics: {topics}, or 'null' if it cannot be infered."
-        f"Output the answer in json dictionary format like this: "
-        f'{{ "{Attribute.CONTENT_TYPE.name.lower()}":'
-        f'"{Attribute.CONTENT_TYPE.name}", "{Attribute.AUTHOR.name.lower()}": '
-        f'"{Attribute.AUTHOR.name}", "{Attribute.YEAR.name.lower()}": "{Attribute.YEAR.name}",'
-        f'"{Attribute.TITLE.name.lower()}": "{Attribute.TITLE.name}"}}. '
-        f'"{Attribute.TOPIC.name.lower()}": "{Attribute.TOPIC.name}"}}. '
-        f'"{Attribute.SUB_TOPIC.name.lower()}": "{Attribute.SUB_TOPIC.name}"}}. '
-        "The CONTENT_TYPE must be one of ['book', 'article', 'null' ], Any property must be 'null' if cannot be deduced."
+        introduction
+        + "In the case content type is known, also retrieve the Author, the Year and the Title of the original PDF file. "
+        f"Also provide one main topic and one subtopic that the PDF is about, from the given table of topics: {topics}, or 'null' if it cannot be infered. "
+        + output
+        + "The CONTENT_TYPE must be one of ['book', 'article', 'null' ], Any property must be 'null' if cannot be deduced."
+    )
+
+
+SYSTEM_PROMPT = _build_system_prompt()
+BATCH_SYSTEM_PROMPT = _build_system_prompt(batch=True)
+
+
+def build_query_from_content(content: str, attributes: Optional[List[Attribute]] = None) -> str:
+    """
+    Build the user prompt holding the content extracted from a PDF file, to be sent
+    after SYSTEM_PROMPT.
+
+    When attributes is given, only those attributes are asked for, e.g. the ones that
+    could not be resolved from the embedded metadata of the file.
+    """
+    query = ""
+    if attributes is not None:
+        names = ", ".join(attribute.name for attribute in attributes)
+        query += f"Only output the following properties: {names}.\n\n"
+
+    return query + f"Text extract of the first pages of the PDF file:\n\n{content}"
+
+
+def build_batch_query_from_contents(contents: Dict[str, str]) -> str:
+    """
+    Build the user prompt holding the contents extracted from several PDF files, keyed by
+    their document id, to be sent after BATCH_SYSTEM_PROMPT.
+    """
+    return "\n\n".join(
+        f"Document id: {document_id}\nText extract of the first pages of the PDF file:\n\n{content}"
+        for document_id, content in contents.items()
     )
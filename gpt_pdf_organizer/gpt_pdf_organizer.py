@@ -1,43 +1,578 @@
 #!/usr/bin/env python
 
 import os
+import sys
+import json
 import time
-import openai
+import glob
+import shutil
+import signal
 import argparse
+import threading
+import importlib
+from dataclasses import asdict
+from typing import TYPE_CHECKING
+from typing import Dict
+from typing import List
+from typing import Optional
 
-from gpt_pdf_organizer.app.application import Application
-from gpt_pdf_organizer.infrastructure.gpt_prompt_querier import GPTPromptQuerier
+# the modules importing heavy dependencies, e.g. openai, pdfplumber, tiktoken or rich,
+# are imported by the stage needing them, so that --help and the batch job commands
+# start fast
+from gpt_pdf_organizer.app.exception import TokenizerFileNotCachedException
+from gpt_pdf_organizer.domain.attribute import Attribute
+from gpt_pdf_organizer.infrastructure.embedded_metadata_resolver import EmbeddedMetadataResolver
+from gpt_pdf_organizer.infrastructure.identifier_metadata_resolver import IdentifierMetadataResolver
+from gpt_pdf_organizer.service.batch_backend import BatchBackend
+from gpt_pdf_organizer.service.metadata_resolver import MetadataResolver
+from gpt_pdf_organizer.service.prompt_querier import PromptQuerier
+from gpt_pdf_organizer.service.text_extractor import TextExtractor
 from gpt_pdf_organizer.utils.config import Config
-from rich.progress import (
-    Progress,
-    TextColumn,
-    BarColumn,
-    TaskProgressColumn,
-    TimeRemainingColumn,
-)
+from gpt_pdf_organizer.utils.classification_cache import ClassificationCache
+from gpt_pdf_organizer.utils.page_text_store import PageTextStore
+from gpt_pdf_organizer.utils.batch_job import BatchJobFolder
+from gpt_pdf_organizer.utils.library_manifest import LibraryManifest
+from gpt_pdf_organizer.utils.metrics import merge_run_reports
+from gpt_pdf_organizer.utils.metrics import write_json_report
+from gpt_pdf_organizer.utils.metrics import write_prometheus_report
+from gpt_pdf_organizer.utils.run_journal import RunJournal
+from gpt_pdf_organizer.utils.tokenizer import configure_tokenizer_cache
+from gpt_pdf_organizer.utils.tokenizer import get_tokenizer
+from gpt_pdf_organizer.utils.work_folder import WorkFolder
+
+if TYPE_CHECKING:
+    from gpt_pdf_organizer.app.application import Application
+
+
+def _build_querier_config(config: Config) -> dict:
+    return {
+        "api_key": config.apiKey,
+        "model_name": config.llmModelName,
+        "max_tokens": config.maxNumTokens,
+        "base_url": config.llmClient.baseUrl,
+        "timeout": config.llmClient.timeout,
+        "max_retries": config.llmClient.maxRetries,
+        "max_connections": config.llmClient.maxConnections,
+        "max_keepalive_connections": config.llmClient.maxKeepaliveConnections,
+        "keepalive_expiry": config.llmClient.keepaliveExpiry,
+    }
+
+
+def build_prompt_querier(config: Config) -> PromptQuerier:
+    querier_config = _build_querier_config(config)
+    if config.llmClient.useAsync:
+        from gpt_pdf_organizer.infrastructure.async_gpt_prompt_querier import AsyncGPTPromptQuerier
+        querier = AsyncGPTPromptQuerier(querier_config)
+    else:
+        from gpt_pdf_organizer.infrastructure.gpt_prompt_querier import GPTPromptQuerier
+        querier = GPTPromptQuerier(querier_config)
+
+    if not config.rateLimit.enabled:
+        return querier
+
+    from gpt_pdf_organizer.infrastructure.rate_limited_prompt_querier import RateLimitedPromptQuerier
+
+    return RateLimitedPromptQuerier(
+        querier,
+        requests_per_minute=config.rateLimit.requestsPerMinute,
+        tokens_per_minute=config.rateLimit.tokensPerMinute,
+        max_concurrency=config.rateLimit.maxConcurrency or config.concurrency.queryWorkers,
+        max_retries=config.rateLimit.maxRetries,
+        initial_backoff=config.rateLimit.initialBackoffSeconds,
+        max_backoff=config.rateLimit.maxBackoffSeconds,
+        max_completion_tokens=config.maxNumTokens,
+    )
+
+
+def build_classification_cache(config: Config, refresh: bool = False) -> ClassificationCache:
+    if not config.cache.enabled:
+        return None
+
+    return ClassificationCache(
+        path=config.cache.path,
+        max_entries=config.cache.maxEntries,
+        max_age_days=config.cache.maxAgeDays,
+        read_enabled=not refresh,
+    )
+
+
+def build_page_text_store(config: Config) -> PageTextStore:
+    if not config.pageTextStore.enabled:
+        return None
+
+    return PageTextStore(config.pageTextStore.path)
+
+
+METADATA_RESOLVERS = {
+    "embedded": EmbeddedMetadataResolver,
+    "identifiers": IdentifierMetadataResolver,
+}
+
+
+def build_metadata_resolvers(config: Config) -> List[MetadataResolver]:
+    if not config.metadataResolver.enabled:
+        return []
+
+    resolvers = []
+    for name in config.metadataResolver.resolvers:
+        if name not in METADATA_RESOLVERS:
+            raise ValueError(
+                f"Unknown metadata resolver {name}. Please use any of {list(METADATA_RESOLVERS)}"
+            )
+        resolvers.append(METADATA_RESOLVERS[name]())
+    return resolvers
+
+
+# the subcommands of the offline batch job workflow, working on a job folder
+BATCH_JOB_COMMANDS = ("prepare", "submit", "poll", "apply")
+
+# the module and class of each text extractor, imported only when configured
+TEXT_EXTRACTORS = {
+    "pdfplumber": ("gpt_pdf_organizer.utils.pdf", "PdfplumberTextExtractor"),
+    "pdfminer": ("gpt_pdf_organizer.infrastructure.pdfminer_text_extractor", "PdfminerTextExtractor"),
+    "pdfium": ("gpt_pdf_organizer.infrastructure.pdfium_text_extractor", "PdfiumTextExtractor"),
+}
+
+
+def build_text_extractor(name: str) -> TextExtractor:
+    if name not in TEXT_EXTRACTORS:
+        raise ValueError(
+            f"Unknown extraction backend {name}. Please use any of {list(TEXT_EXTRACTORS)}"
+        )
+    module_name, class_name = TEXT_EXTRACTORS[name]
+    return getattr(importlib.import_module(module_name), class_name)()
+
+
+def build_text_extractors(config: Config) -> List[TextExtractor]:
+    return [build_text_extractor(name) for name in config.extraction.backends]
+
+
+def build_batch_backend(config: Config, backend_name: str) -> BatchBackend:
+    if backend_name == "local":
+        from gpt_pdf_organizer.infrastructure.local_batch_backend import LocalBatchBackend
+        return LocalBatchBackend(config.batchJob.localPath, build_prompt_querier(config))
+
+    from gpt_pdf_organizer.infrastructure.openai_batch_backend import OpenAIBatchBackend
+    return OpenAIBatchBackend(_build_querier_config(config))
+
+
+def warm_tokenizers(config: Config, model_names: List[str]):
+    """
+    Download the encoding files of the tokenizers of the given models, and of the
+    configured one, to the tokenizer cache folder, so that runs in offline mode, or on
+    machines the folder is copied to, load them from there.
+    """
+    configure_tokenizer_cache(config.tokenizer.cacheDir)
+    for model_name in dict.fromkeys([config.llmModelName] + model_names):
+        try:
+            get_tokenizer(model_name)
+        except Exception as e:
+            raise SystemExit(f"could not download the tokenizer of {model_name}: {e}")
+        print(f"cached the tokenizer of {model_name}")
+    print(f"tokenizer cache folder: {os.path.abspath(config.tokenizer.cacheDir)}")
+
+
+def submit_batch_job(config: Config, job_folder: BatchJobFolder):
+    if not os.path.exists(job_folder.requests_path):
+        raise SystemExit(f"no batch job prepared in {job_folder.path}, run prepare first")
+
+    if os.path.getsize(job_folder.requests_path) == 0:
+        # every file was classified without the LLM: there is nothing to wait for
+        open(job_folder.results_path, "w").close()
+        job_folder.save_state(batch_id=None, backend=None, status="completed")
+        print("all files are already classified, nothing to submit: run apply")
+        return
+
+    backend_name = config.batchJob.backend
+    batch_id = build_batch_backend(config, backend_name).submit(job_folder.requests_path)
+    job_folder.save_state(batch_id=batch_id, backend=backend_name, status="validating")
+    print(f"submitted batch {batch_id} to the {backend_name} backend")
+
+
+def poll_batch_job(config: Config, job_folder: BatchJobFolder, wait: bool):
+    state = job_folder.load_state()
+    if "batch_id" not in state:
+        raise SystemExit(f"no batch job submitted from {job_folder.path}, run submit first")
+    if state["batch_id"] is None:
+        print("all files are already classified: run apply")
+        return
+
+    backend = build_batch_backend(config, state["backend"])
+    status = backend.poll(state["batch_id"])
+    while wait and not status.finished:
+        print(f"batch {status.batch_id} is {status.status}: {status.completed}/{status.total} requests completed")
+        time.sleep(config.batchJob.pollIntervalSeconds)
+        status = backend.poll(state["batch_id"])
+
+    job_folder.save_state(status=status.status)
+    print(
+        f"batch {status.batch_id} is {status.status}: {status.completed}/{status.total} requests completed, "
+        f"{status.failed} failed"
+    )
+    if status.finished:
+        backend.download_results(status.batch_id, job_folder.results_path)
+        print(f"downloaded results to {job_folder.results_path}: run apply")
+
+
+def query_library(
+    output_folder: str,
+    filters: Dict[Attribute, str],
+    status: Optional[str],
+    limit: Optional[int],
+    output_format: str,
+):
+    manifest_path = LibraryManifest.get_path(output_folder)
+    if not os.path.exists(manifest_path):
+        raise SystemExit(f"no library manifest in {output_folder}, organize files into it with manifest.enabled first")
+
+    manifest = LibraryManifest(manifest_path)
+    start = time.perf_counter()
+    try:
+        entries = manifest.query(filters, status=status, limit=limit)
+    finally:
+        manifest.close()
+    elapsed = time.perf_counter() - start
+
+    if output_format == "table":
+        print("\t".join(["status"] + [attribute.value for attribute in Attribute] + ["destination"]))
+    for entry in entries:
+        if output_format == "json":
+            print(json.dumps(asdict(entry)))
+        elif output_format == "paths":
+            print(entry.destination)
+        else:
+            print("\t".join(
+                [entry.status]
+                + [entry.get_attribute(attribute) or "" for attribute in Attribute]
+                + [entry.destination or ""]
+            ))
+    print(f"{len(entries)} files in {elapsed * 1000:.1f} ms", file=sys.stderr)
+
+
+def merge_distributed_run(config: Config, output_folder: str):
+    """
+    Merge the run journals, library manifests and run reports of the workers of a
+    distributed run into those of the output folder, and remove its work folder.
+    """
+    work_folder = WorkFolder(
+        WorkFolder.get_path(output_folder),
+        lease_seconds=config.distributed.leaseSeconds,
+        heartbeat_seconds=config.distributed.heartbeatSeconds,
+    )
+    if not os.path.isdir(work_folder.path):
+        raise SystemExit(f"no distributed run in {output_folder}, run workers with --distributed first")
+    active_leases = work_folder.count_active_leases()
+    if active_leases:
+        raise SystemExit(
+            f"{active_leases} files are still being handled by workers: merge once they are done, "
+            f"or their leases expired after {config.distributed.leaseSeconds:g}s"
+        )
+
+    journal_paths = sorted(glob.glob(os.path.join(work_folder.path, "journals", "*.jsonl")))
+    if journal_paths:
+        journal = RunJournal(RunJournal.get_path(output_folder))
+        try:
+            for path in journal_paths:
+                journal.merge(path)
+        finally:
+            journal.close()
+
+    manifest_paths = sorted(glob.glob(os.path.join(work_folder.path, "manifests", "*.sqlite")))
+    if manifest_paths:
+        manifest = LibraryManifest(LibraryManifest.get_path(output_folder))
+        try:
+            for path in manifest_paths:
+                manifest.merge(path)
+        finally:
+            manifest.close()
+
+    reports = []
+    for path in sorted(glob.glob(os.path.join(work_folder.path, "reports", "*.json"))):
+        with open(path, "r", encoding="utf-8") as f:
+            reports.append(json.load(f))
+    report_path = None
+    if reports:
+        report = merge_run_reports(reports, prices=config.metrics.prices)
+        report_path = config.metrics.reportPath or os.path.join(output_folder, "gpt-pdf-organizer-report.json")
+        write_json_report(report_path, report)
+        if config.metrics.prometheusPath:
+            write_prometheus_report(config.metrics.prometheusPath, report)
+
+    shutil.rmtree(work_folder.path)
+    print(f"merged {len(journal_paths)} journals and {len(manifest_paths)} manifests of the workers")
+    if reports:
+        cost = report["cost"]["estimated_usd"]
+        print(
+            f"run: {report['files']} files by {len(reports)} workers in {report['elapsed_seconds']:.1f}s "
+            f"({report['throughput']['files_per_second']:.2f} files/s)"
+            + (f", estimated cost ${cost:.4f}" if cost is not None else "")
+        )
+        print(f"run report: {os.path.abspath(report_path)}")
+
+
+def positive_int(value: str) -> int:
+    """
+    Parse a command line argument as an integer of at least 1.
+    """
+    number = int(value)
+    if number < 1:
+        raise argparse.ArgumentTypeError(f"must be at least 1, got {number}")
+    return number
+
+
+def _format_hit_rate(hits: int, misses: int) -> str:
+    lookups = hits + misses
+    rate = 100.0 * hits / lookups if lookups else 0.0
+    return f"{hits} hits, {misses} misses ({rate:.1f}% hit rate)"
+
+
+def _print_plan_report(progress, report: Dict, config: Config):
+    statuses = report["statuses"]
+    progress.print(
+        f"[blue]plan: {report['files']} files, {statuses['query']} to query in {report['queries']} queries, "
+        f"{statuses['cached']} cached, {statuses['resolved']} resolved without the LLM, "
+        f"{statuses['duplicate']} duplicates, {statuses['unclassified']} unclassified"
+    )
+    cost = report["cost"]
+    progress.print(
+        f"[blue]plan tokens: {cost['prompt_tokens']} prompt, about {cost['completion_tokens']} completion"
+        + (f", estimated cost ${cost['estimated_usd']:.4f} with {cost['model']}"
+           if cost["estimated_usd"] is not None else f", no known price for {cost['model']}")
+    )
+    progress.print(
+        f"[blue]plan time: about {report['projected_seconds']:.0f}s, "
+        f"{report['extraction_seconds']:.1f}s scanning and extracting, "
+        f"{report['query_seconds']:.0f}s querying at {config.dryRun.queryLatencySeconds:g}s per query"
+    )
+    if config.dryRun.planPath:
+        progress.print(f"[blue]plan of each file: {os.path.abspath(config.dryRun.planPath)}")
+
+
+def _stop_on_signals(stop: threading.Event):
+    """
+    Set the stop event on SIGTERM or a first Ctrl+C, and interrupt at once on a second one.
+    """
+    def handle_signal(signum, frame):
+        if stop.is_set():
+            raise KeyboardInterrupt
+        stop.set()
+
+    signal.signal(signal.SIGTERM, handle_signal)
+    signal.signal(signal.SIGINT, handle_signal)
+
+
+async def _organize_async(app: "Application", input_path: str, output_dir: str, resume: bool, on_file_done):
+    try:
+        async for _ in app.organize_async(input_path=input_path, output_dir=output_dir, resume=resume):
+            on_file_done()
+    finally:
+        await app.prompt_querier.aclose()
 
 
 def main():
     parser = argparse.ArgumentParser()
-    parser.add_argument("--input-path", type=str, required=True)
-    parser.add_argument("--output-folder", type=str, required=True)
+    parser.add_argument("--input-path", type=str, required=False)
+    parser.add_argument("--output-folder", type=str, required=False)
     parser.add_argument(
         "--config-file", type=str, required=False, default="./config.yaml"
     )
+    parser.add_argument(
+        "--extraction-workers", type=positive_int, required=False, default=None,
+        help="number of processes extracting PDF text, overrides concurrency.extractionWorkers",
+    )
+    parser.add_argument(
+        "--query-workers", type=positive_int, required=False, default=None,
+        help="number of LLM requests in flight, overrides concurrency.queryWorkers",
+    )
+    parser.add_argument(
+        "--async", dest="use_async", action="store_true", default=None,
+        help="run queries on an asyncio event loop, overrides llmClient.useAsync",
+    )
+    parser.add_argument(
+        "--cache", action="store_true", default=None,
+        help="read and store classifications and page text in the caches, "
+             "overrides cache.enabled and pageTextStore.enabled",
+    )
+    parser.add_argument(
+        "--no-cache", action="store_true",
+        help="neither read nor store classifications and page text in the caches",
+    )
+    parser.add_argument(
+        "--refresh-cache", action="store_true",
+        help="classify all files again and overwrite their cached classifications, enables the cache",
+    )
+    parser.add_argument(
+        "--recursive", action="store_true", default=None,
+        help="also handle the files of the subfolders of the input path, overrides input.recursive",
+    )
+    parser.add_argument(
+        "--report", type=str, required=False, default=None,
+        help="write the JSON report of the run to this path, overrides metrics.reportPath",
+    )
+    parser.add_argument(
+        "--resume", action="store_true",
+        help="skip the files recorded in the run journal of the output folder by a previous run, "
+             "needs journal.enabled",
+    )
+    parser.add_argument(
+        "--watch", action="store_true",
+        help="keep running and organize the PDF files landing in the input path, until SIGTERM or Ctrl+C",
+    )
+    parser.add_argument(
+        "--dry-run", action="store_true",
+        help="plan the run without querying the LLM nor touching the output folder: "
+             "report the tokens, cost, wall time and destination of the files",
+    )
+    parser.add_argument(
+        "--distributed", action="store_true", default=None,
+        help="share the input path with the other workers organizing it into the same output folder, "
+             "overrides distributed.enabled",
+    )
+    parser.add_argument(
+        "--worker-id", type=str, required=False, default=None,
+        help="id of this worker of a distributed run, overrides distributed.workerId",
+    )
+    parser.add_argument(
+        "--offline", action="store_true",
+        help="never download the files of the tokenizer, failing if they are not cached, overrides tokenizer.offline",
+    )
+
+    # offline batch job workflow: prepare, submit, poll until done, then apply
+    commands = parser.add_subparsers(dest="command")
+    prepare_parser = commands.add_parser(
+        "prepare", help="extract the input files and write the requests of a batch job")
+    prepare_parser.add_argument("--input-path", type=str, required=True)
+    prepare_parser.add_argument("--job-folder", type=str, required=True)
+    submit_parser = commands.add_parser(
+        "submit", help="submit the requests of a prepared batch job to batchJob.backend")
+    submit_parser.add_argument("--job-folder", type=str, required=True)
+    poll_parser = commands.add_parser(
+        "poll", help="get the status of a submitted batch job, downloading its results once done")
+    poll_parser.add_argument("--job-folder", type=str, required=True)
+    poll_parser.add_argument(
+        "--wait", action="store_true",
+        help="poll every batchJob.pollIntervalSeconds until the batch job is done")
+    apply_parser = commands.add_parser(
+        "apply", help="place the files of a batch job according to its results")
+    apply_parser.add_argument("--job-folder", type=str, required=True)
+    apply_parser.add_argument("--output-folder", type=str, required=True)
+    query_parser = commands.add_parser(
+        "query", help="list the files of an output folder with the given attributes, from its library manifest")
+    query_parser.add_argument("--output-folder", type=str, required=True)
+    for attribute in Attribute:
+        query_parser.add_argument(
+            f"--{attribute.value.replace('_', '-')}", dest=attribute.value, type=str, default=None,
+            help=f"{attribute.value} of the files, case-insensitive, a trailing * matches any ending")
+    query_parser.add_argument("--status", type=str, default=None, choices=["classified", "duplicate", "unclassified"])
+    query_parser.add_argument("--limit", type=int, default=None)
+    query_parser.add_argument("--format", dest="output_format", default="table", choices=["table", "json", "paths"])
+    relayout_parser = commands.add_parser(
+        "relayout", help="move the classified files of an output folder to the layout of the current organizer settings")
+    relayout_parser.add_argument("--output-folder", type=str, required=True)
+    merge_parser = commands.add_parser(
+        "merge", help="merge the journals, manifests and reports of the workers of a distributed run, once done")
+    merge_parser.add_argument("--output-folder", type=str, required=True)
+    warm_parser = commands.add_parser(
+        "warm", help="download the tokenizer of the configured model to tokenizer.cacheDir, for offline runs")
+    warm_parser.add_argument(
+        "--model", dest="models", type=str, nargs="*", default=[],
+        help="also download the tokenizers of these models")
+
     args = parser.parse_args()
+    if args.command is None and (args.input_path is None or args.output_folder is None):
+        parser.error("the following arguments are required: --input-path, --output-folder")
+    if args.watch and (args.command is not None or args.resume):
+        parser.error("--watch cannot be combined with a command or --resume, it always skips the files already handled")
+    if args.dry_run and (args.command is not None or args.watch):
+        parser.error("--dry-run cannot be combined with a command or --watch")
 
     config = Config()
     config.load_from_file(args.config_file)
+    if args.extraction_workers is not None:
+        config.concurrency.extractionWorkers = args.extraction_workers
+    if args.query_workers is not None:
+        config.concurrency.queryWorkers = args.query_workers
+    if args.use_async is not None:
+        config.llmClient.useAsync = args.use_async
+    if args.recursive is not None:
+        config.input.recursive = args.recursive
+    if args.report is not None:
+        config.metrics.reportPath = args.report
+    if args.no_cache and (args.cache or args.refresh_cache):
+        parser.error("--no-cache cannot be combined with --cache or --refresh-cache")
+    if args.cache or args.refresh_cache:
+        config.cache.enabled = True
+    if args.cache:
+        config.pageTextStore.enabled = True
+    if args.no_cache:
+        config.cache.enabled = False
+        config.pageTextStore.enabled = False
+    if args.distributed is not None:
+        config.distributed.enabled = args.distributed
+    if args.worker_id is not None:
+        config.distributed.workerId = args.worker_id
+    if args.resume and not config.journal.enabled:
+        parser.error("--resume needs the run journal, enable journal.enabled")
+    if config.distributed.enabled and args.watch:
+        parser.error("--watch cannot be combined with a distributed run")
+    if config.llmClient.useAsync and args.watch:
+        parser.error("--watch cannot be combined with --async or llmClient.useAsync, it runs on thread pools")
+    if args.offline or args.dry_run:
+        # a dry run counts the tokens with the cached tokenizer, without network access
+        config.tokenizer.offline = True
+
+    if args.command == "warm":
+        warm_tokenizers(config, args.models)
+        return
+    if args.command == "query":
+        filters = {
+            attribute: getattr(args, attribute.value)
+            for attribute in Attribute if getattr(args, attribute.value) is not None
+        }
+        query_library(args.output_folder, filters, args.status, args.limit, args.output_format)
+        return
+    if args.command == "merge":
+        merge_distributed_run(config, args.output_folder)
+        return
+    configure_tokenizer_cache(config.tokenizer.cacheDir, offline=config.tokenizer.offline)
 
+    job_folder = BatchJobFolder(args.job_folder) if args.command in BATCH_JOB_COMMANDS else None
+    if args.command == "submit":
+        submit_batch_job(config, job_folder)
+        return
+    if args.command == "poll":
+        poll_batch_job(config, job_folder, args.wait)
+        return
+    if args.command == "apply" and not os.path.exists(job_folder.results_path):
+        raise SystemExit(f"no results downloaded to {job_folder.path}, run poll first")
+    if args.command == "relayout" and not os.path.exists(LibraryManifest.get_path(args.output_folder)):
+        raise SystemExit(f"no library manifest in {args.output_folder}, organize files into it with manifest.enabled first")
+
+    if config.tokenizer.offline and args.command not in ("apply", "relayout"):
+        # fail before any file is handled, and let the extraction processes forked
+        # later inherit the loaded tokenizer
+        try:
+            get_tokenizer(config.llmModelName)
+        except TokenizerFileNotCachedException as e:
+            raise SystemExit(str(e))
+
+    from gpt_pdf_organizer.app.application import Application
+    from rich.progress import (
+        Progress,
+        TextColumn,
+        BarColumn,
+        TaskProgressColumn,
+        TimeRemainingColumn,
+    )
+
+    classification_cache = build_classification_cache(config, refresh=args.refresh_cache)
     app = Application(
         config=config,
-        prompt_querier=GPTPromptQuerier(
-            {
-                "api_key": config.apiKey,
-                "model_name": config.llmModelName,
-                "max_tokens": config.maxNumTokens,
-            }
-        ),
+        prompt_querier=build_prompt_querier(config),
+        classification_cache=classification_cache,
+        page_text_store=build_page_text_store(config),
+        metadata_resolvers=build_metadata_resolvers(config),
+        text_extractors=build_text_extractors(config),
     )
 
     # Define a custom progress bar layout
@@ -54,28 +589,198 @@ def main():
         progress.print(f"[blue]---------------------------------------------------------------------------") 
         progress.print(f"[blue]GPT PDF file organizer")
         progress.print(f"[blue]---------------------------------------------------------------------------") 
-        progress.print(f"[blue]source path:      {args.input_path}'")
-        progress.print(f"[blue]output path:      {os.path.abspath(args.output_folder)}")
+        if args.input_path is not None:
+            progress.print(f"[blue]source path:      {args.input_path}'")
+        if job_folder is not None:
+            progress.print(f"[blue]batch job folder: {os.path.abspath(job_folder.path)}")
+        if args.output_folder is not None:
+            progress.print(f"[blue]output path:      {os.path.abspath(args.output_folder)}")
         progress.print(f"[blue]using model:      {config.llmModelName}")
         progress.print(f"[blue]using max tokens: {config.maxNumTokens}")
+        progress.print(f"[blue]workers:          {config.concurrency.extractionWorkers} extraction, {config.concurrency.queryWorkers} query")
+        progress.print(f"[blue]placement:        {config.organizer.placement}")
+        if config.distributed.enabled and args.command is None and not args.dry_run:
+            progress.print(
+                f"[blue]distributed:      worker {config.distributed.workerId or 'named after host and process'}, "
+                f"leases of {config.distributed.leaseSeconds:g}s"
+            )
+        if args.dry_run:
+            progress.print("[blue]dry run:          no LLM query, no file placed")
+        if args.watch:
+            progress.print(
+                f"[blue]watching:         new files settled for {config.watch.settleSeconds:g}s"
+                + (", polling" if config.watch.usePolling else "")
+            )
+        sandboxed = config.extraction.timeoutSeconds is not None or config.extraction.maxMemoryMb is not None
+        progress.print(
+            f"[blue]extraction:       {' then '.join(config.extraction.backends)}"
+            + (" (sandboxed)" if sandboxed else "")
+        )
         progress.print(f"[blue]---------------------------------------------------------------------------") 
         progress.print()
 
         total_processed = 0
         task = progress.add_task("[red]processing files...", total=100)
-        for _ in app.organize(
-            input_path=args.input_path,
-            output_dir=args.output_folder,
-        ):
+
+        def on_file_done():
+            nonlocal total_processed
             task_error = app.get_error()
             task_progress = app.get_progress()
             task_message = app.get_process_message()
             # Simulate some work and update progress
             progress.print(f"[{'green' if not task_error else 'red'}]{task_message}")
-            progress.update(task, completed=task_progress, refresh=True)
+            if task_progress is None:
+                # the input path is still being scanned: show a running count
+                progress.update(
+                    task,
+                    total=None,
+                    description=(
+                        f"[red]processed {app.get_num_files_handled()} files, "
+                        + ("watching for more..." if args.watch else "scanning for more...")
+                    ),
+                    refresh=True,
+                )
+            else:
+                progress.update(
+                    task, total=100, completed=task_progress,
+                    description="[red]processing files...", refresh=True,
+                )
             total_processed += 1
 
-        progress.update(task, description=f"[green]done processing {total_processed} files", completed=100, refresh=True)
+        try:
+            if args.command == "prepare":
+                for _ in app.prepare_batch_job(args.input_path, job_folder):
+                    on_file_done()
+            elif args.command == "apply":
+                for _ in app.apply_batch_job(job_folder, args.output_folder):
+                    on_file_done()
+            elif args.command == "relayout":
+                for _ in app.relayout(args.output_folder):
+                    on_file_done()
+            elif args.dry_run:
+                for _ in app.plan(args.input_path, args.output_folder, resume=args.resume):
+                    on_file_done()
+            elif args.watch:
+                stop = threading.Event()
+                _stop_on_signals(stop)
+                progress.print("[blue]watching for new files, stop with Ctrl+C or SIGTERM...")
+                for _ in app.watch(args.input_path, args.output_folder, stop):
+                    on_file_done()
+            elif config.llmClient.useAsync:
+                import asyncio
+                asyncio.run(_organize_async(
+                    app, args.input_path, args.output_folder, args.resume, on_file_done
+                ))
+            else:
+                for _ in app.organize(
+                    input_path=args.input_path,
+                    output_dir=args.output_folder,
+                    resume=args.resume,
+                ):
+                    on_file_done()
+        finally:
+            if classification_cache is not None:
+                classification_cache.close()
+
+        progress.update(task, description=f"[green]done processing {total_processed} files", total=100, completed=100, refresh=True)
+        stats = app.get_stats()
+        if args.command == "prepare":
+            progress.print(
+                f"[blue]batch job: wrote {stats['batch_requests']} requests, "
+                f"submit them with: gpt-pdf-organizer submit --job-folder {job_folder.path}"
+            )
+        if args.command == "relayout":
+            progress.print(
+                f"[blue]relayout: moved {stats['relayout_moved']} files"
+                + (f", skipped {stats['relayout_conflicts']} files whose new destination is another file"
+                   if stats["relayout_conflicts"] else "")
+            )
+        if stats["missing_files"]:
+            progress.print(f"[red]skipped {stats['missing_files']} files that no longer exist")
+        if stats["extraction_fallbacks"]:
+            progress.print(
+                f"[blue]extraction: {stats['extraction_fallbacks']} files were extracted with a fallback backend, "
+                f"see the log for details"
+            )
+        if stats["extractions_stopped"]:
+            progress.print(
+                f"[red]extraction limits: {stats['extractions_stopped']} files exceeded a limit and were "
+                f"sent to the unclassified folder, see the journal for the reasons"
+            )
+        if stats["placement_fallbacks"]:
+            progress.print(
+                f"[blue]placement: {stats['placement_fallbacks']} files could not be placed with "
+                f"{config.organizer.placement} and were copied instead, see the log for details"
+            )
+        if stats["leases_lost"]:
+            progress.print(
+                f"[red]distributed: the leases of {stats['leases_lost']} files were taken over by other workers "
+                f"while being handled, consider a larger distributed.leaseSeconds"
+            )
+        if config.distributed.enabled and args.command is None and not args.dry_run:
+            progress.print(
+                f"[blue]distributed: once all workers are done, merge their results with: "
+                f"gpt-pdf-organizer merge --output-folder {args.output_folder}"
+            )
+        if stats["resumed_skipped"]:
+            progress.print(f"[blue]resumed run: skipped {stats['resumed_skipped']} files already handled")
+        if stats["rate_limited"]:
+            progress.print(
+                f"[red]rate limits: {stats['rate_limited']} files were still rate limited after retrying, "
+                f"run again with --resume to classify them"
+            )
+        if stats["exact_duplicates"] or stats["near_duplicates"]:
+            progress.print(
+                f"[blue]duplicates: {stats['exact_duplicates']} exact and {stats['near_duplicates']} near "
+                f"duplicates reused the classification of another file"
+            )
+        if stats["resolved_without_llm"]:
+            progress.print(f"[blue]metadata resolvers: classified {stats['resolved_without_llm']} files without the LLM")
+        tiers = sorted(
+            (int(key[len("token_tier_"):]), count) for key, count in stats.items() if key.startswith("token_tier_")
+        )
+        if tiers and config.tokenBudget.tiers:
+            progress.print(
+                "[blue]token tiers: " + ", ".join(f"{count} files at {tier} tokens" for tier, count in tiers)
+            )
+        if stats["queries"]:
+            progress.print(
+                f"[blue]tokens: {stats['prompt_tokens']} prompt ({stats['cached_prompt_tokens']} cached), "
+                f"{stats['completion_tokens']} completion over {stats['queries']} queries, "
+                f"{stats['prompt_tokens'] // stats['queries']} prompt tokens per query"
+            )
+        if classification_cache is not None:
+            progress.print(
+                f"[blue]classification cache: {_format_hit_rate(stats['cache_hits'], stats['cache_misses'])}"
+            )
+        if args.dry_run:
+            _print_plan_report(progress, app.get_plan_report(), config)
+        elif config.metrics.enabled:
+            report = app.get_run_report()
+            cost = report["cost"]["estimated_usd"]
+            progress.print(
+                f"[blue]run: {report['files']} files in {report['elapsed_seconds']:.1f}s "
+                f"({report['throughput']['files_per_second']:.2f} files/s)"
+                + (f", estimated cost ${cost:.4f}" if cost is not None else "")
+            )
+            # the stages taking most of the time of the run, e.g. the LLM queries or the extraction
+            stages = sorted(
+                ((stage, summary) for stage, summary in report["stages"].items() if stage != "file"),
+                key=lambda item: item[1]["sum"], reverse=True,
+            )
+            if stages:
+                progress.print("[blue]time per stage: " + ", ".join(
+                    f"{stage} {summary['sum']:.2f}s (p50 {summary['p50'] * 1000:.0f}ms)"
+                    for stage, summary in stages[:4]
+                ))
+            if report["peak_memory_bytes"] is not None:
+                progress.print(
+                    f"[blue]extraction memory: peaked at {report['peak_memory_bytes'] / 2 ** 20:.0f} MB, "
+                    f"see the journal for the peak of each file"
+                )
+            for path in (config.metrics.reportPath, config.metrics.prometheusPath):
+                if path:
+                    progress.print(f"[blue]run report: {os.path.abspath(path)}")
 if __name__ == "__main__":
     main()
 
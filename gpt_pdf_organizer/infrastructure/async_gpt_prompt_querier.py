@@ -0,0 +1,117 @@
+"""
+This file contains the asyncio based querier for the GPT chatbot.
+"""
+
+import asyncio
+
+import httpx
+import openai
+from gpt_pdf_organizer.infrastructure.gpt_prompt_querier import GPTPromptQuerier
+from gpt_pdf_organizer.infrastructure.gpt_prompt_querier import DEFAULT_TIMEOUT
+from gpt_pdf_organizer.service.prompt_querier import PromptResponse
+from typing import Dict
+from typing import Optional
+
+
+class AsyncGPTPromptQuerier(GPTPromptQuerier):
+    """
+    A GPT PromptQuerier that holds one long-lived AsyncOpenAI client.
+
+    All queries share the client connection pool, so connections and TLS sessions are
+    kept alive across files instead of being rebuilt for each query. The client is bound
+    to the event loop it is first used in: use either aquery from a single event loop,
+    or the blocking query, which runs on a private event loop, but not both.
+    """
+
+    def __init__(self, config: Dict):
+        """
+        Initializes the PromptQuerier with the given arguments.
+
+        Args:
+            config (Dict): The AI backend configuration. Besides api_key, model_name and
+                max_tokens, supports base_url, timeout, max_retries, max_connections,
+                max_keepalive_connections and keepalive_expiry.
+        """
+        super().__init__(config)
+        self._async_client = None
+        self._loop = None
+
+    def __getstate__(self) -> Dict:
+        state = super().__getstate__()
+        state["_async_client"] = None
+        state["_loop"] = None
+        return state
+
+    def query(self, prompt: str, system_prompt: Optional[str] = None, **kwargs) -> PromptResponse:
+        """
+        Queries the AI backend with the given prompt and returns the result, blocking
+        until the response is received.
+
+        Args:
+            prompt (str): The prompt to query with, sent as the user message.
+            system_prompt (str): The instructions sent as the system message, if any.
+            **kwargs (Dict): Additional arguments to pass to the AI backend query.
+
+        Returns:
+            PromptResponse: The generated tokens and the token usage of the query.
+        """
+        if self._loop is None:
+            self._loop = asyncio.new_event_loop()
+        return self._loop.run_until_complete(self.aquery(prompt, system_prompt, **kwargs))
+
+    async def aquery(self, prompt: str, system_prompt: Optional[str] = None, **kwargs) -> PromptResponse:
+        """
+        Asynchronously queries the AI backend with the given prompt and returns the result.
+
+        Args:
+            prompt (str): The prompt to query with, sent as the user message.
+            system_prompt (str): The instructions sent as the system message, if any.
+            **kwargs (Dict): Additional arguments to pass to the AI backend query.
+
+        Returns:
+            PromptResponse: The generated tokens and the token usage of the query.
+
+        Raises:
+            RateLimitException: when the query was rejected for exceeding the rate limits,
+                once the retries of the client are exhausted.
+        """
+        try:
+            response = await self._get_async_client().chat.completions.create(
+                **self._build_completion_request(prompt, system_prompt, **kwargs)
+            )
+        except openai.RateLimitError as e:
+            raise self._build_rate_limit_exception(e) from e
+
+        return self._build_response(response)
+
+    async def aclose(self):
+        """
+        Closes the client and its pooled connections.
+        """
+        if self._async_client is not None:
+            await self._async_client.close()
+            self._async_client = None
+
+    def close(self):
+        """
+        Closes the client and the private event loop used by the blocking query.
+        """
+        if self._loop is None:
+            return
+        self._loop.run_until_complete(self.aclose())
+        self._loop.close()
+        self._loop = None
+
+    def _get_async_client(self) -> openai.AsyncOpenAI:
+        """
+        Gets the client shared by all queries, creating it on first use.
+        """
+        if self._async_client is None:
+            self._async_client = openai.AsyncOpenAI(
+                http_client=httpx.AsyncClient(
+                    limits=self._build_connection_limits(),
+                    timeout=self._get_config("timeout", DEFAULT_TIMEOUT),
+                ),
+                **self._build_client_options(),
+            )
+        return self._async_client
@@ -0,0 +1,77 @@
+"""
+Implements the MetadataResolver service with the metadata embedded in the PDF file.
+"""
+
+import re
+from typing import Dict
+from typing import Optional
+
+from gpt_pdf_organizer.domain.attribute import Attribute
+from gpt_pdf_organizer.service.metadata_resolver import MetadataResolver
+from gpt_pdf_organizer.service.metadata_resolver import ResolvedAttribute
+
+# XMP is usually written by the publisher, while the info dictionary is often filled by
+# the authoring tool, so the latter is trusted less
+XMP_CONFIDENCE = 0.8
+DOCUMENT_INFO_CONFIDENCE = 0.6
+# the creation date of the file is only a hint of the publication year
+CREATION_DATE_CONFIDENCE = 0.5
+
+# titles left by authoring tools, e.g. "Microsoft Word - draft3.docx" or "untitled"
+JUNK_TITLE_PATTERN = re.compile(
+    r"^(untitled|title|no title|document\d*|slide \d+|page \d+)$"
+    r"|^microsoft (word|powerpoint) - "
+    r"|\.(docx?|pdf|tex|dvi|ps|indd|rtf|odt|pptx?)$",
+    re.IGNORECASE,
+)
+JUNK_AUTHOR_PATTERN = re.compile(
+    r"^(unknown|user|owner|admin|administrator|author|default|anonymous)$", re.IGNORECASE
+)
+YEAR_PATTERN = re.compile(r"^(?:D:)?((?:19|20)\d{2})")
+
+
+class EmbeddedMetadataResolver(MetadataResolver):
+    """
+    Resolves the title, author and year of a document from its XMP metadata and its
+    document info dictionary, ignoring the placeholder values left by authoring tools.
+    """
+
+    def resolve(
+        self, document_info: Dict[str, str], first_page_text: str
+    ) -> Dict[Attribute, ResolvedAttribute]:
+        resolved = {}
+        candidates = [
+            (Attribute.TITLE, "dc:title", XMP_CONFIDENCE, self._clean_title),
+            (Attribute.TITLE, "Title", DOCUMENT_INFO_CONFIDENCE, self._clean_title),
+            (Attribute.AUTHOR, "dc:creator", XMP_CONFIDENCE, self._clean_author),
+            (Attribute.AUTHOR, "Author", DOCUMENT_INFO_CONFIDENCE, self._clean_author),
+            (Attribute.YEAR, "xmp:CreateDate", CREATION_DATE_CONFIDENCE, self._parse_year),
+            (Attribute.YEAR, "CreationDate", CREATION_DATE_CONFIDENCE, self._parse_year),
+        ]
+        for attribute, key, confidence, clean in candidates:
+            if attribute in resolved or key not in document_info:
+                continue
+
+            value = clean(document_info[key])
+            if value is not None:
+                resolved[attribute] = ResolvedAttribute(
+                    value=value, confidence=confidence, source=key
+                )
+
+        return resolved
+
+    def _clean_title(self, title: str) -> Optional[str]:
+        title = " ".join(title.split())
+        if len(title) < 4 or title.isdigit() or JUNK_TITLE_PATTERN.search(title):
+            return None
+        return title
+
+    def _clean_author(self, author: str) -> Optional[str]:
+        author = " ".join(author.split())
+        if len(author) < 2 or JUNK_AUTHOR_PATTERN.match(author):
+            return None
+        return author
+
+    def _parse_year(self, date: str) -> Optional[str]:
+        match = YEAR_PATTERN.match(date.strip())
+        return match.group(1) if match else None
@@ -2,13 +2,25 @@
 This file contains the functions to query the GPT chatbot.
 """
 
-import tiktoken
+import threading
+
+import httpx
 import openai
+from gpt_pdf_organizer.app.exception import RateLimitException
 from gpt_pdf_organizer.service.prompt_querier import PromptQuerier
-from gpt_pdf_organizer.utils.tokenizer import first_words_within_k_tokens
+from gpt_pdf_organizer.service.prompt_querier import PromptResponse
+from gpt_pdf_organizer.service.prompt_querier import TokenUsage
+from gpt_pdf_organizer.utils.rate_limit import parse_retry_after
+from gpt_pdf_organizer.utils.tokenizer import get_tokenizer
 from typing import Dict
+from typing import Optional
 from typing import Tuple
 
+DEFAULT_TIMEOUT = 60.0
+DEFAULT_MAX_RETRIES = 2
+DEFAULT_MAX_CONNECTIONS = 10
+DEFAULT_KEEPALIVE_EXPIRY = 30.0
+
 
 class GPTPromptQuerier(PromptQuerier):
     """
@@ -24,39 +36,134 @@ class GPTPromptQuerier(PromptQuerier):
             **kwargs (Dict): Additional arguments to pass to the AI backend.
         """
         self._config = config
-
-    def query(self, prompt: str, **kwargs) -> str:
+        self._client = None
+        self._client_lock = threading.Lock()
+
+    def __getstate__(self) -> Dict:
+        # clients hold sockets and locks: they are rebuilt lazily after unpickling,
+        # e.g. when the querier is sent to extraction worker processes
+        state = self.__dict__.copy()
+        state["_client"] = None
+        state["_client_lock"] = None
+        return state
+
+    def __setstate__(self, state: Dict):
+        self.__dict__.update(state)
+        self._client_lock = threading.Lock()
+
+    def query(self, prompt: str, system_prompt: Optional[str] = None, **kwargs) -> PromptResponse:
         """
         Queries the AI backend with the given prompt and returns the result.
 
         Args:
-            prompt (str): The prompt to query with.
-            max_tokens (int): The maximum number of tokens to generate.
+            prompt (str): The prompt to query with, sent as the user message.
+            system_prompt (str): The instructions sent as the system message, if any.
             **kwargs (Dict): Additional arguments to pass to the AI backend query.
 
         Returns:
-            str: The generated tokens.
+            PromptResponse: The generated tokens and the token usage of the query.
+
+        Raises:
+            RateLimitException: when the query was rejected for exceeding the rate limits,
+                once the retries of the client are exhausted.
+        """
+        try:
+            response = self._get_client().chat.completions.create(
+                **self._build_completion_request(prompt, system_prompt, **kwargs)
+            )
+        except openai.RateLimitError as e:
+            raise self._build_rate_limit_exception(e) from e
+
+        return self._build_response(response)
+
+    def _get_client(self) -> openai.OpenAI:
+        """
+        Gets the client shared by all queries, creating it on first use.
+
+        The client keeps a pool of keep-alive connections and is safe to use from
+        several threads.
+        """
+        with self._client_lock:
+            if self._client is None:
+                self._client = openai.OpenAI(
+                    http_client=httpx.Client(
+                        limits=self._build_connection_limits(),
+                        timeout=self._get_config("timeout", DEFAULT_TIMEOUT),
+                    ),
+                    **self._build_client_options(),
+                )
+            return self._client
+
+    def _build_client_options(self) -> Dict:
+        """
+        Builds the options shared by the sync and async OpenAI clients.
         """
         api_key = self._get_config("api_key")
         if not api_key:
             raise ValueError("API key must be specified")
 
-        max_tokens = self._get_config("max_tokens")
-        model_name = self._get_config("model_name")
+        return {
+            "api_key": api_key,
+            "base_url": self._get_config("base_url"),
+            "max_retries": self._get_config("max_retries", DEFAULT_MAX_RETRIES),
+        }
 
-        openai.api_key = api_key
-        client = openai.OpenAI()
+    def _build_connection_limits(self) -> httpx.Limits:
+        """
+        Builds the connection pool limits of the HTTP client.
+        """
+        return httpx.Limits(
+            max_connections=self._get_config("max_connections", DEFAULT_MAX_CONNECTIONS),
+            max_keepalive_connections=self._get_config(
+                "max_keepalive_connections", DEFAULT_MAX_CONNECTIONS
+            ),
+            keepalive_expiry=self._get_config("keepalive_expiry", DEFAULT_KEEPALIVE_EXPIRY),
+        )
 
-        response = client.chat.completions.create(
-            model=model_name,  # or the latest available model
-            max_tokens=max_tokens,
-            messages=[
-                {"role": "system", "content": prompt},
-                {"role": "user", "content": prompt},
-            ],
+    def _build_completion_request(self, prompt: str, system_prompt: Optional[str] = None, **kwargs) -> Dict:
+        """
+        Builds the chat completion request arguments for the given prompt.
+
+        The system prompt goes first, so requests sharing it share a cacheable prefix.
+        Additional arguments, e.g. max_tokens, override the configured ones.
+        """
+        messages = []
+        if system_prompt is not None:
+            messages.append({"role": "system", "content": system_prompt})
+        messages.append({"role": "user", "content": prompt})
+
+        return {
+            "model": self._get_config("model_name"),  # or the latest available model
+            "max_tokens": self._get_config("max_tokens"),
+            "messages": messages,
+            **kwargs,
+        }
+
+    @staticmethod
+    def _build_rate_limit_exception(error: openai.RateLimitError) -> RateLimitException:
+        return RateLimitException(
+            str(error), retry_after=parse_retry_after(error.response.headers)
         )
 
-        return response.choices[0].message.content
+    @staticmethod
+    def _build_response(response) -> PromptResponse:
+        """
+        Builds the result of a query from a chat completion.
+        """
+        usage = None
+        if response.usage is not None:
+            details = getattr(response.usage, "prompt_tokens_details", None)
+            if isinstance(details, dict):
+                cached_prompt_tokens = details.get("cached_tokens") or 0
+            else:
+                cached_prompt_tokens = getattr(details, "cached_tokens", None) or 0
+            usage = TokenUsage(
+                prompt_tokens=response.usage.prompt_tokens,
+                completion_tokens=response.usage.completion_tokens,
+                cached_prompt_tokens=cached_prompt_tokens,
+            )
+
+        return PromptResponse(response.choices[0].message.content, usage)
 
     def clamp_text_by_tokens(self, text: str, max_tokens: int) -> Tuple[str, int]:
         """
@@ -69,38 +176,19 @@ class GPTPromptQuerier(PromptQuerier):
         Returns:
             a tuple containing the extracted text and the total number of tokens effectivelly used.
         """
+        return get_tokenizer(self._get_config("model_name")).clamp_text_by_tokens(
+            text, max_tokens
+        )
 
-        # Tokenize the text
-        word_count = 0
-        token_count = 0
-
-        words = text.split()
-        encoder = tiktoken.encoding_for_model(self._get_config("model_name"))
-
-        for i, word in enumerate(words):
-            # Count the tokens for the current word
-
-            word_tokens = len(encoder.encode((word)))
-
-            # Check if adding this word exceeds the token limit
-            if token_count + word_tokens > max_tokens:
-                break
-
-            # Add the word's tokens to the total count and increment word count
-            token_count += word_tokens
-            word_count += 1
-
-        # Join the words that fit within the token and word limits
-        selected_text = " ".join(words[:word_count])
-        return selected_text, token_count
-
-    def _get_config(self, key):
+    def _get_config(self, key, default=None):
         """
         Gets the config value for the given key.
         Args:
             key (str): The key to get the config value for.
+            default: The value to return when the key is not set.
 
         Returns:
             str: The config value.
         """
-        return self._config.get(key)
+        value = self._config.get(key)
+        return default if value is None else value
@@ -0,0 +1,99 @@
+"""
+Implements the MetadataResolver service with the identifiers printed on the first page
+of a document, such as DOIs, arXiv ids and ISBNs.
+"""
+
+import re
+from typing import Dict
+from typing import Optional
+
+from gpt_pdf_organizer.domain.attribute import Attribute
+from gpt_pdf_organizer.service.metadata_resolver import MetadataResolver
+from gpt_pdf_organizer.service.metadata_resolver import ResolvedAttribute
+
+ARXIV_CONFIDENCE = 0.9
+ISBN_CONFIDENCE = 0.8
+# below the default confidence threshold: DOIs are also given to books, chapters and datasets
+DOI_CONFIDENCE = 0.6
+COPYRIGHT_CONFIDENCE = 0.6
+
+# new style ids encode the submission year and month, e.g. arXiv:2104.01234v2, while
+# old style ids look like arXiv:hep-th/9901001
+ARXIV_PATTERN = re.compile(
+    r"arXiv:\s*(?:(\d{2})(?:0[1-9]|1[0-2])\.\d{4,5}|[a-z\-]+(?:\.[A-Z]{2})?/(\d{2})\d{5})",
+    re.IGNORECASE,
+)
+DOI_PATTERN = re.compile(r"\b10\.\d{4,9}/[^\s\"<>]+")
+ISBN_PATTERN = re.compile(r"\bISBN(?:-1[03])?:?\s*((?:97[89][\s\-]?)?(?:\d[\s\-]?){9}[\dXx])")
+COPYRIGHT_PATTERN = re.compile(
+    r"(?:©|\(c\)|copyright)\s*(?:(?:19|20)\d{2}\s*[\-–,]\s*)?((?:19|20)\d{2})",
+    re.IGNORECASE,
+)
+
+
+class IdentifierMetadataResolver(MetadataResolver):
+    """
+    Resolves the content type and year of a document from the identifiers found on its
+    first page: an arXiv id, or with less confidence a DOI, marks an article, a valid
+    ISBN marks a book, and arXiv ids and copyright notices give the year.
+    """
+
+    def resolve(
+        self, document_info: Dict[str, str], first_page_text: str
+    ) -> Dict[Attribute, ResolvedAttribute]:
+        resolved = {}
+        text = first_page_text or ""
+
+        arxiv = ARXIV_PATTERN.search(text)
+        isbn = self._find_isbn(text)
+        doi = DOI_PATTERN.search(text) or DOI_PATTERN.search(document_info.get("prism:doi", ""))
+        if arxiv is not None:
+            resolved[Attribute.CONTENT_TYPE] = ResolvedAttribute(
+                value="article", confidence=ARXIV_CONFIDENCE, source="arxiv"
+            )
+            resolved[Attribute.YEAR] = ResolvedAttribute(
+                value=self._arxiv_year(arxiv.group(1) or arxiv.group(2)),
+                confidence=ARXIV_CONFIDENCE,
+                source="arxiv",
+            )
+        elif isbn is not None:
+            resolved[Attribute.CONTENT_TYPE] = ResolvedAttribute(
+                value="book", confidence=ISBN_CONFIDENCE, source="isbn"
+            )
+        elif doi is not None:
+            resolved[Attribute.CONTENT_TYPE] = ResolvedAttribute(
+                value="article", confidence=DOI_CONFIDENCE, source="doi"
+            )
+
+        copyright_notice = COPYRIGHT_PATTERN.search(text)
+        if Attribute.YEAR not in resolved and copyright_notice is not None:
+            resolved[Attribute.YEAR] = ResolvedAttribute(
+                value=copyright_notice.group(1),
+                confidence=COPYRIGHT_CONFIDENCE,
+                source="copyright",
+            )
+
+        return resolved
+
+    def _arxiv_year(self, two_digit_year: str) -> str:
+        # arXiv started in 1991
+        year = int(two_digit_year)
+        return str(1900 + year if year >= 91 else 2000 + year)
+
+    def _find_isbn(self, text: str) -> Optional[str]:
+        for match in ISBN_PATTERN.finditer(text):
+            digits = re.sub(r"[\s\-]", "", match.group(1)).upper()
+            if self._is_valid_isbn(digits):
+                return digits
+        return None
+
+    def _is_valid_isbn(self, digits: str) -> bool:
+        if len(digits) == 10:
+            total = sum(
+                (10 if c == "X" else int(c)) * (10 - i) for i, c in enumerate(digits)
+            )
+            return total % 11 == 0
+        if len(digits) == 13 and digits.isdigit():
+            total = sum(int(c) * (1 if i % 2 == 0 else 3) for i, c in enumerate(digits))
+            return total % 10 == 0
+        return False
@@ -0,0 +1,108 @@
+"""
+This file contains a file-based batch backend running requests through a PromptQuerier.
+"""
+
+import os
+import json
+import uuid
+import shutil
+from gpt_pdf_organizer.service.batch_backend import BatchBackend
+from gpt_pdf_organizer.service.batch_backend import BatchStatus
+from gpt_pdf_organizer.service.prompt_querier import PromptQuerier
+from typing import Dict
+
+
+class LocalBatchBackend(BatchBackend):
+    """
+    A BatchBackend keeping each batch in a folder, and running its requests one after
+    another through a PromptQuerier the first time it is polled.
+
+    It stands in for a batch API in tests, and runs batch jobs against a local
+    chat-completions server.
+    """
+
+    def __init__(self, folder: str, prompt_querier: PromptQuerier):
+        self.folder = folder
+        self.prompt_querier = prompt_querier
+
+    def submit(self, requests_path: str) -> str:
+        batch_id = f"batch_{uuid.uuid4().hex}"
+        os.makedirs(self._get_path(batch_id))
+        shutil.copyfile(requests_path, self._get_path(batch_id, "requests.jsonl"))
+        self._save_status(BatchStatus(batch_id=batch_id, status="validating"))
+        return batch_id
+
+    def poll(self, batch_id: str) -> BatchStatus:
+        status = self._load_status(batch_id)
+        if not status.finished:
+            status = self._run(batch_id)
+        return status
+
+    def download_results(self, batch_id: str, results_path: str):
+        shutil.copyfile(self._get_path(batch_id, "results.jsonl"), results_path)
+
+    def _run(self, batch_id: str) -> BatchStatus:
+        """
+        Run the requests of the given batch, streaming their results to its results file.
+        """
+        status = BatchStatus(batch_id=batch_id, status="in_progress")
+        results_path = self._get_path(batch_id, "results.jsonl")
+        with open(self._get_path(batch_id, "requests.jsonl"), "r", encoding="utf-8") as requests, \
+                open(f"{results_path}.tmp", "w", encoding="utf-8") as results:
+            for line in requests:
+                if not line.strip():
+                    continue
+                request = json.loads(line)
+                result = self._run_request(request)
+                status.total += 1
+                if result["error"] is None:
+                    status.completed += 1
+                else:
+                    status.failed += 1
+                results.write(json.dumps(result) + "\n")
+
+        os.replace(f"{results_path}.tmp", results_path)
+        status.status = "completed"
+        self._save_status(status)
+        return status
+
+    def _run_request(self, request: Dict) -> Dict:
+        body = dict(request["body"])
+        messages = body.pop("messages")
+        body.pop("model", None)
+        system_prompt = next(
+            (m["content"] for m in messages if m["role"] == "system"), None
+        )
+        prompt = next(m["content"] for m in messages if m["role"] == "user")
+        result = {"id": uuid.uuid4().hex, "custom_id": request["custom_id"], "response": None, "error": None}
+        try:
+            content = self.prompt_querier.query(prompt, system_prompt=system_prompt, **body)
+        except Exception as e:
+            result["error"] = {"code": type(e).__name__, "message": str(e)}
+            return result
+
+        usage = getattr(content, "usage", None)
+        result["response"] = {
+            "status_code": 200,
+            "body": {
+                "object": "chat.completion",
+                "choices": [{"index": 0, "message": {"role": "assistant", "content": str(content)}}],
+                "usage": None if usage is None else {
+                    "prompt_tokens": usage.prompt_tokens,
+                    "completion_tokens": usage.completion_tokens,
+                    "total_tokens": usage.prompt_tokens + usage.completion_tokens,
+                },
+            },
+        }
+        return result
+
+    def _load_status(self, batch_id: str) -> BatchStatus:
+        with open(self._get_path(batch_id, "status.json"), "r") as f:
+            return BatchStatus(**json.load(f))
+
+    def _save_status(self, status: BatchStatus):
+        with open(self._get_path(status.batch_id, "status.json"), "w") as f:
+            json.dump(status.__dict__, f)
+
+    def _get_path(self, batch_id: str, *names: str) -> str:
+        return os.path.join(self.folder, batch_id, *names)
@@ -0,0 +1,93 @@
+"""
+This file contains the batch backend running requests through the OpenAI batch API.
+"""
+
+import httpx
+import openai
+from gpt_pdf_organizer.infrastructure.gpt_prompt_querier import DEFAULT_TIMEOUT
+from gpt_pdf_organizer.infrastructure.gpt_prompt_querier import DEFAULT_MAX_RETRIES
+from gpt_pdf_organizer.service.batch_backend import BatchBackend
+from gpt_pdf_organizer.service.batch_backend import BatchStatus
+from typing import Dict
+
+COMPLETION_WINDOW = "24h"
+
+
+class OpenAIBatchBackend(BatchBackend):
+    """
+    A BatchBackend uploading request files to the OpenAI batch API, which runs them
+    within 24 hours at a discount over synchronous requests.
+
+    The installed client has no batches resource, so batches are created and
+    retrieved through its generic post and get methods.
+    """
+
+    def __init__(self, config: Dict):
+        """
+        Initializes the backend.
+
+        Args:
+            config (Dict): The AI backend configuration: api_key, and optionally base_url,
+                timeout and max_retries.
+        """
+        self._config = config
+        self._client = None
+
+    def submit(self, requests_path: str) -> str:
+        with open(requests_path, "rb") as f:
+            requests_file = self._get_client().files.create(file=f, purpose="batch")
+
+        batch = self._get_client().post(
+            "/batches",
+            body={
+                "input_file_id": requests_file.id,
+                "endpoint": "/v1/chat/completions",
+                "completion_window": COMPLETION_WINDOW,
+            },
+            cast_to=httpx.Response,
+        ).json()
+        return batch["id"]
+
+    def poll(self, batch_id: str) -> BatchStatus:
+        batch = self._get_batch(batch_id)
+        counts = batch.get("request_counts") or {}
+        return BatchStatus(
+            batch_id=batch_id,
+            status=batch["status"],
+            total=counts.get("total", 0),
+            completed=counts.get("completed", 0),
+            failed=counts.get("failed", 0),
+        )
+
+    def download_results(self, batch_id: str, results_path: str):
+        batch = self._get_batch(batch_id)
+        with open(results_path, "wb") as f:
+            # failed requests are listed in a separate error file
+            for file_id in (batch.get("output_file_id"), batch.get("error_file_id")):
+                if file_id is None:
+                    continue
+                content = self._get_client().files.content(file_id).content
+                f.write(content)
+                if content and not content.endswith(b"\n"):
+                    f.write(b"\n")
+
+    def _get_batch(self, batch_id: str) -> Dict:
+        return self._get_client().get(f"/batches/{batch_id}", cast_to=httpx.Response).json()
+
+    def _get_client(self) -> openai.OpenAI:
+        if self._client is None:
+            api_key = self._get_config("api_key")
+            if not api_key:
+                raise ValueError("API key must be specified")
+
+            self._client = openai.OpenAI(
+                api_key=api_key,
+                base_url=self._get_config("base_url"),
+                max_retries=self._get_config("max_retries", DEFAULT_MAX_RETRIES),
+                http_client=httpx.Client(timeout=self._get_config("timeout", DEFAULT_TIMEOUT)),
+            )
+        return self._client
+
+    def _get_config(self, key, default=None):
+        value = self._config.get(key)
+        return default if value is None else value
@@ -0,0 +1,130 @@
+"""
+Implements the TextExtractor service with pdfminer, without layout analysis.
+"""
+
+from typing import Dict
+from typing import Iterator
+from typing import List
+from typing import Optional
+
+from pdfminer.layout import LTChar
+from pdfminer.layout import LTContainer
+from pdfminer.layout import LTPage
+from pdfminer.converter import PDFLayoutAnalyzer
+from pdfminer.pdfdocument import PDFDocument
+from pdfminer.pdfinterp import PDFPageInterpreter
+from pdfminer.pdfinterp import PDFResourceManager
+from pdfminer.pdfpage import PDFPage
+from pdfminer.pdfparser import PDFParser
+
+from gpt_pdf_organizer.app.exception import ExtractionGuardException
+from gpt_pdf_organizer.service.text_extractor import TextDocument
+from gpt_pdf_organizer.service.text_extractor import TextExtractor
+from gpt_pdf_organizer.utils.pdf import read_document_info
+from gpt_pdf_organizer.utils.pdf import read_num_pages
+
+# a character starts a new line when its baseline moves by more than this fraction of
+# its height, and a new word when it is further than this fraction of its width
+LINE_BREAK_HEIGHT_RATIO = 0.5
+WORD_BREAK_WIDTH_RATIO = 0.3
+
+
+class TextOnlyConverter(PDFLayoutAnalyzer):
+    """
+    A pdfminer device writing the characters of a page in the order they are drawn,
+    breaking lines where the baseline moves and words where characters are apart,
+    instead of grouping characters into words, lines and boxes.
+    """
+
+    def __init__(self, resource_manager: PDFResourceManager, max_chars: Optional[int] = None):
+        super().__init__(resource_manager, laparams=None)
+        self.text = ""
+        self.max_chars = max_chars
+        self.num_chars = 0
+
+    def begin_page(self, page: PDFPage, ctm):
+        super().begin_page(page, ctm)
+        self.num_chars = 0
+
+    def render_char(self, *args, **kwargs) -> float:
+        # stop interpreting a page as soon as it has too many characters, before they
+        # all are in memory
+        self.num_chars += 1
+        if self.max_chars is not None and self.num_chars > self.max_chars:
+            raise ExtractionGuardException(
+                f"page {self.pageno} has more than {self.max_chars} characters"
+            )
+        return super().render_char(*args, **kwargs)
+
+    def receive_layout(self, ltpage: LTPage):
+        parts: List[str] = []
+        previous = None
+        for char in self._iter_chars(ltpage):
+            if previous is not None:
+                if abs(char.y0 - previous.y0) > LINE_BREAK_HEIGHT_RATIO * previous.height:
+                    parts.append("\n")
+                elif (
+                    char.x0 - previous.x1 > WORD_BREAK_WIDTH_RATIO * previous.width
+                    and not previous.get_text().isspace()
+                    and not char.get_text().isspace()
+                ):
+                    parts.append(" ")
+            parts.append(char.get_text())
+            previous = char
+        self.text = "".join(parts)
+
+    def _iter_chars(self, item) -> Iterator[LTChar]:
+        for child in item:
+            if isinstance(child, LTChar):
+                yield child
+            elif isinstance(child, LTContainer):
+                yield from self._iter_chars(child)
+
+
+class PdfminerTextDocument(TextDocument):
+    """
+    A PDF file parsed by pdfminer, whose pages are interpreted without layout analysis.
+    """
+
+    def __init__(self, pdf_path: str):
+        self._file = open(pdf_path, "rb")
+        try:
+            self._doc = PDFDocument(PDFParser(self._file))
+        except BaseException:
+            self._file.close()
+            raise
+
+    def iter_pages_text(self, start_page: int = 0, max_chars: Optional[int] = None) -> Iterator[str]:
+        resource_manager = PDFResourceManager(caching=True)
+        device = TextOnlyConverter(resource_manager, max_chars)
+        interpreter = PDFPageInterpreter(resource_manager, device)
+        for i, page in enumerate(PDFPage.create_pages(self._doc)):
+            if i < start_page:
+                continue
+
+            device.pageno = i + 1
+            interpreter.process_page(page)
+            yield device.text
+
+    def get_num_pages(self) -> int:
+        return read_num_pages(self._doc)
+
+    def get_document_info(self) -> Dict[str, str]:
+        return read_document_info(self._doc)
+
+    def close(self):
+        self._file.close()
+
+
+class PdfminerTextExtractor(TextExtractor):
+    """
+    Extracts the text of the pages with pdfminer, writing characters in drawing order
+    without layout analysis. Several times faster than pdfplumber, but the lines of
+    multi-column pages may be interleaved, which matters little for the first tokens
+    of a document.
+    """
+
+    name = "pdfminer"
+
+    def open(self, pdf_path: str) -> TextDocument:
+        return PdfminerTextDocument(pdf_path)
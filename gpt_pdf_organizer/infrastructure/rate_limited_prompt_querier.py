@@ -0,0 +1,263 @@
+"""
+This file contains the scheduler admitting the queries of a PromptQuerier within the
+rate limits of the AI backend.
+"""
+
+import time
+import random
+import asyncio
+import threading
+from collections import Counter
+from typing import Callable
+from typing import Dict
+from typing import Optional
+from typing import Tuple
+
+from gpt_pdf_organizer.app.exception import RateLimitException
+from gpt_pdf_organizer.service.prompt_querier import PromptQuerier
+from gpt_pdf_organizer.utils.rate_limit import TokenBucket
+
+# seconds between two admission attempts while all the concurrency slots are taken
+CONCURRENCY_POLL_INTERVAL = 0.05
+# the concurrency is halved at most once per interval, so a burst of rate limited
+# responses to queries sent together counts as a single congestion signal
+CONCURRENCY_DECREASE_INTERVAL = 1.0
+
+
+class RateLimitedPromptQuerier(PromptQuerier):
+    """
+    A PromptQuerier that schedules the queries of another one within the requests and
+    tokens per minute allowed by the AI backend.
+
+    Queries are admitted through two token buckets, one of requests and one of tokens,
+    the token cost of a query being estimated from its prompt plus the completion tokens
+    it may generate, and corrected once the backend reports the actual usage.
+
+    Rate limited queries are retried with jittered exponential backoff, or after the
+    delay the backend asked for, during which no other query is sent. The number of
+    queries in flight follows an additive increase, multiplicative decrease policy: it
+    grows slowly while queries succeed, and is halved when the backend rate limits them.
+    """
+
+    def __init__(
+        self,
+        prompt_querier: PromptQuerier,
+        requests_per_minute: Optional[int] = None,
+        tokens_per_minute: Optional[int] = None,
+        max_concurrency: int = 1,
+        max_retries: int = 6,
+        initial_backoff: float = 1.0,
+        max_backoff: float = 60.0,
+        max_completion_tokens: int = 0,
+        clock: Callable[[], float] = time.monotonic,
+    ):
+        """
+        Initializes the scheduler.
+
+        Args:
+            prompt_querier (PromptQuerier): The querier whose queries are scheduled.
+            requests_per_minute (int): The requests per minute allowed, or None if unlimited.
+            tokens_per_minute (int): The tokens per minute allowed, or None if unlimited.
+            max_concurrency (int): The maximum number of queries in flight.
+            max_retries (int): The number of times a rate limited query is retried.
+            initial_backoff (float): The backoff in seconds before the first retry.
+            max_backoff (float): The maximum backoff in seconds.
+            max_completion_tokens (int): The completion tokens reserved for each query,
+                unless the query passes max_tokens.
+        """
+        self.prompt_querier = prompt_querier
+        self.max_concurrency = max_concurrency
+        self.max_retries = max_retries
+        self.initial_backoff = initial_backoff
+        self.max_backoff = max_backoff
+        self.max_completion_tokens = max_completion_tokens
+        self.concurrency_limit = float(max_concurrency)
+        self.stats = Counter()
+        self._clock = clock
+        self._request_bucket = None
+        if requests_per_minute:
+            self._request_bucket = TokenBucket(requests_per_minute, clock)
+        self._token_bucket = None
+        if tokens_per_minute:
+            self._token_bucket = TokenBucket(tokens_per_minute, clock)
+        self._in_flight = 0
+        self._paused_until = 0.0
+        self._last_decrease = float("-inf")
+        self._prompt_tokens = {}
+        self._lock = threading.Lock()
+
+    def __getstate__(self) -> Dict:
+        state = self.__dict__.copy()
+        state["_lock"] = None
+        return state
+
+    def __setstate__(self, state: Dict):
+        self.__dict__.update(state)
+        self._lock = threading.Lock()
+
+    def query(self, prompt: str, system_prompt: Optional[str] = None, **kwargs) -> str:
+        """
+        Queries the scheduled querier once the query is admitted, retrying it while it is
+        rate limited.
+
+        Raises:
+            RateLimitException: when the query is still rate limited after max_retries retries.
+        """
+        cost = self._estimate_cost(prompt, system_prompt, kwargs.get("max_tokens"))
+        for attempt in range(self.max_retries + 1):
+            wait = self._try_admit(cost)
+            while wait > 0:
+                time.sleep(wait)
+                wait = self._try_admit(cost)
+
+            try:
+                response = self.prompt_querier.query(prompt, system_prompt, **kwargs)
+            except RateLimitException as e:
+                self._on_rate_limited(e, attempt)
+                if attempt == self.max_retries:
+                    raise
+                continue
+            except BaseException:
+                self._release()
+                raise
+
+            self._on_success(cost, response)
+            return response
+
+    async def aquery(self, prompt: str, system_prompt: Optional[str] = None, **kwargs) -> str:
+        """
+        Asynchronously queries the scheduled querier once the query is admitted, retrying
+        it while it is rate limited.
+
+        Raises:
+            RateLimitException: when the query is still rate limited after max_retries retries.
+        """
+        cost = self._estimate_cost(prompt, system_prompt, kwargs.get("max_tokens"))
+        for attempt in range(self.max_retries + 1):
+            wait = self._try_admit(cost)
+            while wait > 0:
+                await asyncio.sleep(wait)
+                wait = self._try_admit(cost)
+
+            try:
+                response = await self.prompt_querier.aquery(prompt, system_prompt, **kwargs)
+            except RateLimitException as e:
+                self._on_rate_limited(e, attempt)
+                if attempt == self.max_retries:
+                    raise
+                continue
+            except BaseException:
+                self._release()
+                raise
+
+            self._on_success(cost, response)
+            return response
+
+    async def aclose(self):
+        await self.prompt_querier.aclose()
+
+    def clamp_text_by_tokens(self, text: str, max_tokens: int) -> Tuple[str, int]:
+        return self.prompt_querier.clamp_text_by_tokens(text, max_tokens)
+
+    def get_stats(self) -> Counter:
+        """
+        Get the counters of the scheduler: rate_limited responses and retries.
+        """
+        return self.stats
+
+    def _estimate_cost(self, prompt: str, system_prompt: Optional[str], max_tokens: Optional[int]) -> int:
+        """
+        Estimate the tokens counted against the quota for a query: its prompt tokens and
+        the completion tokens it may generate.
+        """
+        if self._token_bucket is None:
+            return 0
+
+        cost = self._count_tokens(prompt)
+        if system_prompt is not None:
+            # the system prompt is the same for most queries: count it once
+            if system_prompt not in self._prompt_tokens:
+                self._prompt_tokens[system_prompt] = self._count_tokens(system_prompt)
+            cost += self._prompt_tokens[system_prompt]
+        return cost + (max_tokens or self.max_completion_tokens)
+
+    def _count_tokens(self, text: str) -> int:
+        return self.prompt_querier.clamp_text_by_tokens(text, len(text) + 1)[1]
+
+    def _try_admit(self, cost: int) -> float:
+        """
+        Admit a query of the given token cost if possible.
+
+        Returns zero if the query was admitted, or else the number of seconds to wait
+        before trying again.
+        """
+        with self._lock:
+            now = self._clock()
+            if now < self._paused_until:
+                return self._paused_until - now
+
+            if self._in_flight >= max(1, int(self.concurrency_limit)):
+                return CONCURRENCY_POLL_INTERVAL
+
+            wait = 0.0
+            if self._request_bucket is not None:
+                wait = max(wait, self._request_bucket.get_wait_time(1))
+            if self._token_bucket is not None:
+                wait = max(wait, self._token_bucket.get_wait_time(cost))
+            if wait > 0:
+                return wait
+
+            if self._request_bucket is not None:
+                self._request_bucket.consume(1)
+            if self._token_bucket is not None:
+                self._token_bucket.consume(cost)
+            self._in_flight += 1
+            return 0.0
+
+    def _release(self):
+        with self._lock:
+            self._in_flight -= 1
+
+    def _on_success(self, cost: int, response: str):
+        """
+        Release the slot of a successful query, increase the concurrency additively and
+        correct the estimated token cost with the actual usage.
+        """
+        with self._lock:
+            self._in_flight -= 1
+            self.concurrency_limit = min(
+                float(self.max_concurrency), self.concurrency_limit + 1 / self.concurrency_limit
+            )
+
+            usage = getattr(response, "usage", None)
+            if self._token_bucket is not None and usage is not None:
+                actual_cost = usage.prompt_tokens + usage.completion_tokens
+                if actual_cost < cost:
+                    self._token_bucket.refund(cost - actual_cost)
+                else:
+                    self._token_bucket.consume(actual_cost - cost)
+
+    def _on_rate_limited(self, error: RateLimitException, attempt: int):
+        """
+        Release the slot of a rate limited query, halve the concurrency and pause all
+        queries until the query may be retried.
+        """
+        with self._lock:
+            self._in_flight -= 1
+            self.stats["rate_limited"] += 1
+            now = self._clock()
+            if now - self._last_decrease >= CONCURRENCY_DECREASE_INTERVAL:
+                self.concurrency_limit = max(1.0, self.concurrency_limit / 2)
+                self._last_decrease = now
+
+            if attempt == self.max_retries:
+                return
+
+            self.stats["retries"] += 1
+            backoff = min(self.max_backoff, self.initial_backoff * 2 ** attempt)
+            if error.retry_after is not None:
+                delay = error.retry_after + random.uniform(0, 0.1 * backoff)
+            else:
+                # equal jitter: spread retries while still backing off exponentially
+                delay = backoff / 2 + random.uniform(0, backoff / 2)
+            self._paused_until = max(self._paused_until, now + delay)
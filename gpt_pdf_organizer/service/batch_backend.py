@@ -0,0 +1,65 @@
+"""
+Defines the interface for a BatchBackend service that runs files of chat-completion
+requests offline, in the style of the OpenAI batch API.
+"""
+
+from abc import ABC, abstractmethod
+from dataclasses import dataclass
+
+# batch statuses after which the results no longer change
+FINISHED_BATCH_STATUSES = ("completed", "failed", "expired", "cancelled")
+
+
+@dataclass
+class BatchStatus:
+    """
+    The progress of a submitted batch.
+
+    status is one of the statuses of the OpenAI batch API, e.g. "validating",
+    "in_progress" or "completed".
+    """
+    batch_id: str
+    status: str
+    total: int = 0
+    completed: int = 0
+    failed: int = 0
+
+    @property
+    def finished(self) -> bool:
+        return self.status in FINISHED_BATCH_STATUSES
+
+
+class BatchBackend(ABC):
+    """
+    Defines the interface for a BatchBackend service that runs files of chat-completion
+    requests offline, in the style of the OpenAI batch API.
+
+    Request files hold one JSON object per line with a custom_id, a method, a url and
+    the body of the request. Result files hold one JSON object per line with the
+    custom_id of its request, and either the response or an error.
+    """
+
+    @abstractmethod
+    def submit(self, requests_path: str) -> str:
+        """
+        Submits the requests of the given file.
+
+        Args:
+            requests_path (str): The JSONL file of requests.
+
+        Returns:
+            str: The id of the submitted batch.
+        """
+
+    @abstractmethod
+    def poll(self, batch_id: str) -> BatchStatus:
+        """
+        Gets the progress of the given batch.
+        """
+
+    @abstractmethod
+    def download_results(self, batch_id: str, results_path: str):
+        """
+        Writes the results of the given finished batch to a JSONL file, including the
+        requests that failed.
+        """
@@ -0,0 +1,46 @@
+"""
+Defines the interface for a MetadataResolver service that fills the attributes of a
+document from what is cheaply available, before the AI backend is queried.
+"""
+
+from abc import ABC, abstractmethod
+from dataclasses import dataclass
+from typing import Dict
+
+from gpt_pdf_organizer.domain.attribute import Attribute
+
+
+@dataclass
+class ResolvedAttribute:
+    """
+    The value of an attribute resolved without the AI backend.
+
+    confidence ranges from 0 to 1, and source tells where the value was found,
+    e.g. "xmp:dc:title" or "arxiv".
+    """
+    value: str
+    confidence: float
+    source: str
+
+
+class MetadataResolver(ABC):
+    """
+    Defines the interface for a MetadataResolver service that fills the attributes of a
+    document from what is cheaply available, before the AI backend is queried.
+    """
+
+    @abstractmethod
+    def resolve(
+        self, document_info: Dict[str, str], first_page_text: str
+    ) -> Dict[Attribute, ResolvedAttribute]:
+        """
+        Resolves the attributes of a document.
+
+        Args:
+            document_info (Dict[str, str]): The embedded metadata of the document, as read by
+                PdfDocument.get_document_info.
+            first_page_text (str): The text of the first page of the document.
+
+        Returns:
+            the attributes that could be resolved, with their confidence.
+        """
@@ -0,0 +1,34 @@
+"""
+Defines the interface of the hooks exporting the metrics of a run to another metrics stack.
+"""
+
+from abc import ABC
+from typing import Dict
+
+
+class MetricsHook(ABC):
+    """
+    Defines the interface of a hook receiving the metrics of a run as they are recorded,
+    e.g. to export them to StatsD or OpenTelemetry.
+
+    Hooks are called synchronously, from the thread recording the metric, which may be a
+    worker thread of the pipeline: they must be thread safe and return quickly, e.g. by
+    buffering. Only the methods a hook overrides need to be implemented.
+    """
+
+    def on_timing(self, stage: str, seconds: float):
+        """
+        Called when a stage of the handling of a file took the given number of seconds,
+        e.g. "query" or "placement".
+        """
+
+    def on_counter(self, name: str, value: int):
+        """
+        Called when a counter of the run is incremented by the given value, e.g.
+        "prompt_tokens".
+        """
+
+    def on_report(self, report: Dict):
+        """
+        Called with the report of the run once it finished.
+        """
@@ -3,10 +3,43 @@ Defines the interface for a PromptQuerier service that will abstract the AI back
 for the prompt query service.
 """
 
+import sys
+import functools
 from abc import ABC, abstractmethod
+from dataclasses import dataclass
 from typing import Dict
+from typing import Optional
 from typing import Tuple
 
+# the tokens a chat query adds around the content of each message, e.g. its role
+CHAT_TOKENS_PER_MESSAGE = 3
+# the tokens priming the reply of a chat query
+CHAT_REPLY_TOKENS = 3
+
+
+@dataclass
+class TokenUsage:
+    """
+    The tokens billed for a query, as reported by the AI backend.
+
+    cached_prompt_tokens are the prompt tokens served from the provider prompt cache.
+    """
+    prompt_tokens: int = 0
+    completion_tokens: int = 0
+    cached_prompt_tokens: int = 0
+
+
+class PromptResponse(str):
+    """
+    The generated tokens of a query, carrying the token usage of the query when the AI
+    backend reports it.
+    """
+
+    def __new__(cls, content: str, usage: Optional[TokenUsage] = None):
+        response = super().__new__(cls, content)
+        response.usage = usage
+        return response
+
 
 class PromptQuerier(ABC):
     """
@@ -24,16 +57,45 @@ class PromptQuerier(ABC):
         self._kwargs = kwargs
 
     @abstractmethod
-    def query(self, prompt: str, **kwargs: Dict) -> str:
+    def query(self, prompt: str, system_prompt: Optional[str] = None, **kwargs: Dict) -> str:
         """
         Queries the AI backend with the given prompt and returns the result.
 
         Args:
             prompt (str): The prompt to query with.
+            system_prompt (str): The instructions sent before the prompt, if any.
             **kwargs (Dict): Additional arguments to pass to the AI backend query.
 
         Returns:
-            str: The generated tokens.
+            str: The generated tokens, as a PromptResponse when the token usage is known.
+        """
+
+    async def aquery(self, prompt: str, system_prompt: Optional[str] = None, **kwargs: Dict) -> str:
+        """
+        Asynchronously queries the AI backend with the given prompt and returns the result.
+
+        The default implementation runs the blocking query in the event loop's default
+        executor. Backends with a native async client should override it.
+
+        Args:
+            prompt (str): The prompt to query with.
+            system_prompt (str): The instructions sent before the prompt, if any.
+            **kwargs (Dict): Additional arguments to pass to the AI backend query.
+
+        Returns:
+            str: The generated tokens, as a PromptResponse when the token usage is known.
+        """
+        # already imported by the running event loop: not imported with the interface
+        import asyncio
+
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(
+            None, functools.partial(self.query, prompt, system_prompt, **kwargs)
+        )
+
+    async def aclose(self):
+        """
+        Releases the resources held by the AI backend client, if any.
         """
 
     @abstractmethod
@@ -48,3 +110,21 @@ class PromptQuerier(ABC):
         Returns:
             a tuple containing the extracted text and the total number of tokens effectivelly used.
         """
+
+    def count_prompt_tokens(self, prompt: str, system_prompt: Optional[str] = None) -> int:
+        """
+        Counts the prompt tokens a query with the given prompts is billed for, with the
+        tokenizer of clamp_text_by_tokens, without querying the AI backend.
+
+        Args:
+            prompt (str): The prompt to query with.
+            system_prompt (str): The instructions sent before the prompt, if any.
+
+        Returns:
+            the number of prompt tokens of the query, including the tokens framing its messages.
+        """
+        messages = [prompt] if system_prompt is None else [system_prompt, prompt]
+        return CHAT_REPLY_TOKENS + sum(
+            CHAT_TOKENS_PER_MESSAGE + self.clamp_text_by_tokens(message, sys.maxsize)[1]
+            for message in messages
+        )
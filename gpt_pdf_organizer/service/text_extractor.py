@@ -0,0 +1,77 @@
+"""
+Defines the interface for a TextExtractor service that reads the text of the pages of
+PDF files, abstracting the PDF library used.
+"""
+
+from abc import ABC, abstractmethod
+from typing import Dict
+from typing import Iterator
+from typing import Optional
+
+
+class TextDocument(ABC):
+    """
+    An open PDF file streaming the text of its pages.
+
+    Usage:
+        with text_extractor.open(pdf_path) as document:
+            for text in document.iter_pages_text():
+                ...
+    """
+
+    def __enter__(self) -> "TextDocument":
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    @abstractmethod
+    def iter_pages_text(self, start_page: int = 0, max_chars: Optional[int] = None) -> Iterator[str]:
+        """
+        Lazily yield the text of each page, starting at the given page index.
+
+        Raises:
+            ExtractionGuardException: when a page has more than max_chars characters,
+                checked before the text of the page is extracted where the library allows.
+        """
+
+    @abstractmethod
+    def get_num_pages(self) -> int:
+        """
+        Get the number of pages of the document, without reading the pages.
+        """
+
+    @abstractmethod
+    def get_document_info(self) -> Dict[str, str]:
+        """
+        Read the embedded metadata of the document: the fields of the document info
+        dictionary, e.g. Title, and the properties of the XMP metadata stream, keyed by
+        their qualified name, e.g. dc:title. Fields that are missing or empty are left out.
+        """
+
+    @abstractmethod
+    def close(self):
+        """
+        Close the underlying PDF file.
+        """
+
+
+class TextExtractor(ABC):
+    """
+    Defines the interface for a TextExtractor service that opens PDF files to read the
+    text of their pages.
+
+    Extractors are sent to the extraction processes, so they must be picklable.
+    """
+
+    # the name of the extractor in the config, e.g. "pdfplumber"
+    name: str = ""
+
+    @abstractmethod
+    def open(self, pdf_path: str) -> TextDocument:
+        """
+        Open the given PDF file.
+
+        Raises:
+            Exception: when the file cannot be parsed.
+        """
@@ -0,0 +1,94 @@
+"""
+This file contains the folder holding the requests, state and results of a batch job.
+"""
+
+import os
+import json
+from typing import Any
+from typing import Dict
+from typing import Optional
+
+REQUESTS_FILENAME = "requests.jsonl"
+MANIFEST_FILENAME = "manifest.jsonl"
+RESULTS_FILENAME = "results.jsonl"
+STATE_FILENAME = "job.json"
+
+
+class BatchJobFolder:
+    """
+    The folder of a batch job, holding:
+
+    - requests.jsonl: the chat-completion requests to submit, one per line.
+    - manifest.jsonl: one line per input file, telling its request, or its metadata when
+      it was already known, e.g. from the classification cache.
+    - job.json: the state of the job, e.g. the id of the submitted batch.
+    - results.jsonl: the results of the batch, once downloaded.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self.requests_path = os.path.join(path, REQUESTS_FILENAME)
+        self.manifest_path = os.path.join(path, MANIFEST_FILENAME)
+        self.results_path = os.path.join(path, RESULTS_FILENAME)
+        self.state_path = os.path.join(path, STATE_FILENAME)
+
+    def load_state(self) -> Dict[str, Any]:
+        """
+        Load the state of the job, empty if it was never saved.
+        """
+        if not os.path.exists(self.state_path):
+            return {}
+
+        with open(self.state_path, "r") as f:
+            return json.load(f)
+
+    def save_state(self, **state):
+        """
+        Update the state of the job with the given values.
+        """
+        state = {**self.load_state(), **state}
+        with open(f"{self.state_path}.tmp", "w") as f:
+            json.dump(state, f, indent=4)
+        os.replace(f"{self.state_path}.tmp", self.state_path)
+
+
+class BatchResults:
+    """
+    Random access to the results of a batch by request custom_id.
+
+    Only the offset of each result line is kept in memory, and results are read from
+    the file when requested, since results come back in any order.
+    """
+
+    def __init__(self, path: str):
+        self._file = open(path, "rb")
+        self._offsets = {}
+        offset = 0
+        for line in self._file:
+            try:
+                custom_id = json.loads(line)["custom_id"]
+            except (json.JSONDecodeError, KeyError, TypeError):
+                custom_id = None
+            if custom_id is not None:
+                self._offsets[custom_id] = offset
+            offset += len(line)
+
+    def __enter__(self) -> "BatchResults":
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def get(self, custom_id: str) -> Optional[Dict[str, Any]]:
+        """
+        Get the result of the request with the given custom_id, or None if there is none.
+        """
+        offset = self._offsets.get(custom_id)
+        if offset is None:
+            return None
+
+        self._file.seek(offset)
+        return json.loads(self._file.readline())
+
+    def close(self):
+        self._file.close()
@@ -0,0 +1,162 @@
+"""
+This file contains the persistent cache of the metadata classified from PDF files.
+"""
+
+import os
+import json
+import time
+import sqlite3
+import hashlib
+from typing import Dict
+from typing import Optional
+
+SECONDS_PER_DAY = 24 * 60 * 60
+# number of stored entries between two evictions, so eviction does not scan the
+# whole table on every insert
+EVICTION_INTERVAL = 1000
+
+
+class ClassificationCache:
+    """
+    A SQLite backed cache of the metadata returned by the LLM for a PDF file.
+
+    Entries are keyed by the hash of the file content together with everything that
+    changes the answer of the LLM: the model name, the prompt version and the token
+    budget. The least recently used entries are evicted past max_entries, and entries
+    older than max_age_days are never returned. Eviction runs when the cache is
+    opened and closed, and every EVICTION_INTERVAL stored entries.
+    """
+
+    def __init__(
+        self,
+        path: str,
+        max_entries: Optional[int] = None,
+        max_age_days: Optional[float] = None,
+        read_enabled: bool = True,
+    ):
+        """
+        Open the cache database at the given path, creating it when needed.
+
+        Args:
+            path (str): The SQLite database file.
+            max_entries (int): The maximum number of entries kept, unbounded if None.
+            max_age_days (float): The maximum age of an entry, unbounded if None.
+            read_enabled (bool): When false, lookups always miss but classifications
+                are still stored, which refreshes the cache.
+        """
+        directory = os.path.dirname(os.path.abspath(path))
+        os.makedirs(directory, exist_ok=True)
+
+        self.path = path
+        self.max_entries = max_entries
+        self.max_age_days = max_age_days
+        self.read_enabled = read_enabled
+        self._puts_since_eviction = 0
+        self._connection = sqlite3.connect(path)
+        self._connection.execute("PRAGMA journal_mode=WAL")
+        self._connection.execute("PRAGMA synchronous=NORMAL")
+        self._connection.execute(
+            "CREATE TABLE IF NOT EXISTS classifications ("
+            " key TEXT PRIMARY KEY,"
+            " metadata TEXT NOT NULL,"
+            " created_at REAL NOT NULL,"
+            " accessed_at REAL NOT NULL)"
+        )
+        self._connection.execute(
+            "CREATE INDEX IF NOT EXISTS classifications_accessed_at"
+            " ON classifications (accessed_at)"
+        )
+        self._evict()
+
+    @staticmethod
+    def build_key(
+        content_hash: str,
+        model_name: str,
+        prompt_version: int,
+        max_num_tokens: int,
+        resolver_settings: str = "",
+        token_tiers: str = "",
+    ) -> str:
+        """
+        Build the cache key of a file content classified with the given settings.
+
+        resolver_settings describes the metadata resolvers that ran before the LLM,
+        since they change which attributes the LLM is asked for, and token_tiers the
+        token budgets tried before max_num_tokens, if any.
+        """
+        key = f"{content_hash}:{model_name}:{prompt_version}:{max_num_tokens}:{resolver_settings}"
+        if token_tiers:
+            # only part of the key when set, so keys of runs without tiers are unchanged
+            key += f":{token_tiers}"
+        return hashlib.sha256(key.encode()).hexdigest()
+
+    def get(self, key: str) -> Optional[Dict[str, str]]:
+        """
+        Get the cached metadata for the given key, or None on a cache miss.
+        """
+        if not self.read_enabled:
+            return None
+
+        row = self._connection.execute(
+            "SELECT metadata, created_at FROM classifications WHERE key = ?", (key,)
+        ).fetchone()
+        if row is None:
+            return None
+
+        metadata, created_at = row
+        now = time.time()
+        if self._is_expired(created_at, now):
+            return None
+
+        with self._connection:
+            self._connection.execute(
+                "UPDATE classifications SET accessed_at = ? WHERE key = ?", (now, key)
+            )
+        return json.loads(metadata)
+
+    def put(self, key: str, metadata: Dict[str, str]):
+        """
+        Store the metadata classified for the given key.
+        """
+        now = time.time()
+        with self._connection:
+            self._connection.execute(
+                "INSERT OR REPLACE INTO classifications"
+                " (key, metadata, created_at, accessed_at) VALUES (?, ?, ?, ?)",
+                (key, json.dumps(metadata), now, now),
+            )
+        self._puts_since_eviction += 1
+        if self._puts_since_eviction >= EVICTION_INTERVAL:
+            self._evict()
+
+    def close(self):
+        """
+        Close the cache database.
+        """
+        self._evict()
+        self._connection.close()
+
+    def _is_expired(self, created_at: float, now: float) -> bool:
+        return (
+            self.max_age_days is not None
+            and now - created_at > self.max_age_days * SECONDS_PER_DAY
+        )
+
+    def _evict(self):
+        """
+        Remove expired entries and the least recently used ones past max_entries.
+        """
+        self._puts_since_eviction = 0
+        with self._connection:
+            if self.max_age_days is not None:
+                self._connection.execute(
+                    "DELETE FROM classifications WHERE created_at < ?",
+                    (time.time() - self.max_age_days * SECONDS_PER_DAY,),
+                )
+            if self.max_entries is not None:
+                self._connection.execute(
+                    "DELETE FROM classifications WHERE key IN ("
+                    " SELECT key FROM classifications"
+                    " ORDER BY accessed_at DESC LIMIT -1 OFFSET ?)",
+                    (self.max_entries,),
+                )
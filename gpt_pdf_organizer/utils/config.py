@@ -7,6 +7,7 @@ from functools import reduce
 from dataclasses import dataclass
 from dataclasses import field
 from gpt_pdf_organizer.domain.attribute import Attribute
+from gpt_pdf_organizer.utils.placement import PLACEMENT_MODES
 
 from typing import Dict
 from typing import Any
@@ -14,6 +15,7 @@ from typing import List
 from typing import Optional
 
 SEPARATOR_ALLOWED_CHARS = ["_", "-", " ", "."]
+DEFAULT_CACHE_FOLDER = os.path.join(os.path.expanduser("~"), ".cache", "gpt-pdf-organizer")
 
 
 @dataclass
@@ -26,12 +28,17 @@ class OrganizerSettings:
     )
     filenameAttributeSeparator: str = "-"
     moveInsteadOfCopy: bool = False
+    placement: str = "copy"
 
     def __post_init__(self):
         if self.filenameAttributeSeparator not in SEPARATOR_ALLOWED_CHARS:
             raise ValueError(
                 f"Separator {self.separator} is not allowed. Please use one of {SEPARATOR_ALLOWED_CHARS}"
             )
+        if self.placement not in PLACEMENT_MODES:
+            raise ValueError(
+                f"Placement {self.placement} is not supported. Please use one of {PLACEMENT_MODES}"
+            )
 
     def __str__(self):
         return self.toJSON()
@@ -40,6 +47,211 @@ class OrganizerSettings:
         return json.dumps(self, default=lambda o: o.__dict__, sort_keys=True, indent=4)
 
 
+@dataclass
+class TokenBudgetSettings:
+    tiers: List[int] = field(default_factory=list)
+
+    def __post_init__(self):
+        if any(tier < 1 for tier in self.tiers) or self.tiers != sorted(self.tiers):
+            raise ValueError("Token budget tiers must be positive and increasing")
+
+
+@dataclass
+class InputSettings:
+    recursive: bool = False
+    include: List[str] = field(default_factory=list)
+    exclude: List[str] = field(default_factory=list)
+    followSymlinks: bool = True
+    sortEntries: bool = False
+
+
+@dataclass
+class ConcurrencySettings:
+    extractionWorkers: int = 1
+    queryWorkers: int = 1
+
+    def __post_init__(self):
+        if self.extractionWorkers < 1 or self.queryWorkers < 1:
+            raise ValueError(
+                "Number of extraction and query workers must be at least 1"
+            )
+
+
+@dataclass
+class LlmClientSettings:
+    useAsync: bool = False
+    baseUrl: Optional[str] = None
+    timeout: float = 60.0
+    maxRetries: int = 2
+    maxConnections: int = 10
+    maxKeepaliveConnections: int = 10
+    keepaliveExpiry: float = 30.0
+
+
+@dataclass
+class CacheSettings:
+    enabled: bool = False
+    path: str = os.path.join(DEFAULT_CACHE_FOLDER, "classifications.sqlite")
+    maxEntries: Optional[int] = 100000
+    maxAgeDays: Optional[float] = None
+
+
+@dataclass
+class TokenizerSettings:
+    cacheDir: str = os.path.join(DEFAULT_CACHE_FOLDER, "tiktoken")
+    offline: bool = False
+
+
+@dataclass
+class PageTextStoreSettings:
+    enabled: bool = False
+    path: str = os.path.join(DEFAULT_CACHE_FOLDER, "pages")
+
+
+@dataclass
+class JournalSettings:
+    enabled: bool = False
+    flushIntervalSeconds: float = 1.0
+
+
+@dataclass
+class ManifestSettings:
+    enabled: bool = False
+    flushIntervalSeconds: float = 1.0
+
+
+@dataclass
+class MetadataResolverSettings:
+    enabled: bool = False
+    resolvers: List[str] = field(default_factory=lambda: ["embedded", "identifiers"])
+    confidenceThreshold: float = 0.7
+
+    def __post_init__(self):
+        if not 0 <= self.confidenceThreshold <= 1:
+            raise ValueError("Metadata resolver confidence threshold must be between 0 and 1")
+
+
+@dataclass
+class BatchSettings:
+    size: int = 1
+    maxTokens: int = 8000
+
+    def __post_init__(self):
+        if self.size < 1:
+            raise ValueError("Batch size must be at least 1")
+
+
+@dataclass
+class BatchJobSettings:
+    backend: str = "openai"
+    localPath: str = os.path.join(DEFAULT_CACHE_FOLDER, "batches")
+    pollIntervalSeconds: float = 60.0
+
+    def __post_init__(self):
+        if self.backend not in ("openai", "local"):
+            raise ValueError(
+                f"Batch job backend {self.backend} is not supported. Please use one of ['openai', 'local']"
+            )
+
+
+@dataclass
+class DeduplicationSettings:
+    enabled: bool = True
+    nearDuplicates: bool = False
+    threshold: float = 0.85
+    duplicatesFolder: bool = False
+    maxRepresentatives: int = 100000
+
+    def __post_init__(self):
+        if not 0 < self.threshold <= 1:
+            raise ValueError("Deduplication threshold must be between 0 and 1")
+
+
+@dataclass
+class RateLimitSettings:
+    enabled: bool = True
+    requestsPerMinute: Optional[int] = None
+    tokensPerMinute: Optional[int] = None
+    maxRetries: int = 6
+    initialBackoffSeconds: float = 1.0
+    maxBackoffSeconds: float = 60.0
+    maxConcurrency: Optional[int] = None
+
+    def __post_init__(self):
+        if self.maxRetries < 0:
+            raise ValueError("Rate limit max retries must not be negative")
+
+
+@dataclass
+class ExtractionSettings:
+    backends: List[str] = field(default_factory=lambda: ["pdfplumber"])
+    maxFileSizeMb: Optional[float] = None
+    maxNumPages: Optional[int] = None
+    maxPageChars: Optional[int] = None
+    timeoutSeconds: Optional[float] = None
+    maxMemoryMb: Optional[float] = None
+
+    def __post_init__(self):
+        if not self.backends:
+            raise ValueError("At least one extraction backend must be configured")
+        for name in ("maxFileSizeMb", "maxNumPages", "maxPageChars", "timeoutSeconds", "maxMemoryMb"):
+            if getattr(self, name) is not None and getattr(self, name) <= 0:
+                raise ValueError(f"Extraction limit {name} must be positive")
+
+
+@dataclass
+class WatchSettings:
+    settleSeconds: float = 2.0
+    pollIntervalSeconds: float = 1.0
+    usePolling: bool = False
+
+    def __post_init__(self):
+        if self.settleSeconds < 0:
+            raise ValueError("Watch settle seconds must not be negative")
+        if self.pollIntervalSeconds <= 0:
+            raise ValueError("Watch poll interval must be positive")
+
+
+@dataclass
+class DistributedSettings:
+    enabled: bool = False
+    workerId: Optional[str] = None
+    leaseSeconds: float = 60.0
+    heartbeatSeconds: float = 10.0
+
+    def __post_init__(self):
+        if self.heartbeatSeconds <= 0:
+            raise ValueError("Distributed heartbeat seconds must be positive")
+        if self.leaseSeconds <= self.heartbeatSeconds:
+            raise ValueError("Distributed lease seconds must be greater than the heartbeat seconds")
+
+
+@dataclass
+class DryRunSettings:
+    queryLatencySeconds: float = 2.0
+    completionTokensPerFile: int = 100
+    planPath: Optional[str] = None
+
+    def __post_init__(self):
+        if self.queryLatencySeconds < 0:
+            raise ValueError("Dry run query latency must not be negative")
+        if self.completionTokensPerFile < 0:
+            raise ValueError("Dry run completion tokens per file must not be negative")
+
+
+@dataclass
+class MetricsSettings:
+    enabled: bool = True
+    reportPath: Optional[str] = None
+    prometheusPath: Optional[str] = None
+    prices: Dict[str, Dict[str, float]] = field(default_factory=dict)
+
+    def __post_init__(self):
+        for model, prices in self.prices.items():
+            if "prompt" not in prices or "completion" not in prices:
+                raise ValueError(f"Prices of model {model} must have prompt and completion prices")
+
+
 @dataclass
 class Config:
     apiKey: str
@@ -47,6 +259,25 @@ class Config:
     maxNumTokens: int
     logLevel: str
     organizer: OrganizerSettings
+    tokenBudget: TokenBudgetSettings
+    input: InputSettings
+    concurrency: ConcurrencySettings
+    llmClient: LlmClientSettings
+    cache: CacheSettings
+    pageTextStore: PageTextStoreSettings
+    journal: JournalSettings
+    manifest: ManifestSettings
+    metadataResolver: MetadataResolverSettings
+    batch: BatchSettings
+    batchJob: BatchJobSettings
+    rateLimit: RateLimitSettings
+    deduplication: DeduplicationSettings
+    metrics: MetricsSettings
+    extraction: ExtractionSettings
+    tokenizer: TokenizerSettings
+    watch: WatchSettings
+    dryRun: DryRunSettings
+    distributed: DistributedSettings
 
     def __init__(self, config: Optional[Dict[str, Any]] = None):
         if config is None:
@@ -106,9 +337,145 @@ class Config:
             "organizer.filenameAttributeSeparator", "-"
         )
 
+        moveInsteadOfCopy = self._raw_get("organizer.moveInsteadOfCopy", False)
         self.organizer = OrganizerSettings(
             subfoldersFromAttributes=subfoldersFromAttributes,
             filenameFromAttributes=filenameFromAttributes,
             filenameAttributeSeparator=filenameAttributeSeparator,
-            moveInsteadOfCopy=self._raw_get("organizer.moveInsteadOfCopy", False),
+            moveInsteadOfCopy=moveInsteadOfCopy,
+            # moveInsteadOfCopy is kept for compatibility with the configs predating placement
+            placement=self._raw_get("organizer.placement", "move" if moveInsteadOfCopy else "copy"),
+        )
+
+        self.tokenBudget = TokenBudgetSettings(
+            tiers=self._raw_get("tokenBudget.tiers", []),
+        )
+
+        self.input = InputSettings(
+            recursive=self._raw_get("input.recursive", False),
+            include=self._raw_get("input.include", []),
+            exclude=self._raw_get("input.exclude", []),
+            followSymlinks=self._raw_get("input.followSymlinks", True),
+            sortEntries=self._raw_get("input.sortEntries", False),
+        )
+
+        self.concurrency = ConcurrencySettings(
+            extractionWorkers=self._raw_get("concurrency.extractionWorkers", 1),
+            queryWorkers=self._raw_get("concurrency.queryWorkers", 1),
+        )
+
+        self.llmClient = LlmClientSettings(
+            useAsync=self._raw_get("llmClient.useAsync", False),
+            baseUrl=self._raw_get("llmClient.baseUrl", None),
+            timeout=self._raw_get("llmClient.timeout", 60.0),
+            maxRetries=self._raw_get("llmClient.maxRetries", 2),
+            maxConnections=self._raw_get("llmClient.maxConnections", 10),
+            maxKeepaliveConnections=self._raw_get("llmClient.maxKeepaliveConnections", 10),
+            keepaliveExpiry=self._raw_get("llmClient.keepaliveExpiry", 30.0),
+        )
+
+        self.cache = CacheSettings(
+            enabled=self._raw_get("cache.enabled", False),
+            path=os.path.expanduser(self._raw_get("cache.path", CacheSettings.path)),
+            maxEntries=self._raw_get("cache.maxEntries", CacheSettings.maxEntries),
+            maxAgeDays=self._raw_get("cache.maxAgeDays", CacheSettings.maxAgeDays),
+        )
+
+        self.pageTextStore = PageTextStoreSettings(
+            enabled=self._raw_get("pageTextStore.enabled", False),
+            path=os.path.expanduser(
+                self._raw_get("pageTextStore.path", PageTextStoreSettings.path)
+            ),
+        )
+
+        self.journal = JournalSettings(
+            enabled=self._raw_get("journal.enabled", False),
+            flushIntervalSeconds=self._raw_get("journal.flushIntervalSeconds", 1.0),
+        )
+
+        self.manifest = ManifestSettings(
+            enabled=self._raw_get("manifest.enabled", False),
+            flushIntervalSeconds=self._raw_get("manifest.flushIntervalSeconds", 1.0),
+        )
+
+        self.metadataResolver = MetadataResolverSettings(
+            enabled=self._raw_get("metadataResolver.enabled", False),
+            resolvers=self._raw_get("metadataResolver.resolvers", ["embedded", "identifiers"]),
+            confidenceThreshold=self._raw_get("metadataResolver.confidenceThreshold", 0.7),
+        )
+
+        self.batch = BatchSettings(
+            size=self._raw_get("batch.size", 1),
+            maxTokens=self._raw_get("batch.maxTokens", 8000),
+        )
+
+        self.batchJob = BatchJobSettings(
+            backend=self._raw_get("batchJob.backend", "openai"),
+            localPath=os.path.expanduser(
+                self._raw_get("batchJob.localPath", BatchJobSettings.localPath)
+            ),
+            pollIntervalSeconds=self._raw_get("batchJob.pollIntervalSeconds", 60.0),
+        )
+
+        self.rateLimit = RateLimitSettings(
+            enabled=self._raw_get("rateLimit.enabled", True),
+            requestsPerMinute=self._raw_get("rateLimit.requestsPerMinute", None),
+            tokensPerMinute=self._raw_get("rateLimit.tokensPerMinute", None),
+            maxRetries=self._raw_get("rateLimit.maxRetries", 6),
+            initialBackoffSeconds=self._raw_get("rateLimit.initialBackoffSeconds", 1.0),
+            maxBackoffSeconds=self._raw_get("rateLimit.maxBackoffSeconds", 60.0),
+            maxConcurrency=self._raw_get("rateLimit.maxConcurrency", None),
+        )
+
+        self.deduplication = DeduplicationSettings(
+            enabled=self._raw_get("deduplication.enabled", True),
+            nearDuplicates=self._raw_get("deduplication.nearDuplicates", False),
+            threshold=self._raw_get("deduplication.threshold", 0.85),
+            duplicatesFolder=self._raw_get("deduplication.duplicatesFolder", False),
+            maxRepresentatives=self._raw_get("deduplication.maxRepresentatives", 100000),
+        )
+
+        self.tokenizer = TokenizerSettings(
+            cacheDir=os.path.expanduser(self._raw_get(
+                "tokenizer.cacheDir", os.environ.get("TIKTOKEN_CACHE_DIR", TokenizerSettings.cacheDir)
+            )),
+            offline=self._raw_get("tokenizer.offline", False),
+        )
+
+        self.extraction = ExtractionSettings(
+            backends=self._raw_get("extraction.backends", ["pdfplumber"]),
+            maxFileSizeMb=self._raw_get("extraction.maxFileSizeMb", None),
+            maxNumPages=self._raw_get("extraction.maxNumPages", None),
+            maxPageChars=self._raw_get("extraction.maxPageChars", None),
+            timeoutSeconds=self._raw_get("extraction.timeoutSeconds", None),
+            maxMemoryMb=self._raw_get("extraction.maxMemoryMb", None),
+        )
+
+        self.watch = WatchSettings(
+            settleSeconds=self._raw_get("watch.settleSeconds", 2.0),
+            pollIntervalSeconds=self._raw_get("watch.pollIntervalSeconds", 1.0),
+            usePolling=self._raw_get("watch.usePolling", False),
+        )
+
+        planPath = self._raw_get("dryRun.planPath", None)
+        self.dryRun = DryRunSettings(
+            queryLatencySeconds=self._raw_get("dryRun.queryLatencySeconds", 2.0),
+            completionTokensPerFile=self._raw_get("dryRun.completionTokensPerFile", 100),
+            planPath=os.path.expanduser(planPath) if planPath else None,
+        )
+
+        self.distributed = DistributedSettings(
+            enabled=self._raw_get("distributed.enabled", False),
+            workerId=self._raw_get("distributed.workerId", None),
+            leaseSeconds=self._raw_get("distributed.leaseSeconds", 60.0),
+            heartbeatSeconds=self._raw_get("distributed.heartbeatSeconds", 10.0),
+        )
+
+        reportPath = self._raw_get("metrics.reportPath", None)
+        prometheusPath = self._raw_get("metrics.prometheusPath", None)
+        self.metrics = MetricsSettings(
+            enabled=self._raw_get("metrics.enabled", True),
+            reportPath=os.path.expanduser(reportPath) if reportPath else None,
+            prometheusPath=os.path.expanduser(prometheusPath) if prometheusPath else None,
+            prices=self._raw_get("metrics.prices", {}),
         )
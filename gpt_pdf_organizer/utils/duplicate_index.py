@@ -0,0 +1,213 @@
+"""
+This file contains the index finding exact and near duplicates among the documents of a run.
+"""
+
+import re
+import zlib
+import random
+from array import array
+from dataclasses import dataclass
+from typing import List
+from typing import Optional
+
+WORD_PATTERN = re.compile(r"\w+")
+# Mersenne prime modulus of the MinHash permutations
+MINHASH_PRIME = (1 << 61) - 1
+# each MinHash value is truncated to its low 16 bits (b-bit MinHash), which keeps signatures
+# small at the cost of a 1/65536 chance that two different values collide
+MINHASH_MASK = 0xFFFF
+MINHASH_BITS = 16
+
+
+@dataclass
+class DuplicateMatch:
+    """
+    A document found to duplicate a representative document indexed before it.
+    """
+    representative: int
+    exact: bool
+    similarity: float
+
+
+class IntTable:
+    """
+    An open addressing hash table mapping integer keys to non-negative integer values,
+    stored in two typed arrays instead of Python objects: 4 bytes per value and 4 or 8
+    bytes per key depending on key_typecode, with a load factor kept under 0.5.
+
+    Keys must already be uniformly distributed, e.g. hashes. A key is only inserted once:
+    later insertions of the same key keep the first value.
+    """
+
+    def __init__(self, key_typecode: str = "Q", capacity: int = 1024):
+        self.key_typecode = key_typecode
+        self._key_mask = (1 << (8 * array(key_typecode).itemsize)) - 1
+        self._size = 0
+        self._allocate(capacity)
+
+    def __len__(self) -> int:
+        return self._size
+
+    def get(self, key: int) -> Optional[int]:
+        key &= self._key_mask
+        slot = key & self._mask
+        while self._values[slot]:
+            if self._keys[slot] == key:
+                return self._values[slot] - 1
+            slot = (slot + 1) & self._mask
+        return None
+
+    def add(self, key: int, value: int):
+        key &= self._key_mask
+        if 2 * (self._size + 1) > len(self._values):
+            self._grow()
+        slot = key & self._mask
+        while self._values[slot]:
+            if self._keys[slot] == key:
+                return
+            slot = (slot + 1) & self._mask
+        self._keys[slot] = key
+        # zero marks empty slots
+        self._values[slot] = value + 1
+        self._size += 1
+
+    def _allocate(self, capacity: int):
+        self._keys = array(self.key_typecode, bytes(capacity * array(self.key_typecode).itemsize))
+        self._values = array("I", bytes(capacity * 4))
+        self._mask = capacity - 1
+
+    def _grow(self):
+        keys, values = self._keys, self._values
+        self._allocate(2 * len(values))
+        self._size = 0
+        for key, value in zip(keys, values):
+            if value:
+                self.add(key, value - 1)
+
+
+class DuplicateIndex:
+    """
+    Finds the documents duplicating a document indexed before them, either exactly, by
+    content hash, or nearly, by the MinHash similarity of the word shingles of their
+    first page text, e.g. the same paper with another watermark or arXiv version.
+
+    Near duplicate candidates are found with locality sensitive hashing: the signature
+    of num_permutations MinHash values is split in bands, and documents sharing all the
+    values of a band are candidates, kept when the fraction of equal values of their
+    signatures reaches the threshold. With the default 32 permutations in 8 bands, pairs
+    with a similarity of 0.8 are found with a probability above 98%.
+
+    Only representatives, i.e. documents that duplicate no other one, are indexed, in
+    typed arrays: about 300 bytes per representative, signatures and hash tables
+    included, so the index of a million documents takes about 300 MB.
+    """
+
+    def __init__(
+        self,
+        threshold: float = 0.8,
+        num_permutations: int = 32,
+        bands: int = 8,
+        shingle_size: int = 3,
+        min_shingles: int = 10,
+        seed: int = 1,
+    ):
+        """
+        Args:
+            threshold (float): The minimum estimated similarity of near duplicates.
+            num_permutations (int): The number of MinHash values of each signature.
+            bands (int): The number of bands of the signatures, dividing num_permutations.
+            shingle_size (int): The number of words of each shingle.
+            min_shingles (int): Documents with fewer shingles, e.g. scans without text,
+                are only matched exactly.
+        """
+        if num_permutations % bands:
+            raise ValueError("The number of permutations must be a multiple of the number of bands")
+
+        self.threshold = threshold
+        self.num_permutations = num_permutations
+        self.bands = bands
+        self.rows = num_permutations // bands
+        self.shingle_size = shingle_size
+        self.min_shingles = min_shingles
+        rng = random.Random(seed)
+        self._permutations = [
+            (rng.randrange(1, MINHASH_PRIME), rng.randrange(0, MINHASH_PRIME))
+            for _ in range(num_permutations)
+        ]
+        self._num_representatives = 0
+        self._exact = IntTable("Q")
+        self._bands = IntTable("I")
+        self._signatures = array("H")
+        # representatives without enough text get an empty signature slot
+        self._has_signature = array("B")
+
+    def __len__(self) -> int:
+        return self._num_representatives
+
+    def add_or_match(self, content_hash: Optional[str], text: str) -> Optional[DuplicateMatch]:
+        """
+        Find the representative duplicated by a document given its hex content hash and
+        first page text. If there is none, the document is indexed as a new
+        representative, whose id is the number of representatives indexed before it.
+        """
+        exact_key = int(content_hash[:16], 16) if content_hash else None
+        if exact_key is not None:
+            representative = self._exact.get(exact_key)
+            if representative is not None:
+                return DuplicateMatch(representative, exact=True, similarity=1.0)
+
+        signature = self.get_signature(text)
+        band_keys = [] if signature is None else self._get_band_keys(signature)
+        for key in band_keys:
+            candidate = self._bands.get(key)
+            if candidate is None:
+                continue
+            similarity = self._get_similarity(signature, candidate)
+            if similarity >= self.threshold:
+                return DuplicateMatch(candidate, exact=False, similarity=similarity)
+
+        representative = self._num_representatives
+        self._num_representatives += 1
+        if exact_key is not None:
+            self._exact.add(exact_key, representative)
+        self._has_signature.append(signature is not None)
+        self._signatures.extend(signature or [0] * self.num_permutations)
+        for key in band_keys:
+            self._bands.add(key, representative)
+        return None
+
+    def get_signature(self, text: str) -> Optional[List[int]]:
+        """
+        Get the MinHash signature of the word shingles of a text, or None if the text has
+        fewer than min_shingles shingles.
+        """
+        words = WORD_PATTERN.findall(text.lower())
+        shingles = {
+            zlib.crc32(" ".join(words[i:i + self.shingle_size]).encode("utf-8"))
+            for i in range(len(words) - self.shingle_size + 1)
+        }
+        if len(shingles) < self.min_shingles:
+            return None
+
+        return [
+            min((a * shingle + b) % MINHASH_PRIME for shingle in shingles) & MINHASH_MASK
+            for a, b in self._permutations
+        ]
+
+    def _get_band_keys(self, signature: List[int]) -> List[int]:
+        keys = []
+        for band in range(self.bands):
+            key = band
+            for value in signature[band * self.rows:(band + 1) * self.rows]:
+                key = (key << MINHASH_BITS) | value
+            # mix the band values so the low bits used as slots are uniform
+            keys.append(zlib.crc32(key.to_bytes(2 * self.rows + 2, "little")))
+        return keys
+
+    def _get_similarity(self, signature: List[int], representative: int) -> float:
+        if not self._has_signature[representative]:
+            return 0.0
+
+        start = representative * self.num_permutations
+        other = self._signatures[start:start + self.num_permutations]
+        return sum(a == b for a, b in zip(signature, other)) / self.num_permutations
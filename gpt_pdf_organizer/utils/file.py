@@ -3,19 +3,177 @@ File related functions
 """
 
 import os
-import glob
+import hashlib
+from fnmatch import fnmatch
 
 from gpt_pdf_organizer.app.exception import FilepathNotSupportedException
+from typing import Callable
+from typing import Iterator
 from typing import List
+from typing import Optional
 
 
-def read_files_from_path(path: str, extension: str) -> List[str]:
-    if os.path.isfile(path) and path.endswith(f".{extension}"):
-        return [path]
-    elif not os.path.isdir(path):
-        raise FilepathNotSupportedException(
-            "Path does not contains file extension nor is directory"
+class FileScanner:
+    """
+    Streams the files of an input path with one of the given extensions, compared
+    case-insensitively, as the folders are listed with os.scandir.
+
+    Files of a folder are yielded before descending into its subfolders. Include and
+    exclude glob patterns are matched against the file or folder name, or against its
+    path relative to the input path when the pattern contains a "/". Excluded folders
+    are not listed. When following symbolic links, a folder already visited through
+    another link is skipped, so link loops terminate.
+
+    The number of files yielded so far is num_files, which is the total once finished.
+    """
+
+    def __init__(
+        self,
+        path: str,
+        extensions: List[str],
+        recursive: bool = False,
+        include: Optional[List[str]] = None,
+        exclude: Optional[List[str]] = None,
+        follow_symlinks: bool = True,
+        sort_entries: bool = False,
+        on_error: Optional[Callable[[OSError], None]] = None,
+    ):
+        """
+        Args:
+            path (str): A file or folder path.
+            extensions (List[str]): The extensions of the files to yield, without dot.
+            recursive (bool): Whether to descend into subfolders.
+            include (List[str]): If given, only files matching one of these patterns are yielded.
+            exclude (List[str]): Files and folders matching one of these patterns are skipped.
+            follow_symlinks (bool): Whether to follow symbolic links to files and folders.
+            sort_entries (bool): Whether to sort the entries of each folder by name. Listing
+                a folder must then finish before its first file is yielded.
+            on_error (Callable): Called with the error of a subfolder that could not be
+                listed, which is skipped.
+
+        Raises:
+            FilepathNotSupportedException: when the path is neither a folder nor a file with
+                one of the extensions.
+        """
+        self.path = path
+        self.extensions = {extension.lower().lstrip(".") for extension in extensions}
+        self.recursive = recursive
+        self.include = include or []
+        self.exclude = exclude or []
+        self.follow_symlinks = follow_symlinks
+        self.sort_entries = sort_entries
+        self.on_error = on_error
+        self.num_files = 0
+        self.finished = False
+
+        if os.path.isfile(path) and self._has_extension(path):
+            return
+        if not os.path.isdir(path):
+            raise FilepathNotSupportedException(
+                "Path does not contains file extension nor is directory"
+            )
+
+    def __iter__(self) -> Iterator[str]:
+        self.num_files = 0
+        self.finished = False
+        if os.path.isfile(self.path):
+            files = iter([self.path])
+        else:
+            files = self._scan_folder()
+
+        for file in files:
+            self.num_files += 1
+            yield file
+        self.finished = True
+
+    def _scan_folder(self) -> Iterator[str]:
+        visited_folders = {self._get_folder_key(os.stat(self.path))}
+        # folders left to list, with their path relative to the input path
+        pending_folders = [(self.path, "")]
+        while pending_folders:
+            folder, relative_folder = pending_folders.pop()
+            try:
+                with os.scandir(folder) as entries:
+                    entries = sorted(entries, key=lambda e: e.name) if self.sort_entries else entries
+                    subfolders = []
+                    for entry in entries:
+                        relative_path = f"{relative_folder}{entry.name}"
+                        if self._matches(self.exclude, entry.name, relative_path):
+                            continue
+
+                        try:
+                            if entry.is_file(follow_symlinks=self.follow_symlinks):
+                                if self._has_extension(entry.name) and (
+                                    not self.include
+                                    or self._matches(self.include, entry.name, relative_path)
+                                ):
+                                    yield entry.path
+                            elif self.recursive and entry.is_dir(follow_symlinks=self.follow_symlinks):
+                                folder_key = self._get_folder_key(entry.stat())
+                                if folder_key not in visited_folders:
+                                    visited_folders.add(folder_key)
+                                    subfolders.append((entry.path, f"{relative_path}/"))
+                        except OSError as e:
+                            # e.g. a dangling symbolic link
+                            self._handle_error(e)
+            except OSError as e:
+                if folder == self.path:
+                    raise
+                self._handle_error(e)
+                continue
+
+            # descend into the subfolders depth first, in listing order
+            pending_folders.extend(reversed(subfolders))
+
+    def accepts(self, path: str) -> bool:
+        """
+        Whether a file of the input folder would be yielded by a scan, e.g. a file created
+        after the scan, judging by its path only.
+        """
+        relative_path = os.path.relpath(path, self.path).replace(os.sep, "/")
+        if relative_path == "." or relative_path.startswith("../"):
+            return False
+        names = relative_path.split("/")
+        if len(names) > 1 and not self.recursive:
+            return False
+        for i, name in enumerate(names):
+            if self._matches(self.exclude, name, "/".join(names[:i + 1])):
+                return False
+        return self._has_extension(names[-1]) and (
+            not self.include or self._matches(self.include, names[-1], relative_path)
+        )
+
+    def _has_extension(self, name: str) -> bool:
+        return os.path.splitext(name)[1][1:].lower() in self.extensions
+
+    def _handle_error(self, error: OSError):
+        if self.on_error is not None:
+            self.on_error(error)
+
+    @staticmethod
+    def _matches(patterns: List[str], name: str, relative_path: str) -> bool:
+        return any(
+            fnmatch(relative_path if "/" in pattern else name, pattern) for pattern in patterns
         )
 
-    # List of all PDF files in the directory
-    return list(sorted(glob.glob(f"{path}/*.{extension}")))
+    @staticmethod
+    def _get_folder_key(stat: os.stat_result):
+        return stat.st_dev, stat.st_ino
+
+
+def read_files_from_path(path: str, extension: str) -> List[str]:
+    """
+    List the files of a path with the given extension, not descending into subfolders.
+    """
+    return list(FileScanner(path, [extension]))
+
+
+def hash_file(path: str, chunk_size: int = 1024 * 1024) -> str:
+    """
+    Compute the sha256 hex digest of the content of a file, streaming it in chunks.
+    """
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(chunk_size), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
@@ -0,0 +1,282 @@
+"""
+This file contains the library manifest, an indexed SQLite database of the files placed
+in an output folder and of their metadata.
+"""
+
+import os
+import re
+import json
+import time
+import sqlite3
+from dataclasses import dataclass
+from dataclasses import fields
+from typing import Dict
+from typing import Iterator
+from typing import List
+from typing import Optional
+from typing import Tuple
+
+from gpt_pdf_organizer.domain.attribute import Attribute
+
+MANIFEST_FILENAME = ".gpt-pdf-organizer-manifest.sqlite"
+ATTRIBUTE_COLUMNS = [attribute.value for attribute in Attribute]
+# the separators of the authors of a file, e.g. "Ashish Vaswani, Noam Shazeer and Niki Parmar"
+AUTHOR_SEPARATORS = re.compile(r"\s*(?:[,;&]|\band\b)\s*")
+# the largest character, so that prefix ranges end after every value starting with the prefix
+MAX_CHARACTER = "\U0010ffff"
+# the entries read at a time when iterating over the manifest
+PAGE_SIZE = 1000
+
+SCHEMA = f"""
+CREATE TABLE IF NOT EXISTS files (
+    id INTEGER PRIMARY KEY,
+    source TEXT NOT NULL UNIQUE,
+    destination TEXT,
+    status TEXT NOT NULL,
+    file_key TEXT,
+    content_hash TEXT,
+    {", ".join(f"{column} TEXT COLLATE NOCASE" for column in ATTRIBUTE_COLUMNS)},
+    metadata TEXT,
+    model TEXT,
+    prompt_version INTEGER,
+    elapsed_seconds REAL,
+    peak_memory_bytes INTEGER,
+    reason TEXT,
+    recorded_at REAL NOT NULL
+);
+{"".join(f"CREATE INDEX IF NOT EXISTS files_{column} ON files ({column});" for column in ATTRIBUTE_COLUMNS)}
+CREATE INDEX IF NOT EXISTS files_status ON files (status);
+CREATE INDEX IF NOT EXISTS files_destination ON files (destination);
+CREATE INDEX IF NOT EXISTS files_content_hash ON files (content_hash);
+CREATE TABLE IF NOT EXISTS file_authors (
+    file_id INTEGER NOT NULL,
+    name TEXT NOT NULL COLLATE NOCASE
+);
+CREATE INDEX IF NOT EXISTS file_authors_name ON file_authors (name);
+CREATE INDEX IF NOT EXISTS file_authors_file_id ON file_authors (file_id);
+"""
+
+
+@dataclass
+class ManifestEntry:
+    """
+    The outcome of a handled file, as recorded in the library manifest.
+    """
+    source: str
+    status: str
+    destination: Optional[str] = None
+    metadata: Optional[Dict[str, str]] = None
+    file_key: Optional[str] = None
+    content_hash: Optional[str] = None
+    model: Optional[str] = None
+    prompt_version: Optional[int] = None
+    elapsed_seconds: Optional[float] = None
+    peak_memory_bytes: Optional[int] = None
+    reason: Optional[str] = None
+    recorded_at: Optional[float] = None
+
+    def get_attribute(self, attribute: Attribute) -> Optional[str]:
+        """
+        Get the value of an attribute, or None when it is missing.
+        """
+        value = (self.metadata or {}).get(attribute.value)
+        if value is None or str(value).strip() in ("", "null"):
+            return None
+        return str(value)
+
+
+ENTRY_COLUMNS = [entry_field.name for entry_field in fields(ManifestEntry)]
+
+
+class LibraryManifest:
+    """
+    An indexed SQLite database of the files handled into an output folder: their source,
+    destination, status, content hash, attribute values, model and timings, one entry
+    per source file, the latest outcome replacing earlier ones.
+
+    Every attribute is indexed, and compared case-insensitively, as is each author of
+    a file, so filters on attributes are answered from the indexes. Entries are
+    buffered and inserted in one transaction at most every flush_interval seconds or
+    every flush_every entries.
+    """
+
+    def __init__(self, path: str, flush_interval: float = 1.0, flush_every: int = 1000, wal: bool = True):
+        """
+        Args:
+            path (str): The path of the database.
+            flush_interval (float): The seconds after which buffered entries are inserted.
+            flush_every (int): The number of buffered entries after which they are inserted.
+            wal (bool): Whether to use the write-ahead log, which readers do not block,
+                but which needs the shared memory of a single host: disable it for a
+                manifest written over NFS.
+        """
+        self.path = path
+        self.flush_interval = flush_interval
+        self.flush_every = flush_every
+        self._buffer: List[ManifestEntry] = []
+        self._last_flush = time.monotonic()
+        self._connection = sqlite3.connect(path)
+        self._connection.execute(f"PRAGMA journal_mode={'WAL' if wal else 'DELETE'}")
+        self._connection.execute("PRAGMA synchronous=NORMAL")
+        self._connection.executescript(SCHEMA)
+
+    @staticmethod
+    def get_path(output_dir: str) -> str:
+        """
+        Get the path of the manifest of the given output directory.
+        """
+        return os.path.join(output_dir, MANIFEST_FILENAME)
+
+    def record(self, entry: ManifestEntry):
+        """
+        Record the outcome of a handled file.
+        """
+        if entry.recorded_at is None:
+            entry.recorded_at = time.time()
+        self._buffer.append(entry)
+        if (
+            len(self._buffer) >= self.flush_every
+            or time.monotonic() - self._last_flush >= self.flush_interval
+        ):
+            self.flush()
+
+    def flush(self):
+        """
+        Insert the buffered entries, in one transaction.
+        """
+        self._last_flush = time.monotonic()
+        if not self._buffer:
+            return
+
+        columns = ENTRY_COLUMNS + ATTRIBUTE_COLUMNS
+        # an entry of a source already recorded is updated in place, keeping its id
+        upsert = (
+            f"INSERT INTO files ({', '.join(columns)}) VALUES ({', '.join('?' * len(columns))})"
+            f" ON CONFLICT (source) DO UPDATE SET {', '.join(f'{c} = excluded.{c}' for c in columns)}"
+        )
+        with self._connection:
+            for entry in self._buffer:
+                self._connection.execute(upsert, self._to_row(entry))
+                (file_id,) = self._connection.execute(
+                    "SELECT id FROM files WHERE source = ?", (entry.source,)
+                ).fetchone()
+                self._connection.execute("DELETE FROM file_authors WHERE file_id = ?", (file_id,))
+                self._connection.executemany(
+                    "INSERT INTO file_authors (file_id, name) VALUES (?, ?)",
+                    [(file_id, name) for name in split_authors(entry.get_attribute(Attribute.AUTHOR))],
+                )
+        self._buffer = []
+
+    def merge(self, path: str):
+        """
+        Record the entries of the manifest at the given path, e.g. of a worker of a
+        distributed run, replacing the entries of the same sources.
+        """
+        other = LibraryManifest(path, wal=False)
+        try:
+            for entry in other.iter_entries():
+                self.record(entry)
+        finally:
+            other.close()
+        self.flush()
+
+    def query(
+        self,
+        filters: Dict[Attribute, str],
+        status: Optional[str] = None,
+        limit: Optional[int] = None,
+    ) -> List[ManifestEntry]:
+        """
+        Get the entries matching all the given attribute values, sorted by destination.
+
+        Values are compared case-insensitively, and a value ending with * matches the
+        values starting with the rest of it. An author matches any of the authors of a
+        file.
+        """
+        sql, parameters = self._build_query(filters, status, limit)
+        return [self._to_entry(row) for row in self._connection.execute(sql, parameters)]
+
+    @staticmethod
+    def _build_query(
+        filters: Dict[Attribute, str], status: Optional[str], limit: Optional[int]
+    ) -> Tuple[str, list]:
+        conditions, parameters = [], []
+        for attribute, value in filters.items():
+            column = "name" if attribute == Attribute.AUTHOR else attribute.value
+            if value.endswith("*"):
+                condition = f"{column} >= ? AND {column} < ?"
+                parameters += [value[:-1], value[:-1] + MAX_CHARACTER]
+            else:
+                condition = f"{column} = ?"
+                parameters.append(value)
+            if attribute == Attribute.AUTHOR:
+                condition = f"id IN (SELECT file_id FROM file_authors WHERE {condition})"
+            conditions.append(condition)
+        if status is not None:
+            conditions.append("status = ?")
+            parameters.append(status)
+
+        sql = f"SELECT {', '.join(ENTRY_COLUMNS)} FROM files"
+        if conditions:
+            sql += " WHERE " + " AND ".join(conditions)
+        sql += " ORDER BY destination"
+        if limit is not None:
+            sql += " LIMIT ?"
+            parameters.append(limit)
+        return sql, parameters
+
+    def iter_entries(self, status: Optional[str] = None) -> Iterator[ManifestEntry]:
+        """
+        Iterate over the entries, with the given status if any, PAGE_SIZE entries at a
+        time, so entries can be recorded while iterating.
+        """
+        last_id = 0
+        while True:
+            rows = self._connection.execute(
+                f"SELECT id, {', '.join(ENTRY_COLUMNS)} FROM files"
+                " WHERE id > ? AND (? IS NULL OR status = ?) ORDER BY id LIMIT ?",
+                (last_id, status, status, PAGE_SIZE),
+            ).fetchall()
+            if not rows:
+                return
+            last_id = rows[-1][0]
+            for row in rows:
+                yield self._to_entry(row[1:])
+
+    def count(self, status: Optional[str] = None) -> int:
+        return self._connection.execute(
+            "SELECT COUNT(*) FROM files WHERE ? IS NULL OR status = ?", (status, status)
+        ).fetchone()[0]
+
+    def close(self):
+        """
+        Insert the buffered entries, and close the manifest.
+        """
+        self.flush()
+        # keep the statistics of the query planner up to date
+        self._connection.execute("PRAGMA optimize")
+        self._connection.close()
+
+    @staticmethod
+    def _to_row(entry: ManifestEntry) -> tuple:
+        values = [getattr(entry, column) for column in ENTRY_COLUMNS]
+        values[ENTRY_COLUMNS.index("metadata")] = (
+            json.dumps(entry.metadata) if entry.metadata is not None else None
+        )
+        return tuple(values) + tuple(entry.get_attribute(attribute) for attribute in Attribute)
+
+    @staticmethod
+    def _to_entry(row: tuple) -> ManifestEntry:
+        entry = ManifestEntry(**dict(zip(ENTRY_COLUMNS, row)))
+        if entry.metadata is not None:
+            entry.metadata = json.loads(entry.metadata)
+        return entry
+
+
+def split_authors(authors: Optional[str]) -> List[str]:
+    """
+    Split the author attribute of a file into its authors.
+    """
+    if not authors:
+        return []
+    return [name for name in AUTHOR_SEPARATORS.split(authors) if name]
@@ -0,0 +1,277 @@
+"""
+This file contains the registry of the latency histograms and counters of a run, and the
+writers of its report.
+"""
+
+import os
+import json
+import math
+import time
+import threading
+from bisect import bisect_left
+from collections import Counter
+from contextlib import contextmanager
+from typing import Dict
+from typing import Iterator
+from typing import List
+from typing import Optional
+from typing import Sequence
+
+from gpt_pdf_organizer.domain.pricing import estimate_cost
+from gpt_pdf_organizer.service.metrics_hook import MetricsHook
+
+# upper bounds in seconds of the latency buckets, from file system calls to LLM queries
+LATENCY_BUCKETS = (
+    0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0,
+)
+PROMETHEUS_PREFIX = "gpt_pdf_organizer"
+
+
+class LatencyHistogram:
+    """
+    A histogram of latencies in seconds over fixed buckets, with their count, sum,
+    minimum and maximum. Quantiles are estimated as the upper bound of their bucket.
+
+    The histogram is not thread safe: callers must serialize their calls.
+    """
+
+    def __init__(self, buckets: Sequence[float] = LATENCY_BUCKETS):
+        self.buckets = buckets
+        # the last bucket counts the latencies above the largest bound
+        self.bucket_counts = [0] * (len(buckets) + 1)
+        self.count = 0
+        self.sum = 0.0
+        self.min = math.inf
+        self.max = 0.0
+
+    def observe(self, seconds: float):
+        self.bucket_counts[bisect_left(self.buckets, seconds)] += 1
+        self.count += 1
+        self.sum += seconds
+        self.min = min(self.min, seconds)
+        self.max = max(self.max, seconds)
+
+    def merge(self, summary: Dict):
+        """
+        Add the latencies summarized by the to_dict of another histogram over the same buckets.
+        """
+        bucket_counts = list(summary["buckets"].values())
+        bucket_counts.append(summary["count"] - sum(bucket_counts))
+        for i, count in enumerate(bucket_counts):
+            self.bucket_counts[i] += count
+        if summary["count"]:
+            self.min = min(self.min, summary["min"])
+        self.max = max(self.max, summary["max"])
+        self.count += summary["count"]
+        self.sum += summary["sum"]
+
+    def get_quantile(self, quantile: float) -> float:
+        """
+        Estimate the given quantile, between 0 and 1, of the observed latencies.
+        """
+        if self.count == 0:
+            return 0.0
+
+        rank = quantile * self.count
+        cumulative = 0
+        for bound, count in zip(self.buckets, self.bucket_counts):
+            cumulative += count
+            if cumulative >= rank:
+                return min(bound, self.max)
+        return self.max
+
+    def to_dict(self) -> Dict:
+        return {
+            "count": self.count,
+            "sum": self.sum,
+            "min": self.min if self.count else 0.0,
+            "max": self.max,
+            "mean": self.sum / self.count if self.count else 0.0,
+            "p50": self.get_quantile(0.5),
+            "p90": self.get_quantile(0.9),
+            "p99": self.get_quantile(0.99),
+            "buckets": {
+                str(bound): count for bound, count in zip(self.buckets, self.bucket_counts)
+            },
+        }
+
+
+class Metrics:
+    """
+    The registry of the metrics of a run: a latency histogram per stage, e.g. "open" or
+    "query", and counters, e.g. "prompt_tokens".
+
+    Recording a metric takes a lock held for a few operations, and calls the hooks, if
+    any, so it is cheap enough to time every stage of every file. When disabled, timings
+    are dropped and only the counters are kept.
+    """
+
+    def __init__(
+        self,
+        counters: Optional[Counter] = None,
+        hooks: Optional[List[MetricsHook]] = None,
+        enabled: bool = True,
+    ):
+        """
+        Args:
+            counters (Counter): The counters to increment, a new Counter by default.
+            hooks (List[MetricsHook]): The hooks notified of each recorded metric.
+            enabled (bool): Whether timings are recorded.
+        """
+        self.counters = counters if counters is not None else Counter()
+        self.hooks = list(hooks or [])
+        self.enabled = enabled
+        self.histograms: Dict[str, LatencyHistogram] = {}
+        self._lock = threading.Lock()
+
+    @contextmanager
+    def time(self, stage: str) -> Iterator[None]:
+        """
+        Time the enclosed block as the given stage.
+        """
+        if not self.enabled:
+            yield
+            return
+
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(stage, time.perf_counter() - start)
+
+    def observe(self, stage: str, seconds: float):
+        """
+        Record that the given stage took the given number of seconds.
+        """
+        if not self.enabled:
+            return
+
+        with self._lock:
+            histogram = self.histograms.get(stage)
+            if histogram is None:
+                histogram = self.histograms[stage] = LatencyHistogram()
+            histogram.observe(seconds)
+        for hook in self.hooks:
+            hook.on_timing(stage, seconds)
+
+    def increment(self, name: str, value: int = 1):
+        """
+        Increment the given counter.
+        """
+        with self._lock:
+            self.counters[name] += value
+        for hook in self.hooks:
+            hook.on_counter(name, value)
+
+    def get_stages(self) -> Dict[str, Dict]:
+        """
+        Get the latency summary of each stage timed so far.
+        """
+        with self._lock:
+            return {stage: histogram.to_dict() for stage, histogram in self.histograms.items()}
+
+
+def merge_run_reports(
+    reports: List[Dict], prices: Optional[Dict[str, Dict[str, float]]] = None
+) -> Dict:
+    """
+    Merge the reports of the workers of a distributed run, each with the worker and the
+    started_at and finished_at times of its run, into the report of the whole run, from
+    the start of the first worker until the end of the last one.
+    """
+    counters = Counter()
+    histograms: Dict[str, LatencyHistogram] = {}
+    for report in reports:
+        counters.update(report["counters"])
+        for stage, summary in report["stages"].items():
+            histograms.setdefault(stage, LatencyHistogram()).merge(summary)
+
+    elapsed = max(report["finished_at"] for report in reports) - min(report["started_at"] for report in reports)
+    files = sum(report["files"] for report in reports)
+    model = reports[0]["model"]
+    prompt_tokens = counters["prompt_tokens"]
+    cached_prompt_tokens = counters["cached_prompt_tokens"]
+    completion_tokens = counters["completion_tokens"]
+    peak_memory = [report["peak_memory_bytes"] for report in reports if report["peak_memory_bytes"] is not None]
+    return {
+        "model": model,
+        "elapsed_seconds": elapsed,
+        "files": files,
+        "throughput": {
+            "files_per_second": files / elapsed if elapsed else 0.0,
+            "tokens_per_second": (prompt_tokens + completion_tokens) / elapsed if elapsed else 0.0,
+        },
+        "cost": {
+            "model": model,
+            "prompt_tokens": prompt_tokens,
+            "cached_prompt_tokens": cached_prompt_tokens,
+            "completion_tokens": completion_tokens,
+            "estimated_usd": estimate_cost(
+                model, prompt_tokens, completion_tokens, cached_prompt_tokens, prices=prices
+            ),
+        },
+        "peak_memory_bytes": max(peak_memory) if peak_memory else None,
+        "counters": dict(counters),
+        "stages": {stage: histogram.to_dict() for stage, histogram in histograms.items()},
+        "workers": [
+            {"worker": report["worker"], "files": report["files"], "elapsed_seconds": report["elapsed_seconds"]}
+            for report in reports
+        ],
+    }
+
+
+def write_json_report(path: str, report: Dict):
+    """
+    Write a run report as JSON, replacing the file at once so readers never see a
+    partial report.
+    """
+    _write_atomically(path, json.dumps(report, indent=2, sort_keys=True) + "\n")
+
+
+def write_prometheus_report(path: str, report: Dict):
+    """
+    Write a run report in the Prometheus text format, e.g. for the textfile collector of
+    the node exporter, replacing the file at once so it is never scraped half written.
+    """
+    lines = [
+        f"# HELP {PROMETHEUS_PREFIX}_stage_seconds Latency of each stage of the handling of a file.",
+        f"# TYPE {PROMETHEUS_PREFIX}_stage_seconds histogram",
+    ]
+    for stage, summary in sorted(report["stages"].items()):
+        cumulative = 0
+        for bound, count in summary["buckets"].items():
+            cumulative += count
+            lines.append(f'{PROMETHEUS_PREFIX}_stage_seconds_bucket{{stage="{stage}",le="{bound}"}} {cumulative}')
+        lines.append(f'{PROMETHEUS_PREFIX}_stage_seconds_bucket{{stage="{stage}",le="+Inf"}} {summary["count"]}')
+        lines.append(f'{PROMETHEUS_PREFIX}_stage_seconds_sum{{stage="{stage}"}} {summary["sum"]}')
+        lines.append(f'{PROMETHEUS_PREFIX}_stage_seconds_count{{stage="{stage}"}} {summary["count"]}')
+
+    lines.append(f"# HELP {PROMETHEUS_PREFIX}_events_total Counters of the run, e.g. tokens and cache hits.")
+    lines.append(f"# TYPE {PROMETHEUS_PREFIX}_events_total counter")
+    for name, value in sorted(report["counters"].items()):
+        lines.append(f'{PROMETHEUS_PREFIX}_events_total{{name="{name}"}} {value}')
+
+    model = report["model"]
+    gauges = [
+        ("files", "Files handled by the run.", report["files"]),
+        ("elapsed_seconds", "Duration of the run.", report["elapsed_seconds"]),
+        ("files_per_second", "Files handled per second.", report["throughput"]["files_per_second"]),
+        ("tokens_per_second", "LLM tokens used per second.", report["throughput"]["tokens_per_second"]),
+    ]
+    if report["cost"]["estimated_usd"] is not None:
+        gauges.append(("estimated_cost_usd", "Estimated cost of the LLM queries.", report["cost"]["estimated_usd"]))
+    for name, description, value in gauges:
+        lines.append(f"# HELP {PROMETHEUS_PREFIX}_{name} {description}")
+        lines.append(f"# TYPE {PROMETHEUS_PREFIX}_{name} gauge")
+        lines.append(f'{PROMETHEUS_PREFIX}_{name}{{model="{model}"}} {value}')
+
+    _write_atomically(path, "\n".join(lines) + "\n")
+
+
+def _write_atomically(path: str, text: str):
+    folder = os.path.dirname(os.path.abspath(path))
+    os.makedirs(folder, exist_ok=True)
+    temporary_path = f"{path}.tmp-{os.getpid()}"
+    with open(temporary_path, "w", encoding="utf-8") as f:
+        f.write(text)
+    os.replace(temporary_path, path)
@@ -0,0 +1,124 @@
+"""
+This file contains the persistent store of the text extracted from the pages of PDF files.
+"""
+
+import os
+import json
+import zlib
+import struct
+from dataclasses import dataclass
+from typing import Dict
+from typing import List
+from typing import Optional
+
+MAGIC = b"GPOPAGES"
+FORMAT_VERSION = 2
+# format version, whether the whole document was extracted, number of pages and
+# length of the document info
+HEADER = struct.Struct("<B?II")
+PAGE_LENGTH = struct.Struct("<I")
+
+
+@dataclass
+class StoredDocument:
+    """
+    The compressed text of the first pages of a document.
+
+    complete is true when all the pages of the document were extracted, and
+    document_info holds the embedded metadata of the document, if it was read.
+    """
+    compressed_pages: List[bytes]
+    complete: bool = False
+    document_info: Optional[Dict[str, str]] = None
+
+    def __len__(self) -> int:
+        return len(self.compressed_pages)
+
+    def page_text(self, page_index: int) -> str:
+        """
+        Decompress the text of the given page.
+        """
+        return decompress_text(self.compressed_pages[page_index])
+
+
+def compress_text(text: str) -> bytes:
+    return zlib.compress(text.encode("utf-8"))
+
+
+def decompress_text(data: bytes) -> str:
+    return zlib.decompress(data).decode("utf-8")
+
+
+class PageTextStore:
+    """
+    Stores the text extracted from each page of a document, keyed by the hash of the
+    document content.
+
+    Each document is stored in its own file holding its embedded metadata and its zlib
+    compressed pages, so pages are only decompressed when read, and worker processes
+    can write documents concurrently without locking: files are written to a
+    temporary path and atomically renamed.
+    """
+
+    def __init__(self, folder: str):
+        self.folder = folder
+
+    def load(self, content_hash: str) -> Optional[StoredDocument]:
+        """
+        Load the pages stored for the given document, or None if there are none.
+        """
+        try:
+            with open(self._get_path(content_hash), "rb") as f:
+                data = f.read()
+        except FileNotFoundError:
+            return None
+
+        if not data.startswith(MAGIC):
+            return None
+
+        offset = len(MAGIC)
+        version = data[offset]
+        if version != FORMAT_VERSION:
+            return None
+
+        _, complete, num_pages, info_length = HEADER.unpack_from(data, offset)
+        offset += HEADER.size
+        document_info = json.loads(data[offset:offset + info_length])
+        offset += info_length
+        lengths = struct.unpack_from(f"<{num_pages}I", data, offset)
+        offset += PAGE_LENGTH.size * num_pages
+        compressed_pages = []
+        for length in lengths:
+            compressed_pages.append(data[offset:offset + length])
+            offset += length
+
+        return StoredDocument(
+            compressed_pages=compressed_pages,
+            complete=complete,
+            document_info=document_info,
+        )
+
+    def save(self, content_hash: str, document: StoredDocument):
+        """
+        Store the pages of the given document, replacing any previously stored pages.
+        """
+        path = self._get_path(content_hash)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+
+        document_info = json.dumps(document.document_info).encode("utf-8")
+        temporary_path = f"{path}.{os.getpid()}.tmp"
+        with open(temporary_path, "wb") as f:
+            f.write(MAGIC)
+            f.write(HEADER.pack(
+                FORMAT_VERSION, document.complete, len(document), len(document_info)
+            ))
+            f.write(document_info)
+            f.write(struct.pack(
+                f"<{len(document)}I", *(len(page) for page in document.compressed_pages)
+            ))
+            for page in document.compressed_pages:
+                f.write(page)
+        os.replace(temporary_path, path)
+
+    def _get_path(self, content_hash: str) -> str:
+        return os.path.join(self.folder, content_hash[:2], f"{content_hash}.pages")
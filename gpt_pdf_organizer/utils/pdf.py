@@ -2,18 +2,534 @@
 This file contains functions for reading PDF files.
 """
 
+import os
+import time
+import xml.etree.ElementTree as ElementTree
+from contextlib import closing
+from dataclasses import dataclass
+from dataclasses import field
+from dataclasses import replace
+from typing import Callable
+from typing import Dict
+from typing import Iterator
+from typing import List
+from typing import Optional
+from typing import Tuple
+
 import pdfplumber
-from gpt_pdf_organizer.utils.tokenizer import first_words_within_k_tokens
+from pdfminer.pdfdocument import PDFDocument
+from pdfminer.pdfpage import PDFPage
+from pdfminer.pdftypes import resolve1
+from pdfplumber.page import Page
+from pdfplumber.utils.pdfinternals import resolve_and_decode
+
+from gpt_pdf_organizer.app.exception import ExtractionGuardException
+from gpt_pdf_organizer.service.text_extractor import TextDocument
+from gpt_pdf_organizer.service.text_extractor import TextExtractor
+from gpt_pdf_organizer.utils.page_text_store import PageTextStore
+from gpt_pdf_organizer.utils.page_text_store import StoredDocument
+from gpt_pdf_organizer.utils.page_text_store import compress_text
+from gpt_pdf_organizer.utils.sandbox import run_sandboxed
+
+# embedded metadata fields read from the document info dictionary
+DOCUMENT_INFO_FIELDS = ("Title", "Author", "Subject", "Keywords", "CreationDate")
+
+XMP_NAMESPACES = {
+    "dc": "http://purl.org/dc/elements/1.1/",
+    "xmp": "http://ns.adobe.com/xap/1.0/",
+    "prism": "http://prismstandard.org/namespaces/basic/2.0/",
+    "rdf": "http://www.w3.org/1999/02/22-rdf-syntax-ns#",
+}
+# XMP properties read from the metadata stream, keyed by their qualified name
+XMP_FIELDS = ("dc:title", "dc:creator", "xmp:CreateDate", "prism:doi")
+
+
+class PdfDocument(TextDocument):
+    """
+    A handle over an open PDF file that streams the text of its pages, extracted with
+    the layout analysis of pdfplumber.
+
+    The file is parsed once when the handle is opened, and pages are only
+    materialized when iterated, so reading the first pages of a large document
+    does not pay for the rest of it.
+
+    Usage:
+        with PdfDocument(pdf_path) as document:
+            for text in document.iter_pages_text():
+                ...
+    """
+
+    def __init__(self, pdf_path: str):
+        self.pdf_path = pdf_path
+        self._pdf = None
+
+    def __enter__(self) -> "PdfDocument":
+        self.open()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def open(self):
+        """
+        Open the underlying PDF file.
+        """
+        if self._pdf is None:
+            self._pdf = pdfplumber.open(self.pdf_path)
+
+    def close(self):
+        """
+        Close the underlying PDF file.
+        """
+        if self._pdf is not None:
+            self._pdf.close()
+            self._pdf = None
+
+    def iter_pages_text(self, start_page: int = 0, max_chars: Optional[int] = None) -> Iterator[str]:
+        """
+        Lazily yield the text of each page, starting at the given page index.
+
+        The layout of each page is released as soon as its text was extracted. Pages
+        with more than max_chars characters are rejected before their words and lines
+        are grouped.
+        """
+        if self._pdf is None:
+            raise ValueError("PDF document is not open")
+
+        doctop = 0
+        for i, page_obj in enumerate(PDFPage.create_pages(self._pdf.doc)):
+            page = Page(self._pdf, page_obj, page_number=i + 1, initial_doctop=doctop)
+            doctop += page.height
+            if i < start_page:
+                continue
+
+            try:
+                if max_chars is not None and len(page.chars) > max_chars:
+                    raise ExtractionGuardException(
+                        f"page {i + 1} has more than {max_chars} characters"
+                    )
+                text = page.extract_text()
+            finally:
+                self._release_page(page)
+            yield text
+
+    def get_num_pages(self) -> int:
+        if self._pdf is None:
+            raise ValueError("PDF document is not open")
+
+        return read_num_pages(self._pdf.doc)
+
+    def get_document_info(self) -> Dict[str, str]:
+        """
+        Read the embedded metadata of the document.
+
+        Returns the fields of the document info dictionary, e.g. Title, and the
+        properties of the XMP metadata stream, keyed by their qualified name,
+        e.g. dc:title. Fields that are missing or empty are left out.
+        """
+        if self._pdf is None:
+            raise ValueError("PDF document is not open")
+
+        return read_document_info(self._pdf.doc)
+
+    def _release_page(self, page: Page):
+        """
+        Free the cached layout objects of the given page.
+        """
+        page.flush_cache()
+        get_textmap = getattr(page, "get_textmap", None)
+        if get_textmap is not None and hasattr(get_textmap, "cache_clear"):
+            get_textmap.cache_clear()
 
 
-def read_pdf_page(pdf_path: str, page_index: int) -> str:
+class PdfplumberTextExtractor(TextExtractor):
     """
-    Iterate over the pages of a PDF file and yield the text of each page.
+    Extracts the text of the pages with pdfplumber, whose layout analysis keeps the
+    reading order of multi-column pages, at the cost of analysing every character.
+    """
+
+    name = "pdfplumber"
+
+    def open(self, pdf_path: str) -> TextDocument:
+        document = PdfDocument(pdf_path)
+        document.open()
+        return document
+
+
+def read_document_info(doc: PDFDocument) -> Dict[str, str]:
+    """
+    Read the embedded metadata of a document parsed by pdfminer: the fields listed in
+    DOCUMENT_INFO_FIELDS of its document info dictionary, and the properties listed in
+    XMP_FIELDS of its XMP metadata stream. Fields that are missing or empty are left out.
+    """
+    info = {}
+    for entry in doc.info:
+        info.update(entry)
+
+    document_info = {}
+    for key in DOCUMENT_INFO_FIELDS:
+        try:
+            value = resolve_and_decode(info.get(key))
+        except Exception:
+            continue
+        if isinstance(value, str) and value.strip():
+            document_info[key] = value.strip()
+
+    try:
+        stream = resolve1(doc.catalog.get("Metadata"))
+        if stream is not None:
+            document_info.update(parse_xmp_metadata(stream.get_data()))
+    except Exception:
+        # a broken metadata stream must not prevent reading the pages
+        pass
+
+    return document_info
+
+
+def read_num_pages(doc: PDFDocument) -> int:
+    """
+    Read the number of pages of a document parsed by pdfminer from its page tree,
+    counting the pages only when the tree does not tell.
+    """
+    try:
+        num_pages = resolve1(resolve1(doc.catalog["Pages"])["Count"])
+        if isinstance(num_pages, int):
+            return num_pages
+    except Exception:
+        pass
+
+    return sum(1 for _ in PDFPage.create_pages(doc))
+
+
+def parse_xmp_metadata(data: bytes) -> Dict[str, str]:
+    """
+    Parse the properties listed in XMP_FIELDS from an XMP metadata packet.
+
+    Properties holding a list of values, e.g. the authors in dc:creator, are joined
+    with commas.
+    """
+    root = ElementTree.fromstring(data.strip(b"\x00 \t\r\n"))
+    properties = {}
+    for name in XMP_FIELDS:
+        prefix, local_name = name.split(":")
+        qualified_name = f"{{{XMP_NAMESPACES[prefix]}}}{local_name}"
+        for description in root.iter(f"{{{XMP_NAMESPACES['rdf']}}}Description"):
+            # simple properties may be written as attributes of the description
+            value = description.get(qualified_name)
+            element = description.find(qualified_name)
+            if value is None and element is not None:
+                items = element.findall(".//rdf:li", XMP_NAMESPACES)
+                texts = [item.text for item in items] if items else [element.text]
+                value = ", ".join(text.strip() for text in texts if text and text.strip())
+            if value and value.strip():
+                properties[name] = value.strip()
+                break
+
+    return properties
+
+
+def read_pdf_page(
+    pdf_path: str, page_index: int, text_extractor: Optional[TextExtractor] = None
+) -> str:
+    """
+    Read the text of a single page of a PDF file, with pdfplumber unless another text
+    extractor is given.
+
+    Prefer opening the file once when reading more than one page of the same file.
     """
+    with (text_extractor or PdfplumberTextExtractor()).open(pdf_path) as document:
+        for text in document.iter_pages_text(start_page=page_index):
+            return text
 
-    with pdfplumber.open(pdf_path) as pdf:
-        if page_index >= len(pdf.pages):
-            return None
+    return None
 
-        text = pdf.pages[page_index].extract_text()
-        return text
+
+@dataclass
+class ExtractedDocument:
+    """
+    What is read from a PDF file to classify it.
+
+    content is the text of the first pages clamped to the token budget, or None if the
+    budget was not met within the page limit, num_tokens is the number of tokens of the
+    content, first_page_text is the whole text of the first page, and document_info holds
+    the embedded metadata of the document. timings holds the seconds spent in each stage
+    of the extraction: open, extraction of the page texts and clamping. extractors holds
+    the names of the text extractors that read the pages, more than one when an extractor
+    failed and the next one took over. peak_memory_bytes is the peak resident memory of
+    the extraction, measured when it ran in a sandboxed subprocess.
+    """
+    content: Optional[str]
+    num_tokens: int = 0
+    first_page_text: str = ""
+    document_info: Dict[str, str] = field(default_factory=dict)
+    timings: Dict[str, float] = field(default_factory=dict)
+    extractors: List[str] = field(default_factory=list)
+    peak_memory_bytes: Optional[int] = None
+
+
+@dataclass
+class ExtractionLimits:
+    """
+    The limits of the guarded extraction of a PDF file, None meaning no limit.
+
+    The size and the number of pages of a file are checked before its pages are read,
+    and the number of characters of each page before its text is extracted. When a
+    timeout or a memory limit is set, the extraction runs in a sandboxed subprocess
+    killed when it runs longer than timeout_seconds or its resident memory grows past
+    max_memory_bytes.
+    """
+    max_file_size_bytes: Optional[int] = None
+    max_num_pages: Optional[int] = None
+    max_page_chars: Optional[int] = None
+    timeout_seconds: Optional[float] = None
+    max_memory_bytes: Optional[int] = None
+
+    def is_sandboxed(self) -> bool:
+        return self.timeout_seconds is not None or self.max_memory_bytes is not None
+
+
+def iter_pages_text(
+    pdf_path: str,
+    content_hash: Optional[str] = None,
+    page_text_store: Optional[PageTextStore] = None,
+    document_info: Optional[Dict[str, str]] = None,
+    timings: Optional[Dict[str, float]] = None,
+    text_extractors: Optional[List[TextExtractor]] = None,
+    extractors: Optional[List[str]] = None,
+    limits: Optional[ExtractionLimits] = None,
+) -> Iterator[str]:
+    """
+    Lazily yield the text of each page of a PDF file.
+
+    Pages are extracted with the first of the text extractors, pdfplumber by default.
+    When an extractor fails, the next one takes over from the page it failed on.
+
+    When a page text store is given, the pages already stored for the file content are
+    read from it, and the PDF file is only parsed for the pages past them. Pages newly
+    extracted are added to the store once iteration stops.
+
+    When a document_info dict is given, it is filled with the embedded metadata of the
+    document before the first page is yielded, read from the store when available.
+
+    When a timings dict is given, the seconds spent opening the PDF file are added to
+    its "open" entry, and when an extractors list is given, the names of the extractors
+    used are appended to it.
+
+    When limits are given, files with too many pages and pages with too many characters
+    raise an ExtractionGuardException, which no other text extractor takes over from.
+    """
+    text_extractors = text_extractors or [PdfplumberTextExtractor()]
+    if page_text_store is None or content_hash is None:
+        yield from _iter_extracted_pages(
+            pdf_path, text_extractors, 0, document_info, timings, extractors, limits
+        )
+        return
+
+    stored = page_text_store.load(content_hash) or StoredDocument(compressed_pages=[])
+    document = StoredDocument(
+        compressed_pages=list(stored.compressed_pages),
+        complete=stored.complete,
+        document_info=stored.document_info,
+    )
+    try:
+        if document_info is not None and document.document_info is None and (len(stored) or stored.complete):
+            # the stored pages are yielded first: read the metadata on its own
+            document.document_info = _read_document_info(pdf_path, text_extractors, timings)
+        if document_info is not None and document.document_info is not None:
+            document_info.update(document.document_info)
+
+        for page_index in range(len(stored)):
+            yield stored.page_text(page_index)
+
+        if stored.complete:
+            return
+
+        # the metadata of a document never stored is read along with its first page
+        new_document_info = {} if document_info is not None and document.document_info is None else None
+        for text in _iter_extracted_pages(
+            pdf_path, text_extractors, len(stored), new_document_info, timings, extractors, limits
+        ):
+            if new_document_info is not None and document.document_info is None:
+                document.document_info = new_document_info
+                document_info.update(new_document_info)
+            document.compressed_pages.append(compress_text(text))
+            yield text
+        if new_document_info is not None and document.document_info is None:
+            document.document_info = new_document_info
+            document_info.update(new_document_info)
+        document.complete = True
+    finally:
+        if (
+            len(document) > len(stored)
+            or document.complete != stored.complete
+            or document.document_info != stored.document_info
+        ):
+            page_text_store.save(content_hash, document)
+
+
+def _iter_extracted_pages(
+    pdf_path: str,
+    text_extractors: List[TextExtractor],
+    start_page: int,
+    document_info: Optional[Dict[str, str]],
+    timings: Optional[Dict[str, float]],
+    extractors: Optional[List[str]],
+    limits: Optional[ExtractionLimits] = None,
+) -> Iterator[str]:
+    """
+    Yield the text of the pages of a PDF file from start_page, falling back to the next
+    text extractor, from the page the previous one failed on, when one fails.
+    """
+    limits = limits or ExtractionLimits()
+    page_index = start_page
+    for i, text_extractor in enumerate(text_extractors):
+        document = None
+        try:
+            document = _open_document(pdf_path, text_extractor, timings)
+            if extractors is not None:
+                extractors.append(text_extractor.name)
+            if limits.max_num_pages is not None and document.get_num_pages() > limits.max_num_pages:
+                raise ExtractionGuardException(
+                    f"file has more than {limits.max_num_pages} pages"
+                )
+            if document_info is not None and page_index == start_page:
+                document_info.update(document.get_document_info())
+            for text in document.iter_pages_text(
+                start_page=page_index, max_chars=limits.max_page_chars
+            ):
+                yield text
+                page_index += 1
+            return
+        except ExtractionGuardException:
+            # the next text extractors would read the same pages
+            raise
+        except Exception:
+            if i == len(text_extractors) - 1:
+                raise
+        finally:
+            if document is not None:
+                document.close()
+
+
+def _read_document_info(
+    pdf_path: str, text_extractors: List[TextExtractor], timings: Optional[Dict[str, float]]
+) -> Dict[str, str]:
+    """
+    Read the embedded metadata of a PDF file with the first text extractor that can open it.
+    """
+    for i, text_extractor in enumerate(text_extractors):
+        try:
+            with _open_document(pdf_path, text_extractor, timings) as document:
+                return document.get_document_info()
+        except Exception:
+            if i == len(text_extractors) - 1:
+                raise
+
+
+def _open_document(
+    pdf_path: str, text_extractor: TextExtractor, timings: Optional[Dict[str, float]]
+) -> TextDocument:
+    start = time.perf_counter()
+    try:
+        return text_extractor.open(pdf_path)
+    finally:
+        if timings is not None:
+            timings["open"] = timings.get("open", 0.0) + time.perf_counter() - start
+
+
+def extract_document(
+    pdf_path: str,
+    k: int,
+    clamp_text_by_tokens: Callable[[str, int], Tuple[str, int]],
+    limit_num_pages: int = 25,
+    content_hash: Optional[str] = None,
+    page_text_store: Optional[PageTextStore] = None,
+    text_extractors: Optional[List[TextExtractor]] = None,
+    limits: Optional[ExtractionLimits] = None,
+) -> ExtractedDocument:
+    """
+    Read the first k tokens, the first page and the embedded metadata of the given PDF
+    file, opening it once unless a text extractor fails and the next one takes over.
+
+    Pages are extracted lazily and reading stops as soon as the token budget is met.
+    Pages and metadata already in the page text store are not extracted again.
+
+    Raises:
+        ExtractionGuardException: when the file exceeds one of the given limits.
+    """
+    if limits is not None:
+        if limits.max_file_size_bytes is not None and os.path.getsize(pdf_path) > limits.max_file_size_bytes:
+            raise ExtractionGuardException(
+                f"file is larger than {limits.max_file_size_bytes / 2 ** 20:g} MB"
+            )
+        if limits.is_sandboxed():
+            document, peak_memory_bytes = run_sandboxed(
+                extract_document,
+                (
+                    pdf_path, k, clamp_text_by_tokens, limit_num_pages, content_hash,
+                    page_text_store, text_extractors,
+                    replace(limits, max_file_size_bytes=None, timeout_seconds=None, max_memory_bytes=None),
+                ),
+                timeout_seconds=limits.timeout_seconds,
+                max_memory_bytes=limits.max_memory_bytes,
+            )
+            document.peak_memory_bytes = peak_memory_bytes
+            return document
+
+    document = ExtractedDocument(content=None)
+    start = time.perf_counter()
+    clamp_seconds = 0.0
+    try:
+        current_text = ""
+        total_tokens_read = 0
+        with closing(iter_pages_text(
+            pdf_path, content_hash, page_text_store, document.document_info, document.timings,
+            text_extractors, document.extractors, limits,
+        )) as pages_text:
+            for current_page, text in enumerate(pages_text):
+                if current_page == 0:
+                    document.first_page_text = text
+
+                clamp_start = time.perf_counter()
+                text, num_tokens_read = clamp_text_by_tokens(
+                    text, k - total_tokens_read
+                )
+                clamp_seconds += time.perf_counter() - clamp_start
+                total_tokens_read += num_tokens_read
+                current_text += text
+
+                if total_tokens_read >= k:
+                    break
+
+                if current_page >= limit_num_pages:
+                    return document
+
+        document.content = current_text
+        document.num_tokens = total_tokens_read
+        return document
+    finally:
+        open_seconds = document.timings.get("open", 0.0)
+        document.timings["clamp"] = clamp_seconds
+        document.timings["extraction"] = max(
+            0.0, time.perf_counter() - start - clamp_seconds - open_seconds
+        )
+
+
+def read_first_k_tokens_from_pdf(
+    pdf_path: str,
+    k: int,
+    clamp_text_by_tokens: Callable[[str, int], Tuple[str, int]],
+    limit_num_pages: int = 25,
+    content_hash: Optional[str] = None,
+    page_text_store: Optional[PageTextStore] = None,
+) -> Optional[str]:
+    """
+    Read the first k tokens from the given PDF file, opening it only once.
+
+    Pages are extracted lazily and reading stops as soon as the token budget is met.
+    Pages already in the page text store are not extracted again.
+    Returns None if the budget was not met within the first limit_num_pages pages.
+    """
+    return extract_document(
+        pdf_path, k, clamp_text_by_tokens, limit_num_pages, content_hash, page_text_store
+    ).content
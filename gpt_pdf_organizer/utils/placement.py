@@ -0,0 +1,130 @@
+"""
+This file contains the functions placing a source file at its destination in the output folder.
+"""
+
+import os
+import errno
+import shutil
+import socket
+from typing import Callable
+from typing import Dict
+
+try:
+    import fcntl
+except ImportError:  # not available on Windows
+    fcntl = None
+
+PLACEMENT_MODES = ["copy", "move", "hardlink", "symlink", "reflink", "copy_file_range"]
+
+# ioctl cloning a whole file on Linux filesystems supporting reflinks, e.g. btrfs and XFS
+FICLONE = 0x40049409
+
+# errors telling the placement mode is not possible between the source and the destination,
+# e.g. a hardlink across filesystems, rather than a failure of the file operations themselves
+FALLBACK_ERRNOS = {
+    errno.EXDEV,
+    errno.EPERM,
+    errno.EMLINK,
+    errno.EINVAL,
+    errno.ENOSYS,
+    errno.ENOTTY,
+    errno.EOPNOTSUPP,
+    getattr(errno, "ENOTSUP", errno.EOPNOTSUPP),
+}
+
+
+def place_file(source: str, dest: str, mode: str) -> str:
+    """
+    Place the source file at the destination path, replacing any file already there.
+
+    Modes other than move create the destination under a temporary name first, so an
+    interrupted placement never leaves a partial file at the destination. When a mode is
+    not possible, e.g. a hardlink or reflink across filesystems, the placement falls back
+    to the next mode of its chain: hardlink and reflink fall back to copy_file_range,
+    which falls back to copy.
+
+    Placing a file again is harmless, e.g. by two workers of a distributed run handling
+    the same file: a source already moved to the destination is left there, and the
+    temporary name is unique to the host and process.
+
+    Returns the mode actually used.
+    """
+    if mode == "move":
+        try:
+            shutil.move(source, dest)
+        except FileNotFoundError:
+            if os.path.lexists(source) or not os.path.lexists(dest):
+                raise
+        return mode
+
+    temporary_dest = f"{dest}.tmp-{socket.gethostname()}-{os.getpid()}"
+    while True:
+        try:
+            PLACEMENT_FUNCTIONS[mode](source, temporary_dest)
+            os.replace(temporary_dest, dest)
+            return mode
+        except OSError as e:
+            if os.path.lexists(temporary_dest):
+                os.remove(temporary_dest)
+            if e.errno not in FALLBACK_ERRNOS or mode not in FALLBACK_MODES:
+                raise
+            mode = FALLBACK_MODES[mode]
+
+
+def _copy(source: str, dest: str):
+    # shutil uses sendfile on Linux, copying in the kernel
+    shutil.copy(source, dest)
+
+
+def _hardlink(source: str, dest: str):
+    os.link(source, dest)
+
+
+def _symlink(source: str, dest: str):
+    os.symlink(os.path.abspath(source), dest)
+
+
+def _reflink(source: str, dest: str):
+    """
+    Clone the source file, sharing its blocks until either file is modified.
+    """
+    if fcntl is None:
+        raise OSError(errno.EOPNOTSUPP, "reflinks are not supported on this platform")
+
+    with open(source, "rb") as src, open(dest, "wb") as dst:
+        fcntl.ioctl(dst.fileno(), FICLONE, src.fileno())
+    shutil.copymode(source, dest)
+
+
+def _copy_file_range(source: str, dest: str):
+    """
+    Copy the source file with copy_file_range, which copies in the kernel and lets
+    filesystems share blocks or copy server-side, e.g. NFS 4.2.
+    """
+    if not hasattr(os, "copy_file_range"):
+        raise OSError(errno.ENOSYS, "copy_file_range is not supported on this platform")
+
+    with open(source, "rb") as src, open(dest, "wb") as dst:
+        remaining = os.fstat(src.fileno()).st_size
+        while remaining > 0:
+            copied = os.copy_file_range(src.fileno(), dst.fileno(), remaining)
+            if copied == 0:
+                break
+            remaining -= copied
+    shutil.copymode(source, dest)
+
+
+PLACEMENT_FUNCTIONS: Dict[str, Callable[[str, str], None]] = {
+    "copy": _copy,
+    "hardlink": _hardlink,
+    "symlink": _symlink,
+    "reflink": _reflink,
+    "copy_file_range": _copy_file_range,
+}
+
+FALLBACK_MODES = {
+    "hardlink": "copy_file_range",
+    "symlink": "copy",
+    "reflink": "copy_file_range",
+    "copy_file_range": "copy",
+}
@@ -0,0 +1,87 @@
+"""
+This file contains the building blocks of the client-side rate limiting of LLM queries.
+"""
+
+import time
+from email.utils import parsedate_to_datetime
+from typing import Callable
+from typing import Mapping
+from typing import Optional
+
+
+class TokenBucket:
+    """
+    A token bucket holding up to `capacity` tokens, refilled continuously so that
+    `capacity` tokens are added per minute, e.g. the requests or tokens per minute
+    allowed by an API quota.
+
+    The bucket is not thread safe: callers must serialize their calls.
+    """
+
+    def __init__(self, capacity: float, clock: Callable[[], float] = time.monotonic):
+        self.capacity = capacity
+        self.rate = capacity / 60.0
+        self._clock = clock
+        self._tokens = capacity
+        self._updated_at = clock()
+
+    def get_wait_time(self, amount: float) -> float:
+        """
+        Get the number of seconds until the given amount of tokens is available, zero if
+        it is available now. Amounts larger than the capacity wait for a full bucket.
+        """
+        self._refill()
+        missing = min(amount, self.capacity) - self._tokens
+        return max(0.0, missing / self.rate)
+
+    def consume(self, amount: float):
+        """
+        Take the given amount of tokens, which may leave the bucket in debt.
+        """
+        self._refill()
+        self._tokens -= min(amount, self.capacity)
+
+    def refund(self, amount: float):
+        """
+        Give back tokens reserved in excess, e.g. when a request used fewer tokens than
+        estimated.
+        """
+        self._refill()
+        self._tokens = min(self.capacity, self._tokens + amount)
+
+    def _refill(self):
+        now = self._clock()
+        self._tokens = min(self.capacity, self._tokens + (now - self._updated_at) * self.rate)
+        self._updated_at = now
+
+
+def parse_retry_after(headers: Optional[Mapping[str, str]]) -> Optional[float]:
+    """
+    Parse the number of seconds to wait before retrying from the headers of a rate
+    limited response, or None if the headers do not tell.
+
+    Supports retry-after-ms, and retry-after given in seconds or as an HTTP date.
+    """
+    if not headers:
+        return None
+
+    retry_after_ms = headers.get("retry-after-ms")
+    if retry_after_ms is not None:
+        try:
+            return max(0.0, float(retry_after_ms) / 1000)
+        except ValueError:
+            pass
+
+    retry_after = headers.get("retry-after")
+    if retry_after is None:
+        return None
+
+    try:
+        return max(0.0, float(retry_after))
+    except ValueError:
+        pass
+
+    try:
+        return max(0.0, parsedate_to_datetime(retry_after).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
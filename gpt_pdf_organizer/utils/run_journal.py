@@ -0,0 +1,141 @@
+"""
+This file contains the append-only journal of the files handled by a run.
+"""
+
+import os
+import json
+import time
+from typing import Dict
+from typing import List
+from typing import Optional
+from typing import Set
+
+JOURNAL_FILENAME = ".gpt-pdf-organizer-journal.jsonl"
+
+
+def get_file_key(path: str) -> str:
+    """
+    Identify a source file by its absolute path, size and modification time, so a file
+    replaced by a different one at the same path is not considered already handled.
+    """
+    stat = os.stat(path)
+    return f"{os.path.abspath(path)}:{stat.st_size}:{stat.st_mtime_ns}"
+
+
+class RunJournal:
+    """
+    An append-only journal recording the status, metadata and destination of each
+    handled file, one JSON object per line.
+
+    Records are buffered and written, flushed and fsync'd at most every
+    flush_interval seconds or every flush_every records, so journaling does not
+    become the bottleneck of a run. At most the records of the last interval are
+    lost on a crash, and those files are handled again on resume.
+    """
+
+    def __init__(self, path: str, flush_interval: float = 1.0, flush_every: int = 100):
+        self.path = path
+        self.flush_interval = flush_interval
+        self.flush_every = flush_every
+        self._buffer: List[str] = []
+        self._last_flush = time.monotonic()
+        truncated = False
+        if os.path.exists(path) and os.path.getsize(path) > 0:
+            with open(path, "rb") as f:
+                f.seek(-1, os.SEEK_END)
+                truncated = f.read(1) != b"\n"
+
+        self._file = open(path, "a", encoding="utf-8")
+        # terminate a line truncated by an interrupted write, so new records start on their own line
+        if truncated:
+            self._file.write("\n")
+
+    @staticmethod
+    def get_path(output_dir: str) -> str:
+        """
+        Get the path of the journal of the given output directory.
+        """
+        return os.path.join(output_dir, JOURNAL_FILENAME)
+
+    @staticmethod
+    def load_handled_file_keys(path: str) -> Set[str]:
+        """
+        Load the keys of the files recorded in the journal at the given path.
+
+        A truncated last line, left by an interrupted write, is ignored.
+        """
+        keys = set()
+        if not os.path.exists(path):
+            return keys
+
+        with open(path, "r", encoding="utf-8") as f:
+            for line in f:
+                try:
+                    record = json.loads(line)
+                except json.JSONDecodeError:
+                    continue
+                keys.add(record["key"])
+
+        return keys
+
+    def record(
+        self,
+        key: str,
+        source: str,
+        status: str,
+        destination: Optional[str] = None,
+        metadata: Optional[Dict[str, str]] = None,
+        **extra,
+    ):
+        """
+        Record the outcome of a handled file.
+        """
+        self._buffer.append(json.dumps({
+            "key": key,
+            "source": source,
+            "status": status,
+            "destination": destination,
+            "metadata": metadata,
+            "time": time.time(),
+            **extra,
+        }))
+
+        if (
+            len(self._buffer) >= self.flush_every
+            or time.monotonic() - self._last_flush >= self.flush_interval
+        ):
+            self.flush()
+
+    def merge(self, path: str):
+        """
+        Append the records of the journal at the given path, e.g. of a worker of a
+        distributed run. A truncated last line is ignored.
+        """
+        with open(path, "r", encoding="utf-8") as f:
+            for line in f:
+                try:
+                    json.loads(line)
+                except json.JSONDecodeError:
+                    continue
+                self._buffer.append(line.rstrip("\n"))
+        self.flush()
+
+    def flush(self):
+        """
+        Write the buffered records and fsync them to disk.
+        """
+        self._last_flush = time.monotonic()
+        if not self._buffer:
+            return
+
+        self._file.write("\n".join(self._buffer) + "\n")
+        self._buffer = []
+        self._file.flush()
+        os.fsync(self._file.fileno())
+
+    def close(self):
+        """
+        Flush the buffered records and close the journal.
+        """
+        self.flush()
+        self._file.close()
@@ -0,0 +1,169 @@
+"""
+This file contains the functions running a function in a sandboxed subprocess, with a
+wall-clock timeout and a memory limit, and measuring its peak memory.
+"""
+
+import os
+import time
+import threading
+import multiprocessing
+from typing import Any
+from typing import Callable
+from typing import Optional
+from typing import Tuple
+
+try:
+    import resource
+except ImportError:  # not available on Windows
+    resource = None
+
+from gpt_pdf_organizer.app.exception import ExtractionGuardException
+
+# seconds between two checks of the memory and the running time of the subprocess
+POLL_INTERVAL_SECONDS = 0.05
+PAGE_SIZE = os.sysconf("SC_PAGE_SIZE") if hasattr(os, "sysconf") else 4096
+
+
+def run_sandboxed(
+    fn: Callable,
+    args: tuple,
+    timeout_seconds: Optional[float] = None,
+    max_memory_bytes: Optional[int] = None,
+) -> Tuple[Any, Optional[int]]:
+    """
+    Run fn(*args) in a subprocess, killing it when it runs longer than timeout_seconds or
+    its resident memory grows past max_memory_bytes.
+
+    The memory of the subprocess is sampled from /proc where available, and otherwise
+    bounded by the size of its address space. A crash or a kill of the subprocess, e.g.
+    by the out-of-memory killer, does not affect the calling process.
+
+    Returns the result of the function and the peak resident memory of the subprocess, in
+    bytes, or None when it cannot be measured. Exceptions raised by the function are
+    raised again.
+
+    Raises:
+        ExtractionGuardException: when the subprocess was killed or died.
+    """
+    context = get_sandbox_context()
+    receiver, sender = context.Pipe(duplex=False)
+    process = context.Process(
+        target=_run_child, args=(sender, fn, args, max_memory_bytes), daemon=True
+    )
+    start = time.monotonic()
+    process.start()
+    sender.close()
+
+    peak_memory_bytes = None
+    try:
+        while not receiver.poll(POLL_INTERVAL_SECONDS):
+            memory_bytes = get_process_memory(process.pid)
+            if memory_bytes is not None:
+                peak_memory_bytes = max(peak_memory_bytes or 0, memory_bytes)
+            if max_memory_bytes is not None and memory_bytes is not None and memory_bytes > max_memory_bytes:
+                raise ExtractionGuardException(
+                    f"exceeded the memory limit of {max_memory_bytes / 2 ** 20:.0f} MB",
+                    peak_memory_bytes=peak_memory_bytes,
+                )
+            if timeout_seconds is not None and time.monotonic() - start > timeout_seconds:
+                raise ExtractionGuardException(
+                    f"exceeded the timeout of {timeout_seconds:g} seconds",
+                    peak_memory_bytes=peak_memory_bytes,
+                )
+
+        try:
+            failed, value, child_peak_memory_bytes = receiver.recv()
+        except EOFError:
+            process.join()
+            raise ExtractionGuardException(
+                f"the extraction process died with exit code {process.exitcode}",
+                peak_memory_bytes=peak_memory_bytes,
+            )
+    finally:
+        receiver.close()
+        if process.is_alive():
+            process.kill()
+        process.join()
+
+    if child_peak_memory_bytes is not None:
+        peak_memory_bytes = max(peak_memory_bytes or 0, child_peak_memory_bytes)
+    if failed:
+        if isinstance(value, MemoryError) and max_memory_bytes is not None:
+            raise ExtractionGuardException(
+                f"exceeded the memory limit of {max_memory_bytes / 2 ** 20:.0f} MB",
+                peak_memory_bytes=peak_memory_bytes,
+            ) from value
+        if isinstance(value, ExtractionGuardException) and value.peak_memory_bytes is None:
+            value.peak_memory_bytes = peak_memory_bytes
+        raise value
+    return value, peak_memory_bytes
+
+
+def get_sandbox_context() -> multiprocessing.context.BaseContext:
+    """
+    Get the multiprocessing context starting the sandboxed subprocesses.
+
+    Forking is the fastest, but forking a process running other threads may copy locks
+    held by them, so the subprocess is then started from a fork server, or spawned where
+    there is none, and fn and its arguments must be picklable.
+    """
+    start_methods = multiprocessing.get_all_start_methods()
+    if "fork" in start_methods and threading.active_count() == 1:
+        return multiprocessing.get_context("fork")
+    return multiprocessing.get_context("forkserver" if "forkserver" in start_methods else "spawn")
+
+
+def get_process_memory(pid: int) -> Optional[int]:
+    """
+    Get the resident memory of a process, in bytes, or None when it cannot be read.
+    """
+    try:
+        with open(f"/proc/{pid}/statm", "rb") as f:
+            return int(f.read().split()[1]) * PAGE_SIZE
+    except (OSError, IndexError, ValueError):
+        return None
+
+
+def get_peak_memory() -> Optional[int]:
+    """
+    Get the peak resident memory of the current process, in bytes, or None when it
+    cannot be read.
+    """
+    try:
+        with open("/proc/self/status", "rb") as f:
+            for line in f:
+                if line.startswith(b"VmHWM:"):
+                    return int(line.split()[1]) * 1024
+    except (OSError, IndexError, ValueError):
+        pass
+    return None
+
+
+def _run_child(sender, fn: Callable, args: tuple, max_memory_bytes: Optional[int]):
+    """
+    Run the function in the subprocess and send back whether it failed, its result or
+    exception, and the peak memory of the subprocess.
+    """
+    try:
+        # the peak memory of a forked process starts at the one of its parent
+        with open("/proc/self/clear_refs", "w") as f:
+            f.write("5")
+    except OSError:
+        pass
+    if max_memory_bytes is not None and resource is not None and get_process_memory(os.getpid()) is None:
+        # the parent cannot sample the memory of the process: bound its address space instead
+        resource.setrlimit(resource.RLIMIT_AS, (max_memory_bytes, max_memory_bytes))
+
+    failed, value = False, None
+    try:
+        value = fn(*args)
+    except BaseException as e:
+        failed, value = True, e
+    peak_memory_bytes = get_peak_memory()
+    try:
+        sender.send((failed, value, peak_memory_bytes))
+    except Exception as e:
+        # the result or the exception of the function could not be pickled
+        sender.send((True, RuntimeError(f"could not send back {type(value).__name__} {value}: {e}"), peak_memory_bytes))
+    finally:
+        sender.close()
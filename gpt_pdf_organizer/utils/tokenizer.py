@@ -1,32 +1,184 @@
 """
-This file contains the functions for tokenizing the text and selecting the first words within a token limit.
+This file contains the tokenizer service used to count tokens and clamp text to a token budget.
+
+tiktoken is only imported when a tokenizer is first loaded, as it is not needed to
+start the command line interface.
 """
 
-import tiktoken
+import os
+import functools
+import threading
+from contextlib import contextmanager
+from contextlib import nullcontext
+from typing import TYPE_CHECKING
+from typing import Iterator
+from typing import List
+from typing import Tuple
+
+from gpt_pdf_organizer.app.exception import TokenizerFileNotCachedException
+
+if TYPE_CHECKING:
+    import tiktoken
+
+# environment variables read when a tokenizer is loaded, inherited by the extraction
+# processes: the folder tiktoken caches its encoding files in, and whether downloading
+# the files missing from it is forbidden
+CACHE_DIR_ENV = "TIKTOKEN_CACHE_DIR"
+OFFLINE_ENV = "GPT_PDF_ORGANIZER_OFFLINE"
+
+# generous upper bound of the average number of characters per token, used to only
+# encode the prefix of a long text that is needed to fill a token budget
+PREFIX_CHARS_PER_TOKEN = 8
+WHITESPACE_CHARACTERS = " \n\t\r"
+
+
+class Tokenizer:
+    """
+    Counts and clamps text with the encoder of a given LLM model.
+
+    Text is encoded in a single call, and clamped at the token offset where the
+    budget is met, so the returned count is the exact number of tokens of the
+    returned text within the original text.
+    """
+
+    def __init__(self, encoder: "tiktoken.Encoding"):
+        self.encoder = encoder
+
+    def encode(self, text: str) -> List[int]:
+        """
+        Encode the given text, treating special tokens as plain text.
+        """
+        return self.encoder.encode(text, disallowed_special=())
+
+    def encode_batch(self, texts: List[str]) -> List[List[int]]:
+        """
+        Encode many texts at once, e.g. all the pages of a document.
+        """
+        return self.encoder.encode_batch(texts, disallowed_special=())
+
+    def count_tokens(self, text: str) -> int:
+        """
+        Count the tokens of the given text.
+        """
+        return len(self.encode(text))
+
+    def clamp_text_by_tokens(self, text: str, max_tokens: int) -> Tuple[str, int]:
+        """
+        Extracts the first max_tokens tokens from the given text.
+
+        Returns:
+            a tuple containing the extracted text and the total number of tokens effectivelly used.
+        """
+        if max_tokens <= 0:
+            return "", 0
+
+        # cutting right before a space starting a whitespace run keeps the prefix
+        # tokenized exactly as it is within the whole text, so its tokens can be used
+        # when they fill the budget: the pre-tokenizers of the GPT encodings may join a
+        # whitespace run, or newlines following punctuation, into a single token
+        prefix_end = text.rfind(" ", 0, max_tokens * PREFIX_CHARS_PER_TOKEN)
+        while prefix_end > 0 and text[prefix_end - 1] in WHITESPACE_CHARACTERS:
+            prefix_end = text.rfind(" ", 0, prefix_end)
+        if len(text) > max_tokens * PREFIX_CHARS_PER_TOKEN and prefix_end > 0:
+            prefix = text[:prefix_end]
+            tokens = self.encode(prefix)
+            if len(tokens) > max_tokens:
+                return self.clamp_tokens(prefix, tokens, max_tokens)
+
+        return self.clamp_tokens(text, self.encode(text), max_tokens)
+
+    def clamp_texts_by_tokens(self, texts: List[str], max_tokens: int) -> Tuple[str, int]:
+        """
+        Extracts the first max_tokens tokens from the concatenation of the given texts,
+        encoding all of them in one batch.
+
+        Returns:
+            a tuple containing the extracted text and the total number of tokens effectivelly used.
+        """
+        selected_text = ""
+        token_count = 0
+        for text, tokens in zip(texts, self.encode_batch(texts)):
+            if token_count >= max_tokens:
+                break
+            text, num_tokens = self.clamp_tokens(text, tokens, max_tokens - token_count)
+            selected_text += text
+            token_count += num_tokens
+
+        return selected_text, token_count
+
+    def clamp_tokens(self, text: str, tokens: List[int], max_tokens: int) -> Tuple[str, int]:
+        """
+        Clamps an already encoded text to its first max_tokens tokens.
+        """
+        if max_tokens <= 0:
+            return "", 0
+
+        if len(tokens) <= max_tokens:
+            return text, len(tokens)
+
+        # a token may end in the middle of a multi-byte character: back off to the
+        # last token boundary that is also a character boundary
+        num_tokens = max_tokens
+        while num_tokens > 0:
+            try:
+                return self.encoder.decode_bytes(tokens[:num_tokens]).decode("utf-8"), num_tokens
+            except UnicodeDecodeError:
+                num_tokens -= 1
+
+        return "", 0
+
+
+_load_lock = threading.Lock()
+
+
+def configure_tokenizer_cache(cache_dir: str, offline: bool = False):
+    """
+    Set the folder the encoding files of the tokenizers are cached in, and whether
+    downloading the files missing from it is forbidden, for the current process and
+    the processes it starts.
+    """
+    os.environ[CACHE_DIR_ENV] = cache_dir
+    if offline:
+        os.environ[OFFLINE_ENV] = "1"
+    else:
+        os.environ.pop(OFFLINE_ENV, None)
 
 
-def first_words_within_k_tokens(text: str, k: int, llm_model_name: str):
+@functools.lru_cache(maxsize=None)
+def get_tokenizer(llm_model_name: str) -> Tokenizer:
+    """
+    Get the tokenizer of the given model, loading its encoder only once per process.
 
-    # Tokenize the text
-    word_count = 0
-    token_count = 0
+    Raises:
+        TokenizerFileNotCachedException: in offline mode, when an encoding file of the
+            tokenizer is not in the cache folder.
+    """
+    import tiktoken
 
-    words = text.split()
-    encoder = tiktoken.encoding_for_model(llm_model_name)
+    offline = bool(os.environ.get(OFFLINE_ENV))
+    with _downloads_disabled() if offline else nullcontext():
+        return Tokenizer(tiktoken.encoding_for_model(llm_model_name))
 
-    for i, word in enumerate(words):
-        # Count the tokens for the current word
 
-        word_tokens = len(encoder.encode((word)))
+@contextmanager
+def _downloads_disabled() -> Iterator[None]:
+    """
+    Make tiktoken fail instead of downloading the encoding files missing from its cache.
+    """
+    import tiktoken.load
 
-        # Check if adding this word exceeds the token limit
-        if token_count + word_tokens > k:
-            break
+    with _load_lock:
+        read_file = tiktoken.load.read_file
+        tiktoken.load.read_file = _refuse_download
+        try:
+            yield
+        finally:
+            tiktoken.load.read_file = read_file
 
-        # Add the word's tokens to the total count and increment word count
-        token_count += word_tokens
-        word_count += 1
 
-    # Join the words that fit within the token and word limits
-    selected_text = " ".join(words[:word_count])
-    return selected_text, token_count
+def _refuse_download(blobpath: str) -> bytes:
+    raise TokenizerFileNotCachedException(
+        f"the tokenizer file {blobpath} is not in the cache folder {os.environ.get(CACHE_DIR_ENV)} "
+        f"and downloads are disabled in offline mode: run gpt-pdf-organizer warm where the network "
+        f"is available, then copy the cache folder"
+    )
@@ -0,0 +1,276 @@
+"""
+This file contains the watcher of an input folder, reporting its new and modified
+files once they are completely written.
+"""
+
+import os
+import time
+import ctypes
+import select
+import struct
+from typing import Dict
+from typing import Iterable
+from typing import List
+from typing import Optional
+from typing import Tuple
+
+from gpt_pdf_organizer.utils.file import FileScanner
+
+# inotify event masks and flags, from <sys/inotify.h>
+IN_MODIFY = 0x00000002
+IN_ATTRIB = 0x00000004
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_FROM = 0x00000040
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_DELETE = 0x00000200
+IN_Q_OVERFLOW = 0x00004000
+IN_IGNORED = 0x00008000
+IN_ISDIR = 0x40000000
+IN_NONBLOCK = 0o4000
+IN_CLOEXEC = 0o2000000
+WATCH_MASK = IN_MODIFY | IN_ATTRIB | IN_CLOSE_WRITE | IN_MOVED_FROM | IN_MOVED_TO | IN_CREATE | IN_DELETE
+# the header of an event, followed by its null-padded name: wd, mask, cookie and name length
+EVENT_HEADER = struct.Struct("iIII")
+READ_SIZE = 64 * 1024
+
+
+class Inotify:
+    """
+    A minimal binding of the Linux inotify API, with ctypes.
+    """
+
+    def __init__(self):
+        """
+        Raises:
+            OSError: when inotify is not available, e.g. on another operating system.
+        """
+        libc = ctypes.CDLL(None, use_errno=True)
+        if not hasattr(libc, "inotify_init1"):
+            raise OSError("inotify is not available on this system")
+        self._libc = libc
+        self.fd = libc.inotify_init1(IN_NONBLOCK | IN_CLOEXEC)
+        if self.fd < 0:
+            raise _get_os_error()
+        # the watched folders, by watch descriptor
+        self._folders: Dict[int, str] = {}
+
+    def add_watch(self, folder: str):
+        """
+        Watch the files created, modified, moved or deleted in a folder.
+        """
+        wd = self._libc.inotify_add_watch(self.fd, os.fsencode(folder), WATCH_MASK)
+        if wd < 0:
+            raise _get_os_error(folder)
+        self._folders[wd] = folder
+
+    def read_events(self, timeout: float) -> List[Tuple[Optional[str], int]]:
+        """
+        Wait up to timeout seconds for events and read them.
+
+        Returns the path and the mask of each event. The path is None when the event
+        queue overflowed, i.e. events were lost.
+        """
+        events = []
+        if not select.select([self.fd], [], [], timeout)[0]:
+            return events
+
+        while True:
+            try:
+                data = os.read(self.fd, READ_SIZE)
+            except BlockingIOError:
+                return events
+
+            offset = 0
+            while offset < len(data):
+                wd, mask, _, length = EVENT_HEADER.unpack_from(data, offset)
+                offset += EVENT_HEADER.size
+                name = os.fsdecode(data[offset:offset + length].rstrip(b"\0"))
+                offset += length
+                if mask & IN_Q_OVERFLOW:
+                    events.append((None, mask))
+                elif mask & IN_IGNORED:
+                    # the folder was deleted or unmounted
+                    self._folders.pop(wd, None)
+                elif wd in self._folders:
+                    events.append((os.path.join(self._folders[wd], name), mask))
+
+    def close(self):
+        os.close(self.fd)
+
+
+class FolderWatcher:
+    """
+    Watches the input folder of a file scanner for new and modified files, with inotify
+    on Linux, and otherwise by listing the folder every poll_interval seconds, which
+    use_polling forces, e.g. for network file systems not reporting remote writes.
+
+    A file is reported once its size and modification time stayed the same for
+    settle_seconds, so files still being written or copied are not reported partway.
+    The files present when the watcher starts are reported the same way. Files in one of
+    the ignored folders, e.g. the output folder, are not reported.
+    """
+
+    def __init__(
+        self,
+        scanner: FileScanner,
+        settle_seconds: float = 2.0,
+        poll_interval: float = 1.0,
+        use_polling: bool = False,
+        ignored_folders: Iterable[str] = (),
+    ):
+        self.scanner = scanner
+        self.settle_seconds = settle_seconds
+        self.poll_interval = poll_interval
+        self.use_polling = use_polling
+        self.ignored_folders = [os.path.abspath(folder) for folder in ignored_folders]
+        self._inotify: Optional[Inotify] = None
+        # the files not settled yet, with their last seen size and modification time and since when
+        self._pending: Dict[str, Tuple[Optional[Tuple[int, int]], float]] = {}
+        # the size and modification time of each file at the last listing, when polling
+        self._snapshot: Dict[str, Tuple[int, int]] = {}
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    @property
+    def backend(self) -> str:
+        return "inotify" if self._inotify is not None else "polling"
+
+    def start(self):
+        """
+        Start watching the folder, and take its current files as new files.
+
+        Falls back to polling when inotify is not available or runs out of watches.
+        """
+        if not self.use_polling and os.path.isdir(self.scanner.path):
+            try:
+                self._inotify = Inotify()
+                self._watch_tree(self.scanner.path)
+                return
+            except OSError:
+                self.close()
+        self._list_changed_files()
+
+    def get_settled_files(self, timeout: float) -> List[str]:
+        """
+        Wait up to timeout seconds for new or modified files to settle.
+
+        Returns the settled files, sorted by path, as soon as there are any.
+        """
+        deadline = time.monotonic() + timeout
+        while True:
+            settled_files = self._pop_settled_files()
+            remaining = deadline - time.monotonic()
+            if settled_files or remaining <= 0:
+                return settled_files
+
+            wait = min(remaining, self.poll_interval)
+            if self._pending:
+                wait = min(wait, self.settle_seconds)
+            if self._inotify is not None:
+                self._handle_events(self._inotify.read_events(wait))
+            else:
+                time.sleep(wait)
+                self._list_changed_files()
+
+    def close(self):
+        if self._inotify is not None:
+            self._inotify.close()
+            self._inotify = None
+
+    def _watch_tree(self, folder: str):
+        """
+        Watch a folder, and its subfolders when recursive, and take their files as new files.
+        """
+        visited_folders = set()
+        for root, folders, files in os.walk(folder, followlinks=self.scanner.follow_symlinks):
+            stat = os.stat(root)
+            if (stat.st_dev, stat.st_ino) in visited_folders:
+                folders[:] = []
+                continue
+            visited_folders.add((stat.st_dev, stat.st_ino))
+
+            self._inotify.add_watch(root)
+            for name in files:
+                path = os.path.join(root, name)
+                if self.scanner.accepts(path):
+                    self._mark_pending(path)
+
+            if not self.scanner.recursive:
+                break
+            folders[:] = [name for name in folders if not self._is_ignored(os.path.join(root, name))]
+
+    def _handle_events(self, events: List[Tuple[Optional[str], int]]):
+        for path, mask in events:
+            if path is None:
+                # events were lost: look at every file again
+                self._watch_tree(self.scanner.path)
+            elif self._is_ignored(path):
+                continue
+            elif mask & IN_ISDIR:
+                if mask & (IN_CREATE | IN_MOVED_TO) and self.scanner.recursive:
+                    # files may land in a new folder before it is watched
+                    try:
+                        self._watch_tree(path)
+                    except FileNotFoundError:
+                        # removed already
+                        pass
+            elif mask & (IN_DELETE | IN_MOVED_FROM):
+                self._pending.pop(path, None)
+            elif self.scanner.accepts(path):
+                self._mark_pending(path)
+
+    def _list_changed_files(self):
+        """
+        List the folder, and take the files new or modified since the last listing as new files.
+        """
+        snapshot = {}
+        for file in self.scanner:
+            if self._is_ignored(file):
+                continue
+            try:
+                stat = os.stat(file)
+            except OSError:
+                continue
+            snapshot[file] = (stat.st_size, stat.st_mtime_ns)
+            if self._snapshot.get(file) != snapshot[file]:
+                self._mark_pending(file)
+        self._snapshot = snapshot
+
+    def _mark_pending(self, file: str):
+        self._pending[file] = (None, time.monotonic())
+
+    def _pop_settled_files(self) -> List[str]:
+        now = time.monotonic()
+        settled_files = []
+        for file, (last_seen, since) in list(self._pending.items()):
+            try:
+                stat = os.stat(file)
+            except OSError:
+                # deleted or moved away before settling
+                del self._pending[file]
+                continue
+
+            seen = (stat.st_size, stat.st_mtime_ns)
+            if seen != last_seen:
+                self._pending[file] = (seen, now)
+            elif now - since >= self.settle_seconds:
+                del self._pending[file]
+                settled_files.append(file)
+        return sorted(settled_files)
+
+    def _is_ignored(self, path: str) -> bool:
+        path = os.path.abspath(path)
+        return any(
+            path == folder or path.startswith(folder + os.sep) for folder in self.ignored_folders
+        )
+
+
+def _get_os_error(filename: Optional[str] = None) -> OSError:
+    errno = ctypes.get_errno()
+    return OSError(errno, os.strerror(errno), filename)
@@ -0,0 +1,304 @@
+"""
+This file contains the work folder shared by the workers of a distributed run, through
+which they claim the files to handle with leases.
+"""
+
+import os
+import re
+import json
+import time
+import socket
+import hashlib
+import threading
+from typing import Callable
+from typing import Dict
+from typing import Iterable
+from typing import Iterator
+from typing import List
+from typing import Optional
+
+WORK_FOLDER_NAME = ".gpt-pdf-organizer-work"
+LEASE_SUFFIX = ".lease"
+DONE_SUFFIX = ".done"
+
+# the states of a file in the work folder
+CLAIMED = "claimed"
+LEASED = "leased"
+DONE = "done"
+
+
+def get_default_worker_id() -> str:
+    return f"{socket.gethostname()}-{os.getpid()}"
+
+
+class WorkFolder:
+    """
+    The folder of the output folder through which the workers of a distributed run,
+    on one host or several sharing the output folder, e.g. over NFS, split the files
+    of a common input folder between them. It holds:
+
+    - leases/: a lease file per file being handled, created atomically by the worker
+      claiming the file, and a done file per file handled.
+    - journals/, manifests/ and reports/: the run journal, library manifest and run
+      report of each worker, merged into those of the output folder once all the
+      workers are done.
+
+    A worker touches the leases it holds every heartbeat_seconds. A lease not touched
+    for lease_seconds, e.g. of a crashed worker, has expired, and its file is claimed
+    by another worker, so the clocks of the hosts must agree within lease_seconds
+    minus heartbeat_seconds. Files are identified by their path relative to the input
+    folder, their size and modification time, so the input folder may be mounted at
+    different paths on different hosts.
+    """
+
+    def __init__(
+        self,
+        path: str,
+        worker_id: Optional[str] = None,
+        lease_seconds: float = 60.0,
+        heartbeat_seconds: float = 10.0,
+        on_lease_lost: Optional[Callable[[str], None]] = None,
+    ):
+        """
+        Args:
+            path (str): The path of the work folder.
+            worker_id (str): The id of this worker, unique among the workers of the run,
+                the host name and process id by default.
+            lease_seconds (float): The seconds after which a lease not touched expires.
+            heartbeat_seconds (float): The seconds between two touches of the leases held.
+            on_lease_lost (Callable): Called with the file whose lease was taken over by
+                another worker while this worker was handling it.
+        """
+        self.path = path
+        self.worker_id = re.sub(r"[^A-Za-z0-9_.-]", "_", worker_id or get_default_worker_id())
+        self.lease_seconds = lease_seconds
+        self.heartbeat_seconds = heartbeat_seconds
+        self.on_lease_lost = on_lease_lost
+        self.leases_path = os.path.join(path, "leases")
+        self.journal_path = os.path.join(path, "journals", f"{self.worker_id}.jsonl")
+        self.manifest_path = os.path.join(path, "manifests", f"{self.worker_id}.sqlite")
+        self.report_path = os.path.join(path, "reports", f"{self.worker_id}.json")
+        self.input_path = None
+        self.started_at = None
+        # the lease name of each file held, by file
+        self._held: Dict[str, str] = {}
+        # the files leased by other workers when seen, by file
+        self._deferred: Dict[str, str] = {}
+        self._lock = threading.Lock()
+        self._stopped = threading.Event()
+        self._heartbeat = None
+
+    @staticmethod
+    def get_path(output_dir: str) -> str:
+        """
+        Get the path of the work folder of the given output directory.
+        """
+        return os.path.join(output_dir, WORK_FOLDER_NAME)
+
+    def start(self, input_path: str):
+        """
+        Start claiming the files of the given input path, and touching the leases held.
+        """
+        self.input_path = input_path
+        self.started_at = time.time()
+        os.makedirs(self.leases_path, exist_ok=True)
+        for path in (self.journal_path, self.manifest_path, self.report_path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        self._stopped.clear()
+        self._heartbeat = threading.Thread(target=self._touch_leases, daemon=True)
+        self._heartbeat.start()
+
+    def claim_files(self, files: Iterable[str]) -> Iterator[str]:
+        """
+        Claim the given files, yielding the ones claimed by this worker.
+
+        Files done are skipped, and files leased by another worker are deferred, to be
+        claimed from wait_for_released_files when their lease is released or expires.
+        """
+        for file in files:
+            try:
+                name = self._get_lease_name(file)
+            except OSError:
+                # gone since it was listed, e.g. moved by another worker
+                continue
+            state = self._claim(file, name)
+            if state == CLAIMED:
+                yield file
+            elif state == LEASED:
+                self._deferred[file] = name
+
+    def has_deferred_files(self) -> bool:
+        return bool(self._deferred)
+
+    def wait_for_released_files(self) -> List[str]:
+        """
+        Wait until some of the deferred files are no longer leased by another worker,
+        looking at their leases every heartbeat_seconds.
+
+        Returns the released files, to be claimed again, or no file once all the
+        deferred files are done. Must not be called while holding leases, since the
+        other workers may be waiting for them.
+        """
+        while self._deferred:
+            released = []
+            for file, name in list(self._deferred.items()):
+                if os.path.exists(self._get_done_path(name)):
+                    del self._deferred[file]
+                elif not self._is_leased(self._get_lease_path(name)):
+                    del self._deferred[file]
+                    released.append(file)
+            if released or not self._deferred:
+                return released
+            time.sleep(self.heartbeat_seconds)
+        return []
+
+    def complete(self, file: str, status: str):
+        """
+        Mark a file held by this worker as done, so no worker handles it again.
+        """
+        with self._lock:
+            name = self._held.pop(file, None)
+        if name is None:
+            return
+
+        with open(self._get_done_path(name), "w", encoding="utf-8") as f:
+            json.dump({"worker": self.worker_id, "file": file, "status": status, "time": time.time()}, f)
+        self._remove_lease(name)
+
+    def release(self, file: str):
+        """
+        Release the lease of a file held by this worker without marking it as done, so
+        another worker, or a later run, handles it.
+        """
+        with self._lock:
+            name = self._held.pop(file, None)
+        if name is not None:
+            self._remove_lease(name)
+
+    def close(self):
+        """
+        Stop touching the leases, and release the leases of the files not done.
+        """
+        self._stopped.set()
+        if self._heartbeat is not None:
+            self._heartbeat.join()
+            self._heartbeat = None
+        for file in list(self._held):
+            self.release(file)
+        self._deferred.clear()
+
+    def count_active_leases(self) -> int:
+        """
+        Count the leases not expired, i.e. the files being handled by workers.
+        """
+        count = 0
+        for root, _, names in os.walk(self.leases_path):
+            count += sum(
+                1 for name in names
+                if name.endswith(LEASE_SUFFIX) and self._is_leased(os.path.join(root, name))
+            )
+        return count
+
+    def _claim(self, file: str, name: str) -> str:
+        """
+        Claim a file by creating its lease, taking over an expired lease.
+        """
+        lease_path = self._get_lease_path(name)
+        for _ in range(2):
+            if os.path.exists(self._get_done_path(name)):
+                return DONE
+            try:
+                # creating a file exclusively is atomic, also over NFS 3 and later
+                fd = os.open(lease_path, os.O_CREAT | os.O_EXCL | os.O_WRONLY, 0o644)
+            except FileExistsError:
+                if self._is_leased(lease_path):
+                    return LEASED
+                self._take_over_expired_lease(lease_path)
+                continue
+
+            with os.fdopen(fd, "w", encoding="utf-8") as f:
+                json.dump({"worker": self.worker_id, "file": file, "time": time.time()}, f)
+            # the file may have been done by the previous holder of the lease meanwhile
+            if os.path.exists(self._get_done_path(name)):
+                os.remove(lease_path)
+                return DONE
+            with self._lock:
+                self._held[file] = name
+            return CLAIMED
+
+        return LEASED
+
+    def _take_over_expired_lease(self, lease_path: str):
+        """
+        Remove an expired lease, unless another worker removed or renewed it meanwhile.
+        """
+        # renaming is atomic: a single worker gets the lease out of the way
+        expired_path = f"{lease_path}.expired-{self.worker_id}"
+        try:
+            os.rename(lease_path, expired_path)
+        except FileNotFoundError:
+            return
+        if self._is_leased(expired_path):
+            # renewed by its holder since it was found expired: put it back
+            try:
+                os.link(expired_path, lease_path)
+            except FileExistsError:
+                pass
+        os.remove(expired_path)
+
+    def _is_leased(self, lease_path: str) -> bool:
+        """
+        Whether a lease exists and was touched within lease_seconds.
+        """
+        try:
+            return time.time() - os.stat(lease_path).st_mtime < self.lease_seconds
+        except FileNotFoundError:
+            return False
+
+    def _touch_leases(self):
+        while not self._stopped.wait(self.heartbeat_seconds):
+            with self._lock:
+                held = list(self._held.items())
+            for file, name in held:
+                lease_path = self._get_lease_path(name)
+                if self._is_owned(lease_path):
+                    try:
+                        os.utime(lease_path)
+                        continue
+                    except FileNotFoundError:
+                        pass
+                with self._lock:
+                    lost = self._held.pop(file, None) is not None
+                if lost and self.on_lease_lost is not None:
+                    self.on_lease_lost(file)
+
+    def _is_owned(self, lease_path: str) -> bool:
+        try:
+            with open(lease_path, "r", encoding="utf-8") as f:
+                return json.load(f).get("worker") == self.worker_id
+        except (OSError, ValueError):
+            return False
+
+    def _remove_lease(self, name: str):
+        lease_path = self._get_lease_path(name)
+        # the lease may have expired and been taken over by another worker
+        if self._is_owned(lease_path):
+            try:
+                os.remove(lease_path)
+            except FileNotFoundError:
+                pass
+
+    def _get_lease_name(self, file: str) -> str:
+        stat = os.stat(file)
+        relative_path = os.path.relpath(file, self.input_path).replace(os.sep, "/")
+        name = hashlib.sha256(f"{relative_path}:{stat.st_size}:{stat.st_mtime_ns}".encode()).hexdigest()
+        # spread the leases over subfolders, so no folder holds too many files
+        folder = os.path.join(self.leases_path, name[:2])
+        os.makedirs(folder, exist_ok=True)
+        return os.path.join(name[:2], name)
+
+    def _get_lease_path(self, name: str) -> str:
+        return os.path.join(self.leases_path, name + LEASE_SUFFIX)
+
+    def _get_done_path(self, name: str) -> str:
+        return os.path.join(self.leases_path, name + DONE_SUFFIX)
@@ -0,0 +1,107 @@
+import json
+import threading
+from http.server import BaseHTTPRequestHandler
+from http.server import ThreadingHTTPServer
+
+import pytest
+
+# the synthetic PDF writer is shared with the benchmarks
+from benchmarks.corpus import write_pdf  # noqa: F401
+from fakes import FakePromptQuerier
+from fakes import build_config
+from gpt_pdf_organizer.app.application import Application
+
+
+class ChatCompletionsStubServer(ThreadingHTTPServer):
+    """
+    A local HTTP server speaking the chat-completions protocol.
+
+    Every request is answered with the next configured (status, body, headers)
+    response, or with a completion whose content is `content` when none is left.
+    """
+
+    daemon_threads = True
+
+    def __init__(self):
+        super().__init__(("127.0.0.1", 0), ChatCompletionsStubHandler)
+        self.content = "{}"
+        self.responses = []
+        self.requests = []
+        self.connections = set()
+        self.lock = threading.Lock()
+
+    @property
+    def base_url(self) -> str:
+        return f"http://127.0.0.1:{self.server_address[1]}/v1"
+
+    def next_response(self, request_body):
+        with self.lock:
+            self.requests.append(request_body)
+            if self.responses:
+                return self.responses.pop(0)
+
+        return 200, {
+            "id": "chatcmpl-stub",
+            "object": "chat.completion",
+            "created": 0,
+            "model": request_body.get("model", "stub"),
+            "choices": [
+                {
+                    "index": 0,
+                    "finish_reason": "stop",
+                    "message": {"role": "assistant", "content": self.content},
+                }
+            ],
+            "usage": {"prompt_tokens": 10, "completion_tokens": 5, "total_tokens": 15},
+        }, {}
+
+
+class ChatCompletionsStubHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def do_POST(self):
+        length = int(self.headers.get("Content-Length", 0))
+        request_body = json.loads(self.rfile.read(length) or b"{}")
+        with self.server.lock:
+            self.server.connections.add(self.client_address)
+
+        status, body, headers = self.server.next_response(request_body)
+        payload = json.dumps(body).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(payload)))
+        for key, value in headers.items():
+            self.send_header(key, value)
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def log_message(self, format, *args):
+        pass
+
+
+@pytest.fixture
+def chat_completions_server():
+    server = ChatCompletionsStubServer()
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+@pytest.fixture
+def make_app(tmp_path, monkeypatch):
+    """
+    Build applications running from tmp_path, with a config of the given overrides and
+    a FakePromptQuerier unless another querier is given.
+    """
+    monkeypatch.chdir(tmp_path)
+
+    def make_app(config=None, prompt_querier=None, **kwargs):
+        return Application(
+            config=build_config(config),
+            prompt_querier=prompt_querier if prompt_querier is not None else FakePromptQuerier(),
+            **kwargs,
+        )
+
+    return make_app
@@ -0,0 +1,63 @@
+"""
+The fakes the application is tested with: a prompt querier answering without the LLM,
+and the config of the applications under test.
+"""
+
+import json
+
+from gpt_pdf_organizer.service.prompt_querier import PromptQuerier
+from gpt_pdf_organizer.service.prompt_querier import PromptResponse
+from gpt_pdf_organizer.utils.config import Config
+
+# the config of the applications under test, before their overrides
+BASE_CONFIG = {
+    "apiKey": "test",
+    "llmModelName": "gpt-4o-mini",
+    "organizer": {"subfoldersFromAttributes": ["content_type"], "filenameFromAttributes": ["title"]},
+    # the tests tell files apart by their input order
+    "input": {"sortEntries": True},
+    "cache": {"enabled": False},
+    "deduplication": {"enabled": False},
+}
+
+
+def answer_with_last_word(prompt):
+    return {"title": prompt.split()[-1], "content_type": "article"}
+
+
+class FakePromptQuerier(PromptQuerier):
+    """
+    Answers each prompt with the metadata returned by answer, the last word of the
+    prompt as the title of an article by default, recording the prompts. Texts are
+    clamped by words rather than tokens.
+
+    The querier is sent to the extraction processes along with its clamp, so answer
+    must be a module-level function.
+    """
+
+    def __init__(self, answer=answer_with_last_word, usage=None):
+        super().__init__()
+        self.answer = answer
+        self.usage = usage
+        self.prompts = []
+
+    def query(self, prompt, system_prompt=None, **kwargs):
+        self.prompts.append(prompt)
+        return PromptResponse(json.dumps(self.answer(prompt)), self.usage)
+
+    def clamp_text_by_tokens(self, text, max_tokens):
+        words = text.split()[:max_tokens]
+        return " ".join(words), len(words)
+
+
+def build_config(overrides=None):
+    """
+    Build the config of BASE_CONFIG with the given overrides, merged into its sections.
+    """
+    raw = {key: dict(value) if isinstance(value, dict) else value for key, value in BASE_CONFIG.items()}
+    for key, value in (overrides or {}).items():
+        if isinstance(value, dict) and isinstance(raw.get(key), dict):
+            raw[key].update(value)
+        else:
+            raw[key] = value
+    return Config(raw)
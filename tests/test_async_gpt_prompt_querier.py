@@ -0,0 +1,126 @@
+import json
+import pickle
+import asyncio
+
+from conftest import write_pdf
+from gpt_pdf_organizer.app.application import Application
+from gpt_pdf_organizer.infrastructure.async_gpt_prompt_querier import AsyncGPTPromptQuerier
+from gpt_pdf_organizer.utils.config import Config
+
+METADATA = {
+    "content_type": "article",
+    "author": "Ada Lovelace",
+    "year": "1843",
+    "title": "Notes on the Analytical Engine",
+    "topic": "Formal Sciences",
+    "sub_topic": "Computer Science",
+}
+
+
+class WhitespaceAsyncGPTPromptQuerier(AsyncGPTPromptQuerier):
+    """
+    Counts whitespace separated words as tokens, so tests need no tokenizer download.
+    """
+
+    def clamp_text_by_tokens(self, text, max_tokens):
+        words = text.split()[:max_tokens]
+        return " ".join(words), len(words)
+
+
+def build_querier(server, **config):
+    return WhitespaceAsyncGPTPromptQuerier({
+        "api_key": "test",
+        "model_name": "gpt-3.5-turbo",
+        "max_tokens": 50,
+        "base_url": server.base_url,
+        "max_retries": 0,
+        **config,
+    })
+
+
+def test_aquery_returns_completion_content(chat_completions_server):
+    chat_completions_server.content = "hello"
+    querier = build_querier(chat_completions_server)
+
+    async def run():
+        try:
+            return await querier.aquery("a prompt")
+        finally:
+            await querier.aclose()
+
+    assert asyncio.run(run()) == "hello"
+    assert chat_completions_server.requests[0]["model"] == "gpt-3.5-turbo"
+
+
+def test_concurrent_queries_share_pooled_connections(chat_completions_server):
+    querier = build_querier(chat_completions_server, max_connections=2)
+
+    async def run():
+        try:
+            for _ in range(3):
+                await asyncio.gather(*(querier.aquery("a prompt") for _ in range(4)))
+        finally:
+            await querier.aclose()
+
+    asyncio.run(run())
+    assert len(chat_completions_server.requests) == 12
+    assert len(chat_completions_server.connections) <= 2
+
+
+def test_blocking_query_reuses_client(chat_completions_server):
+    chat_completions_server.content = "hello"
+    querier = build_querier(chat_completions_server)
+    try:
+        assert querier.query("a prompt") == "hello"
+        assert querier.query("a prompt") == "hello"
+    finally:
+        querier.close()
+
+    assert len(chat_completions_server.connections) == 1
+
+
+def test_querier_can_be_pickled_after_use(chat_completions_server):
+    querier = build_querier(chat_completions_server)
+    try:
+        querier.query("a prompt")
+        restored = pickle.loads(pickle.dumps(querier))
+    finally:
+        querier.close()
+
+    assert restored.clamp_text_by_tokens("one two three", 2) == ("one two", 2)
+
+
+def test_organize_async_classifies_files(chat_completions_server, tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    chat_completions_server.content = json.dumps(METADATA)
+    input_dir = tmp_path / "input"
+    input_dir.mkdir()
+    for i in range(3):
+        write_pdf(input_dir / f"file{i}.pdf", [f"Notes on the Analytical Engine {i}"])
+
+    config = Config({
+        "apiKey": "test",
+        "maxNumTokens": 5,
+        "organizer": {
+            "subfoldersFromAttributes": ["content_type"],
+            "filenameFromAttributes": ["year", "title"],
+        },
+        "concurrency": {"queryWorkers": 2},
+    })
+    app = Application(config=config, prompt_querier=build_querier(chat_completions_server))
+    output_dir = tmp_path / "output"
+
+    async def run():
+        progress = []
+        try:
+            async for _ in app.organize_async(str(input_dir), str(output_dir)):
+                progress.append((app.get_progress(), app.get_error()))
+        finally:
+            await app.prompt_querier.aclose()
+        return progress
+
+    progress = asyncio.run(run())
+
+    assert [error for _, error in progress] == [False, False, False]
+    assert progress[-1][0] == 100.0
+    assert (output_dir / "article" / "1843-notes_on_the_analytical_engine.pdf").exists()
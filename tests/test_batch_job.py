@@ -0,0 +1,48 @@
+import json
+
+from conftest import write_pdf
+from fakes import FakePromptQuerier
+from gpt_pdf_organizer.infrastructure.local_batch_backend import LocalBatchBackend
+from gpt_pdf_organizer.utils.batch_job import BatchJobFolder
+
+
+def answer_book_or_fail(prompt):
+    """
+    Answers with the last word of the prompt as title, and fails on "broken" documents.
+    """
+    title = prompt.split()[-1]
+    if title == "broken":
+        raise RuntimeError("the backend failed")
+    return {"title": title, "content_type": "book"}
+
+
+def test_prepared_batch_job_is_applied_from_local_backend_results(tmp_path, make_app):
+    input_dir = tmp_path / "input"
+    input_dir.mkdir()
+    for title in ["alpha", "broken", "gamma"]:
+        write_pdf(input_dir / f"{title}.pdf", [title])
+
+    querier = FakePromptQuerier(answer_book_or_fail)
+    app = make_app({"maxNumTokens": 1}, querier)
+    job_folder = BatchJobFolder(str(tmp_path / "job"))
+
+    assert len(list(app.prepare_batch_job(str(input_dir), job_folder))) == 3
+    with open(job_folder.requests_path) as f:
+        requests = [json.loads(line) for line in f]
+    assert [request["custom_id"] for request in requests] == ["file-0", "file-1", "file-2"]
+    assert requests[0]["body"]["messages"][0]["role"] == "system"
+
+    backend = LocalBatchBackend(str(tmp_path / "batches"), querier)
+    batch_id = backend.submit(job_folder.requests_path)
+    status = backend.poll(batch_id)
+    assert status.finished
+    assert (status.completed, status.failed) == (2, 1)
+    backend.download_results(batch_id, job_folder.results_path)
+
+    output_dir = tmp_path / "output"
+    errors = [app.get_error() for _ in app.apply_batch_job(job_folder, str(output_dir))]
+
+    assert errors == [False, True, False]
+    assert (output_dir / "book" / "alpha.pdf").exists()
+    assert (output_dir / "book" / "gamma.pdf").exists()
+    assert (output_dir / "unclassified" / "broken.pdf").exists()
@@ -0,0 +1,41 @@
+import re
+
+from conftest import write_pdf
+from fakes import FakePromptQuerier
+from fakes import answer_with_last_word
+
+
+def answer_batch(prompt):
+    """
+    Answers batched queries with the title of each document, leaving out the answer of
+    the document whose content contains "forgotten".
+    """
+    documents = re.findall(r"Document id: (\S+)\n.*?\n\n(\S+)", prompt)
+    if not documents:
+        return answer_with_last_word(prompt)
+    return [
+        {"id": document_id, "title": title, "content_type": "article"}
+        for document_id, title in documents
+        if title != "forgotten"
+    ]
+
+
+def test_batched_files_are_mapped_back_and_failed_items_retried(tmp_path, make_app):
+    input_dir = tmp_path / "input"
+    input_dir.mkdir()
+    titles = ["alpha", "beta", "forgotten", "delta", "epsilon"]
+    for i, title in enumerate(titles):
+        write_pdf(input_dir / f"file{i}.pdf", [title])
+
+    querier = FakePromptQuerier(answer_batch)
+    app = make_app({"maxNumTokens": 1, "batch": {"size": 2}, "concurrency": {"queryWorkers": 2}}, querier)
+    output_dir = tmp_path / "output"
+
+    for _ in app.organize(str(input_dir), str(output_dir)):
+        assert not app.get_error()
+
+    for title in titles:
+        assert (output_dir / "article" / f"{title}.pdf").exists()
+    # two batches of two files, the file left alone in its batch, and the forgotten file retried
+    assert len(querier.prompts) == 4
+    assert app.get_stats()["batch_retries"] == 1
@@ -0,0 +1,22 @@
+from benchmarks.bench_suite import compare_results
+from benchmarks.corpus import build_corpus
+
+
+def test_corpora_are_deterministic(tmp_path):
+    first = build_corpus(str(tmp_path / "first"), num_files=3, min_pages=1, max_pages=4, seed=7)
+    second = build_corpus(str(tmp_path / "second"), num_files=3, min_pages=1, max_pages=4, seed=7)
+
+    for a, b in zip(first, second):
+        assert open(a, "rb").read() == open(b, "rb").read()
+
+
+def test_results_slower_than_the_threshold_are_regressions():
+    baseline = {"organize.small.sequential.file": 0.1, "helpers.build_filename": 1e-5, "helpers.new": 1.0}
+    current = {
+        "organize.small.sequential.file": 0.105,
+        "organize.small.sequential.stage.query": 9.0,
+        "helpers.build_filename": 2e-5,
+        "helpers.read_pdf_page": 0.1,
+    }
+
+    assert compare_results(baseline, current, threshold=0.1) == ["helpers.build_filename"]
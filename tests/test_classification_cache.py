@@ -0,0 +1,58 @@
+import time
+
+from gpt_pdf_organizer.utils.classification_cache import ClassificationCache
+
+METADATA = {"title": "Notes on the Analytical Engine", "year": "1843"}
+
+
+def test_key_depends_on_classification_settings():
+    key = ClassificationCache.build_key("hash", "gpt-3.5-turbo", 1, 1000)
+
+    assert key == ClassificationCache.build_key("hash", "gpt-3.5-turbo", 1, 1000)
+    assert key != ClassificationCache.build_key("hash", "gpt-4", 1, 1000)
+    assert key != ClassificationCache.build_key("hash", "gpt-3.5-turbo", 2, 1000)
+    assert key != ClassificationCache.build_key("hash", "gpt-3.5-turbo", 1, 500)
+
+
+def test_cached_metadata_persists_across_instances(tmp_path):
+    path = str(tmp_path / "cache.sqlite")
+    cache = ClassificationCache(path)
+    cache.put("key", METADATA)
+    cache.close()
+
+    cache = ClassificationCache(path)
+    assert cache.get("key") == METADATA
+    assert cache.get("missing") is None
+    cache.close()
+
+
+def test_refresh_mode_skips_reads_but_stores(tmp_path):
+    path = str(tmp_path / "cache.sqlite")
+    cache = ClassificationCache(path, read_enabled=False)
+    cache.put("key", METADATA)
+    assert cache.get("key") is None
+    cache.close()
+
+    assert ClassificationCache(path).get("key") == METADATA
+
+
+def test_least_recently_used_entries_are_evicted(tmp_path):
+    path = str(tmp_path / "cache.sqlite")
+    cache = ClassificationCache(path, max_entries=2)
+    for key in ["a", "b", "c"]:
+        cache.put(key, METADATA)
+        time.sleep(0.01)
+    cache.get("a")
+    cache.close()
+
+    cache = ClassificationCache(path, max_entries=2)
+    assert cache.get("a") == METADATA
+    assert cache.get("b") is None
+    assert cache.get("c") == METADATA
+
+
+def test_expired_entries_are_not_returned(tmp_path):
+    cache = ClassificationCache(str(tmp_path / "cache.sqlite"), max_age_days=-1)
+    cache.put("key", METADATA)
+
+    assert cache.get("key") is None
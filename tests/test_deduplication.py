@@ -0,0 +1,57 @@
+import shutil
+
+import pytest
+
+from conftest import write_pdf
+from fakes import FakePromptQuerier
+from gpt_pdf_organizer.utils.duplicate_index import DuplicateIndex
+
+ABSTRACT = " ".join(
+    f"{word}{i // 27}" for i, word in enumerate(
+        "we study the convergence of stochastic gradient descent on overparameterized "
+        "neural networks and show that wide networks reach a global minimum at a linear rate".split() * 4
+    )
+)
+
+
+def answer_with_first_word(prompt):
+    return {"title": prompt.split("\n\n")[-1].split()[0], "content_type": "article"}
+
+
+def test_duplicate_index_matches_exact_and_near_duplicates_only():
+    index = DuplicateIndex(threshold=0.8)
+
+    assert index.add_or_match("ab" * 32, ABSTRACT) is None
+    assert index.add_or_match("ab" * 32, "").exact
+    near = index.add_or_match("cd" * 32, ABSTRACT + " downloaded from arxiv")
+    assert near.representative == 0 and not near.exact
+    assert index.add_or_match("ef" * 32, "an unrelated text " + ABSTRACT[::-1]) is None
+    assert index.add_or_match("12" * 32, "too short") is None
+    assert len(index) == 3
+
+
+@pytest.mark.parametrize("query_workers", [1, 2])
+def test_duplicates_reuse_the_classification_of_their_representative(tmp_path, make_app, query_workers):
+    input_dir = tmp_path / "input"
+    input_dir.mkdir()
+    write_pdf(input_dir / "a.pdf", ["sgd " + ABSTRACT])
+    shutil.copyfile(input_dir / "a.pdf", input_dir / "b.pdf")
+    write_pdf(input_dir / "c.pdf", ["sgd " + ABSTRACT + " downloaded from arxiv"])
+    write_pdf(input_dir / "d.pdf", ["other " + ABSTRACT[::-1]])
+
+    querier = FakePromptQuerier(answer_with_first_word)
+    app = make_app({
+        "maxNumTokens": 100,
+        "concurrency": {"queryWorkers": query_workers},
+        "pageTextStore": {"enabled": False},
+        "deduplication": {"enabled": True, "nearDuplicates": True, "duplicatesFolder": True},
+    }, querier)
+
+    output_dir = tmp_path / "output"
+    list(app.organize(str(input_dir), str(output_dir)))
+
+    assert len(querier.prompts) == 2
+    assert app.get_stats()["exact_duplicates"] == 1
+    assert app.get_stats()["near_duplicates"] == 1
+    assert sorted(p.name for p in (output_dir / "duplicates").iterdir()) == ["b.pdf", "c.pdf"]
+    assert sorted(p.name for p in (output_dir / "article").iterdir()) == ["other.pdf", "sgd.pdf"]
@@ -0,0 +1,118 @@
+import os
+import json
+import time
+import multiprocessing
+
+from conftest import write_pdf
+from fakes import FakePromptQuerier
+from fakes import answer_with_last_word
+from fakes import build_config
+from gpt_pdf_organizer.app.application import Application
+from gpt_pdf_organizer.gpt_pdf_organizer import merge_distributed_run
+from gpt_pdf_organizer.utils.library_manifest import LibraryManifest
+from gpt_pdf_organizer.utils.run_journal import RunJournal
+from gpt_pdf_organizer.utils.work_folder import WorkFolder
+
+NUM_FILES = 12
+
+
+def answer_slowly(prompt):
+    """
+    Answers with the last word of the prompt as title, slowly enough for the workers
+    to handle files at the same time.
+    """
+    time.sleep(0.05)
+    return answer_with_last_word(prompt)
+
+
+def build_worker_config(worker_id):
+    return build_config({
+        "organizer": {"placement": "move"},
+        "journal": {"enabled": True},
+        "manifest": {"enabled": True},
+        "distributed": {"enabled": True, "workerId": worker_id, "leaseSeconds": 2, "heartbeatSeconds": 0.2},
+    })
+
+
+def run_worker(worker_id, input_dir, output_dir):
+    app = Application(config=build_worker_config(worker_id), prompt_querier=FakePromptQuerier(answer_slowly))
+    list(app.organize(input_dir, output_dir))
+
+
+def test_workers_share_the_files_and_their_results_are_merged(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    input_dir = tmp_path / "input"
+    input_dir.mkdir()
+    for i in range(NUM_FILES):
+        write_pdf(input_dir / f"paper{i}.pdf", [f"paper{i}"])
+    output_dir = tmp_path / "output"
+
+    context = multiprocessing.get_context("fork")
+    workers = [
+        context.Process(target=run_worker, args=(f"worker-{i}", str(input_dir), str(output_dir)))
+        for i in range(3)
+    ]
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join(timeout=120)
+        assert worker.exitcode == 0
+
+    assert sorted(os.listdir(output_dir / "article")) == sorted(f"paper{i}.pdf" for i in range(NUM_FILES))
+    work_path = WorkFolder.get_path(str(output_dir))
+    # each file was handled by a single worker
+    sources = []
+    for name in os.listdir(os.path.join(work_path, "journals")):
+        with open(os.path.join(work_path, "journals", name)) as f:
+            sources += [json.loads(line)["source"] for line in f]
+    assert sorted(sources) == sorted(str(input_dir / f"paper{i}.pdf") for i in range(NUM_FILES))
+
+    merge_distributed_run(build_worker_config(None), str(output_dir))
+
+    assert not os.path.exists(work_path)
+    assert len(RunJournal.load_handled_file_keys(RunJournal.get_path(str(output_dir)))) == NUM_FILES
+    manifest = LibraryManifest(LibraryManifest.get_path(str(output_dir)))
+    try:
+        assert manifest.count(status="classified") == NUM_FILES
+    finally:
+        manifest.close()
+    with open(output_dir / "gpt-pdf-organizer-report.json") as f:
+        report = json.load(f)
+    assert report["files"] == NUM_FILES
+    assert sorted(worker["worker"] for worker in report["workers"]) == ["worker-0", "worker-1", "worker-2"]
+    assert report["stages"]["query"]["count"] == NUM_FILES
+
+
+def test_files_of_a_crashed_worker_are_taken_over_once_their_lease_expires(tmp_path):
+    input_dir = tmp_path / "input"
+    input_dir.mkdir()
+    for name in ["crashed", "live"]:
+        (input_dir / f"{name}.pdf").write_bytes(b"%PDF")
+    files = [str(input_dir / "crashed.pdf"), str(input_dir / "live.pdf")]
+    path = WorkFolder.get_path(str(tmp_path / "output"))
+
+    other = WorkFolder(path, worker_id="other", lease_seconds=1, heartbeat_seconds=0.1)
+    other.start(str(input_dir))
+    assert list(other.claim_files(files)) == files
+    # the other worker crashes holding its first file, and keeps handling the second one
+    with other._lock:
+        del other._held[files[0]]
+
+    worker = WorkFolder(path, worker_id="worker", lease_seconds=1, heartbeat_seconds=0.1)
+    worker.start(str(input_dir))
+    try:
+        assert list(worker.claim_files(files)) == []
+        assert worker.has_deferred_files()
+
+        assert worker.wait_for_released_files() == [files[0]]
+        assert list(worker.claim_files([files[0]])) == [files[0]]
+        other.complete(files[1], "classified")
+        assert worker.wait_for_released_files() == []
+        assert not worker.has_deferred_files()
+
+        worker.complete(files[0], "classified")
+        assert list(worker.claim_files(files)) == []
+        assert worker.count_active_leases() == 0
+    finally:
+        worker.close()
+        other.close()
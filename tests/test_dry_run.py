@@ -0,0 +1,73 @@
+import json
+
+from conftest import write_pdf
+from fakes import FakePromptQuerier
+from gpt_pdf_organizer.domain.prompt_builder import SYSTEM_PROMPT
+from gpt_pdf_organizer.domain.prompt_builder import build_query_from_content
+from gpt_pdf_organizer.domain.projection import project_query_seconds
+from gpt_pdf_organizer.utils.classification_cache import ClassificationCache
+
+
+def fail(prompt):
+    raise AssertionError("the LLM must not be queried")
+
+
+def test_dry_run_plans_tokens_cost_and_destinations_without_querying(tmp_path, make_app):
+    input_dir = tmp_path / "input"
+    input_dir.mkdir()
+    write_pdf(input_dir / "alpha.pdf", ["alpha paper about hippocampal place cells"])
+    write_pdf(input_dir / "beta.pdf", ["beta paper about transformers"])
+    write_pdf(input_dir / "copy.pdf", ["alpha paper about hippocampal place cells"])
+    output_dir = tmp_path / "output"
+    plan_path = tmp_path / "plan.jsonl"
+
+    querier = FakePromptQuerier(fail)
+    cache = ClassificationCache(str(tmp_path / "cache.sqlite"))
+    app = make_app({
+        "organizer": {"subfoldersFromAttributes": ["topic"]},
+        "cache": {"enabled": True, "path": str(tmp_path / "cache.sqlite")},
+        "deduplication": {"enabled": True},
+        "dryRun": {"queryLatencySeconds": 3.0, "planPath": str(plan_path)},
+        "rateLimit": {"requestsPerMinute": 1},
+    }, querier, classification_cache=cache)
+    # a classification cached by a previous run
+    cache.put(
+        app._prepare_file(str(input_dir / "beta.pdf")).cache_key,
+        {"title": "Beta", "topic": "Machine Learning", "content_type": "article"},
+    )
+
+    plans = {plan.file: plan for plan in app.plan(str(input_dir), str(output_dir))}
+    cache.close()
+
+    assert not output_dir.exists()
+    alpha = plans[str(input_dir / "alpha.pdf")]
+    assert alpha.status == "query"
+    assert alpha.destination == str(output_dir / "{topic}" / "{title}.pdf")
+    prompt = build_query_from_content("alpha paper about hippocampal place cells")
+    assert alpha.prompt_tokens == querier.count_prompt_tokens(prompt, system_prompt=SYSTEM_PROMPT)
+    assert alpha.prompt_tokens > len(prompt.split()) + len(SYSTEM_PROMPT.split())
+    assert plans[str(input_dir / "beta.pdf")].status == "cached"
+    assert plans[str(input_dir / "beta.pdf")].destination == str(output_dir / "machine_learning" / "beta.pdf")
+    assert plans[str(input_dir / "copy.pdf")].status == "duplicate"
+    assert plans[str(input_dir / "copy.pdf")].prompt_tokens == 0
+
+    with open(plan_path) as f:
+        assert [json.loads(line)["status"] for line in f] == ["query", "cached", "duplicate"]
+
+    report = app.get_plan_report()
+    assert report["files"] == 3
+    assert report["statuses"] == {"query": 1, "cached": 1, "resolved": 0, "duplicate": 1, "unclassified": 0}
+    assert report["queries"] == 1
+    assert report["cost"]["prompt_tokens"] == alpha.prompt_tokens
+    assert report["cost"]["completion_tokens"] == 100
+    assert report["cost"]["estimated_usd"] > 0
+    # a single request per minute is slower than the query latency
+    assert report["query_seconds"] == 60.0
+    assert report["projected_seconds"] >= 60.0
+
+
+def test_projected_query_time_is_bound_by_concurrency_and_rate_limits():
+    assert project_query_seconds(100, 10000, latency_seconds=2.0, concurrency=4) == 50.0
+    assert project_query_seconds(100, 10000, latency_seconds=2.0, concurrency=4, requests_per_minute=60) == 100.0
+    assert project_query_seconds(100, 10000, latency_seconds=2.0, concurrency=4, tokens_per_minute=1000) == 600.0
+    assert project_query_seconds(0, 0, latency_seconds=2.0, concurrency=4) == 0.0
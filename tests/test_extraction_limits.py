@@ -0,0 +1,121 @@
+import json
+import asyncio
+import time
+import threading
+
+import pytest
+
+from conftest import write_pdf
+from fakes import FakePromptQuerier
+from gpt_pdf_organizer.app.exception import ExtractionGuardException
+from gpt_pdf_organizer.infrastructure.pdfium_text_extractor import PdfiumTextExtractor
+from gpt_pdf_organizer.infrastructure.pdfminer_text_extractor import PdfminerTextExtractor
+from gpt_pdf_organizer.utils.pdf import ExtractionLimits
+from gpt_pdf_organizer.utils.pdf import PdfplumberTextExtractor
+from gpt_pdf_organizer.utils.pdf import extract_document
+from gpt_pdf_organizer.utils.run_journal import RunJournal
+from gpt_pdf_organizer.utils.sandbox import get_sandbox_context
+from gpt_pdf_organizer.utils.sandbox import run_sandboxed
+
+
+def answer_a_title(prompt):
+    return {"title": "A title", "content_type": "article"}
+
+
+def allocate(num_bytes):
+    data = bytearray(num_bytes)
+    time.sleep(10)
+    return len(data)
+
+
+@pytest.mark.parametrize("text_extractor", [PdfplumberTextExtractor(), PdfminerTextExtractor(), PdfiumTextExtractor()])
+def test_page_and_character_limits_stop_every_backend(tmp_path, text_extractor):
+    pdf_path = write_pdf(tmp_path / "file.pdf", ["short page", "a much longer second page", "third"])
+    clamp = FakePromptQuerier().clamp_text_by_tokens
+
+    with pytest.raises(ExtractionGuardException, match="more than 2 pages"):
+        extract_document(pdf_path, 100, clamp, text_extractors=[text_extractor], limits=ExtractionLimits(max_num_pages=2))
+    with pytest.raises(ExtractionGuardException, match="page 2 has more than 15 characters"):
+        extract_document(pdf_path, 100, clamp, text_extractors=[text_extractor], limits=ExtractionLimits(max_page_chars=15))
+
+    document = extract_document(
+        pdf_path, 100, clamp, text_extractors=[text_extractor],
+        limits=ExtractionLimits(max_num_pages=3, max_page_chars=30),
+    )
+    assert document.content == "short pagea much longer second pagethird"
+
+
+def test_sandbox_kills_extractions_past_their_timeout_or_memory_limit():
+    assert run_sandboxed(len, ("four",))[0] == 4
+
+    with pytest.raises(ExtractionGuardException, match="timeout of 0.5 seconds"):
+        run_sandboxed(time.sleep, (10,), timeout_seconds=0.5)
+
+    with pytest.raises(ExtractionGuardException, match="memory limit of 64 MB") as e:
+        run_sandboxed(allocate, (256 * 2 ** 20,), timeout_seconds=5, max_memory_bytes=64 * 2 ** 20)
+    assert e.value.peak_memory_bytes > 64 * 2 ** 20
+
+
+def test_sandbox_does_not_fork_while_other_threads_run():
+    stop = threading.Event()
+    thread = threading.Thread(target=stop.wait)
+    thread.start()
+    try:
+        assert get_sandbox_context().get_start_method() == "forkserver"
+        assert run_sandboxed(len, ("four",))[0] == 4
+        with pytest.raises(ExtractionGuardException, match="timeout of 0.5 seconds"):
+            run_sandboxed(time.sleep, (10,), timeout_seconds=0.5)
+    finally:
+        stop.set()
+        thread.join()
+
+
+def test_files_tripping_a_limit_are_unclassified_with_their_reason(tmp_path, make_app):
+    input_dir = tmp_path / "input"
+    input_dir.mkdir()
+    write_pdf(input_dir / "paper.pdf", ["some words " * 20])
+    write_pdf(input_dir / "atlas.pdf", ["map"] * 5)
+
+    app = make_app(
+        {"extraction": {"maxNumPages": 3, "timeoutSeconds": 30, "maxMemoryMb": 1024}, "journal": {"enabled": True}},
+        FakePromptQuerier(answer_a_title),
+    )
+    output_dir = tmp_path / "output"
+    list(app.organize(str(input_dir), str(output_dir)))
+
+    assert (output_dir / "article" / "a_title.pdf").exists()
+    assert (output_dir / "unclassified" / "atlas.pdf").exists()
+    assert app.get_stats()["extractions_stopped"] == 1
+
+    with open(RunJournal.get_path(str(output_dir))) as f:
+        records = {record["source"]: record for record in map(json.loads, f)}
+    atlas = records[str(input_dir / "atlas.pdf")]
+    assert atlas["status"] == "unclassified"
+    assert atlas["reason"] == "file has more than 3 pages"
+    # the extraction of each file ran in its own sandboxed process
+    assert records[str(input_dir / "paper.pdf")]["peak_memory_bytes"] > 0
+    assert atlas["peak_memory_bytes"] > 0
+    assert app.get_run_report()["peak_memory_bytes"] > 0
+
+
+def test_async_runs_record_the_sandboxed_extractions(tmp_path, make_app):
+    input_dir = tmp_path / "input"
+    input_dir.mkdir()
+    write_pdf(input_dir / "paper.pdf", ["some words " * 20])
+    write_pdf(input_dir / "atlas.pdf", ["map"] * 5)
+
+    app = make_app({
+        "maxNumTokens": 5,
+        "concurrency": {"queryWorkers": 2},
+        "extraction": {"maxNumPages": 3, "maxMemoryMb": 512},
+    }, FakePromptQuerier(answer_a_title))
+    output_dir = tmp_path / "output"
+
+    async def organize():
+        return [app.get_error() async for _ in app.organize_async(str(input_dir), str(output_dir))]
+
+    assert sorted(asyncio.run(organize())) == [False, True]
+    assert (output_dir / "article" / "a_title.pdf").exists()
+    assert (output_dir / "unclassified" / "atlas.pdf").exists()
+    assert app.get_stats()["extractions_stopped"] == 1
+    assert app.get_run_report()["peak_memory_bytes"] > 0
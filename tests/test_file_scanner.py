@@ -0,0 +1,25 @@
+import os
+
+from gpt_pdf_organizer.utils.file import FileScanner
+
+
+def touch(path):
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.write_bytes(b"")
+
+
+def test_recursive_scan_matches_extensions_and_patterns_and_stops_at_link_loops(tmp_path):
+    for name in ["b.pdf", "a.PDF", "notes.txt", "sub/c.pdf", "sub/draft-d.pdf", "skip/e.pdf"]:
+        touch(tmp_path / name)
+    os.symlink(tmp_path, tmp_path / "sub" / "loop")
+
+    scanner = FileScanner(
+        str(tmp_path), ["pdf"], recursive=True, exclude=["skip", "sub/draft-*"], sort_entries=True
+    )
+    files = [os.path.relpath(file, tmp_path) for file in scanner]
+
+    assert files == ["a.PDF", "b.pdf", os.path.join("sub", "c.pdf")]
+    assert scanner.finished and scanner.num_files == 3
+
+    scanner = FileScanner(str(tmp_path), ["pdf"], include=["b*"])
+    assert [os.path.basename(file) for file in scanner] == ["b.pdf"]
@@ -0,0 +1,28 @@
+from gpt_pdf_organizer.domain.prompt_builder import SYSTEM_PROMPT
+from gpt_pdf_organizer.domain.prompt_builder import build_query_from_content
+from gpt_pdf_organizer.infrastructure.gpt_prompt_querier import GPTPromptQuerier
+
+
+def test_content_is_sent_once_after_the_static_system_prompt(chat_completions_server):
+    chat_completions_server.content = "{}"
+    querier = GPTPromptQuerier({
+        "api_key": "test",
+        "model_name": "gpt-3.5-turbo",
+        "max_tokens": 50,
+        "base_url": chat_completions_server.base_url,
+        "max_retries": 0,
+    })
+
+    responses = [
+        querier.query(build_query_from_content(content), system_prompt=SYSTEM_PROMPT)
+        for content in ["first document", "second document"]
+    ]
+
+    first, second = (request["messages"] for request in chat_completions_server.requests)
+    assert first[0] == second[0] == {"role": "system", "content": SYSTEM_PROMPT}
+    assert [message["role"] for message in first] == ["system", "user"]
+    assert "first document" in first[1]["content"]
+    assert "first document" not in SYSTEM_PROMPT
+    assert responses[0] == "{}"
+    assert responses[0].usage.prompt_tokens == 10
+    assert responses[0].usage.completion_tokens == 5
@@ -0,0 +1,89 @@
+from conftest import write_pdf
+from fakes import FakePromptQuerier
+from gpt_pdf_organizer.domain.attribute import Attribute
+from gpt_pdf_organizer.utils.library_manifest import LibraryManifest
+
+PAPERS = {
+    "hippocampus": {"author": "Jane Doe, John Smith", "year": "2019", "topic": "Neuroscience"},
+    "cortex": {"author": "John Smith and Ana Lopez", "year": "2019", "topic": "Neurology"},
+    "transformers": {"author": "Jane Doe", "year": "2017", "topic": "Machine Learning"},
+}
+
+
+def answer_paper(prompt):
+    title = next(title for title in PAPERS if title in prompt)
+    return {"title": title, "content_type": "article", **PAPERS[title]}
+
+
+def fail(prompt):
+    raise AssertionError("the LLM must not be queried")
+
+
+def test_manifest_answers_attribute_filters_from_indexes(tmp_path, make_app):
+    input_dir = tmp_path / "input"
+    input_dir.mkdir()
+    for title in PAPERS:
+        write_pdf(input_dir / f"{title}.pdf", [f"{title} paper"])
+    output_dir = tmp_path / "output"
+
+    app = make_app(
+        {"organizer": {"subfoldersFromAttributes": ["topic"]}, "manifest": {"enabled": True}},
+        FakePromptQuerier(answer_paper),
+    )
+    list(app.organize(str(input_dir), str(output_dir)))
+
+    manifest = LibraryManifest(LibraryManifest.get_path(str(output_dir)))
+    try:
+        entries = manifest.query({Attribute.YEAR: "2019", Attribute.TOPIC: "neuro*", Attribute.AUTHOR: "jane doe"})
+        assert [entry.destination for entry in entries] == [
+            str(output_dir / "neuroscience" / "hippocampus.pdf")
+        ]
+        entry = entries[0]
+        assert entry.source == str(input_dir / "hippocampus.pdf")
+        assert entry.status == "classified"
+        assert entry.model == "gpt-4o-mini"
+        assert entry.metadata["author"] == "Jane Doe, John Smith"
+        assert entry.elapsed_seconds > 0
+
+        assert len(manifest.query({Attribute.AUTHOR: "John Smith"})) == 2
+        assert len(manifest.query({Attribute.YEAR: "2019"}, limit=1)) == 1
+        assert manifest.query({Attribute.TOPIC: "Biology"}) == []
+
+        for filters in ({Attribute.YEAR: "2019"}, {Attribute.TOPIC: "neuro*"}, {Attribute.AUTHOR: "Jane Doe"}):
+            sql, parameters = manifest._build_query(filters, status=None, limit=None)
+            plan = manifest._connection.execute("EXPLAIN QUERY PLAN " + sql, parameters).fetchall()
+            assert not any(detail.startswith("SCAN files") for _, _, _, detail in plan), plan
+    finally:
+        manifest.close()
+
+
+def test_relayout_moves_files_without_querying_the_llm(tmp_path, make_app):
+    input_dir = tmp_path / "input"
+    input_dir.mkdir()
+    for title in PAPERS:
+        write_pdf(input_dir / f"{title}.pdf", [f"{title} paper"])
+    output_dir = tmp_path / "output"
+    app = make_app(
+        {"organizer": {"subfoldersFromAttributes": ["topic"]}, "manifest": {"enabled": True}},
+        FakePromptQuerier(answer_paper),
+    )
+    list(app.organize(str(input_dir), str(output_dir)))
+
+    app = make_app({"organizer": {"subfoldersFromAttributes": ["year", "topic"]}}, FakePromptQuerier(fail))
+    assert len(list(app.relayout(str(output_dir)))) == 3
+
+    assert (output_dir / "2019" / "neuroscience" / "hippocampus.pdf").exists()
+    assert (output_dir / "2019" / "neurology" / "cortex.pdf").exists()
+    assert (output_dir / "2017" / "machine_learning" / "transformers.pdf").exists()
+    # the folders of the previous layout were emptied and removed
+    assert not (output_dir / "neuroscience").exists()
+    assert app.get_stats()["relayout_moved"] == 3
+
+    manifest = LibraryManifest(LibraryManifest.get_path(str(output_dir)))
+    try:
+        assert [entry.destination for entry in manifest.query({Attribute.AUTHOR: "ana lopez"})] == [
+            str(output_dir / "2019" / "neurology" / "cortex.pdf")
+        ]
+        assert manifest.count() == 3
+    finally:
+        manifest.close()
@@ -0,0 +1,105 @@
+from conftest import write_pdf
+from fakes import FakePromptQuerier
+from gpt_pdf_organizer.domain.attribute import Attribute
+from gpt_pdf_organizer.infrastructure.embedded_metadata_resolver import EmbeddedMetadataResolver
+from gpt_pdf_organizer.infrastructure.identifier_metadata_resolver import IdentifierMetadataResolver
+from gpt_pdf_organizer.utils.pdf import extract_document
+
+XMP = """<?xpacket begin="" id="W5M0MpCehiHzreSzNTczkc9d"?>
+<x:xmpmeta xmlns:x="adobe:ns:meta/">
+  <rdf:RDF xmlns:rdf="http://www.w3.org/1999/02/22-rdf-syntax-ns#">
+    <rdf:Description rdf:about="" xmlns:dc="http://purl.org/dc/elements/1.1/"
+        xmlns:xmp="http://ns.adobe.com/xap/1.0/" xmp:CreateDate="2021-04-02T10:00:00Z">
+      <dc:title><rdf:Alt><rdf:li xml:lang="x-default">Attention Is All You Need</rdf:li></rdf:Alt></dc:title>
+      <dc:creator><rdf:Seq><rdf:li>Ashish Vaswani</rdf:li><rdf:li>Noam Shazeer</rdf:li></rdf:Seq></dc:creator>
+    </rdf:Description>
+  </rdf:RDF>
+</x:xmpmeta>
+<?xpacket end="w"?>"""
+
+
+def answer_a_paper(prompt):
+    return {"title": "A Paper", "year": "1999"}
+
+
+def answer_a_book(prompt):
+    return {"title": "A Book", "content_type": "book"}
+
+
+def test_embedded_metadata_is_read_from_xmp_and_document_info(tmp_path):
+    pdf_path = write_pdf(
+        tmp_path / "file.pdf",
+        ["first page"],
+        info={"Title": "Microsoft Word - draft3.docx", "Author": "Jane Doe"},
+        xmp=XMP,
+    )
+    document = extract_document(pdf_path, 5, FakePromptQuerier().clamp_text_by_tokens)
+
+    resolved = EmbeddedMetadataResolver().resolve(document.document_info, document.first_page_text)
+
+    assert document.first_page_text == "first page"
+    assert resolved[Attribute.TITLE].value == "Attention Is All You Need"
+    assert resolved[Attribute.AUTHOR].value == "Ashish Vaswani, Noam Shazeer"
+    assert resolved[Attribute.YEAR].value == "2021"
+
+    resolved = EmbeddedMetadataResolver().resolve(
+        {"Title": "Microsoft Word - draft3.docx", "Author": "Jane Doe"}, ""
+    )
+    assert Attribute.TITLE not in resolved
+    assert resolved[Attribute.AUTHOR].value == "Jane Doe"
+
+
+def test_identifiers_resolve_content_type_and_year():
+    resolver = IdentifierMetadataResolver()
+
+    arxiv = resolver.resolve({}, "arXiv:1706.03762v5 [cs.CL] 6 Dec 2017")
+    assert arxiv[Attribute.CONTENT_TYPE].value == "article"
+    assert arxiv[Attribute.YEAR].value == "2017"
+
+    book = resolver.resolve({}, "ISBN 978-0-306-40615-7\nCopyright © 2009 Springer")
+    assert book[Attribute.CONTENT_TYPE].value == "book"
+    assert book[Attribute.YEAR].value == "2009"
+
+    assert resolver.resolve({}, "ISBN 978-0-306-40615-8") == {}
+    assert resolver.resolve({}, "doi:10.1145/3292500.3330701")[Attribute.CONTENT_TYPE].value == "article"
+
+
+def test_llm_is_only_queried_for_unresolved_attributes(tmp_path, make_app):
+    input_dir = tmp_path / "input"
+    input_dir.mkdir()
+    write_pdf(input_dir / "resolved.pdf", ["arXiv:1706.03762v5 [cs.CL]"], xmp=XMP)
+    write_pdf(input_dir / "unresolved.pdf", ["arXiv:1706.03762v5 [cs.CL] a paper"])
+
+    querier = FakePromptQuerier(answer_a_paper)
+    app = make_app(
+        {"maxNumTokens": 5, "organizer": {"filenameFromAttributes": ["year", "title"]}},
+        querier,
+        metadata_resolvers=[EmbeddedMetadataResolver(), IdentifierMetadataResolver()],
+    )
+    output_dir = tmp_path / "output"
+
+    for _ in app.organize(str(input_dir), str(output_dir)):
+        assert not app.get_error()
+
+    assert (output_dir / "article" / "2017-attention_is_all_you_need.pdf").exists()
+    # resolved values take precedence over the ones returned by the LLM
+    assert (output_dir / "article" / "2017-a_paper.pdf").exists()
+    assert len(querier.prompts) == 1
+    assert querier.prompts[0].startswith("Only output the following properties: TITLE.")
+    assert app.get_stats()["resolved_without_llm"] == 1
+
+
+def test_a_doi_alone_does_not_resolve_the_content_type(tmp_path, make_app):
+    input_dir = tmp_path / "input"
+    input_dir.mkdir()
+    write_pdf(input_dir / "file.pdf", ["doi:10.1007/978-3-030-12345-6 a book"])
+
+    querier = FakePromptQuerier(answer_a_book)
+    app = make_app({"maxNumTokens": 5}, querier, metadata_resolvers=[IdentifierMetadataResolver()])
+    output_dir = tmp_path / "output"
+
+    for _ in app.organize(str(input_dir), str(output_dir)):
+        assert not app.get_error()
+
+    assert (output_dir / "book" / "a_book.pdf").exists()
+    assert len(querier.prompts) == 1
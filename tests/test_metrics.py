@@ -0,0 +1,69 @@
+import json
+
+import pytest
+
+from conftest import write_pdf
+from fakes import FakePromptQuerier
+from gpt_pdf_organizer.domain.pricing import estimate_cost
+from gpt_pdf_organizer.service.metrics_hook import MetricsHook
+from gpt_pdf_organizer.service.prompt_querier import TokenUsage
+
+
+class RecordingMetricsHook(MetricsHook):
+
+    def __init__(self):
+        self.timings = []
+        self.counters = []
+        self.reports = []
+
+    def on_timing(self, stage, seconds):
+        self.timings.append(stage)
+
+    def on_counter(self, name, value):
+        self.counters.append((name, value))
+
+    def on_report(self, report):
+        self.reports.append(report)
+
+
+def test_run_report_times_each_stage_and_estimates_the_cost(tmp_path, make_app):
+    input_dir = tmp_path / "input"
+    input_dir.mkdir()
+    write_pdf(input_dir / "first.pdf", ["some words " * 20])
+    write_pdf(input_dir / "second.pdf", ["other words " * 20])
+
+    report_path = tmp_path / "reports" / "run.json"
+    prometheus_path = tmp_path / "reports" / "run.prom"
+    hook = RecordingMetricsHook()
+    querier = FakePromptQuerier(
+        usage=TokenUsage(prompt_tokens=1000, completion_tokens=100, cached_prompt_tokens=200)
+    )
+    app = make_app({
+        "llmModelName": "gpt-4o-mini-2024-07-18",
+        "metrics": {"reportPath": str(report_path), "prometheusPath": str(prometheus_path)},
+    }, querier, metrics_hooks=[hook])
+    list(app.organize(str(input_dir), str(tmp_path / "output")))
+
+    report = json.loads(report_path.read_text())
+    for stage in ["discovery", "open", "extraction", "clamp", "prompt", "query", "parse", "placement", "file"]:
+        assert report["stages"][stage]["count"] == 2, stage
+    assert report["files"] == 2
+    assert report["cost"]["prompt_tokens"] == 2000
+    assert report["cost"]["completion_tokens"] == 200
+    # priced as gpt-4o-mini, with the cached prompt tokens at their discounted price
+    assert report["cost"]["estimated_usd"] == pytest.approx(
+        (1600 * 0.15 + 400 * 0.075 + 200 * 0.6) / 1_000_000
+    )
+
+    prometheus = prometheus_path.read_text()
+    assert 'gpt_pdf_organizer_stage_seconds_count{stage="query"} 2' in prometheus
+    assert 'gpt_pdf_organizer_events_total{name="prompt_tokens"} 2000' in prometheus
+
+    assert hook.timings.count("query") == 2
+    assert ("completion_tokens", 100) in hook.counters
+    assert hook.reports == [report]
+
+
+def test_unknown_models_have_no_estimated_cost():
+    assert estimate_cost("local-llama", 1000, 100) is None
+    assert estimate_cost("local-llama", 1_000_000, 0, prices={"local-llama": {"prompt": 1.0, "completion": 2.0}}) == 1.0
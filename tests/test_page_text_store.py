@@ -0,0 +1,47 @@
+from conftest import write_pdf
+from gpt_pdf_organizer.utils import pdf
+from gpt_pdf_organizer.utils.page_text_store import PageTextStore
+from gpt_pdf_organizer.utils.page_text_store import StoredDocument
+from gpt_pdf_organizer.utils.page_text_store import compress_text
+
+
+def clamp_words(text, max_tokens):
+    words = text.split()[:max_tokens]
+    return " ".join(words), len(words)
+
+
+def test_stored_pages_round_trip(tmp_path):
+    store = PageTextStore(str(tmp_path))
+    pages = ["first page", "", "third page with ünïcode"]
+    store.save("abcdef", StoredDocument([compress_text(p) for p in pages], complete=True))
+
+    stored = store.load("abcdef")
+    assert [stored.page_text(i) for i in range(len(stored))] == pages
+    assert stored.complete
+    assert store.load("missing") is None
+
+
+def test_stored_pages_are_not_extracted_again(tmp_path, monkeypatch):
+    pdf_path = write_pdf(tmp_path / "file.pdf", [f"page {i} one two three" for i in range(6)])
+    store = PageTextStore(str(tmp_path / "pages"))
+    expected = pdf.read_first_k_tokens_from_pdf(pdf_path, 12, clamp_words)
+
+    extracted_from_page = []
+    iter_pages_text = pdf.PdfDocument.iter_pages_text
+
+    def spy(self, start_page=0, **kwargs):
+        extracted_from_page.append(start_page)
+        yield from iter_pages_text(self, start_page, **kwargs)
+
+    monkeypatch.setattr(pdf.PdfDocument, "iter_pages_text", spy)
+
+    def read(k):
+        return pdf.read_first_k_tokens_from_pdf(
+            pdf_path, k, clamp_words, content_hash="hash", page_text_store=store
+        )
+
+    assert read(12) == expected
+    assert read(12) == expected
+    assert extracted_from_page == [0]
+    assert read(18) == pdf.read_first_k_tokens_from_pdf(pdf_path, 18, clamp_words)
+    assert extracted_from_page == [0, 3, 0]
@@ -0,0 +1,76 @@
+import pdfplumber
+import pytest
+from pdfplumber.page import Page
+
+from conftest import write_pdf
+from gpt_pdf_organizer.app.exception import ExtractionGuardException
+from gpt_pdf_organizer.utils.pdf import ExtractionLimits
+from gpt_pdf_organizer.utils.pdf import PdfDocument
+from gpt_pdf_organizer.utils.pdf import extract_document
+
+
+def clamp_text_by_tokens(text, max_tokens):
+    words = text.split()[:max_tokens]
+    return " ".join(words), len(words)
+
+
+@pytest.fixture
+def pdf_reads(monkeypatch):
+    """
+    Count the PDF files opened and the pages whose text was extracted by pdfplumber.
+    """
+    reads = {"opens": 0, "pages": []}
+    open_pdf = pdfplumber.open
+    extract_text = Page.extract_text
+
+    def counting_open(*args, **kwargs):
+        reads["opens"] += 1
+        return open_pdf(*args, **kwargs)
+
+    def counting_extract_text(page, *args, **kwargs):
+        reads["pages"].append(page.page_number)
+        return extract_text(page, *args, **kwargs)
+
+    monkeypatch.setattr(pdfplumber, "open", counting_open)
+    monkeypatch.setattr(Page, "extract_text", counting_extract_text)
+    return reads
+
+
+def test_document_is_opened_once_and_read_until_the_token_budget_is_met(tmp_path, pdf_reads):
+    pdf_path = write_pdf(
+        tmp_path / "file.pdf", [f"page{i} " + "word " * 9 for i in range(5)], info={"Title": "A title"}
+    )
+
+    document = extract_document(pdf_path, 15, clamp_text_by_tokens)
+
+    # the metadata and the text are read from the same open document
+    assert pdf_reads == {"opens": 1, "pages": [1, 2]}
+    assert document.document_info == {"Title": "A title"}
+    assert document.first_page_text.startswith("page0 ")
+    assert document.content.startswith("page0 ")
+    assert "page1" in document.content
+
+
+def test_pages_are_extracted_lazily_from_the_start_page(tmp_path, pdf_reads):
+    pdf_path = write_pdf(tmp_path / "file.pdf", ["one", "two", "three"])
+
+    with PdfDocument(pdf_path) as document:
+        pages_text = document.iter_pages_text(start_page=1)
+        assert next(pages_text) == "two"
+
+    assert pdf_reads == {"opens": 1, "pages": [2]}
+
+
+def test_pages_past_max_chars_are_rejected_before_their_text_is_extracted(tmp_path, pdf_reads):
+    pdf_path = write_pdf(tmp_path / "file.pdf", ["short", "a much longer page", "short"])
+
+    with PdfDocument(pdf_path) as document:
+        pages_text = document.iter_pages_text(max_chars=10)
+        assert next(pages_text) == "short"
+        with pytest.raises(ExtractionGuardException, match="page 2 has more than 10 characters"):
+            next(pages_text)
+
+    with pytest.raises(ExtractionGuardException):
+        extract_document(pdf_path, 100, clamp_text_by_tokens, limits=ExtractionLimits(max_page_chars=10))
+
+    assert pdf_reads == {"opens": 2, "pages": [1, 1]}
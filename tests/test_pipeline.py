@@ -0,0 +1,60 @@
+import json
+import time
+import argparse
+
+import pytest
+
+from conftest import write_pdf
+from fakes import FakePromptQuerier
+from fakes import answer_with_last_word
+from gpt_pdf_organizer.gpt_pdf_organizer import positive_int
+from gpt_pdf_organizer.utils.run_journal import RunJournal
+
+NUM_FILES = 6
+
+
+def answer_earlier_files_last(prompt):
+    """
+    Answers like answer_with_last_word, more slowly for the first files, so their
+    queries finish after the ones of the files following them.
+    """
+    answer = answer_with_last_word(prompt)
+    time.sleep(0.05 * (NUM_FILES - int(answer["title"][len("paper"):])))
+    return answer
+
+
+@pytest.mark.parametrize("extraction_workers, query_workers", [(2, 1), (1, 3), (2, 3)])
+def test_pipelined_files_are_placed_in_input_order(tmp_path, make_app, extraction_workers, query_workers):
+    input_dir = tmp_path / "input"
+    input_dir.mkdir()
+    for i in range(NUM_FILES):
+        write_pdf(input_dir / f"file{i}.pdf", [f"paper{i}"])
+
+    app = make_app(
+        {
+            "concurrency": {"extractionWorkers": extraction_workers, "queryWorkers": query_workers},
+            "journal": {"enabled": True},
+        },
+        FakePromptQuerier(answer_earlier_files_last),
+    )
+    output_dir = tmp_path / "output"
+
+    progress = []
+    for _ in app.organize(str(input_dir), str(output_dir)):
+        assert not app.get_error()
+        source = input_dir / f"file{len(progress)}.pdf"
+        assert app.get_process_message().startswith(f"successfully processed file {source} ")
+        progress.append((app.get_num_files_handled(), app.get_progress()))
+
+    assert progress == [(i, pytest.approx(100.0 * i / NUM_FILES)) for i in range(1, NUM_FILES + 1)]
+    assert sorted(p.name for p in (output_dir / "article").iterdir()) == [f"paper{i}.pdf" for i in range(NUM_FILES)]
+    with open(RunJournal.get_path(str(output_dir))) as f:
+        assert [json.loads(line)["source"] for line in f] == [
+            str(input_dir / f"file{i}.pdf") for i in range(NUM_FILES)
+        ]
+
+
+def test_worker_counts_must_be_positive():
+    assert positive_int("3") == 3
+    with pytest.raises(argparse.ArgumentTypeError, match="must be at least 1"):
+        positive_int("0")
@@ -0,0 +1,34 @@
+import os
+import errno
+
+import pytest
+
+from gpt_pdf_organizer.utils.placement import place_file
+
+
+@pytest.mark.parametrize("mode", ["copy", "hardlink", "symlink", "reflink", "copy_file_range"])
+def test_placed_file_replaces_destination_with_source_content(tmp_path, mode):
+    source = tmp_path / "source.pdf"
+    source.write_bytes(b"%PDF-1.4 content")
+    dest = tmp_path / "dest.pdf"
+    dest.write_bytes(b"previous file")
+
+    place_file(str(source), str(dest), mode)
+
+    assert dest.read_bytes() == b"%PDF-1.4 content"
+    assert sorted(os.listdir(tmp_path)) == ["dest.pdf", "source.pdf"]
+    assert (os.stat(dest).st_ino == os.stat(source).st_ino) == (mode in ("hardlink", "symlink"))
+
+
+def test_hardlink_across_filesystems_falls_back_to_a_copy(tmp_path, monkeypatch):
+    def link(source, dest):
+        raise OSError(errno.EXDEV, "Invalid cross-device link")
+
+    monkeypatch.setattr(os, "link", link)
+    source = tmp_path / "source.pdf"
+    source.write_bytes(b"%PDF-1.4 content")
+
+    used_mode = place_file(str(source), str(tmp_path / "dest.pdf"), "hardlink")
+
+    assert used_mode in ("copy_file_range", "copy")
+    assert (tmp_path / "dest.pdf").read_bytes() == b"%PDF-1.4 content"
@@ -0,0 +1,114 @@
+from types import SimpleNamespace
+
+from fakes import FakePromptQuerier
+from gpt_pdf_organizer.app.exception import RateLimitException
+from gpt_pdf_organizer.infrastructure import rate_limited_prompt_querier
+from gpt_pdf_organizer.infrastructure.gpt_prompt_querier import GPTPromptQuerier
+from gpt_pdf_organizer.infrastructure.rate_limited_prompt_querier import CONCURRENCY_POLL_INTERVAL
+from gpt_pdf_organizer.infrastructure.rate_limited_prompt_querier import RateLimitedPromptQuerier
+from gpt_pdf_organizer.utils.rate_limit import TokenBucket
+
+
+class FakeClock:
+    """
+    A clock only moving forward when slept on, recording the sleeps.
+    """
+
+    def __init__(self):
+        self.now = 0.0
+        self.sleeps = []
+
+    def __call__(self):
+        return self.now
+
+    def sleep(self, seconds):
+        self.sleeps.append(seconds)
+        self.now += seconds
+
+
+def test_token_bucket_refills_at_its_per_minute_rate():
+    clock = FakeClock()
+    bucket = TokenBucket(600, clock)
+
+    assert bucket.get_wait_time(600) == 0
+    bucket.consume(600)
+    assert bucket.get_wait_time(10) == 1.0
+
+    clock.now = 0.5
+    bucket.refund(5)
+    assert bucket.get_wait_time(10) == 0
+
+
+def test_rate_limited_query_is_retried_after_retry_after(chat_completions_server):
+    chat_completions_server.content = "{}"
+    chat_completions_server.responses = [
+        (429, {"error": {"message": "rate limited", "type": "requests", "code": "rate_limit_exceeded"}},
+         {"Retry-After": "0"}),
+    ]
+    querier = RateLimitedPromptQuerier(
+        GPTPromptQuerier({
+            "api_key": "test",
+            "model_name": "gpt-3.5-turbo",
+            "max_tokens": 50,
+            "base_url": chat_completions_server.base_url,
+            "max_retries": 0,
+        }),
+        requests_per_minute=600,
+        max_concurrency=4,
+    )
+
+    assert querier.query("document") == "{}"
+    assert len(chat_completions_server.requests) == 2
+    assert querier.get_stats()["rate_limited"] == 1
+    assert querier.concurrency_limit < 4
+
+
+def test_prompts_larger_than_the_tokens_per_minute_wait_for_a_full_bucket(monkeypatch):
+    clock = FakeClock()
+    monkeypatch.setattr(rate_limited_prompt_querier, "time", SimpleNamespace(sleep=clock.sleep))
+    querier = RateLimitedPromptQuerier(FakePromptQuerier(), tokens_per_minute=100, clock=clock)
+
+    querier.query("word " * 250)
+    querier.query("word " * 250)
+    querier.query("word " * 30)
+
+    # a prompt of 250 tokens takes the whole bucket, rather than waiting forever
+    assert clock.sleeps == [60.0, 18.0]
+
+
+def test_concurrency_is_halved_on_rate_limits_and_grows_back_additively():
+    clock = FakeClock()
+    querier = RateLimitedPromptQuerier(FakePromptQuerier(), max_concurrency=4, clock=clock)
+
+    assert [querier._try_admit(0) for _ in range(5)] == [0, 0, 0, 0, CONCURRENCY_POLL_INTERVAL]
+    # rate limits of queries sent together count as a single congestion signal
+    querier._on_rate_limited(RateLimitException(retry_after=0), attempt=0)
+    querier._on_rate_limited(RateLimitException(retry_after=0), attempt=0)
+    assert querier.concurrency_limit == 2
+
+    clock.now += 1
+    assert querier._try_admit(0) == CONCURRENCY_POLL_INTERVAL
+    querier._on_success(0, "{}")
+    assert querier.concurrency_limit == 2.5
+    assert querier._try_admit(0) == 0
+
+    for _ in range(6):
+        querier._on_success(0, "{}")
+        assert querier._try_admit(0) == 0
+    assert querier.concurrency_limit == 4
+
+
+def test_rate_limit_pauses_all_queries_for_its_retry_after():
+    clock = FakeClock()
+    querier = RateLimitedPromptQuerier(FakePromptQuerier(), max_concurrency=4, clock=clock)
+    assert querier._try_admit(0) == 0
+    assert querier._try_admit(0) == 0
+
+    querier._on_rate_limited(RateLimitException(retry_after=5), attempt=0)
+
+    # the other query in flight, and any new one, waits for the delay asked by the API
+    wait = querier._try_admit(0)
+    assert 5 <= wait <= 5.1
+    clock.now += wait
+    assert querier._try_admit(0) == 0
+    assert querier.get_stats()["retries"] == 1
@@ -0,0 +1,48 @@
+import pytest
+
+from gpt_pdf_organizer.utils.run_journal import RunJournal
+from gpt_pdf_organizer.utils.run_journal import get_file_key
+
+
+def test_recorded_files_are_loaded_on_resume(tmp_path):
+    source = tmp_path / "file.pdf"
+    source.write_bytes(b"%PDF")
+    path = RunJournal.get_path(str(tmp_path))
+
+    journal = RunJournal(path, flush_interval=3600)
+    journal.record(get_file_key(str(source)), str(source), "classified", "dest.pdf", {"title": "t"})
+    assert RunJournal.load_handled_file_keys(path) == set()
+    journal.close()
+
+    assert RunJournal.load_handled_file_keys(path) == {get_file_key(str(source))}
+
+
+def test_changed_file_is_not_considered_handled(tmp_path):
+    source = tmp_path / "file.pdf"
+    source.write_bytes(b"%PDF")
+    key = get_file_key(str(source))
+    source.write_bytes(b"%PDF-1.7 another file")
+
+    assert get_file_key(str(source)) != key
+
+
+def test_truncated_record_is_ignored(tmp_path):
+    path = RunJournal.get_path(str(tmp_path))
+    with open(path, "w") as f:
+        f.write('{"key": "a", "status": "classified"}\n{"key": "b", "sta')
+
+    journal = RunJournal(path)
+    journal.record("c", "c.pdf", "unclassified")
+    journal.close()
+
+    assert RunJournal.load_handled_file_keys(path) == {"a", "c"}
+
+
+def test_resume_needs_the_run_journal(tmp_path, make_app):
+    (tmp_path / "input").mkdir()
+    app = make_app()
+
+    with pytest.raises(ValueError, match="journal.enabled"):
+        next(app.organize(str(tmp_path / "input"), str(tmp_path / "output"), resume=True))
+    with pytest.raises(ValueError, match="journal.enabled"):
+        next(app.plan(str(tmp_path / "input"), str(tmp_path / "output"), resume=True))
@@ -0,0 +1,29 @@
+import pytest
+import tiktoken.load
+
+from benchmarks.bench_startup import get_deferred_imports
+from benchmarks.bench_startup import measure_imports
+from gpt_pdf_organizer.app.exception import TokenizerFileNotCachedException
+from gpt_pdf_organizer.utils.tokenizer import CACHE_DIR_ENV
+from gpt_pdf_organizer.utils.tokenizer import OFFLINE_ENV
+from gpt_pdf_organizer.utils.tokenizer import get_tokenizer
+
+
+def test_cli_does_not_import_heavy_dependencies_at_startup():
+    assert get_deferred_imports(measure_imports()) == []
+
+
+def test_offline_mode_never_downloads_the_tokenizer(tmp_path, monkeypatch):
+    monkeypatch.setenv(CACHE_DIR_ENV, str(tmp_path))
+    monkeypatch.setenv(OFFLINE_ENV, "1")
+    read_file = tiktoken.load.read_file
+    get_tokenizer.cache_clear()
+
+    try:
+        with pytest.raises(TokenizerFileNotCachedException, match="not in the cache folder"):
+            get_tokenizer("gpt-3.5-turbo")
+    finally:
+        get_tokenizer.cache_clear()
+
+    # downloads are only disabled while loading a tokenizer in offline mode
+    assert tiktoken.load.read_file is read_file
@@ -0,0 +1,74 @@
+import pytest
+
+from conftest import write_pdf
+from gpt_pdf_organizer.infrastructure.pdfium_text_extractor import PdfiumTextExtractor
+from gpt_pdf_organizer.infrastructure.pdfminer_text_extractor import PdfminerTextExtractor
+from gpt_pdf_organizer.service.text_extractor import TextExtractor
+from gpt_pdf_organizer.utils.pdf import PdfplumberTextExtractor
+from gpt_pdf_organizer.utils.pdf import extract_document
+from test_metadata_resolver import XMP
+
+
+def clamp_text_by_tokens(text, max_tokens):
+    words = text.split()[:max_tokens]
+    return " ".join(words), len(words)
+
+
+class FailingTextExtractor(TextExtractor):
+    """
+    Extracts pages with pdfminer until the given page, where it fails.
+    """
+
+    name = "failing"
+
+    def __init__(self, failing_page):
+        self.failing_page = failing_page
+
+    def open(self, pdf_path):
+        document = PdfminerTextExtractor().open(pdf_path)
+        iter_pages_text = document.iter_pages_text
+
+        def failing_iter_pages_text(start_page=0, **kwargs):
+            for i, text in enumerate(iter_pages_text(start_page, **kwargs), start_page):
+                if i == self.failing_page:
+                    raise ValueError("broken page")
+                yield text
+
+        document.iter_pages_text = failing_iter_pages_text
+        return document
+
+
+@pytest.mark.parametrize("text_extractor", [PdfplumberTextExtractor(), PdfminerTextExtractor(), PdfiumTextExtractor()])
+def test_backends_extract_the_same_text_and_metadata(tmp_path, text_extractor):
+    pdf_path = write_pdf(
+        tmp_path / "file.pdf",
+        ["Attention Is All You Need\nAshish Vaswani", "second page"],
+        info={"Title": "A title", "Author": "Jane Doe"},
+        xmp=XMP,
+    )
+
+    with text_extractor.open(pdf_path) as document:
+        assert list(document.iter_pages_text()) == ["Attention Is All You Need\nAshish Vaswani", "second page"]
+        assert list(document.iter_pages_text(start_page=1)) == ["second page"]
+        assert document.get_document_info() == {
+            "Title": "A title",
+            "Author": "Jane Doe",
+            "dc:title": "Attention Is All You Need",
+            "dc:creator": "Ashish Vaswani, Noam Shazeer",
+            "xmp:CreateDate": "2021-04-02T10:00:00Z",
+        }
+
+
+def test_next_backend_takes_over_from_the_failing_page(tmp_path):
+    pdf_path = write_pdf(tmp_path / "file.pdf", ["one", "two", "three"])
+
+    document = extract_document(
+        pdf_path, 10, clamp_text_by_tokens,
+        text_extractors=[FailingTextExtractor(failing_page=1), PdfiumTextExtractor()],
+    )
+
+    assert document.content == "onetwothree"
+    assert document.extractors == ["failing", "pdfium"]
+
+    with pytest.raises(ValueError):
+        extract_document(pdf_path, 10, clamp_text_by_tokens, text_extractors=[FailingTextExtractor(failing_page=0)])
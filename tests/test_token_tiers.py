@@ -0,0 +1,46 @@
+import re
+import asyncio
+
+import pytest
+
+from conftest import write_pdf
+from fakes import FakePromptQuerier
+
+
+def answer_with_title_page(prompt):
+    """
+    Answers with the word following "Title" in the content, or a null title when the
+    content does not reach it.
+    """
+    title = re.search(r"Title (\w+)", prompt)
+    return {"title": title.group(1) if title else "null", "content_type": "book"}
+
+
+async def organize_async(app, input_dir, output_dir):
+    return [app.get_error() async for _ in app.organize_async(input_dir, output_dir)]
+
+
+@pytest.mark.parametrize("use_async", [False, True])
+def test_files_are_queried_again_with_larger_token_tiers_until_classified(tmp_path, make_app, use_async):
+    input_dir = tmp_path / "input"
+    input_dir.mkdir()
+    write_pdf(input_dir / "article.pdf", ["Title article " + "words " * 60])
+    write_pdf(input_dir / "book.pdf", ["preface " * 30 + "Title book " + "words " * 60])
+    write_pdf(input_dir / "scan.pdf", ["no title here"])
+
+    querier = FakePromptQuerier(answer_with_title_page)
+    app = make_app({"maxNumTokens": 100, "tokenBudget": {"tiers": [10, 50]}}, querier)
+
+    output_dir = tmp_path / "output"
+    if use_async:
+        asyncio.run(organize_async(app, str(input_dir), str(output_dir)))
+    else:
+        list(app.organize(str(input_dir), str(output_dir)))
+
+    # article: 10 tokens; book: 10, then 50 tokens; scan: its whole content fits in the first tier
+    assert len(querier.prompts) == 4
+    assert app.get_stats()["token_tier_10"] == 1
+    assert app.get_stats()["token_tier_50"] == 1
+    assert (output_dir / "book" / "article.pdf").exists()
+    assert (output_dir / "book" / "book.pdf").exists()
+    assert (output_dir / "unclassified" / "scan.pdf").exists()
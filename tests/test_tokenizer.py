@@ -0,0 +1,59 @@
+import tiktoken
+import pytest
+
+from gpt_pdf_organizer.utils.tokenizer import Tokenizer
+
+# the pre-tokenization pattern of cl100k_base, whose encoding file is not cached here
+CL100K_PATTERN = (
+    r"""(?i:'s|'t|'re|'ve|'m|'ll|'d)|[^\r\n\p{L}\p{N}]?\p{L}+|\p{N}{1,3}| ?[^\s\p{L}\p{N}]+[\r\n]*"""
+    r"""|\s*[\r\n]+|\s+(?!\S)|\s+"""
+)
+# long tokens make the first tokens of a text reach the end of the prefix encoded alone
+WORD = "abcdefgh"
+MERGES = [
+    b"ab", b"cd", b"ef", b"gh", b"abcd", b"efgh", b"abcdefgh", b" abcdefgh",
+    b"\n\n", b".\n\n", b"  ", b"    ", b"\xe6\x97",
+]
+TEXTS = [
+    (WORD * 3 + ".\n\n") * 40,
+    (WORD * 3 + " \n\n \t\r\n   " + WORD) * 40,
+    (WORD + "    " + WORD + "  café 日本語 ") * 40,
+]
+
+
+def build_tokenizer():
+    """
+    A byte-level tokenizer with the pattern of cl100k_base and a few merges, so tokens
+    span whitespace runs and split multi-byte characters.
+    """
+    ranks = {bytes([i]): i for i in range(256)}
+    for merge in MERGES:
+        ranks[merge] = len(ranks)
+    return Tokenizer(tiktoken.Encoding("test", pat_str=CL100K_PATTERN, mergeable_ranks=ranks, special_tokens={}))
+
+
+@pytest.mark.parametrize("text", TEXTS)
+def test_clamped_text_and_count_match_the_encoding_of_the_whole_text(text):
+    tokenizer = build_tokenizer()
+    tokens = tokenizer.encode(text)
+
+    for max_tokens in range(1, 60):
+        clamped, num_tokens = tokenizer.clamp_text_by_tokens(text, max_tokens)
+
+        assert text.startswith(clamped)
+        assert num_tokens <= max_tokens
+        # the clamped text is made of the first tokens of the whole text
+        assert clamped.encode("utf-8") == tokenizer.encoder.decode_bytes(tokens[:num_tokens])
+        assert (clamped, num_tokens) == tokenizer.clamp_tokens(text, tokens, max_tokens)
+
+
+def test_clamped_tokens_back_off_to_a_character_boundary():
+    tokenizer = build_tokenizer()
+    text = "日本"
+    tokens = tokenizer.encode(text)
+    assert len(tokens) == 5
+
+    assert tokenizer.clamp_tokens(text, tokens, 5) == ("日本", 5)
+    assert tokenizer.clamp_tokens(text, tokens, 4) == ("日", 2)
+    assert tokenizer.clamp_tokens(text, tokens, 1) == ("", 0)
+    assert tokenizer.clamp_texts_by_tokens(["日本", "日本"], 7) == ("日本日", 7)
@@ -0,0 +1,84 @@
+import json
+import threading
+
+import pytest
+
+from conftest import write_pdf
+from fakes import FakePromptQuerier
+from gpt_pdf_organizer.utils.file import FileScanner
+from gpt_pdf_organizer.utils.run_journal import RunJournal
+from gpt_pdf_organizer.utils.watcher import FolderWatcher
+
+
+def answer_first_or_second(prompt):
+    return {"title": "second" if "second paper" in prompt else "first", "content_type": "article"}
+
+
+@pytest.mark.parametrize("use_polling", [False, True])
+def test_watcher_reports_files_once_they_settle(tmp_path, use_polling):
+    (tmp_path / "output").mkdir()
+    write_pdf(tmp_path / "present.pdf", ["present"])
+    scanner = FileScanner(str(tmp_path), ["pdf"], recursive=True, exclude=["*.part.pdf"])
+    watcher = FolderWatcher(
+        scanner, settle_seconds=0.3, poll_interval=0.05, use_polling=use_polling,
+        ignored_folders=[str(tmp_path / "output")],
+    )
+
+    with watcher:
+        assert watcher.backend == ("polling" if use_polling else "inotify")
+        assert watcher.get_settled_files(timeout=2) == [str(tmp_path / "present.pdf")]
+
+        (tmp_path / "sub").mkdir()
+        growing = tmp_path / "sub" / "growing.pdf"
+        with open(growing, "wb") as f:
+            # written in chunks slower than the settle time, as by a slow copy
+            for _ in range(3):
+                f.write(b"%PDF" * 1000)
+                f.flush()
+                assert watcher.get_settled_files(timeout=0.15) == []
+        write_pdf(tmp_path / "output" / "placed.pdf", ["placed"])
+        write_pdf(tmp_path / "download.part.pdf", ["partial"])
+        (tmp_path / "notes.txt").write_text("not a pdf")
+
+        assert watcher.get_settled_files(timeout=2) == [str(growing)]
+        assert watcher.get_settled_files(timeout=0.5) == []
+
+
+def test_watch_organizes_new_files_until_stopped(tmp_path, make_app):
+    input_dir = tmp_path / "input"
+    input_dir.mkdir()
+    output_dir = tmp_path / "output"
+    write_pdf(input_dir / "first.pdf", ["the first paper"])
+
+    app = make_app(
+        {"watch": {"settleSeconds": 0.2, "pollIntervalSeconds": 0.05}, "journal": {"enabled": True}},
+        FakePromptQuerier(answer_first_or_second),
+    )
+    stop = threading.Event()
+    # stops a watch never seeing its files
+    timer = threading.Timer(30, stop.set)
+    timer.start()
+
+    handled = 0
+    try:
+        for _ in app.watch(str(input_dir), str(output_dir), stop):
+            handled += 1
+            if handled == 1:
+                assert (output_dir / "article" / "first.pdf").exists()
+                write_pdf(input_dir / "second.pdf", ["the second paper"])
+            else:
+                stop.set()
+    finally:
+        timer.cancel()
+
+    assert handled == 2
+    assert (output_dir / "article" / "second.pdf").exists()
+    with open(RunJournal.get_path(str(output_dir))) as f:
+        assert sorted(json.loads(line)["source"] for line in f) == [
+            str(input_dir / "first.pdf"), str(input_dir / "second.pdf"),
+        ]
+
+    # the files handled by the previous watch are skipped
+    stop = threading.Event()
+    threading.Timer(1, stop.set).start()
+    assert list(app.watch(str(input_dir), str(output_dir), stop)) == []